@@ -0,0 +1,82 @@
+"""قياس أداء استيراد العقود بالجملة مع توليد جدولة الدفعات
+
+التشغيل:
+    python benchmarks/bench_contract_import.py [عدد العقود] [عدد السنوات]
+"""
+import io
+import sys
+import time
+
+from common import create_bench_app
+
+from src.models.property import db, Company
+from src.models.contract import Person, ContractPayment
+from src.utils.bulk_import import UnitImporter, ContractImporter
+from src.utils.financial_summary import check_summary
+
+CONTRACTS = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+YEARS = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+BUILDINGS = 100
+TENANTS = 5_000
+
+
+def build_units_csv():
+    lines = ['building_name,unit_number,current_rent']
+    for index in range(CONTRACTS):
+        lines.append(f'برج {index % BUILDINGS + 1},{index // BUILDINGS + 1},{3000 + index % 5 * 500}')
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def build_contracts_csv():
+    """عقد شهري واحد لكل وحدة، نصفها تاريخية منتهية ومدفوعة حتى نهايتها"""
+    lines = ['unit_id,tenant_id,start_date,end_date,rent_amount,payment_frequency,status,paid_until']
+    for index in range(CONTRACTS):
+        start_year = 2016 + index % 8
+        historical = index % 2 == 0
+        lines.append(
+            f'{index + 1},{index % TENANTS + 1},{start_year}-{index % 12 + 1:02d}-01,'
+            f'{start_year + YEARS - 1}-{index % 12 + 1:02d}-28,{3000 + index % 5 * 500},monthly,'
+            f'{"expired" if historical else "active"},{f"{start_year + YEARS - 1}-12-31" if historical else ""}'
+        )
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def seed_tenants():
+    table = Person.__table__
+    db.session.execute(table.insert(), [
+        {'company_id': 1, 'person_type': 'tenant', 'first_name': f'مستأجر{index}', 'last_name': 'تجريبي',
+         'is_active': True}
+        for index in range(TENANTS)
+    ])
+    db.session.commit()
+
+
+def main():
+    app = create_bench_app()
+    with app.app_context():
+        db.session.add(Company(id=1, name='Bench'))
+        db.session.commit()
+        UnitImporter(1).run(io.BytesIO(build_units_csv()))
+        seed_tenants()
+        data = build_contracts_csv()
+        print(f"استيراد {CONTRACTS:,} عقد شهري لمدة {YEARS} سنوات ({len(data) / 1024 / 1024:.1f} MB) ...")
+
+        start = time.perf_counter()
+        report = ContractImporter(1).run(io.BytesIO(data), dry_run=True)
+        elapsed = time.perf_counter() - start
+        print(f"{'تحقق فقط (dry_run)':<40} {elapsed * 1000:10.2f} ms")
+
+        start = time.perf_counter()
+        report = ContractImporter(1).run(io.BytesIO(data))
+        elapsed = time.perf_counter() - start
+        print(f"{'استيراد':<40} {elapsed * 1000:10.2f} ms")
+        print(f"{'':<40} {report['imported']:10,} عقد، {report['created']['payments']:,} دفعة")
+        print(f"{'':<40} {report['created']['payments'] / elapsed:10,.0f} دفعة/ث")
+
+        payments = db.session.query(ContractPayment).count()
+        mismatches = check_summary(1)
+        print(f"{'التحقق من الملخص المالي':<40} {payments:10,} دفعة، {len(mismatches)} فرق")
+
+
+if __name__ == '__main__':
+    main()
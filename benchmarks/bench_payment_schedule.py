@@ -0,0 +1,95 @@
+"""قياس أداء توليد جدولة الدفعات: الإضافة المتتالية بـ relativedelta مقابل الحساب من فهرس الفترة
+
+التشغيل:
+    python benchmarks/bench_payment_schedule.py [عدد العقود] [عدد السنوات]
+"""
+import sys
+from calendar import monthrange
+from datetime import date, datetime
+from decimal import Decimal
+
+from common import create_bench_app, timed
+
+from dateutil.relativedelta import relativedelta
+from src.models.property import db, Company, Building, Unit
+from src.models.contract import Person, Contract
+from src.utils.payment_schedule import payment_schedule, payment_rows, insert_payments, contract_value
+from src.utils.financial_summary import record_new_payments, check_summary
+
+CONTRACTS = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+YEARS = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+
+
+def stepwise_schedule(start_date, end_date, rent_amount):
+    """الطريقة السابقة: دفعة بعد دفعة بإضافة relativedelta إلى التاريخ السابق (للمقارنة)"""
+    schedule = []
+    current_date = start_date
+    payment_number = 1
+    while current_date <= end_date:
+        schedule.append((payment_number, current_date, rent_amount))
+        current_date = current_date + relativedelta(months=1)
+        payment_number += 1
+    return schedule
+
+
+def contracts():
+    """عقود شهرية طويلة بأيام بداية مختلفة (منها آخر الشهر) وإيجارات بكسور هللة"""
+    for index in range(CONTRACTS):
+        year, month = 2010 + index % 10, index % 12 + 1
+        start = date(year, month, index % 28 + 1 if index % 7 else monthrange(year, month)[1])
+        end = date(start.year + YEARS, start.month, 1) - relativedelta(days=index % 20)
+        yield start, end, Decimal(2000 + index % 997) + Decimal(index % 1000) / 1000
+
+
+def main():
+    items = list(contracts())
+    print(f"جدولة {CONTRACTS:,} عقد شهري لمدة {YEARS} سنة ...")
+
+    timed('الإضافة المتتالية (relativedelta)', lambda: sum(
+        len(stepwise_schedule(start, end, rent)) for start, end, rent in items
+    ), repeat=1)
+    count = timed('من فهرس الفترة مع التناسب والتقريب', lambda: sum(
+        len(payment_schedule(start, end, rent, 'monthly')) for start, end, rent in items
+    ), repeat=3)
+    print(f"{'':<40} {count:10,} دفعة")
+
+    # المجموع يساوي قيمة العقد المقربة (الإيجار × الأشهر الكاملة + الجزء المتناسب) تماماً
+    for start, end, rent in items[:1000]:
+        schedule = payment_schedule(start, end, rent, 'monthly')
+        amounts = [amount for _, _, amount in schedule]
+        assert sum(amounts) == contract_value(start, end, rent, 'monthly')
+        assert max(amounts[:-1]) - min(amounts[:-1]) <= Decimal('0.01')
+
+    app = create_bench_app()
+    with app.app_context():
+        db.session.add(Company(id=1, name='Bench'))
+        db.session.add(Building(id=1, company_id=1, name='B', is_active=True))
+        db.session.add(Unit(id=1, company_id=1, building_id=1, unit_number='1', is_active=True))
+        db.session.add(Person(id=1, company_id=1, person_type='tenant', first_name='T', last_name='T'))
+        db.session.commit()
+        batch = items[:min(CONTRACTS, 2_000)]
+        db.session.execute(Contract.__table__.insert(), [
+            {'id': index + 1, 'company_id': 1, 'contract_number': f'B-{index}', 'unit_id': 1, 'tenant_id': 1,
+             'start_date': start, 'end_date': end, 'rent_amount': rent, 'payment_frequency': 'monthly',
+             'status': 'expired'}
+            for index, (start, end, rent) in enumerate(batch)
+        ])
+        db.session.commit()
+
+        def bulk_insert():
+            now = datetime.utcnow()
+            rows = []
+            for index, (start, end, rent) in enumerate(batch):
+                rows.extend(payment_rows(index + 1, payment_schedule(start, end, rent, 'monthly'), now,
+                                         paid_until=date(2020, 12, 31)))
+            insert_payments(db.session.connection(), rows)
+            record_new_payments(1, rows)
+            db.session.commit()
+            return len(rows)
+
+        rows = timed(f'إدراج جداول {len(batch):,} عقد بالجملة', bulk_insert, repeat=1)
+        print(f"{'':<40} {rows:10,} دفعة، {len(check_summary(1))} فرق في الملخص")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""قياس أداء البحث عن الأشخاص: LIKE '%...%' على خمسة أعمدة مقابل فهرس FTS5
+
+التشغيل:
+    python benchmarks/bench_person_search.py [عدد الأشخاص]
+"""
+import random
+import sys
+
+from common import create_bench_app, timed, insert_chunks
+
+from sqlalchemy import or_
+from src.models.property import db, Company
+from src.models.contract import Person
+from src.utils.fulltext import search_persons
+from src.utils.normalization import normalize_text
+
+PERSONS = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+FIRST_NAMES = ['محمد', 'أحمد', 'عبدالله', 'خالد', 'سارة', 'فاطمة', 'نورة', 'Omar', 'John', 'Maria', 'Ali', 'Rahul']
+LAST_NAMES = ['العتيبي', 'القحطاني', 'الشمري', 'الحربي', 'الزهراني', 'Smith', 'Khan', 'Garcia', 'Hassan', 'Nair']
+
+SEARCHES = ['محم', 'khan', 'omar has', '1000012', '0551234', 'user1999']
+
+
+def seed():
+    """توليد بيانات القياس"""
+    rng = random.Random(7)
+    db.session.add(Company(id=1, name='Bench'))
+    db.session.commit()
+
+    def persons():
+        for index in range(PERSONS):
+            first = rng.choice(FIRST_NAMES)
+            last = rng.choice(LAST_NAMES)
+            yield {
+                'id': index + 1, 'company_id': 1, 'person_type': 'tenant', 'is_active': True,
+                'first_name': first, 'last_name': last, 'search_name': normalize_text(f'{first} {last}'),
+                'id_number': str(1_000_000_000 + index),
+                'phone': f'05{rng.randint(10_000_000, 99_999_999)}',
+                'email': f'user{index}@example.com'
+            }
+    insert_chunks(Person.__table__, persons())
+
+
+def first_page(query):
+    """مثل paginate في get_persons: العدد الكلي ثم الصفحة الأولى"""
+    return query.order_by(None).count(), query.limit(10).all()
+
+
+def like_search(search):
+    """الطريقة السابقة: خمسة شروط LIKE لا تستخدم أي فهرس"""
+    return first_page(Person.query.filter_by(company_id=1, is_active=True).filter(or_(
+        Person.first_name.contains(search),
+        Person.last_name.contains(search),
+        Person.id_number.contains(search),
+        Person.phone.contains(search),
+        Person.email.contains(search)
+    )))
+
+
+def fts_search(search):
+    """الطريقة الجديدة: بحث بادئات في FTS5 مرتب حسب الصلة"""
+    return first_page(search_persons(Person.query.filter_by(company_id=1, is_active=True), search))
+
+
+def main():
+    app = create_bench_app()
+    with app.app_context():
+        print(f"توليد {PERSONS:,} شخص ...")
+        seed()
+        for search in SEARCHES:
+            timed(f'LIKE  {search!r}', lambda: like_search(search))
+            timed(f'FTS5  {search!r}', lambda: fts_search(search))
+
+
+if __name__ == '__main__':
+    main()
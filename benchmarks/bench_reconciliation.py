@@ -0,0 +1,135 @@
+"""قياس أداء مطابقة كشف الحساب البنكي: الفهرسة بالمبلغ والتاريخ مقابل الحلقة المتداخلة
+
+التشغيل:
+    python benchmarks/bench_reconciliation.py [عدد العقود]
+"""
+import io
+import sys
+import time
+from datetime import date, timedelta
+
+from common import create_bench_app, insert_chunks
+
+from dateutil.relativedelta import relativedelta
+from src.models.property import db, Company, Building, Unit
+from src.models.contract import Person, Contract, ContractPayment, Cheque
+from src.utils.reconciliation import StatementReconciler, apply_matches
+from src.utils.financial_summary import rebuild_summary, check_summary
+
+CONTRACTS = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+MONTHS = 24
+STATEMENT_MONTHS = 2
+START = date(2024, 1, 1)
+NAIVE_LINES = 1_000
+
+
+def rent(index):
+    return 2000 + index % 300 * 5
+
+
+def seed():
+    """عقود شهرية بدفعات معلقة، وربعها بشيكات مفتوحة للشهرين الأولين"""
+    db.session.add(Company(id=1, name='Bench'))
+    db.session.add(Person(id=1, company_id=1, person_type='tenant', first_name='T', last_name='T'))
+    db.session.add(Building(id=1, company_id=1, name='B', is_active=True))
+    db.session.commit()
+
+    insert_chunks(Unit.__table__, (
+        {'id': c + 1, 'company_id': 1, 'building_id': 1, 'unit_number': str(c), 'status': 'occupied',
+         'is_active': True}
+        for c in range(CONTRACTS)
+    ))
+    insert_chunks(Contract.__table__, (
+        {'id': c + 1, 'company_id': 1, 'contract_number': f'CNT-2024-{c + 1:06d}', 'unit_id': c + 1,
+         'tenant_id': 1, 'start_date': START, 'end_date': START + relativedelta(months=MONTHS, days=-1),
+         'rent_amount': rent(c), 'status': 'active'}
+        for c in range(CONTRACTS)
+    ))
+    insert_chunks(ContractPayment.__table__, (
+        {'contract_id': c + 1, 'payment_number': n + 1, 'due_date': START + relativedelta(months=n),
+         'amount': rent(c), 'paid_amount': 0, 'status': 'pending'}
+        for c in range(CONTRACTS) for n in range(MONTHS)
+    ))
+    insert_chunks(Cheque.__table__, (
+        {'company_id': 1, 'contract_id': c + 1, 'cheque_number': f'{c * 10 + n:08d}', 'amount': rent(c),
+         'due_date': START + relativedelta(months=n), 'status': 'received'}
+        for c in range(0, CONTRACTS, 4) for n in range(STATEMENT_MONTHS)
+    ))
+    rebuild_summary(1)
+
+
+def build_statement():
+    """حركة لكل دفعة في أول شهرين (متأخرة 0-3 أيام)، نصفها بلا مرجع، مع حركات غير معروفة"""
+    lines = ['date,amount,reference,description,cheque_number']
+    for n in range(STATEMENT_MONTHS):
+        due = START + relativedelta(months=n)
+        for c in range(CONTRACTS):
+            posted = due + timedelta(days=c % 4)
+            if c % 4 == 0:
+                lines.append(f'{posted},{rent(c)},CHQ,,{c * 10 + n}')
+            elif c % 2:
+                lines.append(f'{posted},{rent(c)},TRX{c},تحويل إيجار CNT-2024-{c + 1:06d},')
+            else:
+                lines.append(f'{posted},{rent(c)},TRX{c},تحويل,')
+            if c % 20 == 0:
+                lines.append(f'{posted},{rent(c) + 1},UNKNOWN,,')
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def naive_match(reconciler, count):
+    """الحلقة المتداخلة: كل حركة تمر على كل البنود المفتوحة"""
+    items = [item for bucket in reconciler.by_amount.values() for item in bucket]
+    matched = 0
+    for line in reconciler.lines[:count]:
+        candidates = [item for item in items
+                      if item.minor == line.minor and abs((item.due_date - line.date).days) <= reconciler.window]
+        matched += len(candidates) == 1
+    return matched
+
+
+def main():
+    app = create_bench_app()
+    with app.app_context():
+        seed()
+        data = build_statement()
+        lines = data.count(b'\n') - 1
+        print(f"مطابقة كشف بـ {lines:,} حركة مقابل {CONTRACTS * MONTHS:,} دفعة ...")
+
+        reconciler = StatementReconciler(1)
+        start = time.perf_counter()
+        reconciler.read(io.BytesIO(data))
+        read_time = time.perf_counter() - start
+        start = time.perf_counter()
+        reconciler.load()
+        load_time = time.perf_counter() - start
+        start = time.perf_counter()
+        reconciler.match()
+        match_time = time.perf_counter() - start
+        summary = reconciler.to_dict()['summary']
+
+        print(f"{'قراءة الكشف':<40} {read_time * 1000:10.2f} ms")
+        print(f"{'تحميل البنود المفتوحة وفهرستها':<40} {load_time * 1000:10.2f} ms")
+        print(f"{'المطابقة (فهرس)':<40} {match_time * 1000:10.2f} ms")
+        print(f"{'':<40} {summary['matched']:10,} مؤكدة، {summary['ambiguous']:,} غامضة، "
+              f"{summary['unmatched']:,} غير مطابقة")
+
+        start = time.perf_counter()
+        naive_match(reconciler, NAIVE_LINES)
+        naive_time = time.perf_counter() - start
+        estimate = naive_time / NAIVE_LINES * len(reconciler.lines)
+        print(f"{f'الحلقة المتداخلة ({NAIVE_LINES:,} حركة)':<40} {naive_time * 1000:10.2f} ms")
+        print(f"{'':<40} {estimate:10,.0f} ث تقديرياً لكامل الكشف")
+
+        matches = reconciler.confirmed_matches()
+        start = time.perf_counter()
+        result = apply_matches(1, matches)
+        elapsed = time.perf_counter() - start
+        print(f"{'تطبيق المطابقات المؤكدة':<40} {elapsed * 1000:10.2f} ms")
+        print(f"{'':<40} {result['payments_paid']:10,} دفعة، {result['cheques_cleared']:,} شيك")
+
+        mismatches = check_summary(1)
+        print(f"{'التحقق من الملخص المالي':<40} {len(mismatches):10} فرق")
+
+
+if __name__ == '__main__':
+    main()
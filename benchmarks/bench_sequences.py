@@ -0,0 +1,63 @@
+"""قياس أداء توليد أرقام المستندات: العد (count) مقابل صف التسلسل مقابل الكتل المحجوزة
+
+التشغيل:
+    python benchmarks/bench_sequences.py [عدد المصروفات الموجودة]
+"""
+import sys
+from datetime import date, datetime
+
+from common import create_bench_app, timed, insert_chunks
+
+from flask import current_app
+
+from src.models.property import db, Company
+from src.models.finance import Expense
+from src.utils.sequences import next_number, clear_blocks
+
+EXISTING = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+NUMBERS = 2_000
+
+
+def count_numbers():
+    """الطريقة السابقة: عد مصروفات الشركة لكل رقم جديد"""
+    numbers = []
+    for _ in range(NUMBERS):
+        count = Expense.query.filter_by(company_id=1).count()
+        numbers.append(f"EXP-{datetime.now().year}-{count + 1:04d}")
+    db.session.rollback()
+    return numbers
+
+
+def sequence_numbers(block_size):
+    def run():
+        clear_blocks()
+        current_app.config['DOCUMENT_NUMBER_BLOCK_SIZE'] = block_size
+        numbers = []
+        for _ in range(NUMBERS):
+            numbers.append(next_number('expense'))
+            db.session.commit()
+        return numbers
+    return run
+
+
+def main():
+    app = create_bench_app()
+    with app.app_context():
+        db.session.add(Company(id=1, name='Bench'))
+        db.session.commit()
+        year = datetime.now().year
+        insert_chunks(Expense.__table__, (
+            {'company_id': 1, 'expense_number': f'EXP-{year - 1}-{index + 1:06d}', 'amount': 10,
+             'expense_date': date(year - 1, 1, 1), 'status': 'paid'}
+            for index in range(EXISTING)
+        ))
+        print(f"توليد {NUMBERS:,} رقم مع {EXISTING:,} مصروف موجود ...")
+
+        timed('count() لكل رقم (بدون حفظ)', count_numbers, repeat=1)
+        numbers = timed('صف التسلسل (معاملة لكل رقم)', sequence_numbers(1), repeat=1)
+        numbers += timed('كتل من 100 رقم', sequence_numbers(100), repeat=1)
+        print(f"{'':<40} {len(set(numbers)):10,} رقم فريد من {len(numbers):,}")
+
+
+if __name__ == '__main__':
+    main()
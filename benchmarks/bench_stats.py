@@ -0,0 +1,123 @@
+"""قياس أداء لوحة التحكم والإحصائيات: استعلامات منفصلة مقابل مسح واحد لكل جدول
+
+التشغيل:
+    python benchmarks/bench_stats.py [عدد الدفعات]
+"""
+import sys
+from datetime import date, timedelta
+
+from common import create_bench_app, timed, insert_chunks
+
+from sqlalchemy import and_, func
+from dateutil.relativedelta import relativedelta
+from src.models.property import db, Company, Building, Unit
+from src.models.contract import Person, Contract, ContractPayment
+from src.models.finance import Expense
+from src.utils.metrics import MetricsQuery
+
+PAYMENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+PAYMENTS_PER_CONTRACT = 100
+UNITS_PER_BUILDING = 100
+
+
+def seed():
+    """توليد بيانات القياس"""
+    contracts = max(1, PAYMENTS // PAYMENTS_PER_CONTRACT)
+    buildings = max(1, contracts // UNITS_PER_BUILDING)
+    start = date(2018, 1, 1)
+    today = date.today()
+
+    db.session.add(Company(id=1, name='Bench'))
+    db.session.add(Person(id=1, company_id=1, person_type='tenant', first_name='T', last_name='T'))
+    db.session.commit()
+
+    insert_chunks(Building.__table__, (
+        {'id': b + 1, 'company_id': 1, 'name': f'B{b}', 'is_active': True} for b in range(buildings)
+    ))
+    insert_chunks(Unit.__table__, (
+        {'id': u + 1, 'company_id': 1, 'building_id': u % buildings + 1, 'unit_number': str(u),
+         'status': ('occupied', 'available', 'maintenance')[u % 3], 'is_active': True}
+        for u in range(contracts)
+    ))
+    insert_chunks(Contract.__table__, (
+        {'id': c + 1, 'company_id': 1, 'contract_number': f'CNT-{c}', 'unit_id': c + 1, 'tenant_id': 1,
+         'start_date': start, 'end_date': today + timedelta(days=c % 60),
+         'rent_amount': 1000 + c % 500, 'status': 'active' if c % 4 else 'expired'}
+        for c in range(contracts)
+    ))
+
+    def payments():
+        pid = 0
+        for c in range(contracts):
+            for n in range(PAYMENTS_PER_CONTRACT):
+                pid += 1
+                due = start + relativedelta(months=n)
+                paid = due < today and pid % 7
+                yield {'id': pid, 'contract_id': c + 1, 'payment_number': n + 1, 'due_date': due,
+                       'amount': 1000, 'paid_amount': 1000 if paid else 0,
+                       'payment_date': due if paid else None,
+                       'status': 'paid' if paid else 'pending'}
+    insert_chunks(ContractPayment.__table__, payments())
+
+    insert_chunks(Expense.__table__, (
+        {'id': e + 1, 'company_id': 1, 'expense_number': f'EXP-{e}', 'amount': 100,
+         'expense_date': today - timedelta(days=e % 400), 'status': 'paid' if e % 3 else 'pending'}
+        for e in range(PAYMENTS // 20)
+    ))
+
+
+def legacy_overview(company_id, today, month_start):
+    """الطريقة السابقة: استعلام مستقل لكل مقياس"""
+    Building.query.filter_by(company_id=company_id, is_active=True).count()
+    Unit.query.filter_by(company_id=company_id, is_active=True).count()
+    Unit.query.filter_by(company_id=company_id, status='occupied', is_active=True).count()
+    Unit.query.filter_by(company_id=company_id, status='available', is_active=True).count()
+    Contract.query.filter_by(company_id=company_id, status='active').count()
+    Contract.query.filter(and_(Contract.company_id == company_id, Contract.status == 'active',
+                               Contract.end_date <= today + relativedelta(days=30))).count()
+    db.session.query(func.sum(ContractPayment.paid_amount)).join(Contract).filter(and_(
+        Contract.company_id == company_id, ContractPayment.status == 'paid',
+        ContractPayment.payment_date >= month_start, ContractPayment.payment_date <= today)).scalar()
+    db.session.query(func.sum(Expense.amount)).filter(and_(
+        Expense.company_id == company_id, Expense.status == 'paid',
+        Expense.expense_date >= month_start, Expense.expense_date <= today)).scalar()
+    ContractPayment.query.join(Contract).filter(and_(
+        Contract.company_id == company_id, ContractPayment.status == 'pending',
+        ContractPayment.due_date < today)).count()
+    db.session.query(func.sum(ContractPayment.amount)).join(Contract).filter(and_(
+        Contract.company_id == company_id, ContractPayment.status == 'pending',
+        ContractPayment.due_date < today)).scalar()
+
+
+def folded_overview(company_id, today, month_start):
+    """الطريقة الجديدة: مسح واحد لكل جدول"""
+    MetricsQuery(Building, Building.company_id == company_id, Building.is_active == True).count('total').run()
+    (MetricsQuery(Unit, Unit.company_id == company_id, Unit.is_active == True)
+     .count('total').count('occupied', Unit.status == 'occupied')
+     .count('available', Unit.status == 'available').run())
+    (MetricsQuery(Contract, Contract.company_id == company_id, Contract.status == 'active')
+     .count('active').count('expiring', Contract.end_date <= today + relativedelta(days=30)).run())
+    is_overdue = and_(ContractPayment.status == 'pending', ContractPayment.due_date < today)
+    (MetricsQuery(ContractPayment, Contract.company_id == company_id).join(Contract)
+     .sum('monthly_revenue', ContractPayment.paid_amount, ContractPayment.status == 'paid',
+          ContractPayment.payment_date >= month_start, ContractPayment.payment_date <= today)
+     .count('overdue_payments', is_overdue)
+     .sum('overdue_amount', ContractPayment.amount, is_overdue).run())
+    (MetricsQuery(Expense, Expense.company_id == company_id)
+     .sum('total', Expense.amount, Expense.status == 'paid',
+          Expense.expense_date >= month_start, Expense.expense_date <= today).run())
+
+
+def main():
+    app = create_bench_app()
+    with app.app_context():
+        print(f"توليد {PAYMENTS:,} دفعة ...")
+        seed()
+        today = date.today()
+        month_start = today.replace(day=1)
+        timed('overview: separate queries', lambda: legacy_overview(1, today, month_start), repeat=3)
+        timed('overview: MetricsQuery', lambda: folded_overview(1, today, month_start), repeat=3)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""قياس أداء استيراد الوحدات بالجملة من ملف CSV
+
+التشغيل:
+    python benchmarks/bench_unit_import.py [عدد الوحدات]
+"""
+import io
+import sys
+import time
+
+from common import create_bench_app
+
+from src.models.property import db, Company
+from src.utils.bulk_import import UnitImporter
+
+UNITS = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+BUILDINGS = 200
+
+
+def build_csv():
+    """ملف CSV بوحدات موزعة على مبانٍ جديدة (تُنشأ أثناء الاستيراد)"""
+    lines = ['building_name,unit_number,floor_number,bedrooms,bathrooms,area,current_rent,status,furnished']
+    for index in range(UNITS):
+        bedrooms = index % 4 + 1
+        lines.append(
+            f'برج {index % BUILDINGS + 1},{index // BUILDINGS + 1},{index % 20},{bedrooms},{max(1, bedrooms - 1)},'
+            f'{60 + bedrooms * 25},{2000 + bedrooms * 1000},{"occupied" if index % 3 else "available"},'
+            f'{"yes" if index % 2 else "no"}'
+        )
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def main():
+    app = create_bench_app()
+    with app.app_context():
+        db.session.add(Company(id=1, name='Bench'))
+        db.session.commit()
+        data = build_csv()
+        print(f"استيراد {UNITS:,} وحدة ({len(data) / 1024 / 1024:.1f} MB) ...")
+
+        start = time.perf_counter()
+        report = UnitImporter(1).run(io.BytesIO(data))
+        elapsed = time.perf_counter() - start
+        print(f"{'استيراد':<40} {elapsed * 1000:10.2f} ms")
+        print(f"{'':<40} {report['imported']:10,} وحدة، {report['created']['buildings']:,} مبنى")
+
+        start = time.perf_counter()
+        report = UnitImporter(1).run(io.BytesIO(data))
+        elapsed = time.perf_counter() - start
+        print(f"{'إعادة الملف نفسه (كلها مكررة)':<40} {elapsed * 1000:10.2f} ms")
+        print(f"{'':<40} {report['failed']:10,} صف مرفوض")
+
+
+if __name__ == '__main__':
+    main()
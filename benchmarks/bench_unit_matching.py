@@ -0,0 +1,70 @@
+"""قياس أداء مطابقة الوحدات المتاحة بنطاقات الإيجار والمساحة والغرف
+
+التشغيل:
+    python benchmarks/bench_unit_matching.py [عدد الوحدات]
+"""
+import random
+import sys
+
+from common import create_bench_app, timed, insert_chunks
+
+from sqlalchemy import text
+from src.models.property import db, Company, Building, Unit
+from src.utils.unit_matching import match_units
+
+UNITS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+BUILDINGS = 500
+
+STATUSES = ['available'] * 3 + ['occupied'] * 6 + ['maintenance']
+VIEWS = ['sea', 'city', 'garden', None]
+
+REQUESTS = {
+    '2-3 غرف مفروشة 80-120م تحت 5000': {
+        'bedrooms': (2, 3), 'area': (80, 120), 'rent': (None, 5000), 'furnished': True
+    },
+    'إيجار 3000-4000 فقط': {'rent': (3000, 4000)},
+    '4 غرف فأكثر مع موقفين': {'bedrooms': (4, None), 'parking_spaces': (2, None)},
+    'إطلالة بحرية 100-150م': {'area': (100, 150), 'view_type': 'sea'},
+    'بدون معايير': {}
+}
+
+
+def seed():
+    """توليد بيانات القياس"""
+    rng = random.Random(42)
+    db.session.add(Company(id=1, name='Bench'))
+    db.session.commit()
+    insert_chunks(Building.__table__, (
+        {'id': index + 1, 'company_id': 1, 'name': f'Building {index + 1}', 'is_active': True}
+        for index in range(BUILDINGS)
+    ))
+
+    def units():
+        for index in range(UNITS):
+            bedrooms = rng.randint(1, 5)
+            area = rng.randint(40, 90) + bedrooms * 20
+            yield {
+                'id': index + 1, 'company_id': 1, 'building_id': rng.randint(1, BUILDINGS),
+                'unit_number': str(index + 1), 'status': rng.choice(STATUSES), 'is_active': True,
+                'bedrooms': bedrooms, 'bathrooms': max(1, bedrooms - rng.randint(0, 1)),
+                'parking_spaces': rng.randint(0, 3), 'area': area,
+                'current_rent': round(area * rng.uniform(25, 55), -1),
+                'furnished': rng.random() < 0.4, 'view_type': rng.choice(VIEWS)
+            }
+    insert_chunks(Unit.__table__, units())
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+
+def main():
+    app = create_bench_app()
+    with app.app_context():
+        print(f"توليد {UNITS:,} وحدة ...")
+        seed()
+        for label, criteria in REQUESTS.items():
+            total, _ = timed(label, lambda: match_units(1, criteria))
+            print(f"{'':<40} {total:10,} مطابقة")
+
+
+if __name__ == '__main__':
+    main()
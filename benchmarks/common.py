@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from src.models.property import db
+from src.utils.schema import ensure_schema
+
+
+def create_bench_app():
+    """إنشاء تطبيق بقاعدة بيانات SQLite مؤقتة للقياس"""
+    path = os.path.join(tempfile.mkdtemp(prefix='pm_bench_'), 'bench.db')
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{path}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    with app.app_context():
+        # استيراد جميع النماذج لضمان إنشاء الجداول
+        import src.models.property  # noqa: F401
+        import src.models.contract  # noqa: F401
+        import src.models.finance  # noqa: F401
+        import src.models.notification  # noqa: F401
+        ensure_schema()
+
+    return app
+
+
+def timed(label, fn, repeat=5):
+    """تشغيل الدالة عدة مرات وطباعة أفضل زمن"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<40} {best * 1000:10.2f} ms")
+    return result
+
+
+def insert_chunks(table, rows, chunk_size=50000):
+    """إدراج الصفوف (من أي مولّد) على دفعات باستخدام executemany"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            db.session.execute(table.insert(), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(table.insert(), chunk)
+    db.session.commit()
@@ -15,6 +15,10 @@ from src.routes.dashboard import dashboard_bp
 from src.routes.reports import reports_bp
 from src.routes.templates import templates_bp
 from src.routes.notifications import notifications_bp
+from src.routes.search import search_bp
+from src.routes.autocomplete import autocomplete_bp
+from src.utils.schema import ensure_schema
+from src.utils.commands import register_commands
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'property_management_secret_key_2024'
@@ -39,10 +43,18 @@ app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
 app.register_blueprint(reports_bp, url_prefix='/api/reports')
 app.register_blueprint(templates_bp, url_prefix='/api/templates')
 app.register_blueprint(notifications_bp, url_prefix='/api/notifications')
+app.register_blueprint(search_bp, url_prefix='/api/search')
+app.register_blueprint(autocomplete_bp, url_prefix='/api/autocomplete')
+
+# تسجيل أوامر الصيانة (flask --app src.main <command>)
+register_commands(app)
 
 # تهيئة قاعدة البيانات
 app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+# عدد أرقام المستندات التي يحجزها كل عامل مسبقاً (1 = بلا فجوات، انظر src/utils/sequences.py)
+app.config['DOCUMENT_NUMBER_BLOCK_SIZE'] = 1
 db.init_app(app)
 
 # إنشاء الجداول
@@ -50,10 +62,10 @@ with app.app_context():
     # استيراد جميع النماذج لضمان إنشاء الجداول
     from src.models.property import Company, Branch, Role, User, PropertyType, PropertyCategory, Project, Building, Unit, Property
     from src.models.contract import Person, ContractType, Contract, ContractPayment, Cheque
-    from src.models.finance import Account, JournalEntry, JournalEntryDetail, ExpenseCategory, Expense, MaintenanceRequest
+    from src.models.finance import Account, JournalEntry, JournalEntryDetail, ExpenseCategory, Expense, MaintenanceRequest, FinancialMonthlySummary, FinancialMonthlyCategoryExpense
     from src.models.notification import Notification, NotificationType, NotificationTemplate, NotificationRule, EmailLog, SMSLog, WhatsAppLog
     
-    db.create_all()
+    ensure_schema()
     
     # إنشاء بيانات أولية إذا لم تكن موجودة
     if not Company.query.first():
@@ -5,6 +5,15 @@ from src.models.property import db
 # جدول الأشخاص
 class Person(db.Model):
     __tablename__ = 'persons'
+    __table_args__ = (
+        db.Index('ix_persons_company_search', 'company_id', 'search_name'),
+        db.Index('ix_persons_company_phone', 'company_id', 'phone_e164'),
+        db.Index('ix_persons_company_mobile', 'company_id', 'mobile_e164'),
+        db.Index('ix_persons_company_emergency_phone', 'company_id', 'emergency_contact_phone_e164'),
+        db.Index('ix_persons_company_phone_tail', 'company_id', 'phone_tail'),
+        db.Index('ix_persons_company_mobile_tail', 'company_id', 'mobile_tail'),
+        db.Index('ix_persons_company_emergency_phone_tail', 'company_id', 'emergency_contact_phone_tail'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
@@ -31,6 +40,13 @@ class Person(db.Model):
     emergency_contact_name = db.Column(db.String(255))
     emergency_contact_phone = db.Column(db.String(50))
     notes = db.Column(db.Text)
+    search_name = db.Column(db.Text)  # نص البحث الموحد (normalize_text)
+    phone_e164 = db.Column(db.String(20))  # أرقام E.164 بدون + (normalize_phone)
+    mobile_e164 = db.Column(db.String(20))
+    emergency_contact_phone_e164 = db.Column(db.String(20))
+    phone_tail = db.Column(db.String(10))  # آخر أرقام الصيغة الموحدة (phone_tail) للبحث بنهاية الرقم
+    mobile_tail = db.Column(db.String(10))
+    emergency_contact_phone_tail = db.Column(db.String(10))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
@@ -157,15 +173,15 @@ class ContractPayment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     contract_id = db.Column(db.Integer, db.ForeignKey('contracts.id'), nullable=False)
     payment_number = db.Column(db.Integer, nullable=False)
-    due_date = db.Column(db.Date, nullable=False)
+    due_date = db.Column(db.Date, nullable=False, index=True)
     amount = db.Column(db.Numeric(10, 2), nullable=False)
     paid_amount = db.Column(db.Numeric(10, 2), default=0)
-    payment_date = db.Column(db.Date)
+    payment_date = db.Column(db.Date, index=True)
     payment_method = db.Column(db.String(50))
     status = db.Column(db.String(50), default='pending')  # pending, paid, overdue, cancelled
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # العلاقات
     cheques = db.relationship('Cheque', backref='payment', lazy=True)
@@ -231,3 +247,32 @@ class Cheque(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+
+# جدول حركات الإيراد الشهري المتكرر (صافي التغير في الإيراد الشهري لكل شهر ومبنى ونوع وحدة ونوع عقد)
+class RecurringRevenueMovement(db.Model):
+    __tablename__ = 'recurring_revenue_movements'
+    __table_args__ = (
+        db.UniqueConstraint('company_id', 'month', 'building_id', 'unit_type_id', 'contract_type_id',
+                            name='uq_recurring_revenue_movement'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
+    month = db.Column(db.Date, nullable=False)  # أول يوم في الشهر
+    building_id = db.Column(db.Integer, db.ForeignKey('buildings.id'))
+    unit_type_id = db.Column(db.Integer, db.ForeignKey('property_types.id'))
+    contract_type_id = db.Column(db.Integer, db.ForeignKey('contract_types.id'))
+    mrr_change = db.Column(db.Numeric(15, 2), default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'company_id': self.company_id,
+            'month': self.month.isoformat() if self.month else None,
+            'building_id': self.building_id,
+            'unit_type_id': self.unit_type_id,
+            'contract_type_id': self.contract_type_id,
+            'mrr_change': float(self.mrr_change) if self.mrr_change else 0,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -115,6 +115,9 @@ class ExpenseCategory(db.Model):
 # جدول المصروفات
 class Expense(db.Model):
     __tablename__ = 'expenses'
+    __table_args__ = (
+        db.Index('ix_expenses_company_search', 'company_id', 'search_name'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
@@ -123,9 +126,10 @@ class Expense(db.Model):
     property_id = db.Column(db.Integer)  # can reference buildings or units
     property_type = db.Column(db.String(20))  # 'building' or 'unit' or 'general'
     amount = db.Column(db.Numeric(10, 2), nullable=False)
-    expense_date = db.Column(db.Date, nullable=False)
+    expense_date = db.Column(db.Date, nullable=False, index=True)
     description = db.Column(db.Text)
     vendor_name = db.Column(db.String(255))
+    search_name = db.Column(db.Text)  # نص البحث الموحد (normalize_text)
     invoice_number = db.Column(db.String(100))
     payment_method = db.Column(db.String(50))
     status = db.Column(db.String(50), default='pending')  # pending, paid, cancelled
@@ -201,3 +205,51 @@ class MaintenanceRequest(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+
+# جدول الملخص المالي الشهري (يتم تحديثه تزايدياً مع كل دفعة أو مصروف)
+class FinancialMonthlySummary(db.Model):
+    __tablename__ = 'financial_monthly_summary'
+    __table_args__ = (
+        db.UniqueConstraint('company_id', 'month', name='uq_financial_monthly_summary'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
+    month = db.Column(db.Date, nullable=False)  # أول يوم في الشهر
+    revenue = db.Column(db.Numeric(15, 2), default=0)  # الدفعات المحصلة حسب تاريخ الدفع
+    expenses = db.Column(db.Numeric(15, 2), default=0)  # المصروفات المدفوعة حسب تاريخ المصروف
+    pending_amount = db.Column(db.Numeric(15, 2), default=0)  # الدفعات المعلقة حسب تاريخ الاستحقاق
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'company_id': self.company_id,
+            'month': self.month.isoformat() if self.month else None,
+            'revenue': float(self.revenue) if self.revenue else 0,
+            'expenses': float(self.expenses) if self.expenses else 0,
+            'pending_amount': float(self.pending_amount) if self.pending_amount else 0
+        }
+
+# جدول المصروفات الشهرية حسب الفئة
+class FinancialMonthlyCategoryExpense(db.Model):
+    __tablename__ = 'financial_monthly_category_expenses'
+    __table_args__ = (
+        db.UniqueConstraint('company_id', 'month', 'category_id', name='uq_financial_monthly_category_expense'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
+    month = db.Column(db.Date, nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('expense_categories.id'))
+    amount = db.Column(db.Numeric(15, 2), default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'company_id': self.company_id,
+            'month': self.month.isoformat() if self.month else None,
+            'category_id': self.category_id,
+            'amount': float(self.amount) if self.amount else 0
+        }
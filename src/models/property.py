@@ -187,11 +187,15 @@ class PropertyCategory(db.Model):
 # جدول المشاريع
 class Project(db.Model):
     __tablename__ = 'projects'
+    __table_args__ = (
+        db.Index('ix_projects_company_search', 'company_id', 'search_name'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
     name = db.Column(db.String(255), nullable=False)
     name_en = db.Column(db.String(255))
+    search_name = db.Column(db.Text)  # نص البحث الموحد (normalize_text)
     description = db.Column(db.Text)
     description_en = db.Column(db.Text)
     location = db.Column(db.Text)
@@ -226,12 +230,16 @@ class Project(db.Model):
 # جدول المباني
 class Building(db.Model):
     __tablename__ = 'buildings'
+    __table_args__ = (
+        db.Index('ix_buildings_company_search', 'company_id', 'search_name'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
     project_id = db.Column(db.Integer, db.ForeignKey('projects.id'))
     name = db.Column(db.String(255), nullable=False)
     name_en = db.Column(db.String(255))
+    search_name = db.Column(db.Text)  # نص البحث الموحد (normalize_text)
     address = db.Column(db.Text)
     address_en = db.Column(db.Text)
     total_floors = db.Column(db.Integer)
@@ -270,11 +278,26 @@ class Building(db.Model):
 # جدول الوحدات
 class Unit(db.Model):
     __tablename__ = 'units'
+    __table_args__ = (
+        db.Index('ix_units_company_search', 'company_id', 'search_name'),
+        # فهارس تغطي فلاتر الوحدات وأعداد البحث المصنف (facets) بدون قراءة الجدول
+        db.Index('ix_units_company_facets', 'company_id', 'is_active', 'status', 'unit_type_id',
+                 'category_id', 'bedrooms'),
+        db.Index('ix_units_building_facets', 'building_id', 'is_active', 'status', 'unit_type_id',
+                 'category_id', 'bedrooms'),
+        # مطابقة الوحدات المتاحة: نطاق الإيجار أو عدد الغرف بعد الشركة والحالة، وبقية المعايير
+        # في الفهرس نفسه فيتم الترتيب والعد بدون قراءة الجدول
+        db.Index('ix_units_match_rent', 'company_id', 'status', 'current_rent', 'bedrooms', 'area', 'bathrooms',
+                 'parking_spaces', 'furnished', 'view_type', 'is_active'),
+        db.Index('ix_units_match_bedrooms', 'company_id', 'status', 'bedrooms', 'current_rent', 'area', 'bathrooms',
+                 'parking_spaces', 'furnished', 'view_type', 'is_active'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
     building_id = db.Column(db.Integer, db.ForeignKey('buildings.id'), nullable=False)
     unit_number = db.Column(db.String(50), nullable=False)
+    search_name = db.Column(db.Text)  # نص البحث الموحد (normalize_text)
     floor_number = db.Column(db.Integer)
     unit_type_id = db.Column(db.Integer, db.ForeignKey('property_types.id'))
     category_id = db.Column(db.Integer, db.ForeignKey('property_categories.id'))
@@ -343,3 +366,91 @@ class Property(db.Model):
             'property_id': self.property_id
         }
 
+
+# جدول عدادات الإشغال (عدد الوحدات النشطة لكل حالة على مستوى المبنى والشركة)
+class OccupancyCounter(db.Model):
+    __tablename__ = 'occupancy_counters'
+    __table_args__ = (
+        db.UniqueConstraint('company_id', 'building_id', 'status', name='uq_occupancy_counter'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
+    building_id = db.Column(db.Integer, db.ForeignKey('buildings.id'))  # NULL = إجمالي الشركة
+    status = db.Column(db.String(50), nullable=False)
+    unit_count = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'company_id': self.company_id,
+            'building_id': self.building_id,
+            'status': self.status,
+            'unit_count': self.unit_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+# جدول لقطات الإشغال والإيجارات المتعاقد عليها (يومية ثم مجمعة أسبوعياً وشهرياً)
+class OccupancySnapshot(db.Model):
+    __tablename__ = 'occupancy_snapshots'
+    __table_args__ = (
+        db.UniqueConstraint('building_id', 'period_type', 'period_start', name='uq_occupancy_snapshot'),
+        db.Index('ix_occupancy_snapshots_company_period', 'company_id', 'period_type', 'period_start'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
+    building_id = db.Column(db.Integer, db.ForeignKey('buildings.id'), nullable=False)
+    period_type = db.Column(db.String(10), nullable=False)  # day, week, month
+    period_start = db.Column(db.Date, nullable=False)
+    sample_days = db.Column(db.Integer, default=1)  # عدد اللقطات اليومية في الفترة
+    # أعداد الوحدات والإيجار في نهاية الفترة
+    total_units = db.Column(db.Integer, default=0)
+    available_units = db.Column(db.Integer, default=0)
+    occupied_units = db.Column(db.Integer, default=0)
+    maintenance_units = db.Column(db.Integer, default=0)
+    reserved_units = db.Column(db.Integer, default=0)
+    contracted_rent = db.Column(db.Numeric(15, 2), default=0)
+    # مجموع أيام الشغور (وحدة × يوم) خلال الفترة
+    vacancy_days = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'company_id': self.company_id,
+            'building_id': self.building_id,
+            'period_type': self.period_type,
+            'period_start': self.period_start.isoformat() if self.period_start else None,
+            'sample_days': self.sample_days,
+            'total_units': self.total_units,
+            'available_units': self.available_units,
+            'occupied_units': self.occupied_units,
+            'maintenance_units': self.maintenance_units,
+            'reserved_units': self.reserved_units,
+            'contracted_rent': float(self.contracted_rent) if self.contracted_rent else 0,
+            'vacancy_days': self.vacancy_days
+        }
+
+# جدول تسلسلات أرقام المستندات (آخر رقم مستخدم لكل نوع مستند وسنة؛ الأرقام فريدة على مستوى كل الشركات)
+class DocumentSequence(db.Model):
+    __tablename__ = 'document_sequences'
+    __table_args__ = (
+        db.UniqueConstraint('document_type', 'year', name='uq_document_sequence'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    document_type = db.Column(db.String(50), nullable=False)  # contract, expense, maintenance
+    year = db.Column(db.Integer, nullable=False)
+    last_value = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'document_type': self.document_type,
+            'year': self.year,
+            'last_value': self.last_value,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
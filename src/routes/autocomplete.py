@@ -0,0 +1,56 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from src.models.property import User
+from src.utils.autocomplete import get_index, memory_report, DEFAULT_LIMIT, MAX_LIMIT
+
+autocomplete_bp = Blueprint('autocomplete', __name__)
+
+def get_user_company():
+    """الحصول على شركة المستخدم الحالي"""
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    return user.company_id if user else None
+
+@autocomplete_bp.route('', methods=['GET'])
+@jwt_required()
+def autocomplete():
+    """اقتراحات الإكمال التلقائي لأرقام الوحدات وأسماء المستأجرين وأرقام العقود (من الذاكرة)"""
+    try:
+        company_id = get_user_company()
+        if not company_id:
+            return jsonify({'error': 'غير مصرح'}), 403
+        
+        entity_type = request.args.get('type', '')
+        query = request.args.get('q', '')
+        limit = max(1, min(request.args.get('limit', DEFAULT_LIMIT, type=int), MAX_LIMIT))
+        
+        try:
+            index = get_index(company_id, entity_type)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        with index.lock:
+            suggestions = index.lookup(query, limit)
+        
+        return jsonify({
+            'type': entity_type,
+            'query': query,
+            'suggestions': suggestions
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@autocomplete_bp.route('/memory', methods=['GET'])
+@jwt_required()
+def get_autocomplete_memory():
+    """حجم فهارس الإكمال التلقائي المحملة في الذاكرة"""
+    try:
+        company_id = get_user_company()
+        if not company_id:
+            return jsonify({'error': 'غير مصرح'}), 403
+        
+        return jsonify(memory_report()), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
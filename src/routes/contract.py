@@ -5,6 +5,20 @@ from src.models.contract import Person, Contract, ContractType, ContractPayment,
 from datetime import datetime, date
 from sqlalchemy import and_, or_, func
 from dateutil.relativedelta import relativedelta
+from src.utils.metrics import MetricsQuery
+from src.utils.financial_summary import record_new_payments
+from src.utils.recurring_revenue import current_mrr, mrr_series, MRR_GROUPS
+from src.utils.timeseries import parse_series_args
+from src.utils.fulltext import search_persons
+from src.utils.search_index import search_filter
+from src.utils.caller_id import lookup_caller
+from src.utils.sequences import next_number
+from src.utils.payment_posting import mark_payments_paid
+from src.utils.reconciliation import reconcile_statement, apply_matches, DEFAULT_WINDOW_DAYS
+from src.utils.cheque_series import register_cheque_series
+from src.utils.bulk_import import PersonImporter, ContractImporter
+from src.utils.payment_schedule import payment_schedule, payment_rows, insert_payments
+import src.utils.occupancy  # noqa: F401 (تسجيل مستمع عدادات الإشغال)
 
 contract_bp = Blueprint('contract', __name__)
 
@@ -33,13 +47,7 @@ def get_persons():
         query = Person.query.filter_by(company_id=company_id, is_active=True)
         
         if search:
-            query = query.filter(or_(
-                Person.first_name.contains(search),
-                Person.last_name.contains(search),
-                Person.id_number.contains(search),
-                Person.phone.contains(search),
-                Person.email.contains(search)
-            ))
+            query = search_persons(query, search)
         
         if person_type:
             query = query.filter_by(person_type=person_type)
@@ -58,6 +66,30 @@ def get_persons():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@contract_bp.route('/persons/lookup', methods=['GET'])
+@jwt_required()
+def lookup_person_by_phone():
+    """تحديد المتصل من رقم الهاتف (رقم كامل بأي صيغة أو نهاية الرقم) مع عقوده النشطة ورصيده المستحق"""
+    try:
+        company_id = get_user_company()
+        if not company_id:
+            return jsonify({'error': 'غير مصرح'}), 403
+        
+        phone = request.args.get('phone', '')
+        
+        try:
+            match_type, matches = lookup_caller(company_id, phone)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'match_type': match_type,
+            'matches': matches
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @contract_bp.route('/persons', methods=['POST'])
 @jwt_required()
 def create_person():
@@ -111,6 +143,33 @@ def create_person():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@contract_bp.route('/persons/import', methods=['POST'])
+@jwt_required()
+def import_persons():
+    """استيراد الأشخاص من ملف CSV مع منع التكرار برقم الهوية أو الجواز أو الهاتف (dry_run=1 للتصنيف فقط)"""
+    try:
+        company_id = get_user_company()
+        if not company_id:
+            return jsonify({'error': 'غير مصرح'}), 403
+        
+        upload = request.files.get('file')
+        if not upload:
+            return jsonify({'error': 'ملف CSV مطلوب (الحقل file)'}), 400
+        
+        dry_run = request.args.get('dry_run', '').lower() in ('1', 'true')
+        
+        try:
+            report = PersonImporter(company_id).run(upload.stream, dry_run)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        report['dry_run'] = dry_run
+        return jsonify(report), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 # ===== إدارة العقود =====
 
 @contract_bp.route('/', methods=['GET'])
@@ -131,9 +190,8 @@ def get_contracts():
         query = Contract.query.filter_by(company_id=company_id)
         
         if search:
-            query = query.filter(or_(
-                Contract.contract_number.contains(search)
-            ))
+            # أرقام العقود لاتينية؛ التوحيد يحول نص البحث إلى حروف صغيرة وأرقام لاتينية فيُقارن بالرقم بحروف صغيرة
+            query = query.filter(search_filter(Contract, func.lower(Contract.contract_number), company_id, search))
         
         if status:
             query = query.filter_by(status=status)
@@ -217,8 +275,7 @@ def create_contract():
                 return jsonify({'error': f'{field} مطلوب'}), 400
         
         # إنشاء رقم عقد تلقائي
-        contract_count = Contract.query.filter_by(company_id=company_id).count()
-        contract_number = f"CNT-{datetime.now().year}-{contract_count + 1:04d}"
+        contract_number = next_number('contract')
         
         contract = Contract(
             company_id=company_id,
@@ -266,53 +323,40 @@ def create_contract():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-def create_contract_payments(contract, frequency):
-    """إنشاء جدولة الدفعات للعقد"""
-    start_date = contract.start_date
-    end_date = contract.end_date
-    rent_amount = contract.rent_amount
-    
-    # تحديد فترة الدفع
-    if frequency == 'monthly':
-        delta = relativedelta(months=1)
-        payment_amount = rent_amount
-    elif frequency == 'quarterly':
-        delta = relativedelta(months=3)
-        payment_amount = rent_amount * 3
-    elif frequency == 'semi_annual':
-        delta = relativedelta(months=6)
-        payment_amount = rent_amount * 6
-    elif frequency == 'annual':
-        delta = relativedelta(years=1)
-        payment_amount = rent_amount * 12
-    else:
-        delta = relativedelta(months=1)
-        payment_amount = rent_amount
-    
-    current_date = start_date
-    payment_number = 1
-    
-    while current_date <= end_date:
-        # تعديل المبلغ للدفعة الأخيرة إذا لزم الأمر
-        next_date = current_date + delta
-        if next_date > end_date:
-            # حساب المبلغ المتناسب للفترة المتبقية
-            if frequency == 'monthly':
-                remaining_days = (end_date - current_date).days + 1
-                days_in_month = 30  # متوسط أيام الشهر
-                payment_amount = rent_amount * (remaining_days / days_in_month)
-        
-        payment = ContractPayment(
-            contract_id=contract.id,
-            payment_number=payment_number,
-            due_date=current_date,
-            amount=payment_amount
-        )
+@contract_bp.route('/import', methods=['POST'])
+@jwt_required()
+def import_contracts():
+    """استيراد العقود من ملف CSV مع توليد جدولة دفعاتها (dry_run=1 للتحقق فقط)"""
+    try:
+        company_id = get_user_company()
+        if not company_id:
+            return jsonify({'error': 'غير مصرح'}), 403
+        
+        upload = request.files.get('file')
+        if not upload:
+            return jsonify({'error': 'ملف CSV مطلوب (الحقل file)'}), 400
+        
+        dry_run = request.args.get('dry_run', '').lower() in ('1', 'true')
         
-        db.session.add(payment)
+        try:
+            report = ContractImporter(company_id, get_jwt_identity()).run(upload.stream, dry_run)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        current_date = next_date
-        payment_number += 1
+        report['dry_run'] = dry_run
+        return jsonify(report), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+def create_contract_payments(contract, frequency):
+    """إنشاء جدولة الدفعات للعقد بإدراج واحد بالجملة"""
+    schedule = payment_schedule(contract.start_date, contract.end_date, contract.rent_amount, frequency)
+    rows = payment_rows(contract.id, schedule, datetime.utcnow())
+    if rows:
+        insert_payments(db.session.connection(), rows)
+        record_new_payments(contract.company_id, rows)
 
 @contract_bp.route('/<int:contract_id>', methods=['GET'])
 @jwt_required()
@@ -425,16 +469,12 @@ def mark_payment_paid(payment_id):
         if not payment:
             return jsonify({'error': 'الدفعة غير موجودة'}), 404
         
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         
-        payment.paid_amount = data.get('paid_amount', payment.amount)
-        payment.payment_date = datetime.strptime(data['payment_date'], '%Y-%m-%d').date() if data.get('payment_date') else date.today()
-        payment.payment_method = data.get('payment_method')
-        payment.status = 'paid'
-        payment.notes = data.get('notes')
-        payment.updated_at = datetime.utcnow()
-        
-        db.session.commit()
+        # نفس مسار التسجيل بالجملة: التحقق من القيم وتحديث الملخص وأرشفة التنبيهات وإبطال التوقعات
+        result = mark_payments_paid(company_id, [{**data, 'payment_id': payment_id}])['results'][0]
+        if not result['success']:
+            return jsonify({'error': result['error']}), 400
         
         return jsonify({
             'message': 'تم تسجيل الدفعة بنجاح',
@@ -445,6 +485,28 @@ def mark_payment_paid(payment_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@contract_bp.route('/payments/pay', methods=['POST'])
+@jwt_required()
+def mark_payments_paid_batch():
+    """تسجيل عدة دفعات كمدفوعة في معاملة واحدة (payments: [{payment_id, paid_amount, payment_date, payment_method, notes}])"""
+    try:
+        company_id = get_user_company()
+        if not company_id:
+            return jsonify({'error': 'غير مصرح'}), 403
+        
+        data = request.get_json() or {}
+        
+        try:
+            result = mark_payments_paid(company_id, data.get('payments'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify(result), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 # ===== إدارة الشيكات =====
 
 @contract_bp.route('/cheques', methods=['GET'])
@@ -531,6 +593,88 @@ def create_cheque():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@contract_bp.route('/cheques/series', methods=['POST'])
+@jwt_required()
+def create_cheque_series():
+    """تسجيل سلسلة شيكات مؤجلة لعقد (رقم الشيك الأول، البنك، العدد) مع ربطها بدفعات العقد"""
+    try:
+        company_id = get_user_company()
+        if not company_id:
+            return jsonify({'error': 'غير مصرح'}), 403
+        
+        data = request.get_json() or {}
+        
+        contract = Contract.query.filter_by(id=data.get('contract_id'), company_id=company_id).first()
+        if not contract:
+            return jsonify({'error': 'العقد غير موجود'}), 404
+        
+        try:
+            cheques = register_cheque_series(contract, data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'message': 'تم تسجيل الشيكات بنجاح',
+            'count': len(cheques),
+            'cheques': [cheque.to_dict() for cheque in cheques]
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+# ===== تسوية كشف الحساب البنكي =====
+
+@contract_bp.route('/reconciliation/statement', methods=['POST'])
+@jwt_required()
+def reconcile_bank_statement():
+    """مطابقة كشف حساب بنكي (CSV) مع الدفعات المعلقة والشيكات المفتوحة (apply=1 لتطبيق المطابقات المؤكدة)"""
+    try:
+        company_id = get_user_company()
+        if not company_id:
+            return jsonify({'error': 'غير مصرح'}), 403
+        
+        upload = request.files.get('file')
+        if not upload:
+            return jsonify({'error': 'ملف CSV مطلوب (الحقل file)'}), 400
+        
+        window_days = request.args.get('window_days', DEFAULT_WINDOW_DAYS, type=int)
+        apply = request.args.get('apply', '').lower() in ('1', 'true')
+        
+        try:
+            report = reconcile_statement(company_id, upload.stream, window_days, apply)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        report['window_days'] = window_days
+        return jsonify(report), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@contract_bp.route('/reconciliation/apply', methods=['POST'])
+@jwt_required()
+def apply_reconciliation():
+    """تطبيق مطابقات كشف الحساب المؤكدة: [{type: payment|cheque, id, date, reference}]"""
+    try:
+        company_id = get_user_company()
+        if not company_id:
+            return jsonify({'error': 'غير مصرح'}), 403
+        
+        data = request.get_json() or {}
+        
+        try:
+            result = apply_matches(company_id, data.get('matches'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify(result), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 # ===== إحصائيات العقود =====
 
 @contract_bp.route('/stats', methods=['GET'])
@@ -540,33 +684,25 @@ def get_contract_stats():
     try:
         company_id = get_user_company()
         
-        # إحصائيات العقود
-        total_contracts = Contract.query.filter_by(company_id=company_id).count()
-        active_contracts = Contract.query.filter_by(company_id=company_id, status='active').count()
-        expiring_contracts = Contract.query.filter(
-            and_(
-                Contract.company_id == company_id,
-                Contract.status == 'active',
-                Contract.end_date <= date.today() + relativedelta(days=30)
-            )
-        ).count()
+        # إحصائيات العقود في مسح واحد
+        is_active = Contract.status == 'active'
+        contract_stats = (MetricsQuery(Contract, Contract.company_id == company_id)
+                          .count('total')
+                          .count('active', is_active)
+                          .count('expiring', is_active, Contract.end_date <= date.today() + relativedelta(days=30))
+                          .run())
+        total_contracts = contract_stats['total']
+        active_contracts = contract_stats['active']
+        expiring_contracts = contract_stats['expiring']
         
-        # إحصائيات الدفعات
-        overdue_payments = ContractPayment.query.join(Contract).filter(
-            and_(
-                Contract.company_id == company_id,
-                ContractPayment.status == 'pending',
-                ContractPayment.due_date < date.today()
-            )
-        ).count()
+        # الإيراد الشهري المتكرر من جدول الحركات
+        monthly_revenue = current_mrr(company_id)
         
-        # إجمالي الإيرادات الشهرية
-        monthly_revenue = db.session.query(func.sum(Contract.rent_amount)).filter(
-            and_(
-                Contract.company_id == company_id,
-                Contract.status == 'active'
-            )
-        ).scalar() or 0
+        # إحصائيات الدفعات
+        overdue_payments = (MetricsQuery(ContractPayment, Contract.company_id == company_id)
+                            .join(Contract)
+                            .count('overdue', ContractPayment.status == 'pending', ContractPayment.due_date < date.today())
+                            .run())['overdue']
         
         return jsonify({
             'contracts': {
@@ -578,10 +714,76 @@ def get_contract_stats():
                 'overdue': overdue_payments
             },
             'revenue': {
-                'monthly': float(monthly_revenue)
+                'monthly': float(monthly_revenue),
+                'annual': float(monthly_revenue * 12)
             }
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@contract_bp.route('/mrr', methods=['GET'])
+@jwt_required()
+def get_mrr_series():
+    """تطور الإيراد الشهري المتكرر عبر الزمن مع التوزيع حسب المبنى أو نوع الوحدة أو نوع العقد"""
+    try:
+        company_id = get_user_company()
+        if not company_id:
+            return jsonify({'error': 'غير مصرح'}), 403
+        
+        group_by = request.args.get('group_by')
+        if group_by and group_by not in MRR_GROUPS:
+            return jsonify({'error': 'التجميع يجب أن يكون building أو unit_type أو contract_type'}), 400
+        
+        try:
+            start_date, end_date, granularity, _ = parse_series_args(request.args, default_months=12)
+            series = mrr_series(company_id, granularity, start_date, end_date, group_by)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        current = current_mrr(company_id)
+        
+        return jsonify({
+            'granularity': granularity,
+            'current_mrr': float(current),
+            'current_arr': float(current * 12),
+            'series': series
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@contract_bp.route('/<int:contract_id>/status', methods=['PUT'])
+@jwt_required()
+def update_contract_status(contract_id):
+    """تغيير حالة العقد (إنهاء، انتهاء، تجديد، إعادة تفعيل)"""
+    try:
+        company_id = get_user_company()
+        contract = Contract.query.filter_by(id=contract_id, company_id=company_id).first()
+        
+        if not contract:
+            return jsonify({'error': 'العقد غير موجود'}), 404
+        
+        data = request.get_json() or {}
+        status = data.get('status')
+        if status not in ('active', 'expired', 'terminated', 'renewed'):
+            return jsonify({'error': 'حالة العقد غير صحيحة'}), 400
+        
+        contract.status = status
+        
+        # تحرير الوحدة عند انتهاء العقد أو إنهائه
+        if status in ('expired', 'terminated') and contract.unit and contract.unit.status == 'occupied':
+            contract.unit.status = 'available'
+        elif status == 'active' and contract.unit:
+            contract.unit.status = 'occupied'
+        
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'تم تحديث حالة العقد بنجاح',
+            'contract': contract.to_dict()
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
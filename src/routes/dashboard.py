@@ -6,6 +6,11 @@ from src.models.finance import Expense, MaintenanceRequest
 from datetime import datetime, date
 from sqlalchemy import and_, or_, func, extract
 from dateutil.relativedelta import relativedelta
+from src.utils.metrics import MetricsQuery
+from src.utils.timeseries import parse_series_args, sum_by_bucket, fill_series
+from src.utils.financial_summary import is_month_aligned, summary_by_bucket
+from src.utils.occupancy import company_occupancy, building_occupancy
+from src.utils.snapshots import snapshot_series
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
@@ -28,65 +33,52 @@ def get_dashboard_overview():
         month_start = today.replace(day=1)
         
         # إحصائيات العقارات
-        total_buildings = Building.query.filter_by(company_id=company_id, is_active=True).count()
-        total_units = Unit.query.filter_by(company_id=company_id, is_active=True).count()
-        occupied_units = Unit.query.filter_by(company_id=company_id, status='occupied', is_active=True).count()
-        available_units = Unit.query.filter_by(company_id=company_id, status='available', is_active=True).count()
+        total_buildings = MetricsQuery(
+            Building, Building.company_id == company_id, Building.is_active == True
+        ).count('total').run()['total']
+        
+        unit_stats = company_occupancy(company_id)
+        total_units = unit_stats['total']
+        occupied_units = unit_stats['occupied']
+        available_units = unit_stats['available']
         
         # معدل الإشغال
         occupancy_rate = (occupied_units / total_units * 100) if total_units > 0 else 0
         
         # إحصائيات العقود
-        active_contracts = Contract.query.filter_by(company_id=company_id, status='active').count()
-        expiring_contracts = Contract.query.filter(
-            and_(
-                Contract.company_id == company_id,
-                Contract.status == 'active',
-                Contract.end_date <= today + relativedelta(days=30)
-            )
-        ).count()
-        
-        # الإحصائيات المالية
-        monthly_revenue = db.session.query(func.sum(ContractPayment.paid_amount)).join(Contract).filter(
-            and_(
-                Contract.company_id == company_id,
-                ContractPayment.status == 'paid',
-                ContractPayment.payment_date >= month_start,
-                ContractPayment.payment_date <= today
-            )
-        ).scalar() or 0
-        
-        monthly_expenses = db.session.query(func.sum(Expense.amount)).filter(
-            and_(
-                Expense.company_id == company_id,
-                Expense.status == 'paid',
-                Expense.expense_date >= month_start,
-                Expense.expense_date <= today
-            )
-        ).scalar() or 0
-        
-        # المبالغ المتأخرة
-        overdue_payments = ContractPayment.query.join(Contract).filter(
-            and_(
-                Contract.company_id == company_id,
-                ContractPayment.status == 'pending',
-                ContractPayment.due_date < today
-            )
-        ).count()
-        
-        overdue_amount = db.session.query(func.sum(ContractPayment.amount)).join(Contract).filter(
-            and_(
-                Contract.company_id == company_id,
-                ContractPayment.status == 'pending',
-                ContractPayment.due_date < today
-            )
-        ).scalar() or 0
+        contract_stats = (MetricsQuery(Contract, Contract.company_id == company_id, Contract.status == 'active')
+                          .count('active')
+                          .count('expiring', Contract.end_date <= today + relativedelta(days=30))
+                          .run())
+        active_contracts = contract_stats['active']
+        expiring_contracts = contract_stats['expiring']
+        
+        # الإحصائيات المالية والمبالغ المتأخرة في مسح واحد للدفعات
+        is_overdue = and_(ContractPayment.status == 'pending', ContractPayment.due_date < today)
+        payment_stats = (MetricsQuery(ContractPayment, Contract.company_id == company_id)
+                         .join(Contract)
+                         .sum('monthly_revenue', ContractPayment.paid_amount,
+                              ContractPayment.status == 'paid',
+                              ContractPayment.payment_date >= month_start,
+                              ContractPayment.payment_date <= today)
+                         .count('overdue_payments', is_overdue)
+                         .sum('overdue_amount', ContractPayment.amount, is_overdue)
+                         .run())
+        monthly_revenue = payment_stats['monthly_revenue']
+        overdue_payments = payment_stats['overdue_payments']
+        overdue_amount = payment_stats['overdue_amount']
+        
+        monthly_expenses = (MetricsQuery(Expense, Expense.company_id == company_id)
+                            .sum('total', Expense.amount,
+                                 Expense.status == 'paid',
+                                 Expense.expense_date >= month_start,
+                                 Expense.expense_date <= today)
+                            .run())['total']
         
         # طلبات الصيانة المفتوحة
-        open_maintenance = MaintenanceRequest.query.filter_by(
-            company_id=company_id, 
-            status='open'
-        ).count()
+        open_maintenance = MetricsQuery(
+            MaintenanceRequest, MaintenanceRequest.company_id == company_id
+        ).count('open', MaintenanceRequest.status == 'open').run()['open']
         
         return jsonify({
             'properties': {
@@ -192,33 +184,34 @@ def get_revenue_chart():
         if not company_id:
             return jsonify({'error': 'غير مصرح'}), 403
         
-        months = request.args.get('months', 6, type=int)
-        
-        revenue_data = []
-        
-        for i in range(months):
-            month_start = date.today().replace(day=1) - relativedelta(months=i)
-            month_end = month_start + relativedelta(months=1) - relativedelta(days=1)
-            
-            revenue = db.session.query(func.sum(ContractPayment.paid_amount)).join(Contract).filter(
-                and_(
-                    Contract.company_id == company_id,
-                    ContractPayment.status == 'paid',
-                    ContractPayment.payment_date >= month_start,
-                    ContractPayment.payment_date <= month_end
-                )
-            ).scalar() or 0
-            
-            revenue_data.append({
-                'month': month_start.strftime('%Y-%m'),
-                'month_name': month_start.strftime('%B %Y'),
-                'revenue': float(revenue)
-            })
+        try:
+            start_date, end_date, granularity, buckets = parse_series_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if granularity in ('month', 'quarter', 'year') and is_month_aligned(start_date, end_date):
+            # الفترات الشهرية تُقرأ من جدول الملخص المالي الشهري
+            revenue, _ = summary_by_bucket(company_id, granularity, start_date, end_date)
+        else:
+            # استعلام واحد مجمّع حسب الفترة
+            revenue = sum_by_bucket(
+                ContractPayment.paid_amount, ContractPayment.payment_date, granularity, start_date, end_date,
+                filters=[Contract.company_id == company_id, ContractPayment.status == 'paid'],
+                joins=[Contract]
+            )
         
-        # ترتيب البيانات من الأقدم للأحدث
-        revenue_data.reverse()
+        revenue_data = [
+            {
+                'period': bucket.isoformat(),
+                'month': bucket.strftime('%Y-%m'),
+                'month_name': bucket.strftime('%B %Y'),
+                'revenue': float(amount)
+            }
+            for bucket, amount in fill_series(buckets, revenue)
+        ]
         
         return jsonify({
+            'granularity': granularity,
             'revenue_data': revenue_data
         }), 200
         
@@ -234,49 +227,67 @@ def get_occupancy_chart():
         if not company_id:
             return jsonify({'error': 'غير مصرح'}), 403
         
-        # إحصائيات الإشغال حسب المبنى
-        buildings_occupancy = db.session.query(
-            Building.name,
-            func.count(Unit.id).label('total_units'),
-            func.sum(func.case([(Unit.status == 'occupied', 1)], else_=0)).label('occupied_units')
-        ).join(Unit).filter(
-            and_(
-                Building.company_id == company_id,
-                Building.is_active == True,
-                Unit.is_active == True
-            )
-        ).group_by(Building.id).all()
+        # إحصائيات الإشغال حسب المبنى من عدادات الإشغال
+        buildings = db.session.query(Building.id, Building.name).filter(
+            Building.company_id == company_id,
+            Building.is_active == True
+        ).all()
+        occupancy = building_occupancy(company_id, [building.id for building in buildings])
         
         occupancy_data = []
-        for building in buildings_occupancy:
-            occupancy_rate = (building.occupied_units / building.total_units * 100) if building.total_units > 0 else 0
+        for building in buildings:
+            counts = occupancy[building.id]
+            if counts['total'] == 0:
+                continue
             occupancy_data.append({
                 'building_name': building.name,
-                'total_units': building.total_units,
-                'occupied_units': building.occupied_units,
-                'occupancy_rate': round(occupancy_rate, 2)
+                'total_units': counts['total'],
+                'occupied_units': counts['occupied'],
+                'occupancy_rate': counts['occupancy_rate']
             })
         
         # إحصائيات عامة
-        total_units = Unit.query.filter_by(company_id=company_id, is_active=True).count()
-        occupied_units = Unit.query.filter_by(company_id=company_id, status='occupied', is_active=True).count()
-        available_units = Unit.query.filter_by(company_id=company_id, status='available', is_active=True).count()
-        maintenance_units = Unit.query.filter_by(company_id=company_id, status='maintenance', is_active=True).count()
+        overall = company_occupancy(company_id)
         
         return jsonify({
             'buildings_occupancy': occupancy_data,
             'overall_stats': {
-                'total_units': total_units,
-                'occupied_units': occupied_units,
-                'available_units': available_units,
-                'maintenance_units': maintenance_units,
-                'occupancy_rate': round((occupied_units / total_units * 100) if total_units > 0 else 0, 2)
+                'total_units': overall['total'],
+                'occupied_units': overall['occupied'],
+                'available_units': overall['available'],
+                'maintenance_units': overall['maintenance'],
+                'occupancy_rate': overall['occupancy_rate']
             }
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@dashboard_bp.route('/charts/occupancy-trend', methods=['GET'])
+@jwt_required()
+def get_occupancy_trend():
+    """الحصول على تطور الإشغال والإيجار المتعاقد عليه عبر الزمن (من جدول اللقطات فقط)"""
+    try:
+        company_id = get_user_company()
+        if not company_id:
+            return jsonify({'error': 'غير مصرح'}), 403
+        
+        building_id = request.args.get('building_id', type=int)
+        
+        try:
+            start_date, end_date, granularity, _ = parse_series_args(request.args, default_months=12)
+            series = snapshot_series(company_id, granularity, start_date, end_date, building_id)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'granularity': granularity,
+            'trend': series
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @dashboard_bp.route('/upcoming-events', methods=['GET'])
 @jwt_required()
 def get_upcoming_events():
@@ -2,10 +2,20 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models.property import db, User
 from src.models.finance import Expense, ExpenseCategory, MaintenanceRequest
-from src.models.contract import Contract, ContractPayment
+from src.models.contract import Contract, ContractPayment, Person
 from datetime import datetime, date
-from sqlalchemy import and_, or_, func, extract
+from sqlalchemy import and_, or_, func, extract, case
 from dateutil.relativedelta import relativedelta
+from src.utils.payment_cube import get_cube, DATE_FIELDS, MEASURES, GROUP_FIELDS
+from src.utils.forecast import cached_forecast, invalidate_forecast
+from src.utils.search_index import search_filter
+from src.utils.sequences import next_number
+from src.utils.aging import aging_report, AGING_GROUPS
+from src.utils.timeseries import parse_series_args, sum_by_bucket, fill_series
+from src.utils.financial_summary import (
+    record_expense_change, expense_state, is_month_aligned, summary_by_bucket,
+    period_totals, expenses_by_category_name, current_month_totals, receivable_totals
+)
 
 finance_bp = Blueprint('finance', __name__)
 
@@ -37,11 +47,7 @@ def get_expenses():
         query = Expense.query.filter_by(company_id=company_id)
         
         if search:
-            query = query.filter(or_(
-                Expense.expense_number.contains(search),
-                Expense.description.contains(search),
-                Expense.vendor_name.contains(search)
-            ))
+            query = query.filter(search_filter(Expense, Expense.search_name, company_id, search))
         
         if category_id:
             query = query.filter_by(category_id=category_id)
@@ -94,8 +100,7 @@ def create_expense():
             return jsonify({'error': 'المبلغ وتاريخ المصروف مطلوبان'}), 400
         
         # إنشاء رقم مصروف تلقائي
-        expense_count = Expense.query.filter_by(company_id=company_id).count()
-        expense_number = f"EXP-{datetime.now().year}-{expense_count + 1:04d}"
+        expense_number = next_number('expense')
         
         expense = Expense(
             company_id=company_id,
@@ -114,6 +119,7 @@ def create_expense():
         )
         
         db.session.add(expense)
+        record_expense_change(expense)
         db.session.commit()
         
         return jsonify({
@@ -137,6 +143,7 @@ def update_expense(expense_id):
             return jsonify({'error': 'المصروف غير موجود'}), 404
         
         data = request.get_json()
+        before = expense_state(expense)
         
         # تحديث البيانات
         for field in ['category_id', 'property_id', 'property_type', 'amount', 
@@ -149,6 +156,9 @@ def update_expense(expense_id):
                     setattr(expense, field, data[field])
         
         expense.updated_at = datetime.utcnow()
+        
+        # تحديث الملخص المالي الشهري ضمن نفس المعاملة
+        record_expense_change(expense, before)
         db.session.commit()
         
         return jsonify({
@@ -286,8 +296,7 @@ def create_maintenance_request():
             return jsonify({'error': 'وصف المشكلة مطلوب'}), 400
         
         # إنشاء رقم طلب تلقائي
-        request_count = MaintenanceRequest.query.filter_by(company_id=company_id).count()
-        request_number = f"MNT-{datetime.now().year}-{request_count + 1:04d}"
+        request_number = next_number('maintenance')
         
         maintenance_request = MaintenanceRequest(
             company_id=company_id,
@@ -340,40 +349,11 @@ def get_income_statement():
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
         
-        # حساب الإيرادات
-        revenue_query = db.session.query(func.sum(ContractPayment.paid_amount)).join(Contract).filter(
-            and_(
-                Contract.company_id == company_id,
-                ContractPayment.status == 'paid',
-                ContractPayment.payment_date >= start_date,
-                ContractPayment.payment_date <= end_date
-            )
-        )
-        total_revenue = revenue_query.scalar() or 0
-        
-        # حساب المصروفات
-        expense_query = db.session.query(func.sum(Expense.amount)).filter(
-            and_(
-                Expense.company_id == company_id,
-                Expense.status == 'paid',
-                Expense.expense_date >= start_date,
-                Expense.expense_date <= end_date
-            )
-        )
-        total_expenses = expense_query.scalar() or 0
-        
-        # حساب المصروفات حسب الفئة
-        expenses_by_category = db.session.query(
-            ExpenseCategory.name,
-            func.sum(Expense.amount)
-        ).join(Expense).filter(
-            and_(
-                Expense.company_id == company_id,
-                Expense.status == 'paid',
-                Expense.expense_date >= start_date,
-                Expense.expense_date <= end_date
-            )
-        ).group_by(ExpenseCategory.name).all()
+        # الإيرادات والمصروفات من الملخص الشهري (أطراف الفترة فقط من الجداول الأصلية)
+        totals = period_totals(company_id, start_date, end_date)
+        total_revenue = totals['revenue']
+        total_expenses = totals['expenses']
+        expenses_by_category = expenses_by_category_name(company_id, totals['by_category'])
         
         net_income = total_revenue - total_expenses
         
@@ -407,46 +387,42 @@ def get_cash_flow():
         if not company_id:
             return jsonify({'error': 'غير مصرح'}), 403
         
-        months = request.args.get('months', 6, type=int)
-        
-        # حساب التدفق النقدي للأشهر الماضية
-        cash_flow_data = []
+        try:
+            start_date, end_date, granularity, buckets = parse_series_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        for i in range(months):
-            month_start = date.today().replace(day=1) - relativedelta(months=i)
-            month_end = month_start + relativedelta(months=1) - relativedelta(days=1)
-            
-            # الإيرادات
-            revenue = db.session.query(func.sum(ContractPayment.paid_amount)).join(Contract).filter(
-                and_(
-                    Contract.company_id == company_id,
-                    ContractPayment.status == 'paid',
-                    ContractPayment.payment_date >= month_start,
-                    ContractPayment.payment_date <= month_end
-                )
-            ).scalar() or 0
-            
-            # المصروفات
-            expenses = db.session.query(func.sum(Expense.amount)).filter(
-                and_(
-                    Expense.company_id == company_id,
-                    Expense.status == 'paid',
-                    Expense.expense_date >= month_start,
-                    Expense.expense_date <= month_end
-                )
-            ).scalar() or 0
+        if granularity in ('month', 'quarter', 'year') and is_month_aligned(start_date, end_date):
+            # الفترات الشهرية تُقرأ من جدول الملخص المالي الشهري
+            revenue, expenses = summary_by_bucket(company_id, granularity, start_date, end_date)
+        else:
+            # الإيرادات: استعلام واحد مجمّع حسب الفترة
+            revenue = sum_by_bucket(
+                ContractPayment.paid_amount, ContractPayment.payment_date, granularity, start_date, end_date,
+                filters=[Contract.company_id == company_id, ContractPayment.status == 'paid'],
+                joins=[Contract]
+            )
             
+            # المصروفات: استعلام واحد مجمّع حسب الفترة
+            expenses = sum_by_bucket(
+                Expense.amount, Expense.expense_date, granularity, start_date, end_date,
+                filters=[Expense.company_id == company_id, Expense.status == 'paid']
+            )
+        
+        cash_flow_data = []
+        for bucket in buckets:
+            bucket_revenue = revenue.get(bucket, 0)
+            bucket_expenses = expenses.get(bucket, 0)
             cash_flow_data.append({
-                'month': month_start.strftime('%Y-%m'),
-                'revenue': float(revenue),
-                'expenses': float(expenses),
-                'net_cash_flow': float(revenue - expenses)
+                'period': bucket.isoformat(),
+                'month': bucket.strftime('%Y-%m'),
+                'revenue': float(bucket_revenue),
+                'expenses': float(bucket_expenses),
+                'net_cash_flow': float(bucket_revenue - bucket_expenses)
             })
         
-        # ترتيب البيانات من الأقدم للأحدث
-        cash_flow_data.reverse()
-        
         return jsonify({
+            'granularity': granularity,
             'cash_flow': cash_flow_data
         }), 200
         
@@ -462,32 +438,23 @@ def get_receivables_report():
         if not company_id:
             return jsonify({'error': 'غير مصرح'}), 403
         
-        # المبالغ المستحقة (غير مدفوعة)
-        pending_payments = db.session.query(
-            Contract.contract_number,
-            func.concat(Person.first_name, ' ', Person.last_name).label('tenant_name'),
-            func.sum(ContractPayment.amount).label('total_amount'),
-            func.count(ContractPayment.id).label('payment_count')
-        ).join(Contract).join(Person, Contract.tenant_id == Person.id).filter(
-            and_(
-                Contract.company_id == company_id,
-                ContractPayment.status == 'pending'
-            )
-        ).group_by(Contract.id, Person.id).all()
+        today = date.today()
+        is_overdue = ContractPayment.due_date < today
         
-        # المبالغ المتأخرة
-        overdue_payments = db.session.query(
+        # المبالغ المستحقة والمتأخرة لكل عقد في مسح واحد
+        rows = db.session.query(
             Contract.contract_number,
-            func.concat(Person.first_name, ' ', Person.last_name).label('tenant_name'),
+            (Person.first_name + ' ' + Person.last_name).label('tenant_name'),
             func.sum(ContractPayment.amount).label('total_amount'),
-            func.count(ContractPayment.id).label('payment_count')
-        ).join(Contract).join(Person, Contract.tenant_id == Person.id).filter(
+            func.count(ContractPayment.id).label('payment_count'),
+            func.coalesce(func.sum(case((is_overdue, ContractPayment.amount), else_=0)), 0).label('overdue_amount'),
+            func.coalesce(func.sum(case((is_overdue, 1), else_=0)), 0).label('overdue_count')
+        ).select_from(ContractPayment).join(Contract).join(Person, Contract.tenant_id == Person.id).filter(
             and_(
                 Contract.company_id == company_id,
-                ContractPayment.status == 'pending',
-                ContractPayment.due_date < date.today()
+                ContractPayment.status == 'pending'
             )
-        ).group_by(Contract.id, Person.id).all()
+        ).group_by(Contract.id, Contract.contract_number, Person.first_name, Person.last_name).all()
         
         return jsonify({
             'pending_payments': [
@@ -497,22 +464,143 @@ def get_receivables_report():
                     'total_amount': float(row.total_amount),
                     'payment_count': row.payment_count
                 }
-                for row in pending_payments
+                for row in rows
             ],
             'overdue_payments': [
                 {
                     'contract_number': row.contract_number,
                     'tenant_name': row.tenant_name,
-                    'total_amount': float(row.total_amount),
-                    'payment_count': row.payment_count
+                    'total_amount': float(row.overdue_amount),
+                    'payment_count': row.overdue_count
                 }
-                for row in overdue_payments
+                for row in rows if row.overdue_count
             ]
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@finance_bp.route('/reports/aging', methods=['GET'])
+@jwt_required()
+def get_aging_report():
+    """تقرير أعمار الذمم (حالي، 1-30، 31-60، 61-90، أكثر من 90 يوماً) لكل مستأجر أو عقد أو مبنى"""
+    try:
+        company_id = get_user_company()
+        if not company_id:
+            return jsonify({'error': 'غير مصرح'}), 403
+        
+        group_by = request.args.get('group_by', 'tenant')
+        if group_by not in AGING_GROUPS:
+            return jsonify({'error': 'مستوى التجميع يجب أن يكون tenant أو contract أو building'}), 400
+        
+        try:
+            as_of = request.args.get('as_of')
+            as_of = datetime.strptime(as_of, '%Y-%m-%d').date() if as_of else date.today()
+            report = aging_report(
+                company_id,
+                as_of=as_of,
+                group_by=group_by,
+                sort=request.args.get('sort', 'total'),
+                order=request.args.get('order', 'desc'),
+                page=request.args.get('page', 1, type=int),
+                per_page=max(1, min(request.args.get('per_page', 50, type=int), 500))
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify(report), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ===== توقع التدفقات النقدية =====
+
+@finance_bp.route('/forecast', methods=['GET'])
+@jwt_required()
+def get_cash_forecast():
+    """توقع التدفقات النقدية الداخلة من جداول الدفعات المعلقة والشيكات المؤجلة"""
+    try:
+        company_id = get_user_company()
+        if not company_id:
+            return jsonify({'error': 'غير مصرح'}), 403
+        
+        granularity = request.args.get('granularity', 'month')
+        months = request.args.get('months', 6, type=int)
+        if months < 1 or months > 24:
+            return jsonify({'error': 'عدد الأشهر يجب أن يكون بين 1 و 24'}), 400
+        
+        if request.args.get('refresh') == '1':
+            invalidate_forecast(company_id)
+        
+        try:
+            forecast = cached_forecast(company_id, granularity, months)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify(forecast), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ===== تحليلات الدفعات =====
+
+@finance_bp.route('/analytics/payments', methods=['GET'])
+@jwt_required()
+def get_payment_analytics():
+    """مجموع الدفعات لفترة اختيارية مع التجميع حسب المبنى أو طريقة الدفع أو الحالة (من الذاكرة)"""
+    try:
+        company_id = get_user_company()
+        if not company_id:
+            return jsonify({'error': 'غير مصرح'}), 403
+        
+        date_field = request.args.get('date_field', 'payment_date')
+        measure = request.args.get('measure', 'paid_amount')
+        group_by = request.args.get('group_by')
+        status = request.args.get('status', 'paid')
+        if status == 'all':
+            status = None
+        
+        if date_field not in DATE_FIELDS or measure not in MEASURES or (group_by and group_by not in GROUP_FIELDS):
+            return jsonify({'error': 'معاملات التحليل غير صحيحة'}), 400
+        
+        try:
+            today = date.today()
+            start_date = request.args.get('from')
+            end_date = request.args.get('to')
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else today.replace(day=1)
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else today
+        except ValueError:
+            return jsonify({'error': 'صيغة التاريخ غير صحيحة'}), 400
+        
+        filters = {
+            'date_field': date_field,
+            'measure': measure,
+            'status': status,
+            'building_id': request.args.get('building_id', type=int),
+            'method': request.args.get('payment_method')
+        }
+        
+        cube = get_cube(company_id)
+        with cube.lock:
+            total = cube.range_sum(start_date, end_date, **filters)
+            groups = cube.group_sum(group_by, start_date, end_date, **filters) if group_by else None
+        
+        result = {
+            'from': start_date.isoformat(),
+            'to': end_date.isoformat(),
+            'total': total / 100
+        }
+        if groups is not None:
+            result['groups'] = [
+                {'key': key, 'total': value / 100}
+                for key, value in groups.items() if value
+            ]
+        
+        return jsonify(result), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ===== إحصائيات مالية =====
 
 @finance_bp.route('/stats', methods=['GET'])
@@ -524,44 +612,12 @@ def get_finance_stats():
         
         # الشهر الحالي
         today = date.today()
-        month_start = today.replace(day=1)
-        
-        # الإيرادات الشهرية
-        monthly_revenue = db.session.query(func.sum(ContractPayment.paid_amount)).join(Contract).filter(
-            and_(
-                Contract.company_id == company_id,
-                ContractPayment.status == 'paid',
-                ContractPayment.payment_date >= month_start,
-                ContractPayment.payment_date <= today
-            )
-        ).scalar() or 0
         
-        # المصروفات الشهرية
-        monthly_expenses = db.session.query(func.sum(Expense.amount)).filter(
-            and_(
-                Expense.company_id == company_id,
-                Expense.status == 'paid',
-                Expense.expense_date >= month_start,
-                Expense.expense_date <= today
-            )
-        ).scalar() or 0
+        # الإيرادات والمصروفات الشهرية من صف الشهر الحالي في الملخص
+        monthly_revenue, monthly_expenses = current_month_totals(company_id, today)
         
-        # المبالغ المعلقة
-        pending_amount = db.session.query(func.sum(ContractPayment.amount)).join(Contract).filter(
-            and_(
-                Contract.company_id == company_id,
-                ContractPayment.status == 'pending'
-            )
-        ).scalar() or 0
-        
-        # المبالغ المتأخرة
-        overdue_amount = db.session.query(func.sum(ContractPayment.amount)).join(Contract).filter(
-            and_(
-                Contract.company_id == company_id,
-                ContractPayment.status == 'pending',
-                ContractPayment.due_date < today
-            )
-        ).scalar() or 0
+        # المبالغ المعلقة والمتأخرة
+        pending_amount, overdue_amount = receivable_totals(company_id, today)
         
         return jsonify({
             'monthly_revenue': float(monthly_revenue),
@@ -14,6 +14,7 @@ import requests
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import json
+from src.utils.metrics import MetricsQuery
 
 notifications_bp = Blueprint('notifications', __name__)
 
@@ -457,18 +458,17 @@ def get_notification_stats():
         if not company:
             return jsonify({'error': 'غير مصرح'}), 403
         
-        total = Notification.query.filter_by(company_id=company.id).count()
-        unread = Notification.query.filter_by(company_id=company.id, status='unread').count()
-        high_priority = Notification.query.filter_by(
-            company_id=company.id, 
-            priority='high',
-            status='unread'
-        ).count()
-        urgent = Notification.query.filter_by(
-            company_id=company.id, 
-            priority='urgent',
-            status='unread'
-        ).count()
+        is_unread = Notification.status == 'unread'
+        stats = (MetricsQuery(Notification, Notification.company_id == company.id)
+                 .count('total')
+                 .count('unread', is_unread)
+                 .count('high_priority', is_unread, Notification.priority == 'high')
+                 .count('urgent', is_unread, Notification.priority == 'urgent')
+                 .run())
+        total = stats['total']
+        unread = stats['unread']
+        high_priority = stats['high_priority']
+        urgent = stats['urgent']
         
         return jsonify({
             'total': total,
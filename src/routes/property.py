@@ -3,9 +3,23 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models.property import db, User, Company, Project, Building, Unit, PropertyType, PropertyCategory
 from datetime import datetime
 from sqlalchemy import and_, or_
+from src.utils.metrics import MetricsQuery, facet_counts
+from src.utils.occupancy import company_occupancy, building_occupancy
+from src.utils.normalization import search_condition
+from src.utils.search_index import search_filter
+from src.utils.bulk_import import UnitImporter
+from src.utils.unit_matching import parse_criteria, match_units, DEFAULT_LIMIT as DEFAULT_MATCH_LIMIT
 
 property_bp = Blueprint('property', __name__)
 
+# فلاتر الوحدات التي تُعرض أعداد قيمها في وضع البحث المصنف (facets=1)
+UNIT_FACETS = {
+    'status': Unit.status,
+    'unit_type_id': Unit.unit_type_id,
+    'category_id': Unit.category_id,
+    'bedrooms': Unit.bedrooms
+}
+
 def get_user_company():
     """الحصول على شركة المستخدم الحالي"""
     user_id = get_jwt_identity()
@@ -30,11 +44,7 @@ def get_projects():
         query = Project.query.filter_by(company_id=company_id, is_active=True)
         
         if search:
-            query = query.filter(or_(
-                Project.name.contains(search),
-                Project.name_en.contains(search),
-                Project.location.contains(search)
-            ))
+            query = query.filter(search_condition(Project.search_name, search))
         
         projects = query.paginate(
             page=page, per_page=per_page, error_out=False
@@ -108,11 +118,7 @@ def get_buildings():
         query = Building.query.filter_by(company_id=company_id, is_active=True)
         
         if search:
-            query = query.filter(or_(
-                Building.name.contains(search),
-                Building.name_en.contains(search),
-                Building.address.contains(search)
-            ))
+            query = query.filter(search_filter(Building, Building.search_name, company_id, search))
         
         if project_id:
             query = query.filter_by(project_id=project_id)
@@ -121,21 +127,20 @@ def get_buildings():
             page=page, per_page=per_page, error_out=False
         )
         
+        # إحصائيات الوحدات لجميع مباني الصفحة من عدادات الإشغال
+        occupancy = building_occupancy(company_id, [building.id for building in buildings.items])
+        
         # إضافة معلومات إضافية لكل مبنى
         buildings_data = []
         for building in buildings.items:
             building_dict = building.to_dict()
-            
-            # إحصائيات الوحدات
-            total_units = Unit.query.filter_by(building_id=building.id, is_active=True).count()
-            occupied_units = Unit.query.filter_by(building_id=building.id, status='occupied', is_active=True).count()
-            available_units = Unit.query.filter_by(building_id=building.id, status='available', is_active=True).count()
+            counts = occupancy[building.id]
             
             building_dict.update({
-                'total_units': total_units,
-                'occupied_units': occupied_units,
-                'available_units': available_units,
-                'occupancy_rate': (occupied_units / total_units * 100) if total_units > 0 else 0
+                'total_units': counts['total'],
+                'occupied_units': counts['occupied'],
+                'available_units': counts['available'],
+                'occupancy_rate': counts['occupancy_rate']
             })
             
             buildings_data.append(building_dict)
@@ -228,29 +233,39 @@ def get_units():
         per_page = request.args.get('per_page', 10, type=int)
         search = request.args.get('search', '')
         building_id = request.args.get('building_id', type=int)
-        status = request.args.get('status')
-        unit_type_id = request.args.get('unit_type_id', type=int)
+        with_facets = request.args.get('facets', '').lower() in ('1', 'true')
+        selected = {
+            'status': request.args.get('status') or None,
+            'unit_type_id': request.args.get('unit_type_id', type=int),
+            'category_id': request.args.get('category_id', type=int),
+            'bedrooms': request.args.get('bedrooms', type=int)
+        }
         
-        query = Unit.query.filter_by(company_id=company_id, is_active=True)
+        filters = [Unit.company_id == company_id, Unit.is_active == True]
         
         if search:
-            query = query.filter(or_(
-                Unit.unit_number.contains(search),
-                Unit.description.contains(search)
-            ))
+            filters.append(search_filter(Unit, Unit.search_name, company_id, search))
         
         if building_id:
-            query = query.filter_by(building_id=building_id)
-        
-        if status:
-            query = query.filter_by(status=status)
-        
-        if unit_type_id:
-            query = query.filter_by(unit_type_id=unit_type_id)
-        
-        units = query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+            filters.append(Unit.building_id == building_id)
+        
+        query = Unit.query.filter(*filters).order_by(Unit.id)
+        for name, value in selected.items():
+            if value is not None:
+                query = query.filter(UNIT_FACETS[name] == value)
+        
+        facets = None
+        if with_facets:
+            # الأعداد والإجمالي من مسح واحد، فلا حاجة لاستعلام count منفصل للصفحة
+            total, facets = facet_counts(Unit, filters, UNIT_FACETS, selected)
+            units = query.paginate(
+                page=page, per_page=per_page, error_out=False, count=False
+            )
+            units.total = total
+        else:
+            units = query.paginate(
+                page=page, per_page=per_page, error_out=False
+            )
         
         # إضافة معلومات إضافية لكل وحدة
         units_data = []
@@ -275,11 +290,40 @@ def get_units():
             
             units_data.append(unit_dict)
         
-        return jsonify({
+        result = {
             'units': units_data,
             'total': units.total,
             'pages': units.pages,
             'current_page': page
+        }
+        if facets is not None:
+            result['facets'] = facets
+        
+        return jsonify(result), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@property_bp.route('/units/match', methods=['GET'])
+@jwt_required()
+def match_available_units():
+    """مطابقة الوحدات المتاحة مع طلب العميل (نطاقات الإيجار والمساحة والغرف...) مرتبة حسب القرب"""
+    try:
+        company_id = get_user_company()
+        if not company_id:
+            return jsonify({'error': 'غير مصرح'}), 403
+        
+        try:
+            criteria = parse_criteria(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        limit = request.args.get('limit', DEFAULT_MATCH_LIMIT, type=int)
+        total, units = match_units(company_id, criteria, limit)
+        
+        return jsonify({
+            'units': units,
+            'total': total
         }), 200
         
     except Exception as e:
@@ -343,6 +387,33 @@ def create_unit():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@property_bp.route('/units/import', methods=['POST'])
+@jwt_required()
+def import_units():
+    """استيراد المباني والوحدات من ملف CSV مع تقرير أخطاء لكل صف (dry_run=1 للتحقق فقط)"""
+    try:
+        company_id = get_user_company()
+        if not company_id:
+            return jsonify({'error': 'غير مصرح'}), 403
+        
+        upload = request.files.get('file')
+        if not upload:
+            return jsonify({'error': 'ملف CSV مطلوب (الحقل file)'}), 400
+        
+        dry_run = request.args.get('dry_run', '').lower() in ('1', 'true')
+        
+        try:
+            report = UnitImporter(company_id).run(upload.stream, dry_run)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        report['dry_run'] = dry_run
+        return jsonify(report), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @property_bp.route('/units/<int:unit_id>', methods=['PUT'])
 @jwt_required()
 def update_unit(unit_id):
@@ -418,13 +489,16 @@ def get_property_stats():
         company_id = get_user_company()
         
         # إحصائيات المباني
-        total_buildings = Building.query.filter_by(company_id=company_id, is_active=True).count()
-        
-        # إحصائيات الوحدات
-        total_units = Unit.query.filter_by(company_id=company_id, is_active=True).count()
-        occupied_units = Unit.query.filter_by(company_id=company_id, status='occupied', is_active=True).count()
-        available_units = Unit.query.filter_by(company_id=company_id, status='available', is_active=True).count()
-        maintenance_units = Unit.query.filter_by(company_id=company_id, status='maintenance', is_active=True).count()
+        total_buildings = MetricsQuery(
+            Building, Building.company_id == company_id, Building.is_active == True
+        ).count('total').run()['total']
+        
+        # إحصائيات الوحدات من عدادات الإشغال
+        unit_stats = company_occupancy(company_id)
+        total_units = unit_stats['total']
+        occupied_units = unit_stats['occupied']
+        available_units = unit_stats['available']
+        maintenance_units = unit_stats['maintenance']
         
         # معدل الإشغال
         occupancy_rate = (occupied_units / total_units * 100) if total_units > 0 else 0
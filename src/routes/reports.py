@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models.property import db, User, Building, Unit
 from src.models.contract import Contract, ContractPayment, Person
@@ -6,6 +6,9 @@ from src.models.finance import Expense, ExpenseCategory
 from datetime import datetime, date
 from sqlalchemy import and_, or_, func
 from dateutil.relativedelta import relativedelta
+from src.utils.financial_summary import period_totals, expenses_by_category_name
+from src.utils.occupancy import building_occupancy
+from src.utils.rent_roll import iter_rent_roll, stream_jsonl, stream_csv
 import io
 import base64
 from reportlab.lib.pagesizes import A4, letter
@@ -203,40 +206,11 @@ def generate_financial_statement():
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
         
-        # حساب الإيرادات
-        revenue_query = db.session.query(func.sum(ContractPayment.paid_amount)).join(Contract).filter(
-            and_(
-                Contract.company_id == company_id,
-                ContractPayment.status == 'paid',
-                ContractPayment.payment_date >= start_date,
-                ContractPayment.payment_date <= end_date
-            )
-        )
-        total_revenue = revenue_query.scalar() or 0
-        
-        # حساب المصروفات
-        expense_query = db.session.query(func.sum(Expense.amount)).filter(
-            and_(
-                Expense.company_id == company_id,
-                Expense.status == 'paid',
-                Expense.expense_date >= start_date,
-                Expense.expense_date <= end_date
-            )
-        )
-        total_expenses = expense_query.scalar() or 0
-        
-        # حساب المصروفات حسب الفئة
-        expenses_by_category = db.session.query(
-            ExpenseCategory.name,
-            func.sum(Expense.amount)
-        ).join(Expense).filter(
-            and_(
-                Expense.company_id == company_id,
-                Expense.status == 'paid',
-                Expense.expense_date >= start_date,
-                Expense.expense_date <= end_date
-            )
-        ).group_by(ExpenseCategory.name).all()
+        # الإيرادات والمصروفات من الملخص الشهري (أطراف الفترة فقط من الجداول الأصلية)
+        totals = period_totals(company_id, start_date, end_date)
+        total_revenue = totals['revenue']
+        total_expenses = totals['expenses']
+        expenses_by_category = expenses_by_category_name(company_id, totals['by_category'])
         
         # إنشاء ملف PDF
         buffer = io.BytesIO()
@@ -437,19 +411,17 @@ def generate_property_report():
             story.append(Spacer(1, 10))
             
             summary_data = [['المبنى', 'إجمالي الوحدات', 'الوحدات المؤجرة', 'الوحدات المتاحة', 'معدل الإشغال']]
+            occupancy = building_occupancy(company_id, [building.id for building in buildings])
             
             for building in buildings:
-                total_units = Unit.query.filter_by(building_id=building.id, is_active=True).count()
-                occupied_units = Unit.query.filter_by(building_id=building.id, status='occupied', is_active=True).count()
-                available_units = Unit.query.filter_by(building_id=building.id, status='available', is_active=True).count()
-                occupancy_rate = (occupied_units / total_units * 100) if total_units > 0 else 0
+                counts = occupancy[building.id]
                 
                 summary_data.append([
                     building.name,
-                    str(total_units),
-                    str(occupied_units),
-                    str(available_units),
-                    f"{occupancy_rate:.1f}%"
+                    str(counts['total']),
+                    str(counts['occupied']),
+                    str(counts['available']),
+                    f"{counts['occupancy_rate']:.1f}%"
                 ])
             
             summary_table = Table(summary_data, colWidths=[4*cm, 2.5*cm, 2.5*cm, 2.5*cm, 2.5*cm])
@@ -610,6 +582,38 @@ def generate_tenant_statement(tenant_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@reports_bp.route('/rent-roll', methods=['GET'])
+@jwt_required()
+def export_rent_roll():
+    """تصدير جدول الإيجارات: كل وحدة مع عقدها النشط والإيجار وتاريخ الاستحقاق القادم (بث بدون تحميل كامل في الذاكرة)"""
+    try:
+        company_id = get_user_company()
+        if not company_id:
+            return jsonify({'error': 'غير مصرح'}), 403
+        
+        export_format = request.args.get('format', 'jsonl')
+        building_id = request.args.get('building_id', type=int)
+        
+        if export_format not in ('jsonl', 'csv'):
+            return jsonify({'error': 'صيغة التصدير يجب أن تكون jsonl أو csv'}), 400
+        
+        rows = iter_rent_roll(company_id, building_id)
+        filename = f"rent_roll_{datetime.now().strftime('%Y%m%d')}.{export_format}"
+        
+        if export_format == 'csv':
+            body, mimetype = stream_csv(rows), 'text/csv; charset=utf-8'
+        else:
+            body, mimetype = stream_jsonl(rows), 'application/x-ndjson; charset=utf-8'
+        
+        return Response(
+            stream_with_context(body),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @reports_bp.route('/available-reports', methods=['GET'])
 @jwt_required()
 def get_available_reports():
@@ -639,6 +643,12 @@ def get_available_reports():
                 'name': 'كشف حساب المستأجر',
                 'description': 'كشف حساب شامل للمستأجر',
                 'parameters': ['tenant_id']
+            },
+            {
+                'id': 'rent_roll',
+                'name': 'جدول الإيجارات',
+                'description': 'كل وحدة مع عقدها النشط والمستأجر والإيجار وتاريخ الاستحقاق القادم (JSONL أو CSV)',
+                'parameters': ['building_id', 'format']
             }
         ]
         
@@ -0,0 +1,42 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from src.models.property import User
+from src.utils.search_index import global_search, DEFAULT_LIMIT
+
+search_bp = Blueprint('search', __name__)
+
+def get_user_company():
+    """الحصول على شركة المستخدم الحالي"""
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    return user.company_id if user else None
+
+@search_bp.route('', methods=['GET'])
+@jwt_required()
+def search_all():
+    """البحث الشامل في المباني والوحدات والأشخاص والعقود والشيكات والمصروفات"""
+    try:
+        company_id = get_user_company()
+        if not company_id:
+            return jsonify({'error': 'غير مصرح'}), 403
+        
+        query = request.args.get('q', '').strip()
+        limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+        types = [value for value in request.args.get('types', '').split(',') if value]
+        
+        if not query:
+            return jsonify({'error': 'نص البحث مطلوب'}), 400
+        
+        try:
+            results, totals = global_search(company_id, query, types, limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'query': query,
+            'results': results,
+            'totals': totals
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,151 @@
+from datetime import date, timedelta
+from sqlalchemy import select, func, case, and_, or_
+from src.models.property import db, Building, Unit
+from src.models.contract import Contract, ContractPayment, Person
+from src.utils.forecast import OPEN_PAYMENT_STATUSES
+
+# فترات الأعمار: (الاسم، أقل عدد أيام تأخير، أكثر عدد أيام تأخير)
+AGING_BUCKETS = (
+    ('current', None, 0),
+    ('days_1_30', 1, 30),
+    ('days_31_60', 31, 60),
+    ('days_61_90', 61, 90),
+    ('days_90_plus', 91, None)
+)
+
+# الدفعات غير المستحقة بعد تدخل في "الحالي" إذا كان استحقاقها خلال هذه المدة
+CURRENT_WINDOW_DAYS = 30
+
+AGING_GROUPS = ('tenant', 'contract', 'building')
+
+AMOUNT_FIELDS = tuple(name for name, _, _ in AGING_BUCKETS) + ('total',)
+
+SORT_FIELDS = AMOUNT_FIELDS + ('payment_count', 'oldest_due_date')
+
+
+def _outstanding():
+    """المبلغ غير المسدد لكل دفعة كما في تاريخ التقرير
+
+    الدفعة المسددة بعد as_of كانت معلقة في ذلك التاريخ فتُحتسب بكامل مبلغها.
+    """
+    remaining = ContractPayment.amount - func.coalesce(ContractPayment.paid_amount, 0)
+    return case(
+        (ContractPayment.status == 'paid', ContractPayment.amount),
+        else_=remaining
+    )
+
+
+def _bucket_condition(as_of, low, high):
+    """شرط الفترة على تاريخ الاستحقاق (أيام التأخير = as_of - due_date)"""
+    conditions = []
+    if low is not None:
+        conditions.append(ContractPayment.due_date <= as_of - timedelta(days=low))
+    if high is not None:
+        conditions.append(ContractPayment.due_date >= as_of - timedelta(days=high))
+    return and_(*conditions)
+
+
+def _group_columns(group_by):
+    """أعمدة التجميع والربط اللازم لكل مستوى"""
+    tenant_name = (Person.first_name + ' ' + Person.last_name).label('tenant_name')
+    if group_by == 'tenant':
+        return [Contract.tenant_id.label('tenant_id'), tenant_name], [Person], [Contract.tenant_id, Person.first_name, Person.last_name]
+    if group_by == 'contract':
+        return [
+            Contract.id.label('contract_id'), Contract.contract_number.label('contract_number'),
+            Contract.tenant_id.label('tenant_id'), tenant_name
+        ], [Person], [Contract.id, Contract.contract_number, Contract.tenant_id, Person.first_name, Person.last_name]
+    if group_by == 'building':
+        return [Building.id.label('building_id'), Building.name.label('building_name')], [Unit, Building], \
+            [Building.id, Building.name]
+    raise ValueError(f'مستوى تجميع غير مدعوم: {group_by}')
+
+
+def _metrics(as_of):
+    """أعمدة SUM(CASE ...) لكل فترة مع المجموع وعدد الدفعات وأقدم استحقاق"""
+    outstanding = _outstanding()
+    metrics = []
+    for name, low, high in AGING_BUCKETS:
+        metrics.append(func.coalesce(func.sum(case(
+            (_bucket_condition(as_of, low, high), outstanding), else_=0
+        )), 0).label(name))
+    metrics.append(func.coalesce(func.sum(outstanding), 0).label('total'))
+    metrics.append(func.count(ContractPayment.id).label('payment_count'))
+    metrics.append(func.min(ContractPayment.due_date).label('oldest_due_date'))
+    return metrics
+
+
+def _scan(stmt, company_id, as_of):
+    """ربط الدفعات بالعقود وتصفية الدفعات غير المسددة كما في as_of"""
+    return stmt.select_from(ContractPayment).join(
+        Contract, ContractPayment.contract_id == Contract.id
+    ).where(and_(
+        Contract.company_id == company_id,
+        ContractPayment.due_date <= as_of + timedelta(days=CURRENT_WINDOW_DAYS),
+        or_(
+            ContractPayment.status.in_(OPEN_PAYMENT_STATUSES),
+            ContractPayment.status.is_(None),
+            and_(ContractPayment.status == 'paid', ContractPayment.payment_date > as_of)
+        )
+    ))
+
+
+def aging_statement(company_id, as_of=None, group_by='tenant', sort='total', order='desc'):
+    """جملة SELECT واحدة تحسب جميع فترات الأعمار لكل مجموعة في مسح واحد"""
+    as_of = as_of or date.today()
+    if sort not in SORT_FIELDS:
+        raise ValueError(f'حقل ترتيب غير مدعوم: {sort}')
+
+    columns, targets, group_columns = _group_columns(group_by)
+    stmt = _scan(select(*columns, *_metrics(as_of)), company_id, as_of)
+    for target in targets:
+        if target is Person:
+            stmt = stmt.join(Person, Contract.tenant_id == Person.id)
+        elif target is Unit:
+            stmt = stmt.join(Unit, Contract.unit_id == Unit.id)
+        elif target is Building:
+            stmt = stmt.join(Building, Unit.building_id == Building.id)
+    stmt = stmt.group_by(*group_columns)
+
+    # الترتيب على النتيجة المجمعة مع ترتيب ثابت لضمان صفحات متسقة
+    sort_column = stmt.selected_columns[sort]
+    return stmt.order_by(sort_column.desc() if order == 'desc' else sort_column.asc(), group_columns[0])
+
+
+def _row_to_dict(row):
+    item = {}
+    for key, value in row._mapping.items():
+        if key in AMOUNT_FIELDS:
+            item[key] = float(value or 0)
+        elif isinstance(value, date):
+            item[key] = value.isoformat()
+        else:
+            item[key] = value
+    return item
+
+
+def aging_report(company_id, as_of=None, group_by='tenant', sort='total', order='desc', page=1, per_page=50):
+    """تقرير أعمار الذمم مع الترتيب والترقيم على النتيجة المجمعة"""
+    as_of = as_of or date.today()
+    page = max(page, 1)
+    stmt = aging_statement(company_id, as_of, group_by, sort, order)
+
+    total = db.session.execute(select(func.count()).select_from(stmt.order_by(None).subquery())).scalar()
+    rows = db.session.execute(stmt.limit(per_page).offset((page - 1) * per_page)).all()
+
+    return {
+        'as_of': as_of.isoformat(),
+        'group_by': group_by,
+        'items': [_row_to_dict(row) for row in rows],
+        'totals': aging_totals(company_id, as_of),
+        'total': total,
+        'pages': (total + per_page - 1) // per_page,
+        'current_page': page
+    }
+
+
+def aging_totals(company_id, as_of=None):
+    """مجاميع الفترات على مستوى الشركة"""
+    as_of = as_of or date.today()
+    row = db.session.execute(_scan(select(*_metrics(as_of)), company_id, as_of)).one()
+    return _row_to_dict(row)
@@ -0,0 +1,313 @@
+import re
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from src.models.property import db, Building, Unit
+from src.models.contract import Person, Contract
+from src.utils.normalization import normalize_text
+
+# عدد الفهارس المحفوظة في الذاكرة (شركة × نوع)؛ الأقدم استخداماً يُحذف أولاً
+MAX_INDEXES = 32
+
+# عمر الفهرس قبل إعادة بنائه (لالتقاط التعديلات من عمليات أخرى أو الكتابة المباشرة)
+MAX_AGE = 600
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+# أقصى عدد مفاتيح يُفحص في بحث متعدد الكلمات قبل التوقف
+MAX_SCAN = 5000
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def _unit_statement():
+    return select(
+        Unit.id, Unit.company_id, (Building.name + ' - ' + Unit.unit_number).label('label'),
+        Unit.unit_number, Building.name, Building.name_en
+    ).join(Building, Unit.building_id == Building.id).where(Unit.is_active == True)
+
+
+def _tenant_statement():
+    return select(
+        Person.id, Person.company_id, (Person.first_name + ' ' + Person.last_name).label('label'),
+        Person.first_name, Person.last_name, Person.first_name_en, Person.last_name_en
+    ).where(Person.is_active == True, Person.person_type == 'tenant')
+
+
+def _contract_statement():
+    return select(
+        Contract.id, Contract.company_id, Contract.contract_number.label('label'), Contract.contract_number
+    )
+
+
+# لكل نوع: النموذج، استعلام المستندات (المعرف، الشركة، نص العرض، حقول المفاتيح...)،
+# والحقول التي يعاد تحديث المستند عند تغيرها
+AUTOCOMPLETE_ENTITIES = {
+    'unit': {
+        'model': Unit, 'statement': _unit_statement,
+        'fields': ('unit_number', 'building_id', 'is_active')
+    },
+    'tenant': {
+        'model': Person, 'statement': _tenant_statement,
+        'fields': ('first_name', 'last_name', 'first_name_en', 'last_name_en', 'person_type', 'is_active')
+    },
+    'contract': {
+        'model': Contract, 'statement': _contract_statement,
+        'fields': ('contract_number',)
+    }
+}
+
+_MODEL_TYPES = {entry['model']: entity_type for entity_type, entry in AUTOCOMPLETE_ENTITIES.items()}
+
+
+def document_keys(fields):
+    """مفاتيح البادئات للمستند: كل كلمة من الحقول بعد التوحيد
+
+    الكلمات تُخزن مرة واحدة (sys.intern) لأن أسماء العائلات والمباني تتكرر كثيراً.
+    """
+    text = normalize_text(' '.join(str(value) for value in fields if value))
+    return tuple(sorted(set(map(sys.intern, _TOKEN.findall(text)))))
+
+
+class PrefixIndex:
+    """فهرس بادئات لنوع واحد في شركة واحدة: مصفوفة مفاتيح مرتبة يُبحث فيها بـ bisect
+
+    keys قائمة نصوص مرتبة، وids مصفوفة معرفات موازية لها (المعرفات مرتبة داخل المفتاح
+    الواحد)، فكل بحث بادئة هو bisect ثم مسح للنطاق المطابق فقط.
+    """
+
+    def __init__(self, company_id, entity_type):
+        self.company_id = company_id
+        self.entity_type = entity_type
+        self.lock = threading.Lock()
+        self.keys = []
+        self.ids = array('q')
+        self.labels = {}
+        self.document_keys = {}
+        self.built_at = 0
+
+    def build(self):
+        """بناء الفهرس من قاعدة البيانات"""
+        entry = AUTOCOMPLETE_ENTITIES[self.entity_type]
+        model = entry['model']
+        stmt = entry['statement']().where(model.company_id == self.company_id)
+
+        pairs = []
+        labels = {}
+        keys_by_id = {}
+        for row in db.session.execute(stmt.execution_options(yield_per=5000)):
+            keys = document_keys(row[3:])
+            labels[row.id] = row.label
+            keys_by_id[row.id] = keys
+            pairs.extend((key, row.id) for key in keys)
+        pairs.sort()
+
+        self.keys = [key for key, _ in pairs]
+        self.ids = array('q', (entity_id for _, entity_id in pairs))
+        self.labels = labels
+        self.document_keys = keys_by_id
+        self.built_at = time.monotonic()
+
+    def _position(self, key, entity_id):
+        low = bisect_left(self.keys, key)
+        high = bisect_right(self.keys, key, low)
+        return bisect_left(self.ids, entity_id, low, high)
+
+    def remove(self, entity_id):
+        for key in self.document_keys.pop(entity_id, ()):
+            position = self._position(key, entity_id)
+            if position < len(self.ids) and self.keys[position] == key and self.ids[position] == entity_id:
+                del self.keys[position]
+                del self.ids[position]
+        self.labels.pop(entity_id, None)
+
+    def upsert(self, entity_id, label, keys):
+        """تحديث مستند واحد في مكانه (None = حذف المستند من الفهرس)"""
+        self.remove(entity_id)
+        if label is None:
+            return
+        for key in keys:
+            position = self._position(key, entity_id)
+            self.keys.insert(position, key)
+            self.ids.insert(position, entity_id)
+        self.labels[entity_id] = label
+        self.document_keys[entity_id] = keys
+
+    def lookup(self, query, limit=DEFAULT_LIMIT):
+        """المستندات التي تبدأ إحدى كلماتها بكل كلمة من نص البحث"""
+        tokens = _TOKEN.findall(normalize_text(query))
+        if not tokens:
+            return []
+        # المسح على أطول كلمة (أضيق نطاق)، وبقية الكلمات تُتحقق من مفاتيح المستند
+        tokens.sort(key=len, reverse=True)
+        scan, others = tokens[0], tokens[1:]
+
+        results = []
+        seen = set()
+        position = bisect_left(self.keys, scan)
+        end = min(len(self.keys), position + MAX_SCAN) if others else len(self.keys)
+        while position < end and len(results) < limit and self.keys[position].startswith(scan):
+            entity_id = self.ids[position]
+            position += 1
+            if entity_id in seen:
+                continue
+            seen.add(entity_id)
+            keys = self.document_keys[entity_id]
+            if all(any(key.startswith(token) for key in keys) for token in others):
+                results.append({'id': entity_id, 'label': self.labels[entity_id]})
+        return results
+
+    def memory_usage(self):
+        """تقدير حجم الفهرس في الذاكرة بالبايت (النصوص المشتركة تُحسب مرة واحدة)"""
+        counted = set()
+
+        def size(value):
+            if id(value) in counted:
+                return 0
+            counted.add(id(value))
+            return sys.getsizeof(value)
+
+        total = sys.getsizeof(self.keys) + sum(size(key) for key in self.keys)
+        total += self.ids.buffer_info()[1] * self.ids.itemsize
+        total += sys.getsizeof(self.labels) + sum(size(label) for label in self.labels.values())
+        total += sys.getsizeof(self.document_keys)
+        total += sum(size(keys) + sum(size(key) for key in keys) for keys in self.document_keys.values())
+        return total
+
+    def stats(self):
+        return {
+            'company_id': self.company_id,
+            'type': self.entity_type,
+            'documents': len(self.labels),
+            'keys': len(self.keys),
+            'bytes': self.memory_usage(),
+            'age_seconds': round(time.monotonic() - self.built_at, 1)
+        }
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_index(company_id, entity_type):
+    """فهرس الشركة والنوع (يُبنى عند أول طلب أو عند انتهاء عمره، مع إزالة الأقدم استخداماً)
+
+    يجب البحث في الفهرس داخل index.lock لأن التحديثات تعدّل المصفوفات في مكانها.
+    """
+    if entity_type not in AUTOCOMPLETE_ENTITIES:
+        raise ValueError(f'نوع غير مدعوم: {entity_type}')
+
+    key = (company_id, entity_type)
+    with _indexes_lock:
+        index = _indexes.pop(key, None)
+        if index is None:
+            index = PrefixIndex(company_id, entity_type)
+        _indexes[key] = index
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+
+    with index.lock:
+        if not index.built_at or time.monotonic() - index.built_at > MAX_AGE:
+            index.build()
+    return index
+
+
+def memory_report():
+    """حجم كل فهرس محمل في الذاكرة والمجموع"""
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    items = []
+    for index in indexes:
+        with index.lock:
+            items.append(index.stats())
+    return {
+        'indexes': items,
+        'total_bytes': sum(item['bytes'] for item in items),
+        'max_indexes': MAX_INDEXES
+    }
+
+
+def invalidate(company_id, entity_type):
+    """حذف فهرس من الذاكرة ليعاد بناؤه عند الطلب التالي (بعد الكتابة المباشرة)"""
+    with _indexes_lock:
+        _indexes.pop((company_id, entity_type), None)
+
+
+def clear_indexes():
+    """تفريغ جميع فهارس الإكمال التلقائي من الذاكرة"""
+    with _indexes_lock:
+        _indexes.clear()
+
+
+# ===== التحديث من أحداث ORM =====
+
+def _loaded(company_id, entity_type):
+    with _indexes_lock:
+        return (company_id, entity_type) in _indexes
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_autocomplete_changes(session, flush_context):
+    """قراءة المستندات المتغيرة للفهارس المحملة فقط، لتطبيقها بعد تثبيت المعاملة"""
+    changed = {}
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        entity_type = _MODEL_TYPES.get(type(obj))
+        if isinstance(obj, Building) and obj in session.dirty:
+            # تغيير اسم المبنى يغير نص العرض ومفاتيح وحداته
+            state = db.inspect(obj)
+            if (state.attrs['name'].history.has_changes() or state.attrs['name_en'].history.has_changes()) \
+                    and _loaded(obj.company_id, 'unit'):
+                unit_ids = session.connection().execute(
+                    select(Unit.id).where(Unit.building_id == obj.id)
+                ).scalars()
+                changed.setdefault(('unit', obj.company_id), set()).update(unit_ids)
+            continue
+        if not entity_type or obj.id is None or not _loaded(obj.company_id, entity_type):
+            continue
+        if obj in session.dirty:
+            state = db.inspect(obj)
+            if not any(state.attrs[field].history.has_changes()
+                       for field in AUTOCOMPLETE_ENTITIES[entity_type]['fields']):
+                continue
+        changed.setdefault((entity_type, obj.company_id), set()).add(obj.id)
+
+    if not changed:
+        return
+
+    pending = session.info.setdefault('autocomplete_pending', [])
+    connection = session.connection()
+    for (entity_type, company_id), ids in changed.items():
+        entry = AUTOCOMPLETE_ENTITIES[entity_type]
+        documents = {
+            row.id: (row.label, document_keys(row[3:]))
+            for row in connection.execute(entry['statement']().where(entry['model'].id.in_(ids)))
+        }
+        for entity_id in ids:
+            label, keys = documents.get(entity_id, (None, ()))
+            pending.append((company_id, entity_type, entity_id, label, keys))
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_autocomplete_changes(session):
+    """تطبيق التغييرات المثبتة على الفهارس المحملة"""
+    pending = session.info.pop('autocomplete_pending', None)
+    if not pending:
+        return
+    for company_id, entity_type, entity_id, label, keys in pending:
+        with _indexes_lock:
+            index = _indexes.get((company_id, entity_type))
+        if index is None:
+            continue
+        with index.lock:
+            index.upsert(entity_id, label, keys)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_autocomplete_changes(session):
+    session.info.pop('autocomplete_pending', None)
@@ -0,0 +1,787 @@
+import csv
+import io
+import re
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import select, or_, bindparam
+from src.models.property import db, Building, Unit
+from src.models.contract import Person, ContractType, Contract
+from src.utils.normalization import (
+    normalize_text, normalize_phone, phone_tail, search_text, PHONE_COLUMNS, PHONE_TAIL_COLUMNS
+)
+from src.utils.occupancy import UNIT_STATUSES, apply_counter_deltas
+from src.utils.financial_summary import record_new_payments
+from src.utils.recurring_revenue import monthly_rent, apply_mrr_deltas
+from src.utils.forecast import invalidate_forecast
+from src.utils.sequences import reserve_numbers
+from src.utils.payment_schedule import payment_schedule, payment_rows, insert_payments, PAYMENT_FREQUENCIES
+from src.utils import autocomplete, search_index
+
+# عدد الصفوف في كل دفعة تحقق وإدراج (معاملة واحدة لكل دفعة)
+CHUNK_SIZE = 2000
+
+# العقود الطويلة تولد مئات الدفعات لكل عقد، فدفعاتها أصغر لتبقى كل معاملة بحجم معقول
+CONTRACT_CHUNK_SIZE = 500
+
+# أقصى عدد أخطاء صفوف يُعاد في التقرير (العدد الكلي يبقى صحيحاً)
+MAX_REPORTED_ERRORS = 1000
+
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 'نعم')
+FALSE_VALUES = ('0', 'false', 'no', 'n', 'لا')
+
+
+class ImportReport:
+    """تقرير الاستيراد: عدد الصفوف المستوردة والفاشلة مع أخطاء كل صف وتصنيفه"""
+
+    def __init__(self):
+        self.total_rows = 0
+        self.imported = 0
+        self.failed = 0
+        self.created = defaultdict(int)
+        self.actions = defaultdict(int)
+        self.errors = []
+        self.rows = []
+
+    def add_errors(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': line, 'errors': errors})
+
+    def add_action(self, line, action, **details):
+        """تصنيف صف (إدراج، تحديث، مكرر...) مع تفاصيله"""
+        self.actions[action] += 1
+        if len(self.rows) < MAX_REPORTED_ERRORS:
+            self.rows.append({'row': line, 'action': action, **details})
+
+    def to_dict(self):
+        report = {
+            'total_rows': self.total_rows,
+            'imported': self.imported,
+            'failed': self.failed,
+            'created': dict(self.created),
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors)
+        }
+        if self.actions:
+            report['actions'] = dict(self.actions)
+            report['rows'] = self.rows
+            report['rows_truncated'] = sum(self.actions.values()) > len(self.rows)
+        return report
+
+
+def open_csv(stream, required_columns):
+    """قارئ CSV متدفق من ملف مرفوع (UTF-8 مع أو بدون BOM) بعد التحقق من الأعمدة المطلوبة"""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    columns = [name.strip() for name in (reader.fieldnames or [])]
+    missing = [name for name in required_columns if name not in columns]
+    if missing:
+        raise ValueError(f'أعمدة مطلوبة غير موجودة في الملف: {", ".join(missing)}')
+    reader.fieldnames = columns
+    return reader
+
+
+def iter_chunks(reader, size=CHUNK_SIZE):
+    """صفوف الملف على دفعات: قوائم من (رقم السطر، قاموس القيم بعد حذف المسافات)"""
+    chunk = []
+    for row in reader:
+        values = {key: (value or '').strip() for key, value in row.items() if key}
+        chunk.append((reader.line_num, values))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ===== تحويل القيم =====
+
+def parse_int(values, name, errors):
+    value = values.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        errors.append(f'{name}: يجب أن يكون رقماً صحيحاً')
+        return None
+
+
+def parse_decimal(values, name, errors):
+    value = values.get(name)
+    if not value:
+        return None
+    try:
+        return Decimal(value.replace(',', ''))
+    except InvalidOperation:
+        errors.append(f'{name}: يجب أن يكون رقماً')
+        return None
+
+
+def parse_bool(values, name, errors, default=False):
+    value = values.get(name, '').lower()
+    if not value:
+        return default
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    errors.append(f'{name}: قيمة غير صحيحة (true أو false)')
+    return default
+
+
+def parse_date(values, name, errors):
+    value = values.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        errors.append(f'{name}: صيغة التاريخ يجب أن تكون YYYY-MM-DD')
+        return None
+
+
+# ===== استيراد المباني والوحدات =====
+
+UNIT_REQUIRED_COLUMNS = ('unit_number',)
+
+UNIT_INTEGER_FIELDS = ('floor_number', 'unit_type_id', 'category_id', 'bedrooms', 'bathrooms', 'balconies',
+                       'parking_spaces')
+UNIT_DECIMAL_FIELDS = ('area', 'purchase_price', 'current_rent')
+UNIT_TEXT_FIELDS = ('view_type', 'ownership_type', 'description', 'description_en')
+
+
+class UnitImporter:
+    """استيراد الوحدات من CSV مع إنشاء المباني غير الموجودة (حسب الاسم)
+
+    المباني والوحدات الحالية للشركة تُحمّل مرة واحدة في الذاكرة، فالتحقق من تكرار
+    (المبنى، رقم الوحدة) لا يستعلم قاعدة البيانات لكل صف. كل دفعة تُدرج بـ executemany
+    في معاملة واحدة مع تحديث عدادات الإشغال وفهرس البحث الشامل، لأن الإدراج المباشر
+    لا يمر بأحداث ORM.
+    """
+
+    def __init__(self, company_id):
+        self.company_id = company_id
+        self.report = ImportReport()
+        self.buildings = {}
+        self.building_names = {}
+        self.existing_units = set()
+
+    def preload(self):
+        """تحميل المباني وأرقام الوحدات النشطة للشركة"""
+        for building_id, name in db.session.execute(
+            select(Building.id, Building.name).where(Building.company_id == self.company_id,
+                                                     Building.is_active == True)
+        ):
+            self.buildings[building_id] = name
+            self.building_names.setdefault(normalize_text(name), building_id)
+
+        for building_id, unit_number in db.session.execute(
+            select(Unit.building_id, Unit.unit_number).where(Unit.company_id == self.company_id,
+                                                             Unit.is_active == True)
+        ):
+            self.existing_units.add((building_id, normalize_text(unit_number)))
+
+    def _building_key(self, values, errors):
+        """معرف المبنى الموجود، أو ('new', الاسم الموحد) لمبنى سيُنشأ"""
+        building_id = parse_int(values, 'building_id', errors)
+        if building_id is not None:
+            if building_id not in self.buildings:
+                errors.append('building_id: المبنى غير موجود')
+            return building_id
+
+        name = values.get('building_name')
+        if not name:
+            errors.append('building_id أو building_name مطلوب')
+            return None
+        key = normalize_text(name)
+        return self.building_names.get(key, ('new', key))
+
+    def validate(self, values):
+        """تحويل صف إلى قيم الوحدة (أو قائمة أخطاء)"""
+        errors = []
+        building_key = self._building_key(values, errors)
+
+        unit_number = values.get('unit_number')
+        if not unit_number:
+            errors.append('unit_number: مطلوب')
+
+        status = values.get('status') or 'available'
+        if status not in UNIT_STATUSES:
+            errors.append(f'status: يجب أن تكون إحدى القيم {", ".join(UNIT_STATUSES)}')
+
+        row = {
+            'company_id': self.company_id,
+            'unit_number': unit_number,
+            'status': status,
+            'furnished': parse_bool(values, 'furnished', errors),
+            'is_active': True
+        }
+        for name in UNIT_INTEGER_FIELDS:
+            row[name] = parse_int(values, name, errors)
+        for name in UNIT_DECIMAL_FIELDS:
+            row[name] = parse_decimal(values, name, errors)
+        for name in UNIT_TEXT_FIELDS:
+            row[name] = values.get(name) or None
+
+        if not errors and building_key is not None:
+            unit_key = (building_key, normalize_text(unit_number))
+            if unit_key in self.existing_units:
+                errors.append('رقم الوحدة موجود بالفعل في هذا المبنى')
+            else:
+                self.existing_units.add(unit_key)
+        return building_key, row, errors
+
+    def _create_buildings(self, connection, names):
+        """إنشاء المباني الجديدة للدفعة وإرجاع معرفاتها"""
+        now = datetime.utcnow()
+        created = {}
+        for key, (name, values) in names.items():
+            building = {
+                'company_id': self.company_id, 'name': name, 'name_en': values.get('building_name_en') or None,
+                'address': values.get('building_address') or None, 'is_active': True,
+                'created_at': now, 'updated_at': now
+            }
+            building['search_name'] = search_text(Building, building)
+            building_id = connection.execute(Building.__table__.insert().values(building)).inserted_primary_key[0]
+            self.buildings[building_id] = name
+            self.building_names[key] = building_id
+            created[('new', key)] = building_id
+        return created
+
+    def import_chunk(self, chunk, dry_run=False):
+        """تحقق دفعة وإدراج صفوفها الصالحة في معاملة واحدة"""
+        valid = []
+        new_buildings = {}
+        for line, values in chunk:
+            self.report.total_rows += 1
+            building_key, row, errors = self.validate(values)
+            if errors:
+                self.report.add_errors(line, errors)
+                continue
+            if isinstance(building_key, tuple) and building_key[1] not in new_buildings:
+                new_buildings[building_key[1]] = (values['building_name'], values)
+            valid.append((line, building_key, row))
+
+        if dry_run or not valid:
+            self.report.imported += len(valid)
+            self.report.created['buildings'] += len(new_buildings)
+            return
+
+        connection = db.session.connection()
+        try:
+            created = self._create_buildings(connection, new_buildings)
+            now = datetime.utcnow()
+            rows = []
+            counters = defaultdict(int)
+            for _, building_key, row in valid:
+                row['building_id'] = created.get(building_key, building_key)
+                row['search_name'] = search_text(Unit, row)
+                row['created_at'] = row['updated_at'] = now
+                rows.append(row)
+                counters[(self.company_id, row['building_id'], row['status'])] += 1
+                counters[(self.company_id, None, row['status'])] += 1
+
+            table = Unit.__table__
+            unit_ids = connection.execute(
+                table.insert().returning(table.c.id), rows
+            ).scalars().all()
+            apply_counter_deltas(connection, counters)
+            search_index.reindex(connection, {'building': list(created.values()), 'unit': unit_ids}, inserted=True)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            # إعادة المفاتيح المحجوزة حتى لا تُرفض الصفوف نفسها عند إعادة المحاولة
+            for _, building_key, row in valid:
+                self.existing_units.discard((building_key, normalize_text(row['unit_number'])))
+            for line, _, _ in valid:
+                self.report.add_errors(line, [f'فشل حفظ الدفعة: {e}'])
+            for key in new_buildings:
+                self.building_names.pop(key, None)
+            return
+
+        # الوحدات المحجوزة باسم مبنى جديد تُسجل بمعرفه الفعلي للتحقق في الدفعات التالية
+        for _, building_key, row in valid:
+            if building_key in created:
+                unit_number = normalize_text(row['unit_number'])
+                self.existing_units.discard((building_key, unit_number))
+                self.existing_units.add((created[building_key], unit_number))
+
+        self.report.imported += len(rows)
+        self.report.created['buildings'] += len(created)
+
+    def run(self, stream, dry_run=False):
+        """استيراد الملف كاملاً دفعة بعد دفعة وإرجاع التقرير"""
+        reader = open_csv(stream, UNIT_REQUIRED_COLUMNS)
+        if 'building_id' not in reader.fieldnames and 'building_name' not in reader.fieldnames:
+            raise ValueError('الملف يجب أن يحتوي على العمود building_id أو building_name')
+
+        self.preload()
+        for chunk in iter_chunks(reader):
+            self.import_chunk(chunk, dry_run)
+
+        if not dry_run and self.report.imported:
+            autocomplete.invalidate(self.company_id, 'unit')
+        return self.report.to_dict()
+
+
+# ===== استيراد الأشخاص =====
+
+PERSON_REQUIRED_COLUMNS = ('first_name', 'last_name')
+
+PERSON_TEXT_FIELDS = ('person_type', 'first_name', 'last_name', 'first_name_en', 'last_name_en', 'nationality',
+                      'id_number', 'passport_number', 'visa_number', 'gender', 'marital_status', 'email',
+                      'phone', 'mobile', 'address', 'address_en', 'emergency_contact_name',
+                      'emergency_contact_phone', 'notes')
+PERSON_DATE_FIELDS = ('id_expiry_date', 'passport_expiry_date', 'visa_expiry_date', 'birth_date')
+PERSON_FIELDS = PERSON_TEXT_FIELDS + PERSON_DATE_FIELDS
+
+# مفاتيح مطابقة الأشخاص بالترتيب: رقم الهوية ثم الجواز ثم الهاتف الموحد
+PERSON_MATCH_KEYS = ('id_number', 'passport_number', 'phone')
+
+_DOCUMENT_SEPARATORS = re.compile(r'[\s\-/.]')
+
+
+def document_key(value):
+    """توحيد رقم الهوية أو الجواز للمطابقة (بدون فواصل، أرقام لاتينية، حروف صغيرة)"""
+    return _DOCUMENT_SEPARATORS.sub('', normalize_text(value)) if value else ''
+
+
+class PersonImporter:
+    """استيراد الأشخاص من CSV مع منع التكرار برقم الهوية أو الجواز أو الهاتف الموحد
+
+    فهارس hash للقيم الموجودة في الشركة تُبنى مرة واحدة، فيُصنف كل صف في O(1):
+    insert (شخص جديد)، update (مطابق لشخص موجود وبعض قيمه مختلفة)، duplicate (مطابق بدون
+    تغيير، أو مكرر لصف سابق في الملف نفسه)، conflict (مفاتيحه تطابق أشخاصاً مختلفين، أو
+    هاتفه يطابق شخصاً باسم مختلف).
+    الإدراج والتحديث يُنفذان بجمل executemany لكل دفعة، وdry_run يرجع التصنيف فقط.
+    """
+
+    def __init__(self, company_id):
+        self.company_id = company_id
+        self.report = ImportReport()
+        self.persons = {}
+        self.pending = {}
+        self.indexes = {key: {} for key in PERSON_MATCH_KEYS}
+
+    def _keys(self, values):
+        """قيم مفاتيح المطابقة للصف: [(المفتاح، القيمة الموحدة)]"""
+        keys = []
+        for name in ('id_number', 'passport_number'):
+            value = document_key(values.get(name))
+            if value:
+                keys.append((name, value))
+        for name in ('phone', 'mobile'):
+            value = normalize_phone(values.get(name))
+            if value:
+                keys.append(('phone', value))
+        return keys
+
+    def _register(self, values, owner):
+        for name, value in self._keys(values):
+            self.indexes[name].setdefault(value, owner)
+
+    def preload(self):
+        """تحميل الأشخاص الحاليين للشركة وبناء فهارس المطابقة"""
+        columns = [Person.id] + [getattr(Person, name) for name in PERSON_FIELDS]
+        for row in db.session.execute(select(*columns).where(Person.company_id == self.company_id)):
+            values = dict(zip(('id',) + PERSON_FIELDS, row))
+            self.persons[values['id']] = values
+            self._register(values, values['id'])
+
+    def validate(self, values):
+        """تحويل صف إلى قيم الشخص (القيم الفارغة تُترك بدون تغيير عند التحديث)"""
+        errors = []
+        row = {}
+        for name in PERSON_TEXT_FIELDS:
+            if values.get(name):
+                row[name] = values[name]
+        for name in PERSON_DATE_FIELDS:
+            value = parse_date(values, name, errors)
+            if value:
+                row[name] = value
+        return row, errors
+
+    @staticmethod
+    def _same(name, old, new):
+        """تساوي القيمتين بعد التوحيد (اختلاف الفواصل أو صيغة الهاتف لا يعتبر تغييراً)"""
+        if name in ('id_number', 'passport_number'):
+            return document_key(old) == document_key(new)
+        if name in PHONE_COLUMNS:
+            return normalize_phone(old) == normalize_phone(new)
+        return old == new
+
+    @staticmethod
+    def _same_name(existing, row):
+        return all(
+            not row.get(name) or normalize_text(existing.get(name)) == normalize_text(row[name])
+            for name in ('first_name', 'last_name')
+        )
+
+    def classify(self, row):
+        """(التصنيف، الشخص أو الصف المطابق، المفتاح المطابق، الحقول المتغيرة)"""
+        owners = {}
+        for name, value in self._keys(row):
+            owner = self.indexes[name].get(value)
+            if owner is not None:
+                owners.setdefault(owner, name)
+
+        if not owners:
+            return 'insert', None, None, []
+        if len(owners) > 1:
+            return 'conflict', sorted(owners, key=str), None, []
+
+        owner, matched_by = next(iter(owners.items()))
+        existing = self.pending[owner] if isinstance(owner, tuple) else self.persons[owner]
+        # الهاتف مفتاح أضعف: قد يكون رقم قريب أو رقماً أعيد استخدامه، فلا يطابق إلا مع الاسم نفسه
+        if matched_by == 'phone' and not self._same_name(existing, row):
+            return 'conflict', [owner], matched_by, []
+        if isinstance(owner, tuple):
+            # مطابق لصف سابق في الملف نفسه
+            return 'duplicate', owner, matched_by, []
+        changes = [name for name, value in row.items() if not self._same(name, existing.get(name), value)]
+        return ('update' if changes else 'duplicate'), owner, matched_by, changes
+
+    def import_chunk(self, chunk, dry_run=False):
+        """تصنيف دفعة ثم تنفيذ الإدراج والتحديث في معاملة واحدة"""
+        inserts = []
+        updates = defaultdict(list)
+        written = []
+        for line, values in chunk:
+            self.report.total_rows += 1
+            row, errors = self.validate(values)
+            action, owner, matched_by, changes = self.classify(row)
+            if action == 'insert' and not (row.get('first_name') and row.get('last_name')):
+                errors.append('الاسم الأول والأخير مطلوبان')
+            if action == 'conflict':
+                errors.append(f'المفاتيح تطابق أشخاصاً آخرين (بأسماء مختلفة أو أكثر من شخص): {owner}')
+            if errors:
+                self.report.add_errors(line, errors)
+                continue
+
+            if action == 'insert':
+                self.pending[('row', line)] = row
+                self._register(row, ('row', line))
+                inserts.append(row)
+                written.append(line)
+                self.report.add_action(line, action)
+            elif action == 'update':
+                updates[tuple(sorted(changes))].append((owner, row))
+                written.append(line)
+                self._register(row, owner)
+                self.report.add_action(line, action, person_id=owner, matched_by=matched_by, changes=changes)
+            else:
+                details = {'row_of': owner[1]} if isinstance(owner, tuple) else {'person_id': owner}
+                self.report.add_action(line, action, matched_by=matched_by, **details)
+
+        if dry_run or not (inserts or updates):
+            return
+
+        try:
+            connection = db.session.connection()
+            person_ids = self._insert(connection, inserts)
+            updated_ids = self._update(connection, updates)
+            search_index.reindex(connection, {'person': person_ids}, inserted=True)
+            search_index.reindex(connection, {'person': updated_ids})
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for line in written:
+                self.report.add_errors(line, [f'فشل حفظ الدفعة: {e}'])
+            return
+
+        self.report.imported += len(person_ids) + len(updated_ids)
+        self.report.created['persons'] += len(person_ids)
+
+    def _insert(self, connection, rows):
+        if not rows:
+            return []
+        now = datetime.utcnow()
+        records = []
+        for row in rows:
+            record = {name: row.get(name) for name in PERSON_FIELDS}
+            record.update(company_id=self.company_id, is_active=True, created_at=now, updated_at=now)
+            record['person_type'] = record['person_type'] or 'tenant'
+            record['search_name'] = search_text(Person, record)
+            for field, column in PHONE_COLUMNS.items():
+                record[column] = normalize_phone(record[field]) or None
+                record[PHONE_TAIL_COLUMNS[field]] = phone_tail(record[column])
+            records.append(record)
+
+        table = Person.__table__
+        person_ids = connection.execute(table.insert().returning(table.c.id), records).scalars().all()
+        return person_ids
+
+    def _update(self, connection, updates):
+        """تحديث الأشخاص المطابقين: جملة executemany واحدة لكل مجموعة حقول متغيرة"""
+        table = Person.__table__
+        now = datetime.utcnow()
+        updated = []
+        for changes, items in updates.items():
+            columns = list(changes)
+            derived = []
+            if any(name in ('first_name', 'last_name', 'first_name_en', 'last_name_en') for name in changes):
+                derived.append('search_name')
+            for field, column in PHONE_COLUMNS.items():
+                if field in changes:
+                    derived.extend((column, PHONE_TAIL_COLUMNS[field]))
+
+            params = []
+            for person_id, row in items:
+                existing = self.persons[person_id]
+                existing.update({name: row[name] for name in columns})
+                param = {'b_id': person_id, 'b_updated_at': now}
+                param.update({f'b_{name}': row[name] for name in columns})
+                if 'search_name' in derived:
+                    param['b_search_name'] = search_text(Person, existing)
+                for field, column in PHONE_COLUMNS.items():
+                    if column in derived:
+                        param[f'b_{column}'] = normalize_phone(existing[field]) or None
+                        param[f'b_{PHONE_TAIL_COLUMNS[field]}'] = phone_tail(param[f'b_{column}'])
+                params.append(param)
+                updated.append(person_id)
+
+            stmt = table.update().where(table.c.id == bindparam('b_id')).values(
+                {name: bindparam(f'b_{name}') for name in columns + derived + ['updated_at']}
+            )
+            connection.execute(stmt, params)
+        return updated
+
+    def run(self, stream, dry_run=False):
+        """استيراد الملف كاملاً دفعة بعد دفعة وإرجاع التقرير"""
+        reader = open_csv(stream, PERSON_REQUIRED_COLUMNS)
+        self.preload()
+        for chunk in iter_chunks(reader):
+            self.import_chunk(chunk, dry_run)
+
+        if not dry_run and self.report.imported:
+            autocomplete.invalidate(self.company_id, 'tenant')
+        return self.report.to_dict()
+
+
+# ===== استيراد العقود =====
+
+CONTRACT_REQUIRED_COLUMNS = ('unit_id', 'tenant_id', 'start_date', 'end_date', 'rent_amount')
+
+CONTRACT_STATUSES = ('active', 'expired', 'terminated', 'renewed')
+
+CONTRACT_DECIMAL_FIELDS = ('security_deposit', 'commission_amount', 'commission_percentage')
+CONTRACT_TEXT_FIELDS = ('payment_method', 'terms_and_conditions', 'notes')
+
+
+class ContractImporter:
+    """استيراد العقود من CSV مع توليد جدولة دفعاتها
+
+    الوحدات والأشخاص وأنواع العقود للشركة تُحمّل مرة واحدة في الذاكرة، فالتحقق من المراجع
+    بحث في مجموعات. جداول الدفعات تُولد في الذاكرة، ثم تُدرج العقود والدفعات بـ executemany
+    وتُحدّث حالات الوحدات بجملة واحدة لكل دفعة. ملخص المالية وعدادات الإشغال والإيراد
+    الشهري وفهرس البحث تُحدّث صراحة، لأن الإدراج المباشر لا يمر بأحداث ORM.
+
+    العمود paid_until (اختياري) يسجل الدفعات المستحقة حتى تاريخه كمدفوعة، لاستيراد العقود
+    السابقة دون ظهور دفعاتها كمتأخرة.
+    """
+
+    def __init__(self, company_id, user_id=None):
+        self.company_id = company_id
+        self.user_id = user_id
+        self.report = ImportReport()
+        self.units = {}
+        self.persons = set()
+        self.contract_types = set()
+        self.occupied = set()
+        self.numbers = set()
+
+    def preload(self):
+        """تحميل الوحدات والأشخاص وأنواع العقود والوحدات المرتبطة بعقود نشطة"""
+        for unit_id, building_id, unit_type_id, status in db.session.execute(
+            select(Unit.id, Unit.building_id, Unit.unit_type_id, Unit.status)
+            .where(Unit.company_id == self.company_id, Unit.is_active == True)
+        ):
+            self.units[unit_id] = [building_id, unit_type_id, status]
+
+        self.persons.update(db.session.execute(
+            select(Person.id).where(Person.company_id == self.company_id, Person.is_active == True)
+        ).scalars())
+        self.contract_types.update(db.session.execute(
+            select(ContractType.id).where(or_(ContractType.company_id == self.company_id,
+                                              ContractType.company_id.is_(None)))
+        ).scalars())
+        self.occupied.update(db.session.execute(
+            select(Contract.unit_id).where(Contract.company_id == self.company_id, Contract.status == 'active')
+        ).scalars())
+
+    def _generate_numbers(self, connection, count):
+        """أرقام العقود التلقائية من تسلسل العقود (ضمن معاملة الدفعة، مع تخطي أرقام الملف)"""
+        numbers = []
+        while len(numbers) < count:
+            reserved = reserve_numbers('contract', count - len(numbers), connection)
+            numbers.extend(number for number in reserved if number not in self.numbers)
+        return numbers
+
+    def _reference(self, values, name, known, errors, required=False):
+        value = parse_int(values, name, errors)
+        if value is None:
+            if required and not values.get(name):
+                errors.append(f'{name}: مطلوب')
+            return None
+        if value not in known:
+            errors.append(f'{name}: غير موجود')
+        return value
+
+    def validate(self, values, taken=()):
+        """تحويل صف إلى قيم العقد (أو قائمة أخطاء)؛ taken أرقام الدفعة الموجودة في قاعدة البيانات"""
+        errors = []
+        unit_id = self._reference(values, 'unit_id', self.units, errors, required=True)
+        row = {
+            'company_id': self.company_id,
+            'unit_id': unit_id,
+            'tenant_id': self._reference(values, 'tenant_id', self.persons, errors, required=True),
+            'landlord_id': self._reference(values, 'landlord_id', self.persons, errors),
+            'contract_type_id': self._reference(values, 'contract_type_id', self.contract_types, errors),
+            'start_date': parse_date(values, 'start_date', errors),
+            'end_date': parse_date(values, 'end_date', errors),
+            'rent_amount': parse_decimal(values, 'rent_amount', errors),
+            'payment_frequency': values.get('payment_frequency') or 'monthly',
+            'auto_renewal': parse_bool(values, 'auto_renewal', errors),
+            'renewal_notice_days': parse_int(values, 'renewal_notice_days', errors) or 30,
+            'status': values.get('status') or 'active',
+            'created_by': self.user_id
+        }
+        for name in CONTRACT_DECIMAL_FIELDS:
+            row[name] = parse_decimal(values, name, errors)
+        for name in CONTRACT_TEXT_FIELDS:
+            row[name] = values.get(name) or None
+        paid_until = parse_date(values, 'paid_until', errors)
+
+        for name in ('start_date', 'end_date', 'rent_amount'):
+            if row[name] is None and not values.get(name):
+                errors.append(f'{name}: مطلوب')
+        if row['start_date'] and row['end_date'] and row['end_date'] < row['start_date']:
+            errors.append('end_date: يجب أن يكون بعد تاريخ البداية')
+        if row['rent_amount'] is not None and row['rent_amount'] <= 0:
+            errors.append('rent_amount: يجب أن يكون أكبر من صفر')
+        if row['payment_frequency'] not in PAYMENT_FREQUENCIES:
+            errors.append(f'payment_frequency: يجب أن تكون إحدى القيم {", ".join(PAYMENT_FREQUENCIES)}')
+        if row['status'] not in CONTRACT_STATUSES:
+            errors.append(f'status: يجب أن تكون إحدى القيم {", ".join(CONTRACT_STATUSES)}')
+
+        number = values.get('contract_number')
+        if number and (number in self.numbers or number in taken):
+            errors.append('contract_number: رقم العقد مستخدم بالفعل')
+        if row['status'] == 'active' and unit_id in self.occupied:
+            errors.append('unit_id: الوحدة مرتبطة بعقد نشط آخر')
+
+        if not errors:
+            row['contract_number'] = number or None
+            if number:
+                self.numbers.add(number)
+            if row['status'] == 'active':
+                self.occupied.add(unit_id)
+        return row, paid_until, errors
+
+    def import_chunk(self, chunk, dry_run=False):
+        """تحقق دفعة وإدراج عقودها ودفعاتها في معاملة واحدة"""
+        # الأرقام المُدخلة في الملف والمستخدمة مسبقاً، باستعلام واحد للدفعة
+        numbers = [values['contract_number'] for _, values in chunk if values.get('contract_number')]
+        taken = set(db.session.execute(
+            select(Contract.contract_number).where(Contract.contract_number.in_(numbers))
+        ).scalars()) if numbers else set()
+
+        valid = []
+        for line, values in chunk:
+            self.report.total_rows += 1
+            row, paid_until, errors = self.validate(values, taken)
+            if errors:
+                self.report.add_errors(line, errors)
+                continue
+            valid.append((line, row, paid_until))
+
+        if dry_run or not valid:
+            self.report.imported += len(valid)
+            self.report.created['payments'] += sum(
+                len(payment_schedule(row['start_date'], row['end_date'], row['rent_amount'],
+                                     row['payment_frequency']))
+                for _, row, _ in valid
+            )
+            return
+
+        connection = db.session.connection()
+        occupied_units = []
+        try:
+            now = datetime.utcnow()
+            generated = iter(self._generate_numbers(
+                connection, sum(1 for _, row, _ in valid if not row['contract_number'])
+            ))
+            contracts = []
+            for _, row, _ in valid:
+                row['contract_number'] = row['contract_number'] or next(generated)
+                row['created_at'] = row['updated_at'] = now
+                contracts.append(row)
+            table = Contract.__table__
+            # ترتيب RETURNING غير مضمون مع executemany، فالربط برقم العقد الفريد
+            contract_ids = dict(
+                (number, contract_id) for contract_id, number in connection.execute(
+                    table.insert().returning(table.c.id, table.c.contract_number), contracts
+                )
+            )
+
+            payments = []
+            mrr = defaultdict(Decimal)
+            counters = defaultdict(int)
+            for _, row, paid_until in valid:
+                schedule = payment_schedule(row['start_date'], row['end_date'], row['rent_amount'],
+                                            row['payment_frequency'])
+                payments.extend(payment_rows(contract_ids[row['contract_number']], schedule, now, paid_until,
+                                             row['payment_method']))
+                if row['status'] != 'active':
+                    continue
+                building_id, unit_type_id, status = self.units[row['unit_id']]
+                key = (self.company_id, row['start_date'].replace(day=1), building_id, unit_type_id,
+                       row['contract_type_id'])
+                mrr[key] += monthly_rent(row['rent_amount'])
+                occupied_units.append({'b_id': row['unit_id'], 'b_rent': row['rent_amount'], 'b_now': now})
+                if status != 'occupied':
+                    counters[(self.company_id, building_id, status)] -= 1
+                    counters[(self.company_id, None, status)] -= 1
+                    counters[(self.company_id, building_id, 'occupied')] += 1
+                    counters[(self.company_id, None, 'occupied')] += 1
+
+            insert_payments(connection, payments)
+            if occupied_units:
+                units = Unit.__table__
+                connection.execute(
+                    units.update().where(units.c.id == bindparam('b_id'))
+                    .values(status='occupied', current_rent=bindparam('b_rent'), updated_at=bindparam('b_now')),
+                    occupied_units
+                )
+            record_new_payments(self.company_id, payments)
+            apply_counter_deltas(connection, counters)
+            apply_mrr_deltas(connection, mrr)
+            search_index.reindex(connection, {'contract': list(contract_ids.values())}, inserted=True)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            # إعادة الأرقام والوحدات المحجوزة حتى لا تُرفض الصفوف نفسها عند إعادة المحاولة
+            for line, row, _ in valid:
+                self.numbers.discard(row['contract_number'])
+                if row['status'] == 'active':
+                    self.occupied.discard(row['unit_id'])
+                self.report.add_errors(line, [f'فشل حفظ الدفعة: {e}'])
+            return
+
+        for item in occupied_units:
+            self.units[item['b_id']][2] = 'occupied'
+        self.report.imported += len(contract_ids)
+        self.report.created['payments'] += len(payments)
+
+    def run(self, stream, dry_run=False):
+        """استيراد الملف كاملاً دفعة بعد دفعة وإرجاع التقرير"""
+        reader = open_csv(stream, CONTRACT_REQUIRED_COLUMNS)
+        self.preload()
+        for chunk in iter_chunks(reader, CONTRACT_CHUNK_SIZE):
+            self.import_chunk(chunk, dry_run)
+
+        if not dry_run and self.report.imported:
+            autocomplete.invalidate(self.company_id, 'contract')
+            invalidate_forecast(self.company_id)
+        return self.report.to_dict()
@@ -0,0 +1,77 @@
+from datetime import date
+from sqlalchemy import select, func, and_, or_
+from src.models.property import db
+from src.models.contract import Person, Contract, ContractPayment
+from src.utils.normalization import (
+    normalize_phone, phone_digits, PHONE_COLUMNS, PHONE_TAIL_COLUMNS, MIN_PHONE_SUFFIX
+)
+from src.utils.forecast import OPEN_PAYMENT_STATUSES
+
+# الرقم الكامل (بدون رمز الدولة) لا يقل عن 9 أرقام؛ الأقصر منه يعامل كنهاية رقم
+MIN_FULL_NUMBER = 9
+
+MAX_MATCHES = 10
+
+
+def _phone_condition(company_id, phone):
+    """شرط المطابقة على أعمدة الهاتف الموحدة ونوع المطابقة (exact أو suffix)"""
+    digits = phone_digits(phone)
+    if len(digits) < MIN_PHONE_SUFFIX:
+        raise ValueError(f'رقم الهاتف يجب أن يحتوي على {MIN_PHONE_SUFFIX} أرقام على الأقل')
+
+    # شرط الشركة داخل كل فرع ليستخدم SQLite فهرس (company_id, عمود الهاتف) لكل فرع
+    if len(digits) >= MIN_FULL_NUMBER:
+        e164 = normalize_phone(phone)
+        return or_(*[
+            and_(Person.company_id == company_id, getattr(Person, column) == e164)
+            for column in PHONE_COLUMNS.values()
+        ]), 'exact'
+    # نهاية الرقم: مساواة على عمود آخر الأرقام المفهرس، ثم تحقق من النهاية الكاملة على الصفوف المطابقة فقط
+    tail = digits[-MIN_PHONE_SUFFIX:]
+    return or_(*[
+        and_(Person.company_id == company_id, getattr(Person, PHONE_TAIL_COLUMNS[field]) == tail,
+             getattr(Person, column).endswith(digits))
+        for field, column in PHONE_COLUMNS.items()
+    ]), 'suffix'
+
+
+def lookup_caller(company_id, phone, today=None):
+    """تحديد المتصل: الشخص وعقوده النشطة ورصيده المستحق في استعلام واحد"""
+    today = today or date.today()
+    condition, match_type = _phone_condition(company_id, phone)
+
+    active_contracts = select(func.group_concat(Contract.contract_number)).where(and_(
+        Contract.tenant_id == Person.id,
+        Contract.status == 'active'
+    )).scalar_subquery()
+
+    balance_filter = and_(
+        ContractPayment.contract_id == Contract.id,
+        Contract.tenant_id == Person.id,
+        ContractPayment.status.in_(OPEN_PAYMENT_STATUSES)
+    )
+    outstanding = select(
+        func.coalesce(func.sum(ContractPayment.amount - func.coalesce(ContractPayment.paid_amount, 0)), 0)
+    ).where(balance_filter, ContractPayment.due_date <= today).scalar_subquery()
+    next_due = select(func.min(ContractPayment.due_date)).where(
+        balance_filter, ContractPayment.due_date > today
+    ).scalar_subquery()
+
+    rows = db.session.execute(
+        select(
+            Person,
+            active_contracts.label('active_contracts'),
+            outstanding.label('outstanding_balance'),
+            next_due.label('next_due_date')
+        ).where(condition, Person.is_active == True).limit(MAX_MATCHES)
+    ).all()
+
+    matches = []
+    for person, contracts, balance, next_due_date in rows:
+        matches.append({
+            'person': person.to_dict(),
+            'active_contracts': contracts.split(',') if contracts else [],
+            'outstanding_balance': float(balance or 0),
+            'next_due_date': next_due_date.isoformat() if hasattr(next_due_date, 'isoformat') else next_due_date
+        })
+    return match_type, matches
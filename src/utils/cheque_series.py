@@ -0,0 +1,108 @@
+import re
+from datetime import datetime, date
+from sqlalchemy import select, and_
+from src.models.property import db
+from src.models.contract import ContractPayment, Cheque
+from src.utils.forecast import OPEN_PAYMENT_STATUSES, OPEN_CHEQUE_STATUSES, invalidate_forecast
+from src.utils import search_index
+
+# أقصى عدد شيكات في السلسلة الواحدة (عقد شهري لخمس سنوات)
+MAX_SERIES_SIZE = 60
+
+_TRAILING_DIGITS = re.compile(r'(.*?)(\d+)')
+
+
+def cheque_numbers(start_number, count):
+    """أرقام شيكات متتالية تبدأ من start_number مع الحفاظ على البادئة والأصفار البادئة (000123 ← 000124)"""
+    match = _TRAILING_DIGITS.fullmatch((start_number or '').strip())
+    if not match:
+        raise ValueError('رقم الشيك الأول يجب أن ينتهي بأرقام')
+    prefix, digits = match.groups()
+    first = int(digits)
+    return [f'{prefix}{first + index:0{len(digits)}d}' for index in range(count)]
+
+
+def _parse_date(data, name):
+    if not data.get(name):
+        return None
+    try:
+        return datetime.strptime(data[name], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError(f'{name}: صيغة التاريخ يجب أن تكون YYYY-MM-DD')
+
+
+def _open_payments(contract_id, first_due_date):
+    """دفعات العقد المعلقة غير المغطاة بشيك مفتوح مرتبة بتاريخ الاستحقاق"""
+    linked_payments = set()
+    linked_dues = set()
+    for payment_id, due_date in db.session.execute(
+        select(Cheque.payment_id, Cheque.due_date)
+        .where(Cheque.contract_id == contract_id, Cheque.status.in_(OPEN_CHEQUE_STATUSES))
+    ):
+        if payment_id:
+            linked_payments.add(payment_id)
+        else:
+            linked_dues.add(due_date)
+
+    query = select(ContractPayment.id, ContractPayment.due_date, ContractPayment.amount).where(and_(
+        ContractPayment.contract_id == contract_id,
+        ContractPayment.status.in_(OPEN_PAYMENT_STATUSES)
+    ))
+    if first_due_date:
+        query = query.where(ContractPayment.due_date >= first_due_date)
+    return [
+        row for row in db.session.execute(query.order_by(ContractPayment.due_date, ContractPayment.payment_number))
+        if row.id not in linked_payments and row.due_date not in linked_dues
+    ]
+
+
+def register_cheque_series(contract, data):
+    """تسجيل سلسلة شيكات مؤجلة لعقد وربط كل شيك بدفعته في معاملة واحدة
+
+    الشيكات تأخذ أرقاماً متتالية من رقم الشيك الأول، وتُربط بالترتيب بدفعات العقد المعلقة
+    غير المغطاة بشيكات (من first_due_date إن حُدد) في مرور واحد على الجدولة: كل شيك يأخذ
+    تاريخ استحقاق دفعته ومبلغها. تُدرج كلها بجملة executemany واحدة.
+    """
+    try:
+        count = int(data.get('count'))
+    except (TypeError, ValueError):
+        raise ValueError('عدد الشيكات مطلوب')
+    if not 1 <= count <= MAX_SERIES_SIZE:
+        raise ValueError(f'عدد الشيكات يجب أن يكون بين 1 و {MAX_SERIES_SIZE}')
+    bank_name = (data.get('bank_name') or '').strip()
+    if not bank_name:
+        raise ValueError('اسم البنك مطلوب')
+    numbers = cheque_numbers(data.get('start_cheque_number'), count)
+    issue_date = _parse_date(data, 'issue_date')
+    received_date = _parse_date(data, 'received_date') or date.today()
+    first_due_date = _parse_date(data, 'first_due_date')
+
+    company_id = contract.company_id
+    payments = _open_payments(contract.id, first_due_date)
+    if len(payments) < count:
+        raise ValueError(f'عدد الدفعات المعلقة غير المغطاة بشيكات ({len(payments)}) أقل من عدد الشيكات')
+
+    duplicates = db.session.execute(
+        select(Cheque.cheque_number)
+        .where(Cheque.company_id == company_id, Cheque.bank_name == bank_name, Cheque.cheque_number.in_(numbers))
+    ).scalars().all()
+    if duplicates:
+        raise ValueError(f'أرقام شيكات مسجلة مسبقاً لنفس البنك: {", ".join(sorted(duplicates)[:10])}')
+
+    now = datetime.utcnow()
+    rows = [{
+        'company_id': company_id, 'contract_id': contract.id, 'payment_id': payment.id,
+        'cheque_number': number, 'bank_name': bank_name, 'account_number': data.get('account_number'),
+        'amount': payment.amount, 'issue_date': issue_date, 'due_date': payment.due_date,
+        'received_date': received_date, 'status': 'received', 'notes': data.get('notes'),
+        'created_at': now, 'updated_at': now
+    } for number, payment in zip(numbers, payments)]
+
+    connection = db.session.connection()
+    table = Cheque.__table__
+    cheque_ids = connection.execute(table.insert().returning(table.c.id), rows).scalars().all()
+    search_index.reindex(connection, {'cheque': cheque_ids}, inserted=True)
+    db.session.commit()
+    invalidate_forecast(company_id)
+
+    return Cheque.query.filter(Cheque.id.in_(cheque_ids)).order_by(Cheque.due_date).all()
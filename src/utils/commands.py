@@ -0,0 +1,52 @@
+import click
+from src.utils import financial_summary, occupancy, snapshots, recurring_revenue, search_index
+
+
+def register_commands(app):
+    """تسجيل أوامر الصيانة على تطبيق Flask"""
+
+    @app.cli.command('rebuild-financial-summary')
+    @click.option('--company-id', type=int, default=None, help='شركة محددة (الافتراضي: جميع الشركات)')
+    def rebuild_financial_summary(company_id):
+        """إعادة بناء الملخص المالي الشهري من الدفعات والمصروفات"""
+        months = financial_summary.rebuild_summary(company_id)
+        click.echo(f'تمت إعادة بناء {months} صف في الملخص المالي الشهري')
+
+    @app.cli.command('check-financial-summary')
+    @click.option('--company-id', type=int, default=None, help='شركة محددة (الافتراضي: جميع الشركات)')
+    def check_financial_summary(company_id):
+        """التحقق من تطابق الملخص المالي الشهري مع البيانات الأصلية"""
+        mismatches = financial_summary.check_summary(company_id)
+        for mismatch in mismatches:
+            click.echo(mismatch)
+        if mismatches:
+            raise click.ClickException(f'{len(mismatches)} فرق في الملخص المالي الشهري')
+        click.echo('الملخص المالي الشهري مطابق')
+
+    @app.cli.command('reconcile-occupancy')
+    @click.option('--company-id', type=int, default=None, help='شركة محددة (الافتراضي: جميع الشركات)')
+    def reconcile_occupancy(company_id):
+        """مطابقة عدادات الإشغال مع جدول الوحدات وتصحيح الانحراف"""
+        fixes = occupancy.reconcile_occupancy(company_id)
+        for fix in fixes:
+            click.echo(fix)
+        click.echo(f'تم تصحيح {len(fixes)} عداد إشغال')
+
+    @app.cli.command('snapshot-occupancy')
+    def snapshot_occupancy():
+        """أخذ لقطة الإشغال اليومية وضغط اللقطات القديمة"""
+        result = snapshots.run_nightly()
+        click.echo(result)
+
+    @app.cli.command('rebuild-mrr')
+    @click.option('--company-id', type=int, default=None, help='شركة محددة (الافتراضي: جميع الشركات)')
+    def rebuild_mrr(company_id):
+        """إعادة بناء حركات الإيراد الشهري المتكرر من العقود النشطة"""
+        rows = recurring_revenue.rebuild_mrr(company_id)
+        click.echo(f'تمت إعادة بناء {rows} صف في حركات الإيراد الشهري المتكرر')
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        """إعادة بناء فهرس البحث الشامل من جميع الجداول"""
+        documents = search_index.rebuild_search_index()
+        click.echo(f'تمت فهرسة {documents} مستند في فهرس البحث الشامل')
@@ -0,0 +1,407 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import select, func, case, update, delete, and_
+from dateutil.relativedelta import relativedelta
+from src.models.property import db
+from src.models.contract import Contract, ContractPayment
+from src.models.finance import Expense, ExpenseCategory, FinancialMonthlySummary, FinancialMonthlyCategoryExpense
+from src.utils.timeseries import bucket_expression, bucket_start, to_date
+
+ZERO = Decimal('0')
+CENT = Decimal('0.01')
+
+SUMMARY_FIELDS = ('revenue', 'expenses', 'pending_amount')
+
+# حالة الدفعة كما يراها الملخص: الفارغة 'pending' في المسار التزايدي وإعادة البناء معاً
+PAYMENT_STATUS = func.coalesce(ContractPayment.status, 'pending')
+
+
+def _decimal(value):
+    return Decimal(str(value)).quantize(CENT) if value is not None else ZERO
+
+
+def _month(value):
+    return value.replace(day=1)
+
+
+# ===== التحديث التزايدي =====
+
+def payment_state(payment):
+    """الحقول التي تؤثر بها الدفعة على الملخص (تؤخذ قبل التعديل)"""
+    # الحالة الافتراضية لا تُطبق إلا عند الإدراج، لذلك نعتبر القيمة الفارغة 'pending'
+    return (payment.status or 'pending', _decimal(payment.amount), _decimal(payment.paid_amount),
+            payment.due_date, payment.payment_date)
+
+
+def expense_state(expense):
+    """الحقول التي يؤثر بها المصروف على الملخص (تؤخذ قبل التعديل)"""
+    return (expense.status or 'pending', _decimal(expense.amount), expense.expense_date, expense.category_id)
+
+
+def _payment_effects(state):
+    if state is None:
+        return []
+    status, amount, paid_amount, due_date, payment_date = state
+    if status == 'paid' and payment_date:
+        return [(_month(payment_date), 'revenue', None, paid_amount)]
+    if status == 'pending' and due_date:
+        return [(_month(due_date), 'pending_amount', None, amount)]
+    return []
+
+
+def _expense_effects(state):
+    if state is None:
+        return []
+    status, amount, expense_date, category_id = state
+    if status == 'paid' and expense_date:
+        month = _month(expense_date)
+        return [(month, 'expenses', None, amount), (month, 'category', category_id, amount)]
+    return []
+
+
+def _add_summary(company_id, month, field, delta):
+    column = getattr(FinancialMonthlySummary, field)
+    result = db.session.execute(
+        update(FinancialMonthlySummary)
+        .where(and_(FinancialMonthlySummary.company_id == company_id, FinancialMonthlySummary.month == month))
+        .values({field: column + delta})
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.session.add(FinancialMonthlySummary(company_id=company_id, month=month, **{field: delta}))
+        db.session.flush()
+
+
+def _add_category(company_id, month, category_id, delta):
+    result = db.session.execute(
+        update(FinancialMonthlyCategoryExpense)
+        .where(and_(
+            FinancialMonthlyCategoryExpense.company_id == company_id,
+            FinancialMonthlyCategoryExpense.month == month,
+            FinancialMonthlyCategoryExpense.category_id.is_(None) if category_id is None
+            else FinancialMonthlyCategoryExpense.category_id == category_id
+        ))
+        .values(amount=FinancialMonthlyCategoryExpense.amount + delta)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.session.add(FinancialMonthlyCategoryExpense(
+            company_id=company_id, month=month, category_id=category_id, amount=delta
+        ))
+        db.session.flush()
+
+
+def apply_effects(company_id, before, after):
+    """تطبيق الفرق بين التأثير السابق والجديد على جداول الملخص"""
+    deltas = defaultdict(Decimal)
+    for month, field, category_id, amount in before:
+        deltas[(month, field, category_id)] -= amount
+    for month, field, category_id, amount in after:
+        deltas[(month, field, category_id)] += amount
+
+    for (month, field, category_id), delta in deltas.items():
+        if not delta:
+            continue
+        if field == 'category':
+            _add_category(company_id, month, category_id, delta)
+        else:
+            _add_summary(company_id, month, field, delta)
+
+
+def record_payment_change(company_id, payment, before=None):
+    """تحديث الملخص بعد إنشاء دفعة أو تعديلها (ضمن نفس المعاملة)"""
+    apply_effects(company_id, _payment_effects(before), _payment_effects(payment_state(payment)))
+
+
+def record_payment_changes(company_id, changes):
+    """تحديث الملخص لعدة دفعات معدلة [(الحالة السابقة، الحالة الجديدة)] بتحديث واحد لكل شهر وحقل"""
+    before = []
+    after = []
+    for old_state, new_state in changes:
+        before.extend(_payment_effects(old_state))
+        after.extend(_payment_effects(new_state))
+    apply_effects(company_id, before, after)
+
+
+def record_new_payments(company_id, rows):
+    """تحديث الملخص بعد إدراج دفعات بالجملة (قواميس قيم) بتحديث واحد لكل شهر وحقل
+
+    المبالغ تُجمع كما هي ثم تُقرب مرة واحدة لكل مجموعة، بنفس أثر _payment_effects لكل صف.
+    """
+    totals = defaultdict(Decimal)
+    for row in rows:
+        status = row.get('status') or 'pending'
+        if status == 'paid' and row.get('payment_date'):
+            totals[(_month(row['payment_date']), 'revenue')] += row.get('paid_amount') or 0
+        elif status == 'pending' and row['due_date']:
+            totals[(_month(row['due_date']), 'pending_amount')] += row['amount'] or 0
+    apply_effects(company_id, [], [
+        (month, field, None, _decimal(amount)) for (month, field), amount in totals.items()
+    ])
+
+
+def record_expense_change(expense, before=None):
+    """تحديث الملخص بعد إنشاء مصروف أو تعديله (ضمن نفس المعاملة)"""
+    apply_effects(expense.company_id, _expense_effects(before), _expense_effects(expense_state(expense)))
+
+
+# ===== القراءة =====
+
+def is_month_aligned(start_date, end_date):
+    """هل الفترة تبدأ بأول شهر وتنتهي بآخر شهر"""
+    return start_date.day == 1 and (end_date + relativedelta(days=1)).day == 1
+
+
+def _summary_rows(company_id, first_month, last_month):
+    return FinancialMonthlySummary.query.filter(
+        FinancialMonthlySummary.company_id == company_id,
+        FinancialMonthlySummary.month >= first_month,
+        FinancialMonthlySummary.month <= last_month
+    ).all()
+
+
+def summary_by_bucket(company_id, granularity, start_date, end_date):
+    """الإيرادات والمصروفات لكل فترة (شهر/ربع/سنة) من جدول الملخص
+
+    يجب أن تكون الفترة محاذية للأشهر (انظر is_month_aligned).
+    """
+    revenue = defaultdict(Decimal)
+    expenses = defaultdict(Decimal)
+    for row in _summary_rows(company_id, _month(start_date), _month(end_date)):
+        bucket = bucket_start(row.month, granularity)
+        revenue[bucket] += _decimal(row.revenue)
+        expenses[bucket] += _decimal(row.expenses)
+    return revenue, expenses
+
+
+def _raw_totals(company_id, start_date, end_date):
+    revenue = db.session.query(func.sum(ContractPayment.paid_amount)).join(Contract).filter(
+        and_(
+            Contract.company_id == company_id,
+            ContractPayment.status == 'paid',
+            ContractPayment.payment_date >= start_date,
+            ContractPayment.payment_date <= end_date
+        )
+    ).scalar() or 0
+
+    by_category = db.session.query(Expense.category_id, func.sum(Expense.amount)).filter(
+        and_(
+            Expense.company_id == company_id,
+            Expense.status == 'paid',
+            Expense.expense_date >= start_date,
+            Expense.expense_date <= end_date
+        )
+    ).group_by(Expense.category_id).all()
+
+    return _decimal(revenue), {category_id: _decimal(amount) for category_id, amount in by_category}
+
+
+def period_totals(company_id, start_date, end_date):
+    """إجمالي الإيرادات والمصروفات (مع التوزيع حسب الفئة) لفترة محددة
+
+    الأشهر الكاملة تُقرأ من جدول الملخص، وأطراف الفترة غير الكاملة فقط
+    تُحسب من الجداول الأصلية.
+    """
+    first_full = start_date if start_date.day == 1 else _month(start_date) + relativedelta(months=1)
+    last_full_end = end_date if (end_date + relativedelta(days=1)).day == 1 else _month(end_date) - relativedelta(days=1)
+
+    revenue = ZERO
+    by_category = defaultdict(Decimal)
+
+    if first_full > last_full_end:
+        fragments = [(start_date, end_date)]
+    else:
+        fragments = []
+        if start_date < first_full:
+            fragments.append((start_date, first_full - relativedelta(days=1)))
+        if end_date > last_full_end:
+            fragments.append((last_full_end + relativedelta(days=1), end_date))
+
+        for row in _summary_rows(company_id, first_full, _month(last_full_end)):
+            revenue += _decimal(row.revenue)
+        category_rows = FinancialMonthlyCategoryExpense.query.filter(
+            FinancialMonthlyCategoryExpense.company_id == company_id,
+            FinancialMonthlyCategoryExpense.month >= first_full,
+            FinancialMonthlyCategoryExpense.month <= _month(last_full_end)
+        ).all()
+        for row in category_rows:
+            by_category[row.category_id] += _decimal(row.amount)
+
+    for fragment_start, fragment_end in fragments:
+        fragment_revenue, fragment_categories = _raw_totals(company_id, fragment_start, fragment_end)
+        revenue += fragment_revenue
+        for category_id, amount in fragment_categories.items():
+            by_category[category_id] += amount
+
+    return {
+        'revenue': revenue,
+        'expenses': sum(by_category.values(), ZERO),
+        'by_category': dict(by_category)
+    }
+
+
+def expenses_by_category_name(company_id, by_category):
+    """تحويل مفاتيح الفئات إلى أسمائها (المصروفات غير المصنفة لا تظهر كما في التقرير الأصلي)"""
+    names = dict(db.session.query(ExpenseCategory.id, ExpenseCategory.name).filter(
+        ExpenseCategory.id.in_([category_id for category_id in by_category if category_id is not None])
+    ).all()) if by_category else {}
+
+    totals = defaultdict(Decimal)
+    for category_id, amount in by_category.items():
+        if category_id in names and amount:
+            totals[names[category_id]] += amount
+    return list(totals.items())
+
+
+def current_month_totals(company_id, today=None):
+    """إيرادات ومصروفات الشهر الحالي من صف الملخص"""
+    today = today or date.today()
+    row = FinancialMonthlySummary.query.filter_by(company_id=company_id, month=_month(today)).first()
+    if not row:
+        return ZERO, ZERO
+    return _decimal(row.revenue), _decimal(row.expenses)
+
+
+def receivable_totals(company_id, today=None):
+    """المبالغ المعلقة والمتأخرة
+
+    المعلق كله من الملخص، والمتأخر = المعلق في الأشهر السابقة + المستحق
+    قبل اليوم في الشهر الحالي فقط (استعلام محدود بشهر واحد).
+    """
+    today = today or date.today()
+    month_start = _month(today)
+
+    pending, overdue_before = db.session.query(
+        func.coalesce(func.sum(FinancialMonthlySummary.pending_amount), 0),
+        func.coalesce(func.sum(case(
+            (FinancialMonthlySummary.month < month_start, FinancialMonthlySummary.pending_amount), else_=0
+        )), 0)
+    ).filter(FinancialMonthlySummary.company_id == company_id).one()
+
+    overdue_this_month = db.session.query(func.sum(ContractPayment.amount)).join(Contract).filter(
+        and_(
+            Contract.company_id == company_id,
+            PAYMENT_STATUS == 'pending',
+            ContractPayment.due_date >= month_start,
+            ContractPayment.due_date < today
+        )
+    ).scalar() or 0
+
+    return _decimal(pending), _decimal(overdue_before) + _decimal(overdue_this_month)
+
+
+# ===== إعادة البناء والتحقق =====
+
+def compute_summary(company_id=None):
+    """حساب الملخص من الجداول الأصلية بثلاث استعلامات مجمّعة"""
+    summary = defaultdict(lambda: dict.fromkeys(SUMMARY_FIELDS, ZERO))
+    categories = defaultdict(Decimal)
+
+    def company_filter(column):
+        return [column == company_id] if company_id else []
+
+    payment_month = bucket_expression(ContractPayment.payment_date, 'month')
+    for row in db.session.execute(
+        select(Contract.company_id, payment_month.label('month'), func.sum(ContractPayment.paid_amount))
+        .join(Contract)
+        .where(ContractPayment.status == 'paid', ContractPayment.payment_date.isnot(None),
+               *company_filter(Contract.company_id))
+        .group_by(Contract.company_id, payment_month)
+    ):
+        summary[(row[0], to_date(row[1]))]['revenue'] += _decimal(row[2])
+
+    due_month = bucket_expression(ContractPayment.due_date, 'month')
+    for row in db.session.execute(
+        select(Contract.company_id, due_month.label('month'), func.sum(ContractPayment.amount))
+        .join(Contract)
+        .where(PAYMENT_STATUS == 'pending', *company_filter(Contract.company_id))
+        .group_by(Contract.company_id, due_month)
+    ):
+        summary[(row[0], to_date(row[1]))]['pending_amount'] += _decimal(row[2])
+
+    expense_month = bucket_expression(Expense.expense_date, 'month')
+    for row in db.session.execute(
+        select(Expense.company_id, expense_month.label('month'), Expense.category_id, func.sum(Expense.amount))
+        .where(Expense.status == 'paid', *company_filter(Expense.company_id))
+        .group_by(Expense.company_id, expense_month, Expense.category_id)
+    ):
+        key = (row[0], to_date(row[1]))
+        summary[key]['expenses'] += _decimal(row[3])
+        categories[key + (row[2],)] += _decimal(row[3])
+
+    return summary, categories
+
+
+def rebuild_summary(company_id=None):
+    """إعادة بناء جداول الملخص بالكامل (للتعبئة الأولية أو بعد إصلاح البيانات)"""
+    summary, categories = compute_summary(company_id)
+
+    for model in (FinancialMonthlySummary, FinancialMonthlyCategoryExpense):
+        stmt = delete(model)
+        if company_id:
+            stmt = stmt.where(model.company_id == company_id)
+        db.session.execute(stmt)
+
+    if summary:
+        db.session.execute(FinancialMonthlySummary.__table__.insert(), [
+            dict(company_id=key[0], month=key[1], **values) for key, values in summary.items()
+        ])
+    if categories:
+        db.session.execute(FinancialMonthlyCategoryExpense.__table__.insert(), [
+            dict(company_id=key[0], month=key[1], category_id=key[2], amount=amount)
+            for key, amount in categories.items()
+        ])
+
+    db.session.commit()
+    return len(summary)
+
+
+def seed_summary():
+    """تعبئة جداول الملخص لقاعدة بيانات قائمة قبل إضافتها (عند خلوها ووجود دفعات أو مصروفات)"""
+    if db.session.execute(select(FinancialMonthlySummary.id).limit(1)).first() is not None:
+        return 0
+    if (db.session.execute(select(ContractPayment.id).limit(1)).first() is None
+            and db.session.execute(select(Expense.id).limit(1)).first() is None):
+        return 0
+    return rebuild_summary()
+
+
+def check_summary(company_id=None):
+    """مقارنة الملخص المخزن بالقيم الفعلية وإرجاع الفروقات"""
+    actual, actual_categories = compute_summary(company_id)
+
+    stored_query = FinancialMonthlySummary.query
+    category_query = FinancialMonthlyCategoryExpense.query
+    if company_id:
+        stored_query = stored_query.filter_by(company_id=company_id)
+        category_query = category_query.filter_by(company_id=company_id)
+
+    stored = {(row.company_id, row.month): {field: _decimal(getattr(row, field)) for field in SUMMARY_FIELDS}
+              for row in stored_query.all()}
+    stored_categories = {(row.company_id, row.month, row.category_id): _decimal(row.amount)
+                         for row in category_query.all()}
+
+    mismatches = []
+    for key in set(stored) | set(actual):
+        stored_values = stored.get(key, {})
+        actual_values = actual.get(key, {})
+        for field in SUMMARY_FIELDS:
+            stored_value = stored_values.get(field, ZERO)
+            actual_value = actual_values.get(field, ZERO)
+            if stored_value != actual_value:
+                mismatches.append({
+                    'company_id': key[0], 'month': key[1].isoformat(), 'field': field,
+                    'stored': float(stored_value), 'actual': float(actual_value)
+                })
+
+    for key in set(stored_categories) | set(actual_categories):
+        stored_value = stored_categories.get(key, ZERO)
+        actual_value = actual_categories.get(key, ZERO)
+        if stored_value != actual_value:
+            mismatches.append({
+                'company_id': key[0], 'month': key[1].isoformat(), 'field': 'category',
+                'category_id': key[2], 'stored': float(stored_value), 'actual': float(actual_value)
+            })
+
+    return mismatches
@@ -0,0 +1,212 @@
+import threading
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import event, select, func, case, and_, or_, literal, union_all, exists
+from sqlalchemy.orm import Session
+from dateutil.relativedelta import relativedelta
+from src.models.property import db
+from src.models.contract import Contract, ContractPayment, Cheque
+from src.utils.timeseries import bucket_expression, bucket_range, to_date
+
+FORECAST_GRANULARITIES = ('week', 'month')
+
+# المدة التي تُحسب منها نسبة التحصيل التاريخية لكل مستأجر
+HISTORY_MONTHS = 12
+
+# الدفعات التي ما زالت تنتظر السداد (المتأخرة منها ما زالت تدفقاً متوقعاً)
+OPEN_PAYMENT_STATUSES = ('pending', 'overdue')
+
+# الشيكات التي لم تُصرف بعد (تمثل تدفقاً متوقعاً)
+OPEN_CHEQUE_STATUSES = ('received', 'deposited')
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _ratio(collected, due):
+    if not due:
+        return None
+    return min(Decimal(collected or 0) / Decimal(due), Decimal(1))
+
+
+def collection_rates(company_id, today):
+    """نسبة التحصيل لكل مستأجر عن آخر HISTORY_MONTHS شهراً مع نسبة الشركة ونسبة صرف الشيكات"""
+    since = today - relativedelta(months=HISTORY_MONTHS)
+    rows = db.session.execute(select(
+        Contract.tenant_id,
+        func.sum(case((ContractPayment.status == 'paid', func.coalesce(ContractPayment.paid_amount, ContractPayment.amount)), else_=0)),
+        func.sum(ContractPayment.amount)
+    ).select_from(ContractPayment).join(Contract, ContractPayment.contract_id == Contract.id).where(and_(
+        Contract.company_id == company_id,
+        ContractPayment.due_date >= since,
+        ContractPayment.due_date < today,
+        or_(ContractPayment.status != 'cancelled', ContractPayment.status.is_(None))
+    )).group_by(Contract.tenant_id)).all()
+
+    tenants = {}
+    collected_total = due_total = 0
+    for tenant_id, collected, due in rows:
+        tenants[tenant_id] = _ratio(collected, due)
+        collected_total += collected or 0
+        due_total += due or 0
+
+    cleared, returned = db.session.execute(select(
+        func.coalesce(func.sum(case((Cheque.status == 'cleared', 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Cheque.status == 'returned', 1), else_=0)), 0)
+    ).where(and_(Cheque.company_id == company_id, Cheque.due_date >= since))).one()
+
+    # بدون تاريخ نفترض التحصيل الكامل
+    company_rate = _ratio(collected_total, due_total) or Decimal(1)
+    cheque_rate = _ratio(cleared, cleared + returned) or Decimal(1)
+    return tenants, company_rate, cheque_rate
+
+
+def inflow_statement(company_id, granularity, start_date, end_date):
+    """الدفعات المفتوحة غير المغطاة بشيكات مع الشيكات المفتوحة، مجمعة حسب الفترة والمستأجر ومصدر التدفق
+
+    الدفعة تعتبر مغطاة إذا كان لها شيك مفتوح مرتبط بها، أو شيك غير مرتبط بدفعة
+    على نفس العقد وبنفس تاريخ الاستحقاق.
+    """
+    covered = exists().where(and_(
+        Cheque.status.in_(OPEN_CHEQUE_STATUSES),
+        or_(
+            Cheque.payment_id == ContractPayment.id,
+            and_(
+                Cheque.payment_id.is_(None),
+                Cheque.contract_id == ContractPayment.contract_id,
+                Cheque.due_date == ContractPayment.due_date
+            )
+        )
+    ))
+
+    scheduled = select(
+        bucket_expression(ContractPayment.due_date, granularity).label('bucket'),
+        Contract.tenant_id.label('tenant_id'),
+        literal('scheduled').label('source'),
+        ContractPayment.amount.label('amount')
+    ).select_from(ContractPayment).join(Contract, ContractPayment.contract_id == Contract.id).where(and_(
+        Contract.company_id == company_id,
+        ContractPayment.status.in_(OPEN_PAYMENT_STATUSES),
+        ContractPayment.due_date >= start_date,
+        ContractPayment.due_date <= end_date,
+        ~covered
+    ))
+
+    cheques = select(
+        bucket_expression(Cheque.due_date, granularity).label('bucket'),
+        Contract.tenant_id.label('tenant_id'),
+        literal('cheque').label('source'),
+        Cheque.amount.label('amount')
+    ).select_from(Cheque).outerjoin(Contract, Cheque.contract_id == Contract.id).where(and_(
+        Cheque.company_id == company_id,
+        Cheque.status.in_(OPEN_CHEQUE_STATUSES),
+        Cheque.due_date >= start_date,
+        Cheque.due_date <= end_date
+    ))
+
+    inflows = union_all(scheduled, cheques).subquery('inflows')
+    return select(
+        inflows.c.bucket, inflows.c.tenant_id, inflows.c.source, func.sum(inflows.c.amount).label('total')
+    ).group_by(inflows.c.bucket, inflows.c.tenant_id, inflows.c.source)
+
+
+def compute_forecast(company_id, granularity='month', months=6, today=None):
+    """توقع التدفقات النقدية الداخلة للأشهر القادمة"""
+    today = today or date.today()
+    if granularity not in FORECAST_GRANULARITIES:
+        raise ValueError(f'دقة غير مدعومة: {granularity}')
+
+    end_date = today + relativedelta(months=months) - relativedelta(days=1)
+    buckets = bucket_range(today, end_date, granularity)
+    tenant_rates, company_rate, cheque_rate = collection_rates(company_id, today)
+
+    totals = defaultdict(lambda: {'scheduled': Decimal(0), 'cheques': Decimal(0), 'expected': Decimal(0)})
+    for row in db.session.execute(inflow_statement(company_id, granularity, today, end_date)):
+        amount = Decimal(row.total or 0)
+        bucket = totals[to_date(row.bucket)]
+        if row.source == 'cheque':
+            bucket['cheques'] += amount
+            bucket['expected'] += amount * cheque_rate
+        else:
+            rate = tenant_rates.get(row.tenant_id)
+            bucket['scheduled'] += amount
+            bucket['expected'] += amount * (rate if rate is not None else company_rate)
+
+    series = []
+    for bucket in buckets:
+        values = totals.get(bucket, {'scheduled': 0, 'cheques': 0, 'expected': 0})
+        series.append({
+            'period': bucket.isoformat(),
+            'scheduled': float(values['scheduled']),
+            'cheques': float(values['cheques']),
+            'expected': round(float(values['expected']), 2)
+        })
+
+    return {
+        'as_of': today.isoformat(),
+        'granularity': granularity,
+        'months': months,
+        'company_collection_rate': round(float(company_rate) * 100, 2),
+        'cheque_clearing_rate': round(float(cheque_rate) * 100, 2),
+        'forecast': series,
+        'total_expected': round(sum(item['expected'] for item in series), 2)
+    }
+
+
+def cached_forecast(company_id, granularity='month', months=6):
+    """التوقع محفوظ لكل شركة ويوم؛ يُعاد حسابه مرة واحدة يومياً أو عند إبطاله"""
+    today = date.today()
+    key = (company_id, granularity, months)
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry and entry[0] == today:
+            return entry[1]
+
+    result = compute_forecast(company_id, granularity, months, today)
+    with _cache_lock:
+        # حذف نتائج الأيام السابقة
+        for stale in [k for k, (day, _) in _cache.items() if day != today]:
+            del _cache[stale]
+        _cache[key] = (today, result)
+    return result
+
+
+def invalidate_forecast(company_id):
+    """إبطال التوقعات المحفوظة لشركة بعد تغيير الدفعات أو الشيكات"""
+    with _cache_lock:
+        for key in [k for k in _cache if k[0] == company_id]:
+            del _cache[key]
+
+
+# ===== الإبطال التلقائي عند الكتابة عبر ORM =====
+# مسارات الكتابة بالجملة (Core) تستدعي invalidate_forecast مباشرة بعد الحفظ
+
+@event.listens_for(Session, 'after_flush')
+def track_forecast_changes(session, flush_context):
+    """تسجيل الشركات التي تغيرت عقودها أو دفعاتها أو شيكاتها لإبطال توقعاتها بعد الحفظ"""
+    companies = set()
+    contract_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Contract, Cheque)):
+            companies.add(obj.company_id)
+        elif isinstance(obj, ContractPayment):
+            contract_ids.add(obj.contract_id)
+    if contract_ids:
+        companies.update(session.connection().execute(
+            select(Contract.company_id).where(Contract.id.in_(contract_ids))
+        ).scalars())
+    companies.discard(None)
+    if companies:
+        session.info.setdefault('forecast_companies', set()).update(companies)
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_changed_forecasts(session):
+    for company_id in session.info.pop('forecast_companies', ()):
+        invalidate_forecast(company_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_forecast_changes(session):
+    session.info.pop('forecast_companies', None)
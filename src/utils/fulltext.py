@@ -0,0 +1,103 @@
+import re
+from sqlalchemy import text, or_, column, Integer, Float
+from src.models.property import db
+from src.models.contract import Person
+from src.utils.normalization import normalize_text, search_condition
+
+# الأعمدة المفهرسة في جدول البحث النصي للأشخاص (الأسماء عبر عمود البحث الموحد)
+PERSON_FTS_COLUMNS = ('search_name', 'id_number', 'phone', 'email')
+
+PERSON_FTS_TABLE = 'persons_fts'
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_available():
+    """هل قاعدة البيانات الحالية SQLite (البحث النصي FTS5 متاح)"""
+    return db.engine.dialect.name == 'sqlite'
+
+
+def ensure_person_search():
+    """إنشاء جدول FTS5 الظلي للأشخاص والمشغلات التي تبقيه متزامناً مع جدول persons
+
+    الجدول من نوع external content فلا يخزن النصوص مرة ثانية، والمشغلات تحدث الفهرس
+    داخل نفس المعاملة عند الإدراج والتعديل والحذف. عند إنشاء الجدول لأول مرة يتم
+    بناء الفهرس من الصفوف الموجودة.
+    """
+    if not fts_available():
+        return False
+
+    columns = ', '.join(PERSON_FTS_COLUMNS)
+    new_values = ', '.join(f'new.{name}' for name in PERSON_FTS_COLUMNS)
+    old_values = ', '.join(f'old.{name}' for name in PERSON_FTS_COLUMNS)
+
+    with db.engine.begin() as connection:
+        existing_columns = [row[1] for row in connection.execute(text(f"PRAGMA table_info({PERSON_FTS_TABLE})"))]
+        exists = bool(existing_columns)
+
+        if exists and tuple(existing_columns) != PERSON_FTS_COLUMNS:
+            # تغيرت الأعمدة المفهرسة: إعادة إنشاء الجدول والمشغلات ثم إعادة البناء
+            connection.execute(text(f"DROP TABLE {PERSON_FTS_TABLE}"))
+            for trigger in ('persons_fts_insert', 'persons_fts_delete', 'persons_fts_update'):
+                connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+            exists = False
+
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {PERSON_FTS_TABLE} USING fts5("
+            f"{columns}, content='persons', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        ))
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS persons_fts_insert AFTER INSERT ON persons BEGIN "
+            f"INSERT INTO {PERSON_FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+        ))
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS persons_fts_delete AFTER DELETE ON persons BEGIN "
+            f"INSERT INTO {PERSON_FTS_TABLE}({PERSON_FTS_TABLE}, rowid, {columns}) "
+            f"VALUES ('delete', old.id, {old_values}); END"
+        ))
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS persons_fts_update AFTER UPDATE ON persons BEGIN "
+            f"INSERT INTO {PERSON_FTS_TABLE}({PERSON_FTS_TABLE}, rowid, {columns}) "
+            f"VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO {PERSON_FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+        ))
+
+        if not exists:
+            connection.execute(text(f"INSERT INTO {PERSON_FTS_TABLE}({PERSON_FTS_TABLE}) VALUES ('rebuild')"))
+
+    return True
+
+
+def fts_query(search):
+    """تحويل نص البحث إلى استعلام FTS5: كل كلمة (بعد التوحيد) كبادئة، وجميع الكلمات مطلوبة"""
+    tokens = _TOKEN.findall(normalize_text(search))
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_persons(query, search):
+    """تطبيق البحث على استعلام الأشخاص مع ترتيب النتائج حسب الصلة
+
+    يستخدم فهرس FTS5 على SQLite، وعلى قواعد البيانات الأخرى يرجع إلى LIKE.
+    """
+    match = fts_query(search)
+    if not match:
+        return query
+
+    if not fts_available():
+        return query.filter(or_(
+            search_condition(Person.search_name, search),
+            Person.id_number.contains(search),
+            Person.phone.contains(search),
+            Person.email.contains(search)
+        ))
+
+    ranked = text(
+        f"SELECT rowid AS person_id, rank AS score FROM {PERSON_FTS_TABLE} WHERE {PERSON_FTS_TABLE} MATCH :match"
+    ).bindparams(match=match).columns(
+        column('person_id', Integer), column('score', Float)
+    ).cte('person_matches').prefix_with('MATERIALIZED')
+
+    # MATERIALIZED: تنفيذ MATCH مرة واحدة بدلاً من تكراره لكل صف من persons عند اختيار
+    # المخطط لفهرس الشركة أولاً. rank في FTS5 قيمة bm25 سالبة: الأصغر هو الأكثر صلة
+    return query.join(ranked, ranked.c.person_id == Person.id).order_by(ranked.c.score, Person.id)
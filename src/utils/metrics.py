@@ -0,0 +1,86 @@
+from sqlalchemy import select, func, case, and_, true
+from src.models.property import db
+
+
+class MetricsQuery:
+    """تجميع عدة مقاييس على جدول واحد في مسح واحد
+
+    كل مقياس يتحول إلى SUM(CASE WHEN ... ) داخل استعلام SELECT واحد بدلاً من
+    استعلام count() أو sum() مستقل لكل شرط.
+
+    مثال:
+        stats = (MetricsQuery(Unit, Unit.company_id == company_id, Unit.is_active == True)
+                 .count('total')
+                 .count('occupied', Unit.status == 'occupied')
+                 .run())
+    """
+
+    def __init__(self, model, *filters):
+        self.model = model
+        self.filters = list(filters)
+        self.joins = []
+        self.metrics = []
+
+    def join(self, target, *onclause):
+        """إضافة ربط مع جدول آخر (مثل ربط الدفعات بالعقود لتصفية الشركة)"""
+        self.joins.append((target, onclause))
+        return self
+
+    def count(self, name, *conditions):
+        """عدد الصفوف التي تحقق الشروط"""
+        self.metrics.append((name, self._when(conditions, 1)))
+        return self
+
+    def sum(self, name, column, *conditions):
+        """مجموع العمود للصفوف التي تحقق الشروط"""
+        self.metrics.append((name, self._when(conditions, column)))
+        return self
+
+    @staticmethod
+    def _when(conditions, value):
+        condition = and_(*conditions) if conditions else true()
+        return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+    def statement(self):
+        """بناء جملة SELECT الموحدة"""
+        stmt = select(*[expr.label(name) for name, expr in self.metrics]).select_from(self.model)
+        for target, onclause in self.joins:
+            stmt = stmt.join(target, *onclause)
+        if self.filters:
+            stmt = stmt.where(*self.filters)
+        return stmt
+
+    def run(self):
+        """تنفيذ الاستعلام وإرجاع قاموس بأسماء المقاييس"""
+        row = db.session.execute(self.statement()).one()
+        return dict(row._mapping)
+
+
+def facet_counts(model, filters, facets, selected):
+    """عدد الصفوف لكل قيمة من قيم الفلاتر (facets) في مسح واحد
+
+    filters: الشروط الثابتة (الشركة، البحث...)، facets: {الاسم: العمود}، selected: {الاسم: القيمة
+    المختارة أو None}. استعلام GROUP BY واحد على تركيبات قيم الأعمدة، ثم يُحسب عدد كل قيمة
+    تحت بقية الفلاتر المختارة عدا فلترها نفسه (حتى تبقى القيم البديلة ظاهرة بأعدادها).
+    يرجع (عدد الصفوف المطابقة لجميع الفلاتر، {الاسم: [{'value', 'count'}]}).
+    """
+    names = list(facets)
+    columns = [facets[name] for name in names]
+    stmt = select(*columns, func.count()).select_from(model).where(*filters).group_by(*columns)
+
+    total = 0
+    counts = {name: {} for name in names}
+    for row in db.session.execute(stmt):
+        values, count = row[:-1], row[-1]
+        matches = [selected.get(name) is None or value == selected[name] for name, value in zip(names, values)]
+        if all(matches):
+            total += count
+        for index, name in enumerate(names):
+            if all(match for other, match in enumerate(matches) if other != index):
+                counts[name][values[index]] = counts[name].get(values[index], 0) + count
+
+    return total, {
+        name: [{'value': value, 'count': count}
+               for value, count in sorted(values.items(), key=lambda item: (-item[1], str(item[0])))]
+        for name, values in counts.items()
+    }
@@ -0,0 +1,210 @@
+import re
+from sqlalchemy import event, select, and_, or_
+from sqlalchemy.orm import Session
+from src.models.property import db, Project, Building, Unit
+from src.models.contract import Person
+from src.models.finance import Expense
+
+# التشكيل وعلامة المد (التطويل) تحذف بالكامل
+_DIACRITICS = dict.fromkeys(
+    list(range(0x064B, 0x0653)) + [0x0670, 0x0640], None
+)
+
+_LETTERS = {
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه',
+    'ى': 'ي',
+    'ؤ': 'و',
+    'ئ': 'ي'
+}
+
+# الأرقام العربية الهندية والفارسية إلى أرقام لاتينية
+_DIGITS = {chr(0x0660 + digit): str(digit) for digit in range(10)}
+_DIGITS.update({chr(0x06F0 + digit): str(digit) for digit in range(10)})
+
+_TRANSLATION = str.maketrans({**_DIACRITICS, **_LETTERS, **_DIGITS})
+
+_SPACES = re.compile(r'\s+')
+
+_NON_DIGITS = re.compile(r'\D')
+
+# رمز الدولة للأرقام المحلية التي تبدأ بصفر (السعودية)
+DEFAULT_COUNTRY_CODE = '966'
+
+# أقل عدد أرقام لقبول البحث بنهاية الرقم
+MIN_PHONE_SUFFIX = 7
+
+# أعمدة الهاتف في جدول الأشخاص وأعمدة الصيغة الموحدة (E.164 بدون +)
+PHONE_COLUMNS = {
+    'phone': 'phone_e164',
+    'mobile': 'mobile_e164',
+    'emergency_contact_phone': 'emergency_contact_phone_e164'
+}
+
+# أعمدة آخر MIN_PHONE_SUFFIX أرقام من الصيغة الموحدة: البحث بنهاية الرقم يطابقها بالمساواة
+# على فهرس (company_id، العمود) بدل LIKE '%...' الذي لا يستخدم أي فهرس
+PHONE_TAIL_COLUMNS = {
+    'phone': 'phone_tail',
+    'mobile': 'mobile_tail',
+    'emergency_contact_phone': 'emergency_contact_phone_tail'
+}
+
+# عمود البحث لكل نموذج والحقول التي يُبنى منها
+SEARCH_COLUMNS = {
+    Person: ('search_name', ('first_name', 'last_name', 'first_name_en', 'last_name_en')),
+    Project: ('search_name', ('name', 'name_en', 'location')),
+    Building: ('search_name', ('name', 'name_en', 'address')),
+    Unit: ('search_name', ('unit_number', 'description')),
+    Expense: ('search_name', ('expense_number', 'vendor_name', 'description'))
+}
+
+# أعلى محرف في Unicode: الحد الأعلى لمدى البادئة
+_MAX_CHAR = '\U0010ffff'
+
+
+def normalize_text(value):
+    """توحيد النص العربي للبحث
+
+    يحذف التشكيل والتطويل، ويوحد الألف والهمزات (أ إ آ ٱ ← ا، ؤ ← و، ئ ← ي)،
+    والتاء المربوطة (ة ← ه)، والألف المقصورة (ى ← ي)، ويحول الأرقام العربية الهندية
+    إلى لاتينية، ويحول الحروف اللاتينية إلى صغيرة.
+    """
+    if not value:
+        return ''
+    return _SPACES.sub(' ', str(value).translate(_TRANSLATION).lower()).strip()
+
+
+def phone_digits(value):
+    """أرقام الهاتف فقط (بعد تحويل الأرقام العربية الهندية)"""
+    return _NON_DIGITS.sub('', str(value or '').translate(_TRANSLATION))
+
+
+def normalize_phone(value, country_code=DEFAULT_COUNTRY_CODE):
+    """تحويل رقم الهاتف إلى أرقام E.164 (بدون +)
+
+    "+966 50 123 4567" و "00966501234567" و "0501234567" و "٠٥٠١٢٣٤٥٦٧" كلها
+    تصبح "966501234567". يرجع نصاً فارغاً إذا لم يكن في القيمة رقم صالح.
+    """
+    if not value:
+        return ''
+    text = str(value).strip()
+    digits = phone_digits(text)
+    if not digits:
+        return ''
+    if text.startswith('+'):
+        return digits
+    if digits.startswith('00'):
+        return digits[2:]
+    if digits.startswith('0'):
+        return country_code + digits[1:]
+    if digits.startswith(country_code):
+        return digits
+    # رقم محلي بدون الصفر البادئ (مثل 501234567)
+    return country_code + digits
+
+
+def phone_tail(value):
+    """آخر MIN_PHONE_SUFFIX أرقام من رقم بصيغة E.164 (None للرقم الفارغ)"""
+    return value[-MIN_PHONE_SUFFIX:] if value else None
+
+
+def search_value(obj):
+    """قيمة عمود البحث للكائن من الحقول المصدرية"""
+    _, fields = SEARCH_COLUMNS[type(obj)]
+    return normalize_text(' '.join(str(getattr(obj, field)) for field in fields if getattr(obj, field)))
+
+
+def search_text(model, values):
+    """قيمة عمود البحث من قاموس قيم (للإدراج المباشر الذي لا يمر بأحداث ORM)"""
+    _, fields = SEARCH_COLUMNS[model]
+    return normalize_text(' '.join(str(values[field]) for field in fields if values.get(field)))
+
+
+def search_condition(column, search):
+    """شرط البحث على عمود موحد: القيمة تبدأ بالنص الموحد
+
+    يُكتب كمدى (>= النص و< النص متبوعاً بأعلى محرف) بدل LIKE ليخدمه فهرس (company_id، العمود)
+    مع شرط الشركة، فـ LIKE '%...%' لا يستخدم أي فهرس، وLIKE في SQLite لا يستخدم الفهارس
+    الثنائية لأنه غير حساس لحالة الأحرف (النص الموحد بحروف صغيرة أصلاً).
+    """
+    term = normalize_text(search)
+    return and_(column >= term, column < term + _MAX_CHAR)
+
+
+@event.listens_for(Session, 'before_flush')
+def update_search_columns(session, flush_context, instances):
+    """تحديث أعمدة البحث الموحدة قبل الكتابة عند إنشاء الكائنات أو تعديل حقولها المصدرية"""
+    for obj in list(session.new) + list(session.dirty):
+        entry = SEARCH_COLUMNS.get(type(obj))
+        if not entry:
+            continue
+        column, fields = entry
+        if obj in session.dirty:
+            state = db.inspect(obj)
+            if not any(state.attrs[field].history.has_changes() for field in fields):
+                continue
+        setattr(obj, column, search_value(obj))
+
+
+@event.listens_for(Session, 'before_flush')
+def update_phone_columns(session, flush_context, instances):
+    """تحديث أعمدة الهاتف الموحدة للأشخاص عند الإنشاء أو تعديل الأرقام"""
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Person):
+            continue
+        state = db.inspect(obj)
+        for field, column in PHONE_COLUMNS.items():
+            if obj in session.new or state.attrs[field].history.has_changes():
+                value = normalize_phone(getattr(obj, field)) or None
+                setattr(obj, column, value)
+                setattr(obj, PHONE_TAIL_COLUMNS[field], phone_tail(value))
+
+
+def backfill_search_columns(batch_size=1000):
+    """تعبئة أعمدة البحث للصفوف القديمة التي لم تُحسب لها بعد"""
+    updated = 0
+    for model, (column, fields) in SEARCH_COLUMNS.items():
+        table = model.__table__
+        source = [table.c[field] for field in fields]
+        while True:
+            rows = db.session.execute(
+                select(table.c.id, *source).where(table.c[column].is_(None)).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            for row in rows:
+                value = normalize_text(' '.join(str(part) for part in row[1:] if part))
+                db.session.execute(table.update().where(table.c.id == row.id).values({column: value}))
+            updated += len(rows)
+            db.session.commit()
+    updated += backfill_phone_columns(batch_size)
+    return updated
+
+
+def backfill_phone_columns(batch_size=1000):
+    """تعبئة أعمدة الهاتف الموحدة وأعمدة نهاية الرقم للأشخاص المسجلين قبل إضافتها"""
+    table = Person.__table__
+    updated = 0
+    for field, column in PHONE_COLUMNS.items():
+        tail = PHONE_TAIL_COLUMNS[field]
+        last_id = 0
+        while True:
+            # الترقيم بالمعرف لأن الأرقام غير الصالحة تبقى بدون قيمة موحدة
+            rows = db.session.execute(
+                select(table.c.id, table.c[field]).where(
+                    table.c[field].isnot(None), or_(table.c[column].is_(None), table.c[tail].is_(None)),
+                    table.c.id > last_id
+                ).order_by(table.c.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            for row in rows:
+                value = normalize_phone(row[1])
+                if value:
+                    db.session.execute(table.update().where(table.c.id == row.id).values(
+                        {column: value, tail: phone_tail(value)}
+                    ))
+                    updated += 1
+            last_id = rows[-1].id
+            db.session.commit()
+    return updated
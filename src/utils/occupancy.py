@@ -0,0 +1,209 @@
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import event, select, func, and_, or_, bindparam
+from sqlalchemy.orm import Session
+from src.models.property import db, Unit, OccupancyCounter
+
+UNIT_STATUSES = ('available', 'occupied', 'maintenance', 'reserved')
+
+COUNTED_FIELDS = ('company_id', 'building_id', 'status', 'is_active')
+
+
+# ===== تحديث العدادات عند تغيير الوحدات =====
+
+def _unit_key(company_id, building_id, status, is_active):
+    """مفتاح العداد الذي تُحتسب فيه الوحدة (None إذا كانت غير نشطة)"""
+    # القيم الافتراضية لا تُطبق إلا عند الإدراج
+    if is_active is False or company_id is None or building_id is None:
+        return None
+    return (company_id, building_id, status or 'available')
+
+
+def _expand(key, delta, deltas):
+    company_id, building_id, status = key
+    deltas[(company_id, building_id, status)] += delta
+    deltas[(company_id, None, status)] += delta
+
+
+def _previous_values(session, unit):
+    """القيم المخزنة للوحدة قبل التعديل"""
+    state = db.inspect(unit)
+    values = {}
+    for name in COUNTED_FIELDS:
+        history = state.attrs[name].history
+        if history.deleted:
+            values[name] = history.deleted[0]
+        elif history.unchanged:
+            values[name] = history.unchanged[0]
+        elif not history.added:
+            values[name] = getattr(unit, name)
+
+    missing = [name for name in COUNTED_FIELDS if name not in values]
+    if missing:
+        # القيمة القديمة لم تُحمّل قبل التعديل: نقرؤها من قاعدة البيانات قبل الكتابة
+        row = session.connection().execute(
+            select(*[getattr(Unit, name) for name in missing]).where(Unit.id == unit.id)
+        ).one_or_none()
+        for index, name in enumerate(missing):
+            values[name] = row[index] if row else None
+
+    return values
+
+
+def _counter_update(building_level):
+    table = OccupancyCounter.__table__
+    building_filter = table.c.building_id == bindparam('b_building_id') if building_level else table.c.building_id.is_(None)
+    return table.update().where(and_(
+        table.c.company_id == bindparam('b_company_id'), building_filter, table.c.status == bindparam('b_status')
+    )).values(unit_count=table.c.unit_count + bindparam('b_delta'), updated_at=bindparam('b_now'))
+
+
+# جمل التحديث تُبنى مرة واحدة (مع معاملات مربوطة) لتُستخدم من ذاكرة الترجمة في كل استدعاء
+_COUNTER_UPDATES = {True: _counter_update(True), False: _counter_update(False)}
+
+
+def apply_counter_deltas(connection, deltas):
+    """إضافة الفروقات إلى صفوف العدادات (ينشئ الصف إذا لم يكن موجوداً)"""
+    table = OccupancyCounter.__table__
+    now = datetime.utcnow()
+    for (company_id, building_id, status), delta in deltas.items():
+        if not delta:
+            continue
+        params = {'b_company_id': company_id, 'b_status': status, 'b_delta': delta, 'b_now': now}
+        if building_id is not None:
+            params['b_building_id'] = building_id
+        result = connection.execute(_COUNTER_UPDATES[building_id is not None], params)
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(
+                company_id=company_id, building_id=building_id, status=status,
+                unit_count=delta, updated_at=now
+            ))
+
+
+@event.listens_for(Session, 'before_flush')
+def track_unit_changes(session, flush_context, instances):
+    """تحديث عدادات الإشغال ضمن نفس المعاملة عند إنشاء الوحدات أو تعديلها أو حذفها"""
+    deltas = defaultdict(int)
+
+    for obj in session.new:
+        if isinstance(obj, Unit):
+            key = _unit_key(obj.company_id, obj.building_id, obj.status, obj.is_active)
+            if key:
+                _expand(key, 1, deltas)
+
+    for obj in session.dirty:
+        if not isinstance(obj, Unit):
+            continue
+        state = db.inspect(obj)
+        if not any(state.attrs[name].history.has_changes() for name in COUNTED_FIELDS):
+            continue
+        old = _previous_values(session, obj)
+        old_key = _unit_key(old['company_id'], old['building_id'], old['status'], old['is_active'])
+        new_key = _unit_key(obj.company_id, obj.building_id, obj.status, obj.is_active)
+        if old_key != new_key:
+            if old_key:
+                _expand(old_key, -1, deltas)
+            if new_key:
+                _expand(new_key, 1, deltas)
+
+    for obj in session.deleted:
+        if isinstance(obj, Unit):
+            old = _previous_values(session, obj)
+            key = _unit_key(old['company_id'], old['building_id'], old['status'], old['is_active'])
+            if key:
+                _expand(key, -1, deltas)
+
+    if any(deltas.values()):
+        apply_counter_deltas(session.connection(), deltas)
+
+
+# ===== القراءة =====
+
+def _with_rates(counts):
+    counts = {status: counts.get(status, 0) for status in set(UNIT_STATUSES) | set(counts)}
+    total = sum(counts.values())
+    counts['total'] = total
+    counts['occupancy_rate'] = round(counts['occupied'] / total * 100, 2) if total > 0 else 0
+    return counts
+
+
+def company_occupancy(company_id):
+    """عدد الوحدات النشطة لكل حالة على مستوى الشركة (قراءة صفوف العدادات فقط)"""
+    rows = db.session.query(OccupancyCounter.status, OccupancyCounter.unit_count).filter(
+        OccupancyCounter.company_id == company_id,
+        OccupancyCounter.building_id.is_(None)
+    ).all()
+    return _with_rates(dict(rows))
+
+
+def building_occupancy(company_id, building_ids=None):
+    """عدد الوحدات النشطة لكل حالة لكل مبنى"""
+    query = db.session.query(
+        OccupancyCounter.building_id, OccupancyCounter.status, OccupancyCounter.unit_count
+    ).filter(
+        OccupancyCounter.company_id == company_id,
+        OccupancyCounter.building_id.isnot(None)
+    )
+    if building_ids is not None:
+        query = query.filter(OccupancyCounter.building_id.in_(building_ids))
+
+    counts = defaultdict(dict)
+    for building_id, status, unit_count in query.all():
+        counts[building_id][status] = unit_count
+
+    ids = building_ids if building_ids is not None else counts.keys()
+    return {building_id: _with_rates(counts.get(building_id, {})) for building_id in ids}
+
+
+# ===== المطابقة =====
+
+def _counted_units():
+    """شرط الوحدات المحتسبة في العدادات بنفس قواعد _unit_key (is_active الفارغة تعتبر نشطة)"""
+    return and_(
+        or_(Unit.is_active.is_(None), Unit.is_active == True),
+        Unit.company_id.isnot(None),
+        Unit.building_id.isnot(None)
+    )
+
+
+def reconcile_occupancy(company_id=None):
+    """إعادة احتساب العدادات من جدول الوحدات وتصحيح أي انحراف
+
+    ترجع قائمة بالصفوف التي تم تصحيحها.
+    """
+    actual = defaultdict(int)
+    stmt = select(Unit.company_id, Unit.building_id, func.coalesce(Unit.status, 'available'), func.count(Unit.id)) \
+        .where(_counted_units()).group_by(Unit.company_id, Unit.building_id, Unit.status)
+    if company_id:
+        stmt = stmt.where(Unit.company_id == company_id)
+    for unit_company_id, building_id, status, count in db.session.execute(stmt):
+        _expand((unit_company_id, building_id, status), count, actual)
+
+    stored_query = OccupancyCounter.query
+    if company_id:
+        stored_query = stored_query.filter_by(company_id=company_id)
+    stored = {(row.company_id, row.building_id, row.status): row.unit_count for row in stored_query.all()}
+
+    deltas = {}
+    fixes = []
+    for key in set(actual) | set(stored):
+        delta = actual.get(key, 0) - stored.get(key, 0)
+        if delta:
+            deltas[key] = delta
+            fixes.append({
+                'company_id': key[0], 'building_id': key[1], 'status': key[2],
+                'stored': stored.get(key, 0), 'actual': actual.get(key, 0)
+            })
+
+    apply_counter_deltas(db.session.connection(), deltas)
+    db.session.commit()
+    return fixes
+
+
+def seed_occupancy_counters():
+    """تعبئة العدادات لقاعدة بيانات قائمة قبل إضافة جدولها (عند خلوه فقط)"""
+    if db.session.execute(select(OccupancyCounter.id).limit(1)).first() is not None:
+        return []
+    if db.session.execute(select(Unit.id).limit(1)).first() is None:
+        return []
+    return reconcile_occupancy()
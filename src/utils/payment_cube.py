@@ -0,0 +1,247 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import timedelta
+from decimal import Decimal
+from sqlalchemy import select, func
+from src.models.property import db, Unit
+from src.models.contract import Contract, ContractPayment
+
+# عدد الشركات المحفوظة في الذاكرة (الأقدم استخداماً يُحذف أولاً)
+MAX_COMPANIES = 8
+
+# أقل مدة بين تحديثين تزايديين لنفس الشركة (بالثواني)
+REFRESH_INTERVAL = 2
+
+WATERMARK_OVERLAP = timedelta(minutes=1)
+
+DATE_FIELDS = ('due_date', 'payment_date')
+MEASURES = ('amount', 'paid_amount')
+GROUP_FIELDS = ('building', 'method', 'status')
+
+
+def _cents(value):
+    return int((Decimal(value or 0) * 100).to_integral_value())
+
+
+class PaymentCube:
+    """دفعات شركة واحدة مخزنة كمصفوفات أعمدة مضغوطة
+
+    كل عمود مصفوفة array بنوع ثابت (ترتيب اليوم، المبلغ بالهللات، رمز الحالة،
+    رقم المبنى، رمز طريقة الدفع). لكل تركيبة فلاتر وتجميع تُبنى عند أول طلب
+    مصفوفات مجاميع تراكمية حسب اليوم لكل مجموعة في مرور واحد على الأعمدة،
+    فيصبح مجموع أي فترة عملية طرح واحدة.
+    """
+
+    def __init__(self, company_id):
+        self.company_id = company_id
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.ids = array('q')
+        self.due_day = array('l')
+        self.paid_day = array('l')
+        self.amount = array('q')
+        self.paid_amount = array('q')
+        self.status = array('b')
+        self.building = array('l')
+        self.method = array('h')
+        self.positions = {}
+        self.id_total = 0
+        self.status_codes = {}
+        self.method_codes = {}
+        self.watermark = None
+        self.refreshed_at = 0
+        self.prefix_cache = {}
+
+    # ===== التحميل والتحديث =====
+
+    def _code(self, codes, value):
+        if value not in codes:
+            codes[value] = len(codes)
+        return codes[value]
+
+    def _statement(self):
+        return select(
+            ContractPayment.id, ContractPayment.due_date, ContractPayment.payment_date,
+            ContractPayment.amount, ContractPayment.paid_amount, ContractPayment.status,
+            ContractPayment.payment_method, ContractPayment.updated_at, Unit.building_id
+        ).select_from(ContractPayment).join(
+            Contract, ContractPayment.contract_id == Contract.id
+        ).outerjoin(Unit, Contract.unit_id == Unit.id).where(Contract.company_id == self.company_id)
+
+    def _store(self, row):
+        """تخزين صف الدفعة، وإرجاع True إذا كان جديداً أو تغيرت قيمه (إعادة قراءة الهامش لا تُحتسب تغييراً)"""
+        values = (
+            row.due_date.toordinal() if row.due_date else 0,
+            row.payment_date.toordinal() if row.payment_date else 0,
+            _cents(row.amount),
+            _cents(row.paid_amount),
+            self._code(self.status_codes, row.status or 'pending'),
+            row.building_id or 0,
+            self._code(self.method_codes, row.payment_method)
+        )
+        columns = (self.due_day, self.paid_day, self.amount, self.paid_amount, self.status,
+                   self.building, self.method)
+
+        if row.updated_at and (self.watermark is None or row.updated_at > self.watermark):
+            self.watermark = row.updated_at
+
+        position = self.positions.get(row.id)
+        if position is None:
+            self.positions[row.id] = len(self.ids)
+            self.ids.append(row.id)
+            self.id_total += row.id
+            for column, value in zip(columns, values):
+                column.append(value)
+            return True
+
+        changed = False
+        for column, value in zip(columns, values):
+            if column[position] != value:
+                column[position] = value
+                changed = True
+        return changed
+
+    def _load(self, stmt):
+        changed = 0
+        for row in db.session.execute(stmt.execution_options(yield_per=5000)):
+            if self._store(row):
+                changed += 1
+        return changed
+
+    def refresh(self, force=False):
+        """قراءة الدفعات التي تغيرت منذ آخر تحديث فقط (حسب updated_at)"""
+        if not force and time.monotonic() - self.refreshed_at < REFRESH_INTERVAL:
+            return 0
+
+        stmt = self._statement()
+        if self.watermark is not None:
+            # نعيد قراءة هامش قبل آخر طابع زمني لأن المعاملات قد تُثبَّت بغير ترتيب طوابعها؛
+            # التحديث في مكانه لا يكرر الصفوف، والصفوف التي لم تتغير قيمها لا تُبطل المجاميع
+            stmt = stmt.where(ContractPayment.updated_at >= self.watermark - WATERMARK_OVERLAP)
+        changed = self._load(stmt)
+
+        # الحذف لا يظهر في updated_at: إذا اختلف عدد المعرفات أو مجموعها عن الجدول
+        # (حذف وإضافة معاً لا يغيران العدد) نعيد التحميل كاملاً
+        count, id_total = db.session.execute(
+            select(func.count(ContractPayment.id), func.coalesce(func.sum(ContractPayment.id), 0))
+            .join(Contract).where(Contract.company_id == self.company_id)
+        ).one()
+        if (count, id_total) != (len(self.ids), self.id_total):
+            self._reset()
+            changed = self._load(self._statement())
+
+        if changed:
+            self.prefix_cache = {}
+        self.refreshed_at = time.monotonic()
+        return changed
+
+    # ===== الاستعلام =====
+
+    def _prefixes(self, group_by, date_field, measure, status_code, building_id, method_code):
+        """مصفوفات الأيام المرتبة ومجاميعها التراكمية لكل مجموعة في مرور واحد (None = بدون فلتر أو تجميع)"""
+        key = (group_by, date_field, measure, status_code, building_id, method_code)
+        if key in self.prefix_cache:
+            return self.prefix_cache[key]
+
+        days_column = self.due_day if date_field == 'due_date' else self.paid_day
+        values_column = self.amount if measure == 'amount' else self.paid_amount
+        group_column = {'building': self.building, 'method': self.method, 'status': self.status}.get(group_by)
+
+        totals = {}
+        for index in range(len(self.ids)):
+            day = days_column[index]
+            if not day:
+                continue
+            if status_code is not None and self.status[index] != status_code:
+                continue
+            if building_id is not None and self.building[index] != building_id:
+                continue
+            if method_code is not None and self.method[index] != method_code:
+                continue
+            group_totals = totals.setdefault(group_column[index] if group_column is not None else None, {})
+            group_totals[day] = group_totals.get(day, 0) + values_column[index]
+
+        prefixes = {}
+        for group, group_totals in totals.items():
+            days = array('l', sorted(group_totals))
+            sums = array('q')
+            running = 0
+            for day in days:
+                running += group_totals[day]
+                sums.append(running)
+            prefixes[group] = (days, sums)
+
+        self.prefix_cache[key] = prefixes
+        return prefixes
+
+    def _sum(self, start, end, prefix):
+        if prefix is None:
+            return 0
+        days, sums = prefix
+        low = bisect_left(days, start.toordinal())
+        high = bisect_right(days, end.toordinal())
+        if high <= low:
+            return 0
+        return sums[high - 1] - (sums[low - 1] if low else 0)
+
+    def _codes(self, status, method):
+        # القيمة غير المعروفة تأخذ رمزاً لا يطابق أي صف
+        status_code = self.status_codes.get(status, -1) if status else None
+        method_code = self.method_codes.get(method, -1) if method else None
+        return status_code, method_code
+
+    def range_sum(self, start, end, date_field='payment_date', measure='paid_amount', status='paid',
+                  building_id=None, method=None):
+        """مجموع الفترة بين تاريخين (شاملة) بالهللات"""
+        status_code, method_code = self._codes(status, method)
+        prefixes = self._prefixes(None, date_field, measure, status_code, building_id, method_code)
+        return self._sum(start, end, prefixes.get(None))
+
+    def group_sum(self, group_by, start, end, date_field='payment_date', measure='paid_amount', status='paid',
+                  building_id=None, method=None):
+        """مجموع الفترة لكل مبنى أو طريقة دفع أو حالة"""
+        if group_by not in GROUP_FIELDS:
+            raise ValueError(f'حقل تجميع غير مدعوم: {group_by}')
+        status_code, method_code = self._codes(status, method)
+        prefixes = self._prefixes(group_by, date_field, measure, status_code, building_id, method_code)
+        if group_by == 'building':
+            keys = sorted(set(self.building)) if building_id is None else [building_id]
+            return {key or None: self._sum(start, end, prefixes.get(key)) for key in keys}
+        if group_by == 'method':
+            codes = self.method_codes.items() if method is None else [(method, method_code)]
+        else:
+            codes = self.status_codes.items() if status is None else [(status, status_code)]
+        return {name: self._sum(start, end, prefixes.get(code)) for name, code in codes}
+
+
+_cubes = OrderedDict()
+_cubes_lock = threading.Lock()
+
+
+def get_cube(company_id):
+    """مكعب الشركة بعد تحديثه تزايدياً (مع إزالة الأقدم استخداماً عند تجاوز الحد)
+
+    يجب الاستعلام من المكعب داخل cube.lock لأن التحديث يعدّل المصفوفات في مكانها.
+    """
+    with _cubes_lock:
+        cube = _cubes.pop(company_id, None)
+        if cube is None:
+            cube = PaymentCube(company_id)
+        _cubes[company_id] = cube
+        while len(_cubes) > MAX_COMPANIES:
+            _cubes.popitem(last=False)
+
+    with cube.lock:
+        cube.refresh()
+    return cube
+
+
+def clear_cubes():
+    """تفريغ جميع المكعبات من الذاكرة"""
+    with _cubes_lock:
+        _cubes.clear()
@@ -0,0 +1,142 @@
+from datetime import datetime, date
+from decimal import Decimal, InvalidOperation
+from types import SimpleNamespace
+from sqlalchemy import select, update, bindparam
+from src.models.property import db
+from src.models.contract import Contract, ContractPayment
+from src.models.notification import Notification
+from src.utils.financial_summary import record_payment_changes, payment_state
+from src.utils.forecast import invalidate_forecast
+
+# أقصى عدد دفعات في طلب تسجيل واحد
+MAX_BATCH_SIZE = 1000
+
+# عدد المعرفات في كل استعلام IN (أقل من حد متغيرات SQLite)
+IN_CHUNK_SIZE = 900
+
+# حالات الدفعة التي لا يُعاد تسجيلها كمدفوعة
+CLOSED_STATUSES = ('paid', 'cancelled')
+
+_PAY_UPDATE = update(ContractPayment.__table__).where(ContractPayment.__table__.c.id == bindparam('b_id')).values(
+    paid_amount=bindparam('b_paid_amount'), payment_date=bindparam('b_payment_date'),
+    payment_method=bindparam('b_payment_method'), notes=bindparam('b_notes'), status='paid',
+    updated_at=bindparam('b_updated_at')
+)
+
+
+def _parse_item(item):
+    """قيم عنصر التسجيل: (معرف الدفعة، المبلغ أو None، التاريخ، الطريقة، الملاحظات، الخطأ)"""
+    if not isinstance(item, dict):
+        return None, None, None, None, None, 'عنصر غير صالح'
+    try:
+        payment_id = int(item.get('payment_id'))
+    except (TypeError, ValueError):
+        return None, None, None, None, None, 'payment_id مطلوب'
+
+    paid_amount = None
+    if item.get('paid_amount') is not None:
+        try:
+            paid_amount = Decimal(str(item['paid_amount']))
+        except InvalidOperation:
+            return payment_id, None, None, None, None, 'paid_amount: يجب أن يكون رقماً'
+        if paid_amount <= 0:
+            return payment_id, None, None, None, None, 'paid_amount: يجب أن يكون أكبر من صفر'
+
+    payment_date = date.today()
+    if item.get('payment_date'):
+        try:
+            payment_date = datetime.strptime(item['payment_date'], '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            return payment_id, None, None, None, None, 'payment_date: صيغة التاريخ يجب أن تكون YYYY-MM-DD'
+    return payment_id, paid_amount, payment_date, item.get('payment_method'), item.get('notes'), None
+
+
+def in_chunks(values, size=IN_CHUNK_SIZE):
+    """تقسيم المعرفات لاستعلامات IN لا تتجاوز حد المتغيرات"""
+    values = list(values)
+    for index in range(0, len(values), size):
+        yield values[index:index + size]
+
+
+def post_payments(company_id, parsed, now=None):
+    """تسجيل دفعات محللة [(المعرف، المبلغ، التاريخ، الطريقة، الملاحظات، الخطأ)] ضمن المعاملة الحالية
+
+    الدفعات تُتحقق من الشركة باستعلام واحد لكل IN_CHUNK_SIZE معرف، وتُحدّث بجملة executemany
+    واحدة، ثم يُطبق أثرها على الملخص المالي بتحديث واحد لكل شهر وحقل، وتُؤرشف تنبيهات
+    استحقاقها. العناصر غير الصالحة (غير موجودة، مدفوعة أو ملغاة، مكررة) تُرفض وحدها.
+    تُرجع (نتيجة كل عنصر، عدد الدفعات المسجلة) دون حفظ المعاملة.
+    """
+    ids = {payment_id for payment_id, *_ in parsed if payment_id is not None}
+    payments = {}
+    for chunk in in_chunks(ids):
+        payments.update((row.id, row) for row in db.session.execute(
+            select(ContractPayment.id, ContractPayment.amount, ContractPayment.paid_amount,
+                   ContractPayment.status, ContractPayment.due_date, ContractPayment.payment_date)
+            .join(Contract, ContractPayment.contract_id == Contract.id)
+            .where(ContractPayment.id.in_(chunk), Contract.company_id == company_id)
+        ))
+
+    now = now or datetime.utcnow()
+    results = []
+    params = []
+    changes = []
+    seen = set()
+    for payment_id, paid_amount, payment_date, payment_method, notes, error in parsed:
+        payment = payments.get(payment_id)
+        if not error:
+            if payment is None:
+                error = 'الدفعة غير موجودة'
+            elif payment_id in seen:
+                error = 'الدفعة مكررة في الطلب'
+            elif payment.status in CLOSED_STATUSES:
+                error = 'الدفعة مسجلة كمدفوعة أو ملغاة'
+        if error:
+            results.append({'payment_id': payment_id, 'success': False, 'error': error})
+            continue
+
+        seen.add(payment_id)
+        amount = paid_amount if paid_amount is not None else payment.amount
+        params.append({
+            'b_id': payment_id, 'b_paid_amount': amount, 'b_payment_date': payment_date,
+            'b_payment_method': payment_method, 'b_notes': notes, 'b_updated_at': now
+        })
+        changes.append((payment_state(payment), payment_state(SimpleNamespace(
+            status='paid', amount=payment.amount, paid_amount=amount, due_date=payment.due_date,
+            payment_date=payment_date
+        ))))
+        results.append({'payment_id': payment_id, 'success': True, 'paid_amount': float(amount),
+                        'payment_date': payment_date.isoformat()})
+
+    if params:
+        connection = db.session.connection()
+        connection.execute(_PAY_UPDATE, params)
+        record_payment_changes(company_id, changes)
+        # تنبيهات الاستحقاق لم تعد مطلوبة بعد السداد
+        notifications = Notification.__table__
+        for chunk in in_chunks(seen):
+            connection.execute(
+                update(notifications)
+                .where(notifications.c.payment_id.in_(chunk), notifications.c.status != 'archived')
+                .values(status='archived', updated_at=now)
+            )
+    return results, len(params)
+
+
+def mark_payments_paid(company_id, items):
+    """تسجيل عدة دفعات كمدفوعة في معاملة واحدة وإرجاع نتيجة كل عنصر (انظر post_payments)"""
+    if not isinstance(items, list) or not items:
+        raise ValueError('قائمة الدفعات مطلوبة')
+    if len(items) > MAX_BATCH_SIZE:
+        raise ValueError(f'الحد الأقصى {MAX_BATCH_SIZE} دفعة في الطلب الواحد')
+
+    results, paid = post_payments(company_id, [_parse_item(item) for item in items])
+    if paid:
+        db.session.commit()
+        invalidate_forecast(company_id)
+
+    return {
+        'total': len(results),
+        'paid': paid,
+        'failed': len(results) - paid,
+        'results': results
+    }
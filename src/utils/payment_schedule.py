@@ -0,0 +1,111 @@
+from calendar import monthrange
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from src.models.contract import ContractPayment
+
+# تكرار الدفع ← عدد أشهر الفترة (rent_amount إيجار شهري يُضرب في عدد الأشهر)
+PAYMENT_FREQUENCIES = {
+    'monthly': 1,
+    'quarterly': 3,
+    'semi_annual': 6,
+    'annual': 12
+}
+
+# أعمدة صفوف الدفعات (نفس المفاتيح في كل صف ليُنفذ الإدراج بـ executemany واحد)
+PAYMENT_COLUMNS = ('contract_id', 'payment_number', 'due_date', 'amount', 'paid_amount', 'payment_date',
+                   'payment_method', 'status', 'created_at', 'updated_at')
+
+
+def period_starts(start_date, months, count):
+    """تواريخ بداية count فترة محسوبة من تاريخ البداية مباشرة (وليس بالإضافة المتتالية)
+
+    اليوم يُثبت على يوم البداية ويُقص لآخر الشهر عند الحاجة، فعقد يبدأ في 31 يناير
+    يستحق في 29 فبراير ثم 31 مارس، دون انزياح التواريخ بعد الأشهر القصيرة.
+    """
+    base = start_date.year * 12 + start_date.month - 1
+    indexes = range(base, base + months * count, months)
+    day = start_date.day
+    if day <= 28:
+        return [date(index // 12, index % 12 + 1, day) for index in indexes]
+    return [
+        date(index // 12, index % 12 + 1, min(day, monthrange(index // 12, index % 12 + 1)[1]))
+        for index in indexes
+    ]
+
+
+def _cents(value):
+    return int(value.to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def payment_schedule(start_date, end_date, rent_amount, frequency):
+    """جدولة دفعات العقد كاملة في مرور واحد: قائمة (رقم الدفعة، تاريخ الاستحقاق، المبلغ)
+
+    كل تواريخ الاستحقاق تُحسب من فهرس الفترة، والفترة الأخيرة غير الكاملة تُحسب بالتناسب
+    مع أيامها الفعلية (أيام التغطية ÷ أيام الفترة) لأي تكرار. المبالغ تُقرب تراكمياً
+    بالهللات، فمجموع الدفعات يساوي قيمة العقد المقربة تماماً وفرق التقريب يوزع على الدفعات
+    بدل أن يتجمع في آخرها. التكرار غير المعروف يعامل كشهري.
+    """
+    if end_date < start_date:
+        return []
+    months = PAYMENT_FREQUENCIES.get(frequency, 1)
+    elapsed = (end_date.year - start_date.year) * 12 + end_date.month - start_date.month
+    boundaries = period_starts(start_date, months, elapsed // months + 2)
+
+    # عدد الفترات التي تبدأ قبل نهاية العقد (الحد التالي لآخرها بعد النهاية دائماً)
+    count = len(boundaries) - 1
+    while boundaries[count - 1] > end_date:
+        count -= 1
+    last_start, last_end = boundaries[count - 1], boundaries[count]
+    covered = (end_date - last_start).days + 1
+    period_days = (last_end - last_start).days
+    full = count if covered >= period_days else count - 1
+
+    # قيمة الفترة الكاملة بالهللات (قد تكون كسرية إذا كان الإيجار بأكثر من منزلتين)
+    period = Decimal(str(rent_amount)) * months * 100
+    if period == period.to_integral_value():
+        amount = Decimal(int(period)).scaleb(-2)
+        amounts = [amount] * full
+        paid_cents = int(period) * full
+    else:
+        cumulative = [_cents(period * index) for index in range(full + 1)]
+        amounts = [Decimal(cumulative[index + 1] - cumulative[index]).scaleb(-2) for index in range(full)]
+        paid_cents = cumulative[full]
+    if full < count:
+        total_cents = _cents(period * full + period * covered / period_days)
+        amounts.append(Decimal(total_cents - paid_cents).scaleb(-2))
+
+    return list(zip(range(1, count + 1), boundaries[:count], amounts))
+
+
+def contract_value(start_date, end_date, rent_amount, frequency):
+    """قيمة العقد الكاملة (مجموع دفعات جدولته)"""
+    return sum((amount for _, _, amount in payment_schedule(start_date, end_date, rent_amount, frequency)),
+               Decimal('0.00'))
+
+
+def payment_rows(contract_id, schedule, now, paid_until=None, payment_method=None):
+    """صفوف الدفعات للإدراج بالجملة (الدفعات المستحقة حتى paid_until تُسجل مدفوعة)
+
+    كل الصفوف بنفس المفاتيح ليُنفذ إدراجها بجملة executemany واحدة.
+    """
+    rows = []
+    for payment_number, due_date, amount in schedule:
+        if paid_until is not None and due_date <= paid_until:
+            rows.append({
+                'contract_id': contract_id, 'payment_number': payment_number, 'due_date': due_date,
+                'amount': amount, 'paid_amount': amount, 'payment_date': due_date,
+                'payment_method': payment_method, 'status': 'paid', 'created_at': now, 'updated_at': now
+            })
+        else:
+            rows.append({
+                'contract_id': contract_id, 'payment_number': payment_number, 'due_date': due_date,
+                'amount': amount, 'paid_amount': 0, 'payment_date': None,
+                'payment_method': None, 'status': 'pending', 'created_at': now, 'updated_at': now
+            })
+    return rows
+
+
+def insert_payments(connection, rows):
+    """إدراج صفوف الدفعات بجملة executemany واحدة (كل الصفوف بنفس المفاتيح PAYMENT_COLUMNS)"""
+    if rows:
+        connection.execute(ContractPayment.__table__.insert(), rows)
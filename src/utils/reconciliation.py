@@ -0,0 +1,511 @@
+import heapq
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import select, update, bindparam, and_
+from src.models.property import db
+from src.models.contract import Contract, ContractPayment, Cheque
+from src.utils.bulk_import import open_csv, parse_decimal, document_key, MAX_REPORTED_ERRORS
+from src.utils.forecast import OPEN_PAYMENT_STATUSES, OPEN_CHEQUE_STATUSES, invalidate_forecast
+from src.utils.payment_posting import post_payments, in_chunks
+
+STATEMENT_REQUIRED_COLUMNS = ('date', 'amount')
+
+# صيغ التاريخ المقبولة في كشف الحساب بالترتيب
+STATEMENT_DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y')
+
+# الفرق الافتراضي والأقصى (بالأيام) بين تاريخ الحركة وتاريخ الاستحقاق
+DEFAULT_WINDOW_DAYS = 5
+MAX_WINDOW_DAYS = 31
+
+# أقصى عدد مرشحين يُعاد لكل حركة غامضة
+MAX_CANDIDATES = 5
+
+MATCH_TYPES = ('payment', 'cheque')
+
+_REFERENCE_TOKENS = re.compile(r'[\w\-/]+')
+
+
+def to_minor(amount):
+    """المبلغ بالهللات كعدد صحيح (مفتاح المطابقة بدل مقارنة الأرقام العشرية)"""
+    return int((Decimal(amount) * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def cheque_key(value):
+    """توحيد رقم الشيك للمطابقة (بدون فواصل ولا أصفار بادئة، فالبنك قد يطبعه 000123)"""
+    return document_key(value).lstrip('0')
+
+
+def parse_statement_date(value):
+    for date_format in STATEMENT_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+class OpenItem:
+    """بند مفتوح قابل للمطابقة: دفعة معلقة أو شيك لم يُصرف"""
+
+    __slots__ = ('type', 'id', 'minor', 'due_date', 'contract_id', 'contract_number', 'cheque_number',
+                 'payment_id', 'matched')
+
+    def __init__(self, type, id, amount, due_date, contract_id, contract_number, cheque_number=None,
+                 payment_id=None):
+        self.type = type
+        self.id = id
+        self.minor = to_minor(amount)
+        self.due_date = due_date
+        self.contract_id = contract_id
+        self.contract_number = contract_number
+        self.cheque_number = cheque_number
+        self.payment_id = payment_id
+        self.matched = False
+
+    def to_dict(self):
+        item = {
+            'type': self.type,
+            'id': self.id,
+            'amount': self.minor / 100,
+            'due_date': self.due_date.isoformat(),
+            'contract_id': self.contract_id,
+            'contract_number': self.contract_number
+        }
+        if self.type == 'cheque':
+            item['cheque_number'] = self.cheque_number
+            item['payment_id'] = self.payment_id
+        return item
+
+
+class StatementLine:
+    __slots__ = ('line', 'date', 'minor', 'reference', 'description', 'cheque_number', 'match', 'candidates',
+                 'reason')
+
+    def __init__(self, line, date, minor, reference, description, cheque_number):
+        self.line = line
+        self.date = date
+        self.minor = minor
+        self.reference = reference
+        self.description = description
+        self.cheque_number = cheque_number
+        self.match = None
+        self.candidates = []
+        self.reason = None
+
+    def to_dict(self):
+        result = {
+            'line': self.line,
+            'date': self.date.isoformat(),
+            'amount': self.minor / 100,
+            'reference': self.reference,
+            'description': self.description,
+            'cheque_number': self.cheque_number
+        }
+        if self.match is not None:
+            result['match'] = self.match.to_dict()
+        elif self.candidates:
+            closest = heapq.nsmallest(MAX_CANDIDATES, self.candidates, key=lambda item: (
+                abs((item.due_date - self.date).days), item.due_date, item.id
+            ))
+            result['candidates'] = [item.to_dict() for item in closest]
+            result['candidates_total'] = len(self.candidates)
+        if self.reason:
+            result['reason'] = self.reason
+        return result
+
+
+class StatementReconciler:
+    """مطابقة حركات كشف الحساب البنكي مع الدفعات المعلقة والشيكات المفتوحة
+
+    البنود المفتوحة تُفهرس في قواميس: (المبلغ بالهللات، رقم نافذة التاريخ) ورقم الشيك الموحد
+    ورقم العقد، فكل حركة تبحث في ثلاث نوافذ متجاورة على الأكثر بدل المرور على كل البنود.
+    المطابقة تتم على ثلاث مراحل: رقم الشيك أولاً، ثم المبلغ والتاريخ (بنود العقد الوارد رقمه
+    في المرجع أو الوصف إن وجدت)، ثم إعادة فحص الحركات الغامضة بعد استبعاد البنود المطابقة.
+    """
+
+    def __init__(self, company_id, window_days=DEFAULT_WINDOW_DAYS):
+        if not 0 <= window_days <= MAX_WINDOW_DAYS:
+            raise ValueError(f'نافذة التاريخ يجب أن تكون بين 0 و {MAX_WINDOW_DAYS} يوماً')
+        self.company_id = company_id
+        self.window = window_days
+        self.bucket_days = max(window_days, 1)
+        self.by_amount = defaultdict(list)
+        self.by_cheque = defaultdict(list)
+        self.by_contract = defaultdict(list)
+        self.lines = []
+        self.total_rows = 0
+        self.ignored = 0
+        self.failed = 0
+        self.errors = []
+
+    # ===== قراءة الكشف =====
+
+    def read(self, stream):
+        reader = open_csv(stream, STATEMENT_REQUIRED_COLUMNS)
+        for row in reader:
+            self.total_rows += 1
+            values = {key: (value or '').strip() for key, value in row.items() if key}
+            errors = []
+            statement_date = parse_statement_date(values['date']) if values['date'] else None
+            if statement_date is None:
+                errors.append('date: صيغة التاريخ يجب أن تكون YYYY-MM-DD أو DD/MM/YYYY')
+            amount = parse_decimal(values, 'amount', errors)
+            if amount is None and not errors:
+                errors.append('amount: مطلوب')
+            if errors:
+                self.failed += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append({'row': reader.line_num, 'errors': errors})
+                continue
+            # الحركات المدينة (السحوبات) ليست تحصيلات
+            if amount <= 0:
+                self.ignored += 1
+                continue
+            self.lines.append(StatementLine(
+                reader.line_num, statement_date, to_minor(amount), values.get('reference') or None,
+                values.get('description') or None, values.get('cheque_number') or None
+            ))
+
+    # ===== الفهرسة =====
+
+    def _bucket(self, value):
+        return value.toordinal() // self.bucket_days
+
+    def _add(self, item):
+        self.by_amount[(item.minor, self._bucket(item.due_date))].append(item)
+        if item.cheque_number:
+            self.by_cheque[cheque_key(item.cheque_number)].append(item)
+        if item.contract_number:
+            self.by_contract[item.contract_number.upper()].append(item)
+
+    def load(self):
+        """تحميل البنود المفتوحة التي قد تطابق تواريخ الكشف (مع النافذة) وفهرستها"""
+        if not self.lines:
+            return
+        window = timedelta(days=self.window)
+        start_date = min(line.date for line in self.lines) - window
+        end_date = max(line.date for line in self.lines) + window
+
+        # الشيك قد يُصرف بعد تاريخه بكثير، فتُحمّل كل الشيكات المفتوحة المستحقة حتى نهاية الكشف
+        # (المطابقة برقم الشيك لا تتقيد بالنافذة)
+        cheques = db.session.execute(
+            select(Cheque.id, Cheque.amount, Cheque.due_date, Cheque.contract_id, Contract.contract_number,
+                   Cheque.cheque_number, Cheque.payment_id)
+            .select_from(Cheque).outerjoin(Contract, Cheque.contract_id == Contract.id)
+            .where(and_(
+                Cheque.company_id == self.company_id,
+                Cheque.status.in_(OPEN_CHEQUE_STATUSES),
+                Cheque.due_date <= end_date
+            ))
+        )
+        # الدفعة المغطاة بشيك مفتوح تُطابق عبر شيكها: مرتبطة به، أو على نفس العقد وتاريخ الاستحقاق
+        linked_payments = set()
+        linked_dues = set()
+        for row in cheques:
+            self._add(OpenItem('cheque', row.id, row.amount, row.due_date, row.contract_id, row.contract_number,
+                               row.cheque_number, row.payment_id))
+            if row.payment_id:
+                linked_payments.add(row.payment_id)
+            else:
+                linked_dues.add((row.contract_id, row.due_date))
+
+        payments = db.session.execute(
+            select(ContractPayment.id, ContractPayment.amount, ContractPayment.due_date,
+                   ContractPayment.contract_id, Contract.contract_number)
+            .join(Contract, ContractPayment.contract_id == Contract.id)
+            .where(and_(
+                Contract.company_id == self.company_id,
+                ContractPayment.status.in_(OPEN_PAYMENT_STATUSES),
+                ContractPayment.due_date >= start_date,
+                ContractPayment.due_date <= end_date
+            ))
+        )
+        for row in payments:
+            if row.id in linked_payments or (row.contract_id, row.due_date) in linked_dues:
+                continue
+            self._add(OpenItem('payment', row.id, row.amount, row.due_date, row.contract_id, row.contract_number))
+
+    # ===== المطابقة =====
+
+    def _window_candidates(self, line):
+        first = self._bucket(line.date - timedelta(days=self.window))
+        last = self._bucket(line.date + timedelta(days=self.window))
+        candidates = []
+        for index in range(first, last + 1):
+            for item in self.by_amount.get((line.minor, index), ()):
+                if not item.matched and abs((item.due_date - line.date).days) <= self.window:
+                    candidates.append(item)
+        return candidates
+
+    def _referenced_candidates(self, line):
+        """مرشحو العقود التي يرد رقمها في مرجع الحركة أو وصفها (بالمبلغ نفسه وضمن النافذة)"""
+        text = ' '.join(value for value in (line.reference, line.description) if value)
+        if not text:
+            return []
+        candidates = []
+        for token in {token.upper() for token in _REFERENCE_TOKENS.findall(text)}:
+            for item in self.by_contract.get(token, ()):
+                if (not item.matched and item.minor == line.minor
+                        and abs((item.due_date - line.date).days) <= self.window):
+                    candidates.append(item)
+        return candidates
+
+    @staticmethod
+    def _claim(line, item, reason):
+        item.matched = True
+        line.match = item
+        line.candidates = []
+        line.reason = reason
+
+    def _match_cheque(self, line):
+        items = [item for item in self.by_cheque.get(cheque_key(line.cheque_number), ()) if not item.matched]
+        if not items:
+            return False
+        same_amount = [item for item in items if item.minor == line.minor]
+        if not same_amount:
+            line.candidates = items
+            line.reason = 'رقم الشيك مطابق والمبلغ مختلف'
+            return True
+        if len(same_amount) > 1:
+            # نفس الرقم من أكثر من بنك: الأقرب تاريخاً ضمن النافذة
+            same_amount = [item for item in same_amount
+                           if abs((item.due_date - line.date).days) <= self.window] or same_amount
+        if len(same_amount) == 1:
+            self._claim(line, same_amount[0], 'cheque_number')
+        else:
+            line.candidates = same_amount
+            line.reason = 'رقم الشيك مكرر'
+        return True
+
+    def _match_amount(self, line):
+        candidates, reason = self._referenced_candidates(line), 'contract_reference'
+        if not candidates:
+            candidates, reason = self._window_candidates(line), 'amount_date'
+        if len(candidates) == 1:
+            self._claim(line, candidates[0], reason)
+        else:
+            line.candidates = candidates
+
+    def match(self):
+        # المرحلة الأولى: رقم الشيك (الأقوى) قبل أن تستهلك المطابقة بالمبلغ شيكاته
+        pending = []
+        for line in self.lines:
+            if not (line.cheque_number and self._match_cheque(line)):
+                pending.append(line)
+
+        # المرحلة الثانية: المبلغ ضمن نافذة التاريخ
+        for line in pending:
+            self._match_amount(line)
+
+        # المرحلة الثالثة: حركة غامضة بقي لها مرشح واحد بعد مطابقة غيرها
+        for line in pending:
+            if line.match is None and len(line.candidates) > 1:
+                remaining = [item for item in line.candidates if not item.matched]
+                if len(remaining) == 1:
+                    self._claim(line, remaining[0], 'amount_date')
+                else:
+                    line.candidates = remaining
+
+    def run(self, stream):
+        self.read(stream)
+        self.load()
+        self.match()
+        return self
+
+    # ===== التقرير =====
+
+    def confirmed_matches(self):
+        """المطابقات المؤكدة بصيغة apply_matches"""
+        return [{'type': line.match.type, 'id': line.match.id, 'date': line.date, 'reference': line.reference}
+                for line in self.lines if line.match is not None]
+
+    def to_dict(self):
+        matched, ambiguous, unmatched = [], [], []
+        for line in self.lines:
+            if line.match is not None:
+                matched.append(line)
+            elif line.candidates:
+                ambiguous.append(line)
+            else:
+                unmatched.append(line)
+        return {
+            'summary': {
+                'total_rows': self.total_rows,
+                'credits': len(self.lines),
+                'ignored_debits': self.ignored,
+                'failed': self.failed,
+                'matched': len(matched),
+                'ambiguous': len(ambiguous),
+                'unmatched': len(unmatched),
+                'matched_amount': sum(line.minor for line in matched) / 100,
+                'unmatched_amount': sum(line.minor for line in unmatched) / 100
+            },
+            'matched': [line.to_dict() for line in matched],
+            'ambiguous': [line.to_dict() for line in ambiguous],
+            'unmatched': [line.to_dict() for line in unmatched],
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+
+# ===== تطبيق المطابقات =====
+
+_CLEAR_CHEQUE = update(Cheque.__table__).where(Cheque.__table__.c.id == bindparam('b_id')).values(
+    status='cleared', clear_date=bindparam('b_clear_date'), updated_at=bindparam('b_updated_at')
+)
+
+
+def _parse_match(match):
+    """(النوع، المعرف، التاريخ، المرجع، الخطأ) لمطابقة مؤكدة"""
+    if not isinstance(match, dict) or match.get('type') not in MATCH_TYPES:
+        return None, None, None, None, 'type: يجب أن يكون payment أو cheque'
+    try:
+        item_id = int(match.get('id'))
+    except (TypeError, ValueError):
+        return match['type'], None, None, None, 'id مطلوب'
+    match_date = match.get('date')
+    if isinstance(match_date, str):
+        match_date = parse_statement_date(match_date)
+    if match_date is None:
+        return match['type'], item_id, None, None, 'date: صيغة التاريخ يجب أن تكون YYYY-MM-DD'
+    return match['type'], item_id, match_date, match.get('reference'), None
+
+
+def _note(reference):
+    return f'تسوية كشف الحساب: {reference}' if reference else 'تسوية كشف الحساب'
+
+
+def _linked_payments(company_id, cheques):
+    """الدفعة المعلقة المرتبطة بكل شيك {معرف الشيك: معرف الدفعة}
+
+    الشيك يرتبط بدفعته مباشرة، أو (دون ربط) بدفعة نفس العقد وتاريخ الاستحقاق كما في التوقعات.
+    الحالتان باستعلامين على المفتاح وعلى تاريخ الاستحقاق المفهرس بدل ربط بشرط OR لا يستخدم الفهارس.
+    """
+    open_payments = set()
+    direct = {cheque.payment_id for cheque in cheques if cheque.payment_id}
+    for chunk in in_chunks(direct):
+        open_payments.update(db.session.execute(
+            select(ContractPayment.id)
+            .where(ContractPayment.id.in_(chunk), ContractPayment.status.in_(OPEN_PAYMENT_STATUSES))
+        ).scalars())
+
+    by_due = {}
+    dues = {(cheque.contract_id, cheque.due_date) for cheque in cheques
+            if not cheque.payment_id and cheque.contract_id}
+    for chunk in in_chunks({due_date for _, due_date in dues}):
+        for row in db.session.execute(
+            select(ContractPayment.id, ContractPayment.contract_id, ContractPayment.due_date)
+            .join(Contract, ContractPayment.contract_id == Contract.id)
+            .where(ContractPayment.due_date.in_(chunk), ContractPayment.status.in_(OPEN_PAYMENT_STATUSES),
+                   Contract.company_id == company_id)
+        ):
+            if (row.contract_id, row.due_date) in dues:
+                by_due.setdefault((row.contract_id, row.due_date), row.id)
+
+    linked = {}
+    for cheque in cheques:
+        if cheque.payment_id:
+            if cheque.payment_id in open_payments:
+                linked[cheque.id] = cheque.payment_id
+        elif (cheque.contract_id, cheque.due_date) in by_due:
+            linked[cheque.id] = by_due[(cheque.contract_id, cheque.due_date)]
+    return linked
+
+
+def apply_matches(company_id, matches):
+    """تطبيق المطابقات المؤكدة في معاملة واحدة
+
+    الدفعة تُسجل مدفوعة بتاريخ الحركة، والشيك يُسجل مصروفاً بتاريخ الحركة مع تسجيل دفعته
+    المرتبطة (إن كانت معلقة) مدفوعة بمبلغ الشيك، ونتيجتها ضمن نتيجة الشيك (payment). إذا
+    رُفضت الدفعة المرتبطة يفشل الشيك ولا يُصرف. التحقق والتحديث بالجملة لكل نوع.
+    """
+    if not isinstance(matches, list) or not matches:
+        raise ValueError('قائمة المطابقات مطلوبة')
+
+    parsed = [_parse_match(match) for match in matches]
+    cheque_ids = {item_id for match_type, item_id, _, _, error in parsed if match_type == 'cheque' and not error}
+    cheques = {}
+    for chunk in in_chunks(cheque_ids):
+        cheques.update((row.id, row) for row in db.session.execute(
+            select(Cheque.id, Cheque.amount, Cheque.status, Cheque.payment_id, Cheque.contract_id, Cheque.due_date)
+            .where(Cheque.id.in_(chunk), Cheque.company_id == company_id)
+        ))
+    linked = _linked_payments(company_id, cheques.values())
+
+    now = datetime.utcnow()
+    results = []
+    payments = []
+    # موضع نتيجة كل دفعة مسجلة، ونوع البند صاحب الدفعة (الدفعة نفسها أو الشيك المرتبط بها)
+    positions = []
+    clear_dates = {}
+    for match_type, item_id, match_date, reference, error in parsed:
+        if not error and match_type == 'cheque':
+            cheque = cheques.get(item_id)
+            if cheque is None:
+                error = 'الشيك غير موجود'
+            elif item_id in clear_dates:
+                error = 'الشيك مكرر في الطلب'
+            elif cheque.status not in OPEN_CHEQUE_STATUSES:
+                error = 'الشيك مصروف أو مرتجع أو ملغى'
+        if error:
+            results.append({'type': match_type, 'id': item_id, 'success': False, 'error': error})
+            continue
+
+        if match_type == 'payment':
+            payments.append((item_id, None, match_date, 'bank_transfer', _note(reference), None))
+            positions.append(('payment', len(results)))
+            results.append(None)
+            continue
+
+        clear_dates[item_id] = match_date
+        if item_id in linked:
+            payments.append((linked[item_id], cheque.amount, match_date, 'cheque', _note(reference), None))
+            positions.append(('cheque', len(results)))
+        results.append({'type': 'cheque', 'id': item_id, 'success': True, 'clear_date': match_date.isoformat()})
+
+    payment_results, paid = post_payments(company_id, payments, now) if payments else ([], 0)
+
+    for (owner, position), payment_result in zip(positions, payment_results):
+        payment_id = payment_result.pop('payment_id')
+        if owner == 'payment':
+            results[position] = {'type': 'payment', 'id': payment_id, **payment_result}
+        elif payment_result['success']:
+            results[position]['payment'] = {'id': payment_id, **payment_result}
+        else:
+            # الشيك لا يُصرف إذا رُفض تسجيل دفعته المرتبطة (مثلاً سُجلت في الطلب نفسه كمطابقة دفعة)
+            results[position] = {'type': 'cheque', 'id': results[position]['id'], 'success': False,
+                                 'payment_id': payment_id,
+                                 'error': f"الدفعة المرتبطة: {payment_result['error']}"}
+
+    cheque_params = [
+        {'b_id': result['id'], 'b_clear_date': clear_dates[result['id']], 'b_updated_at': now}
+        for result in results if result['type'] == 'cheque' and result['success']
+    ]
+    if cheque_params:
+        db.session.connection().execute(_CLEAR_CHEQUE, cheque_params)
+
+    applied = sum(1 for result in results if result['success'])
+    if applied:
+        db.session.commit()
+        invalidate_forecast(company_id)
+
+    return {
+        'total': len(results),
+        'applied': applied,
+        'failed': len(results) - applied,
+        'cheques_cleared': len(cheque_params),
+        'payments_paid': paid,
+        'results': results
+    }
+
+
+def reconcile_statement(company_id, stream, window_days=DEFAULT_WINDOW_DAYS, apply=False):
+    """مطابقة كشف حساب CSV وإرجاع التقرير، مع تطبيق المطابقات المؤكدة مباشرة عند apply"""
+    reconciler = StatementReconciler(company_id, window_days).run(stream)
+    report = reconciler.to_dict()
+    if apply:
+        matches = reconciler.confirmed_matches()
+        report['applied'] = apply_matches(company_id, matches) if matches else None
+    return report
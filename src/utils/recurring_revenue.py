@@ -0,0 +1,240 @@
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import event, select, func, and_
+from sqlalchemy.orm import Session
+from src.models.property import db, Unit
+from src.models.contract import Contract, RecurringRevenueMovement
+from src.utils.timeseries import bucket_start, bucket_range
+
+MRR_GROUPS = {
+    'building': 'building_id',
+    'unit_type': 'unit_type_id',
+    'contract_type': 'contract_type_id'
+}
+
+TRACKED_FIELDS = ('company_id', 'unit_id', 'contract_type_id', 'rent_amount', 'status', 'start_date')
+
+CENT = Decimal('0.01')
+
+
+def monthly_rent(rent_amount):
+    """الإيراد الشهري المعياري للعقد
+
+    جدولة الدفعات (create_contract_payments) تعامل rent_amount كإيجار شهري وتضربه في
+    عدد أشهر الفترة (3 للربع سنوي، 12 للسنوي...)، لذلك الإيراد الشهري هو rent_amount
+    أياً كان تكرار الدفع.
+    """
+    return Decimal(str(rent_amount or 0)).quantize(CENT)
+
+
+def _month(value):
+    return value.replace(day=1)
+
+
+# ===== تحديث الحركات عند تغيير العقود =====
+
+def _unit_dimensions(connection, unit_id):
+    row = connection.execute(
+        select(Unit.building_id, Unit.unit_type_id).where(Unit.id == unit_id)
+    ).one_or_none()
+    return (row.building_id, row.unit_type_id) if row else (None, None)
+
+
+def _contribution(connection, values, effective_date):
+    """مساهمة العقد في الإيراد الشهري: (مفتاح الحركة، المبلغ) أو None إذا لم يكن نشطاً"""
+    # الحالة الافتراضية لا تُطبق إلا عند الإدراج
+    if (values['status'] or 'active') != 'active' or not values['company_id'] or not values['unit_id']:
+        return None
+    building_id, unit_type_id = _unit_dimensions(connection, values['unit_id'])
+    month = _month(max(values['start_date'] or effective_date, effective_date))
+    key = (values['company_id'], month, building_id, unit_type_id, values['contract_type_id'])
+    return key, monthly_rent(values['rent_amount'])
+
+
+def _previous_values(session, contract):
+    """القيم المخزنة للعقد قبل التعديل"""
+    state = db.inspect(contract)
+    values = {}
+    for name in TRACKED_FIELDS:
+        history = state.attrs[name].history
+        if history.deleted:
+            values[name] = history.deleted[0]
+        elif history.unchanged:
+            values[name] = history.unchanged[0]
+        elif not history.added:
+            values[name] = getattr(contract, name)
+
+    missing = [name for name in TRACKED_FIELDS if name not in values]
+    if missing:
+        row = session.connection().execute(
+            select(*[getattr(Contract, name) for name in missing]).where(Contract.id == contract.id)
+        ).one_or_none()
+        for index, name in enumerate(missing):
+            values[name] = row[index] if row else None
+    return values
+
+
+def _current_values(contract):
+    return {name: getattr(contract, name) for name in TRACKED_FIELDS}
+
+
+def apply_mrr_deltas(connection, deltas):
+    """إضافة الفروقات إلى صفوف الحركات الشهرية (ينشئ الصف إذا لم يكن موجوداً)"""
+    table = RecurringRevenueMovement.__table__
+    now = datetime.utcnow()
+    for (company_id, month, building_id, unit_type_id, contract_type_id), delta in deltas.items():
+        if not delta:
+            continue
+        conditions = [table.c.company_id == company_id, table.c.month == month]
+        for column, value in (('building_id', building_id), ('unit_type_id', unit_type_id),
+                              ('contract_type_id', contract_type_id)):
+            conditions.append(table.c[column].is_(None) if value is None else table.c[column] == value)
+        result = connection.execute(
+            table.update().where(and_(*conditions)).values(mrr_change=table.c.mrr_change + delta, updated_at=now)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(
+                company_id=company_id, month=month, building_id=building_id, unit_type_id=unit_type_id,
+                contract_type_id=contract_type_id, mrr_change=delta, updated_at=now
+            ))
+
+
+@event.listens_for(Session, 'before_flush')
+def track_contract_changes(session, flush_context, instances):
+    """تسجيل تغير الإيراد الشهري ضمن نفس المعاملة عند إنشاء العقود أو تغيير حالتها أو إيجارها"""
+    deltas = defaultdict(Decimal)
+    today = date.today()
+    connection = None
+
+    for obj in session.new:
+        if isinstance(obj, Contract):
+            connection = connection or session.connection()
+            # العقد الجديد يضاف من شهر بدايته
+            new = _contribution(connection, _current_values(obj), obj.start_date or today)
+            if new:
+                deltas[new[0]] += new[1]
+
+    for obj in session.dirty:
+        if not isinstance(obj, Contract):
+            continue
+        state = db.inspect(obj)
+        if not any(state.attrs[name].history.has_changes() for name in TRACKED_FIELDS):
+            continue
+        connection = connection or session.connection()
+        old = _contribution(connection, _previous_values(session, obj), today)
+        new = _contribution(connection, _current_values(obj), today)
+        if old:
+            deltas[old[0]] -= old[1]
+        if new:
+            deltas[new[0]] += new[1]
+
+    for obj in session.deleted:
+        if isinstance(obj, Contract):
+            connection = connection or session.connection()
+            old = _contribution(connection, _previous_values(session, obj), today)
+            if old:
+                deltas[old[0]] -= old[1]
+
+    if any(deltas.values()):
+        apply_mrr_deltas(connection, deltas)
+
+
+# ===== القراءة =====
+
+def current_mrr(company_id, group_by=None, as_of=None):
+    """الإيراد الشهري المتكرر الحالي (مجموع الحركات حتى الشهر الحالي)"""
+    month = _month(as_of or date.today())
+    filters = and_(
+        RecurringRevenueMovement.company_id == company_id,
+        RecurringRevenueMovement.month <= month
+    )
+    total = func.coalesce(func.sum(RecurringRevenueMovement.mrr_change), 0)
+
+    if group_by is None:
+        return Decimal(db.session.execute(select(total).where(filters)).scalar() or 0)
+
+    column = getattr(RecurringRevenueMovement, MRR_GROUPS[group_by])
+    rows = db.session.execute(select(column, total).where(filters).group_by(column)).all()
+    return {key: Decimal(value or 0) for key, value in rows if value}
+
+
+def mrr_series(company_id, granularity, start_date, end_date, group_by=None):
+    """قيمة الإيراد الشهري المتكرر في نهاية كل فترة (رصيد افتتاحي + مجموع تراكمي للحركات)"""
+    if granularity not in ('month', 'quarter', 'year'):
+        raise ValueError(f'دقة غير مدعومة: {granularity}')
+    buckets = bucket_range(start_date, end_date, granularity)
+    first_month = buckets[0]
+
+    column = getattr(RecurringRevenueMovement, MRR_GROUPS[group_by]) if group_by else None
+    key_columns = [column] if column is not None else []
+
+    stmt = select(
+        RecurringRevenueMovement.month, *key_columns, func.sum(RecurringRevenueMovement.mrr_change)
+    ).where(and_(
+        RecurringRevenueMovement.company_id == company_id,
+        RecurringRevenueMovement.month <= end_date
+    )).group_by(RecurringRevenueMovement.month, *key_columns)
+
+    opening = defaultdict(Decimal)
+    changes = defaultdict(lambda: defaultdict(Decimal))
+    for row in db.session.execute(stmt):
+        month, value = row[0], Decimal(row[-1] or 0)
+        key = row[1] if column is not None else None
+        if month < first_month:
+            opening[key] += value
+        else:
+            changes[bucket_start(month, granularity)][key] += value
+
+    running = dict(opening)
+    series = []
+    for bucket in buckets:
+        for key, value in changes.get(bucket, {}).items():
+            running[key] = running.get(key, Decimal(0)) + value
+        item = {
+            'period': bucket.isoformat(),
+            'mrr': float(sum(running.values(), Decimal(0))),
+            'net_change': float(sum(changes.get(bucket, {}).values(), Decimal(0)))
+        }
+        item['arr'] = round(item['mrr'] * 12, 2)
+        if column is not None:
+            item['groups'] = [{'key': key, 'mrr': float(value)} for key, value in running.items() if value]
+        series.append(item)
+    return series
+
+
+# ===== إعادة البناء =====
+
+def rebuild_mrr(company_id=None):
+    """إعادة بناء الحركات من العقود النشطة (كل عقد يضاف في شهر بدايته)
+
+    إعادة البناء تفقد تاريخ الإنهاءات السابقة، لذلك تستخدم فقط لتهيئة جدول جديد أو
+    بعد تعديل مباشر على قاعدة البيانات.
+    """
+    query = db.session.query(
+        Contract.company_id, Contract.start_date, Contract.rent_amount,
+        Contract.contract_type_id, Unit.building_id, Unit.unit_type_id
+    ).join(Unit, Contract.unit_id == Unit.id).filter(Contract.status == 'active')
+    delete = RecurringRevenueMovement.query
+    if company_id:
+        query = query.filter(Contract.company_id == company_id)
+        delete = delete.filter_by(company_id=company_id)
+
+    deltas = defaultdict(Decimal)
+    for row in query.all():
+        key = (row.company_id, _month(row.start_date), row.building_id, row.unit_type_id, row.contract_type_id)
+        deltas[key] += monthly_rent(row.rent_amount)
+
+    delete.delete(synchronize_session=False)
+    apply_mrr_deltas(db.session.connection(), deltas)
+    db.session.commit()
+    return len(deltas)
+
+
+def seed_mrr():
+    """تعبئة الحركات لقاعدة بيانات قائمة قبل إضافة جدولها (عند خلوه ووجود عقود نشطة)"""
+    if db.session.query(RecurringRevenueMovement.id).first() is not None:
+        return 0
+    if db.session.query(Contract.id).filter(Contract.status == 'active').first() is None:
+        return 0
+    return rebuild_mrr()
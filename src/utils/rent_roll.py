@@ -0,0 +1,120 @@
+import csv
+import io
+import json
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import select, func, and_
+from src.models.property import db, Building, Unit
+from src.models.contract import Contract, ContractPayment, Person
+
+# عدد الصفوف التي تُجلب من قاعدة البيانات في كل دفعة أثناء البث
+STREAM_BATCH_SIZE = 1000
+
+RENT_ROLL_FIELDS = (
+    'building_id', 'building_name', 'unit_id', 'unit_number', 'floor_number', 'unit_status',
+    'area', 'bedrooms', 'market_rent', 'contract_id', 'contract_number', 'tenant_id',
+    'tenant_name', 'tenant_phone', 'start_date', 'end_date', 'rent_amount', 'payment_frequency',
+    'next_due_date', 'next_due_amount'
+)
+
+
+def rent_roll_statement(company_id, building_id=None):
+    """استعلام واحد يربط الوحدات بالعقد النشط والمستأجر وأقرب دفعة معلقة
+
+    يتم اختيار العقد النشط الأحدث لكل وحدة وأقرب دفعة معلقة لكل عقد بدالة
+    ROW_NUMBER() بدلاً من استعلام مستقل لكل وحدة.
+    """
+    active_contract = select(
+        Contract.id, Contract.unit_id, Contract.tenant_id, Contract.contract_number,
+        Contract.start_date, Contract.end_date, Contract.rent_amount, Contract.payment_frequency,
+        func.row_number().over(
+            partition_by=Contract.unit_id, order_by=(Contract.start_date.desc(), Contract.id.desc())
+        ).label('position')
+    ).where(and_(Contract.company_id == company_id, Contract.status == 'active')).subquery('active_contract')
+
+    next_payment = select(
+        ContractPayment.contract_id, ContractPayment.due_date, ContractPayment.amount,
+        func.row_number().over(
+            partition_by=ContractPayment.contract_id, order_by=(ContractPayment.due_date, ContractPayment.id)
+        ).label('position')
+    ).join(Contract, ContractPayment.contract_id == Contract.id).where(and_(
+        Contract.company_id == company_id,
+        Contract.status == 'active',
+        ContractPayment.status == 'pending'
+    )).subquery('next_payment')
+
+    stmt = select(
+        Building.id.label('building_id'),
+        Building.name.label('building_name'),
+        Unit.id.label('unit_id'),
+        Unit.unit_number,
+        Unit.floor_number,
+        Unit.status.label('unit_status'),
+        Unit.area,
+        Unit.bedrooms,
+        Unit.current_rent.label('market_rent'),
+        active_contract.c.id.label('contract_id'),
+        active_contract.c.contract_number,
+        active_contract.c.tenant_id,
+        (Person.first_name + ' ' + Person.last_name).label('tenant_name'),
+        Person.phone.label('tenant_phone'),
+        active_contract.c.start_date,
+        active_contract.c.end_date,
+        active_contract.c.rent_amount,
+        active_contract.c.payment_frequency,
+        next_payment.c.due_date.label('next_due_date'),
+        next_payment.c.amount.label('next_due_amount')
+    ).select_from(Unit).join(
+        Building, Unit.building_id == Building.id
+    ).outerjoin(
+        active_contract, and_(active_contract.c.unit_id == Unit.id, active_contract.c.position == 1)
+    ).outerjoin(
+        Person, Person.id == active_contract.c.tenant_id
+    ).outerjoin(
+        next_payment, and_(next_payment.c.contract_id == active_contract.c.id, next_payment.c.position == 1)
+    ).where(and_(
+        Unit.company_id == company_id,
+        Unit.is_active == True
+    )).order_by(Building.name, Building.id, Unit.unit_number, Unit.id)
+
+    if building_id:
+        stmt = stmt.where(Unit.building_id == building_id)
+    return stmt
+
+
+def _serialize(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def iter_rent_roll(company_id, building_id=None):
+    """صفوف جدول الإيجارات كقواميس مع جلبها من الخادم على دفعات (yield_per)"""
+    stmt = rent_roll_statement(company_id, building_id).execution_options(yield_per=STREAM_BATCH_SIZE)
+    for row in db.session.execute(stmt):
+        yield {field: _serialize(row._mapping[field]) for field in RENT_ROLL_FIELDS}
+
+
+def stream_jsonl(rows):
+    """تحويل الصفوف إلى أسطر JSON (سطر لكل وحدة)"""
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def stream_csv(rows):
+    """تحويل الصفوف إلى CSV سطراً بسطر دون تجميع الملف في الذاكرة"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    # علامة BOM ليتعرف Excel على الترميز العربي
+    buffer.write('\ufeff')
+    writer.writerow(RENT_ROLL_FIELDS)
+    yield buffer.getvalue()
+
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow([row[field] for field in RENT_ROLL_FIELDS])
+        yield buffer.getvalue()
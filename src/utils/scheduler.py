@@ -2,6 +2,8 @@ import schedule
 import time
 import threading
 from src.routes.notifications import NotificationService
+from src.utils.occupancy import reconcile_occupancy
+from src.utils.snapshots import run_nightly
 
 class NotificationScheduler:
     """جدولة التنبيهات التلقائية"""
@@ -22,6 +24,12 @@ class NotificationScheduler:
             # جدولة معالجة التنبيهات اليومية في الساعة 9 صباحاً
             schedule.every().day.at("09:00").do(self._process_daily_notifications)
             
+            # مطابقة عدادات الإشغال يومياً في الساعة 2 صباحاً
+            schedule.every().day.at("02:00").do(self._reconcile_occupancy)
+            
+            # لقطة الإشغال اليومية وضغط اللقطات القديمة
+            schedule.every().day.at("23:50").do(self._snapshot_occupancy)
+            
             # بدء الخيط
             self.thread = threading.Thread(target=self._run_scheduler)
             self.thread.daemon = True
@@ -56,4 +64,21 @@ class NotificationScheduler:
                 print(f"تم معالجة التنبيهات اليومية في {time.strftime('%Y-%m-%d %H:%M:%S')}")
             except Exception as e:
                 print(f"خطأ في معالجة التنبيهات اليومية: {e}")
-
+    
+    def _reconcile_occupancy(self):
+        """مطابقة عدادات الإشغال مع جدول الوحدات"""
+        with self.app.app_context():
+            try:
+                fixes = reconcile_occupancy()
+                print(f"تمت مطابقة عدادات الإشغال ({len(fixes)} تصحيح) في {time.strftime('%Y-%m-%d %H:%M:%S')}")
+            except Exception as e:
+                print(f"خطأ في مطابقة عدادات الإشغال: {e}")
+    
+    def _snapshot_occupancy(self):
+        """أخذ لقطة الإشغال اليومية"""
+        with self.app.app_context():
+            try:
+                result = run_nightly()
+                print(f"تم تسجيل لقطة الإشغال ({result['buildings']} مبنى) في {time.strftime('%Y-%m-%d %H:%M:%S')}")
+            except Exception as e:
+                print(f"خطأ في تسجيل لقطة الإشغال: {e}")
@@ -0,0 +1,63 @@
+from sqlalchemy import inspect, text
+from src.models.property import db, DocumentSequence
+from src.utils.fulltext import ensure_person_search
+from src.utils.normalization import backfill_search_columns
+from src.utils.occupancy import seed_occupancy_counters
+from src.utils.financial_summary import seed_summary
+from src.utils.recurring_revenue import seed_mrr
+from src.utils.search_index import ensure_search_index
+
+
+def ensure_schema():
+    """إنشاء الجداول ثم إضافة الأعمدة والفهارس الجديدة إلى قاعدة بيانات قائمة
+
+    db.create_all() لا يعدّل الجداول الموجودة، لذلك نضيف هنا ما ينقصها من
+    أعمدة (ALTER TABLE ... ADD COLUMN) وفهارس عند بدء التطبيق.
+    """
+    db.create_all()
+
+    inspector = inspect(db.engine)
+
+    # صفوف التسلسل كانت لكل شركة؛ أصبحت صفاً واحداً لكل نوع وسنة، فيُعاد إنشاء الجدول
+    # (كل صف يُنشأ من جديد عند أول استخدام بادئاً من أكبر رقم موجود)
+    sequences = DocumentSequence.__table__
+    if 'company_id' in {column['name'] for column in inspector.get_columns(sequences.name)}:
+        sequences.drop(db.engine)
+        sequences.create(db.engine)
+        inspector = inspect(db.engine)
+    dialect = db.engine.dialect
+
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_type = column.type.compile(dialect=dialect)
+            with db.engine.begin() as connection:
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(db.engine)
+
+    # أعمدة البحث الموحدة للصفوف التي سبقت إضافة الأعمدة
+    backfill_search_columns()
+
+    # فهرس البحث النصي للأشخاص (SQLite فقط)
+    ensure_person_search()
+
+    # فهرس البحث الشامل (SQLite فقط)
+    ensure_search_index()
+
+    # عدادات الإشغال لقاعدة قائمة قبل إضافة جدولها (لوحات الإحصائيات تقرأ العدادات فقط)
+    seed_occupancy_counters()
+
+    # الملخص المالي الشهري لقاعدة قائمة (التقارير المالية تقرأ الملخص فقط)
+    seed_summary()
+
+    # حركات الإيراد الشهري المتكرر لقاعدة قائمة
+    seed_mrr()
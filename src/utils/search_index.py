@@ -0,0 +1,353 @@
+import re
+import weakref
+from collections import defaultdict
+from sqlalchemy import event, select, text, func, column, Integer
+from sqlalchemy.orm import Session
+from src.models.property import db, Building, Unit
+from src.models.contract import Person, Contract, Cheque
+from src.models.finance import Expense
+from src.utils.normalization import normalize_text, search_condition
+
+SEARCH_TABLE = 'search_index'
+
+# أعمدة الفهرس: company لعزل الشركات داخل الفهرس نفسه، title وbody للنص الموحد،
+# والباقي مخزن فقط لعرض النتيجة
+SEARCH_TABLE_COLUMNS = ('company', 'title', 'body', 'label', 'entity_type', 'entity_id')
+
+# أوزان bm25 لكل عمود مفهرس: لا وزن لعمود الشركة، ومطابقة العنوان أهم من التفاصيل
+RANK_WEIGHTS = (0.0, 10.0, 1.0)
+
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 50
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+# قواعد البيانات التي أنشئ فيها الفهرس (المستمع لا يعمل قبل ensure_search_index)
+_ready_engines = weakref.WeakSet()
+
+
+def _building_documents():
+    return select(
+        Building.id, Building.company_id, Building.name.label('label'),
+        Building.name, Building.name_en, Building.address, Building.address_en
+    ).where(Building.is_active == True), 2
+
+
+def _unit_documents():
+    return select(
+        Unit.id, Unit.company_id, (Building.name + ' - ' + Unit.unit_number).label('label'),
+        Unit.unit_number, Building.name, Building.name_en, Unit.description
+    ).join(Building, Unit.building_id == Building.id).where(Unit.is_active == True), 1
+
+
+def _person_documents():
+    return select(
+        Person.id, Person.company_id, (Person.first_name + ' ' + Person.last_name).label('label'),
+        Person.first_name, Person.last_name, Person.first_name_en, Person.last_name_en,
+        Person.id_number, Person.phone_e164, Person.mobile_e164, Person.email
+    ).where(Person.is_active == True), 4
+
+
+def _contract_documents():
+    return select(
+        Contract.id, Contract.company_id, Contract.contract_number.label('label'),
+        Contract.contract_number, Person.first_name, Person.last_name, Unit.unit_number, Building.name
+    ).join(Person, Contract.tenant_id == Person.id).join(
+        Unit, Contract.unit_id == Unit.id
+    ).join(Building, Unit.building_id == Building.id), 1
+
+
+def _cheque_documents():
+    return select(
+        Cheque.id, Cheque.company_id, Cheque.cheque_number.label('label'),
+        Cheque.cheque_number, Cheque.bank_name, Cheque.account_number, Contract.contract_number
+    ).outerjoin(Contract, Cheque.contract_id == Contract.id), 1
+
+
+def _expense_documents():
+    return select(
+        Expense.id, Expense.company_id, Expense.expense_number.label('label'),
+        Expense.expense_number, Expense.invoice_number, Expense.vendor_name, Expense.description
+    ), 2
+
+
+# لكل نوع: الرمز (جزء من rowid في الفهرس)، النموذج، الحقول التي يعاد الفهرسة عند تغيرها،
+# واستعلام المستند: (المعرف، الشركة، نص العرض، حقول العنوان...، حقول التفاصيل...) مع عدد حقول العنوان
+SEARCH_ENTITIES = {
+    'building': {
+        'code': 1, 'model': Building, 'documents': _building_documents,
+        'fields': ('name', 'name_en', 'address', 'address_en', 'is_active')
+    },
+    'unit': {
+        'code': 2, 'model': Unit, 'documents': _unit_documents,
+        'fields': ('unit_number', 'building_id', 'description', 'is_active')
+    },
+    'person': {
+        'code': 3, 'model': Person, 'documents': _person_documents,
+        'fields': ('first_name', 'last_name', 'first_name_en', 'last_name_en', 'id_number',
+                   'phone', 'mobile', 'email', 'is_active')
+    },
+    'contract': {
+        'code': 4, 'model': Contract, 'documents': _contract_documents,
+        'fields': ('contract_number', 'tenant_id', 'unit_id')
+    },
+    'cheque': {
+        'code': 5, 'model': Cheque, 'documents': _cheque_documents,
+        'fields': ('cheque_number', 'bank_name', 'account_number', 'contract_id')
+    },
+    'expense': {
+        'code': 6, 'model': Expense, 'documents': _expense_documents,
+        'fields': ('expense_number', 'invoice_number', 'vendor_name', 'description')
+    }
+}
+
+_MODEL_TYPES = {entry['model']: entity_type for entity_type, entry in SEARCH_ENTITIES.items()}
+
+_CODE_BITS = 3
+
+# الأنواع التي يتضمن مستندها حقولاً من نوع آخر: تعاد فهرستها عند تغيره
+DEPENDENTS = {
+    'building': (
+        ('unit', lambda ids: select(Unit.id).where(Unit.building_id.in_(ids))),
+        ('contract', lambda ids: select(Contract.id).join(Unit, Contract.unit_id == Unit.id)
+                                 .where(Unit.building_id.in_(ids)))
+    ),
+    'unit': (('contract', lambda ids: select(Contract.id).where(Contract.unit_id.in_(ids))),),
+    'person': (('contract', lambda ids: select(Contract.id).where(Contract.tenant_id.in_(ids))),),
+    'contract': (('cheque', lambda ids: select(Cheque.id).where(Cheque.contract_id.in_(ids))),)
+}
+
+
+def _rowid(entity_type, entity_id):
+    """معرف الصف في الفهرس: معرف الكائن مع رمز النوع في البتات الدنيا"""
+    return (entity_id << _CODE_BITS) | SEARCH_ENTITIES[entity_type]['code']
+
+
+def _company_token(company_id):
+    return f'c{company_id}'
+
+
+def search_available():
+    """هل البحث الشامل عبر فهرس FTS5 متاح (SQLite)"""
+    return db.engine.dialect.name == 'sqlite'
+
+
+# ===== بناء الفهرس وتحديثه =====
+
+def _index_documents(connection, entity_type, ids=None, inserted=False):
+    """حذف مستندات الكائنات من الفهرس ثم إدراج المستندات الحالية للموجود منها
+
+    inserted: الكائنات جديدة (إدراج بالجملة) فلا توجد مستندات سابقة لحذفها.
+    """
+    entry = SEARCH_ENTITIES[entity_type]
+    stmt, title_fields = entry['documents']()
+    model = entry['model']
+
+    if ids is not None:
+        ids = list(ids)
+        if not ids:
+            return 0
+        if not inserted:
+            connection.execute(
+                text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = :rowid"),
+                [{'rowid': _rowid(entity_type, entity_id)} for entity_id in ids]
+            )
+        stmt = stmt.where(model.id.in_(ids))
+
+    rows = []
+    for row in connection.execute(stmt):
+        entity_id, company_id, label = row[0], row[1], row[2]
+        fields = row[3:]
+        rows.append((
+            _rowid(entity_type, entity_id),
+            _company_token(company_id),
+            normalize_text(' '.join(str(value) for value in fields[:title_fields] if value)),
+            normalize_text(' '.join(str(value) for value in fields[title_fields:] if value)),
+            label,
+            entity_type,
+            entity_id
+        ))
+    if rows:
+        # إدراج مباشر عبر المشغّل (executemany) بدون معالجة المعاملات في SQLAlchemy لكل صف
+        connection.exec_driver_sql(
+            f"INSERT INTO {SEARCH_TABLE}(rowid, {', '.join(SEARCH_TABLE_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+    return len(rows)
+
+
+def ensure_search_index():
+    """إنشاء فهرس البحث الشامل (FTS5) وبناؤه من البيانات الحالية عند إنشائه لأول مرة"""
+    if not search_available():
+        return False
+
+    with db.engine.begin() as connection:
+        existing_columns = [row[1] for row in connection.execute(text(f"PRAGMA table_info({SEARCH_TABLE})"))]
+        exists = bool(existing_columns)
+        if exists and tuple(existing_columns) != SEARCH_TABLE_COLUMNS:
+            connection.execute(text(f"DROP TABLE {SEARCH_TABLE}"))
+            exists = False
+
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            f"company, title, body, label UNINDEXED, entity_type UNINDEXED, entity_id UNINDEXED, "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        ))
+        if not exists:
+            for entity_type in SEARCH_ENTITIES:
+                _index_documents(connection, entity_type)
+
+    _ready_engines.add(db.engine)
+    return True
+
+
+def rebuild_search_index():
+    """إعادة بناء فهرس البحث الشامل بالكامل (بعد الكتابة المباشرة التي لا تمر بأحداث ORM)"""
+    if not search_available():
+        return 0
+    documents = 0
+    with db.engine.begin() as connection:
+        connection.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+        for entity_type in SEARCH_ENTITIES:
+            documents += _index_documents(connection, entity_type)
+        connection.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')"))
+    return documents
+
+
+def reindex(connection, changes, inserted=False):
+    """إعادة فهرسة الكائنات المتغيرة ({النوع: معرفات}) مع الأنواع التي تعتمد عليها
+
+    تستدعى من مستمع ORM، ومباشرة بعد الإدراج بالجملة الذي لا يمر بأحداث ORM
+    (inserted=True: جميع الكائنات جديدة، فلا مستندات سابقة ولا توابع غير مدرجة معها).
+    """
+    if connection.engine not in _ready_engines:
+        return
+    pending = defaultdict(set)
+    for entity_type, ids in changes.items():
+        pending[entity_type].update(ids)
+        if inserted:
+            continue
+        for dependent_type, dependent_ids in DEPENDENTS.get(entity_type, ()):
+            pending[dependent_type].update(connection.execute(dependent_ids(list(ids))).scalars())
+
+    for entity_type in SEARCH_ENTITIES:
+        if pending.get(entity_type):
+            _index_documents(connection, entity_type, pending[entity_type], inserted)
+
+
+@event.listens_for(Session, 'after_flush')
+def update_search_index(session, flush_context):
+    """تحديث فهرس البحث الشامل داخل نفس المعاملة بعد كتابة الكائنات القابلة للبحث"""
+    changes = defaultdict(set)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        entity_type = _MODEL_TYPES.get(type(obj))
+        if not entity_type or obj.id is None:
+            continue
+        if obj in session.dirty:
+            state = db.inspect(obj)
+            if not any(state.attrs[field].history.has_changes() for field in SEARCH_ENTITIES[entity_type]['fields']):
+                continue
+        changes[entity_type].add(obj.id)
+
+    if changes:
+        reindex(session.connection(), changes)
+
+
+# ===== البحث =====
+
+def search_match(company_id, search):
+    """استعلام FTS5: رمز الشركة مطلوب، وكل كلمة (بعد التوحيد) كبادئة في العنوان أو التفاصيل"""
+    tokens = _TOKEN.findall(normalize_text(search))
+    if not tokens:
+        return None
+    words = ' '.join(f'"{token}"*' for token in tokens)
+    return f'company : "{_company_token(company_id)}" AND {{title body}} : ({words})'
+
+
+def global_search(company_id, search, types=None, limit=DEFAULT_LIMIT):
+    """البحث في جميع الأنواع باستعلام واحد: أفضل النتائج لكل نوع مرتبة حسب الصلة مع العدد الكلي لكل نوع"""
+    types = list(types or SEARCH_ENTITIES)
+    unknown = [entity_type for entity_type in types if entity_type not in SEARCH_ENTITIES]
+    if unknown:
+        raise ValueError(f'أنواع غير مدعومة: {", ".join(unknown)}')
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    if not search_available():
+        return _fallback_search(company_id, search, types, limit)
+
+    match = search_match(company_id, search)
+    if not match:
+        return [], {}
+
+    type_params = {f'type_{index}': entity_type for index, entity_type in enumerate(types)}
+    type_filter = ', '.join(f':{name}' for name in type_params)
+    weights = ', '.join(str(weight) for weight in RANK_WEIGHTS)
+
+    # MATERIALIZED: تنفيذ MATCH مرة واحدة ثم الترقيم والعد لكل نوع على النتائج فقط
+    rows = db.session.execute(text(
+        f"WITH matches AS MATERIALIZED ("
+        f"  SELECT entity_type, entity_id, label, bm25({SEARCH_TABLE}, {weights}) AS score"
+        f"  FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match AND entity_type IN ({type_filter})"
+        f"), ranked AS ("
+        f"  SELECT *, ROW_NUMBER() OVER (PARTITION BY entity_type ORDER BY score, entity_id) AS position,"
+        f"         COUNT(*) OVER (PARTITION BY entity_type) AS type_total"
+        f"  FROM matches"
+        f") SELECT entity_type, entity_id, label, score, type_total FROM ranked"
+        f" WHERE position <= :limit ORDER BY score, entity_type, entity_id"
+    ), {'match': match, 'limit': limit, **type_params}).all()
+
+    results = []
+    totals = {}
+    for entity_type, entity_id, label, score, type_total in rows:
+        totals[entity_type] = type_total
+        # bm25 سالبة في FTS5: نعكس الإشارة لتكون الدرجة الأعلى هي الأكثر صلة
+        results.append({'type': entity_type, 'id': entity_id, 'label': label, 'score': round(-score, 4)})
+    return results, totals
+
+
+def search_filter(model, search_column, company_id, search):
+    """شرط معامل search في قوائم الصفحات، مدعوم بفهرس في الحالتين
+
+    الأنواع المفهرسة في FTS5 تُطابق كل كلمة كبادئة عبر الفهرس الشامل (فالبحث يجد الكلمة
+    الثانية في الاسم أو اسم المورد في المصروف)، والأنواع الأخرى أو قواعد البيانات الأخرى
+    تُطابق ببادئة العمود الموحد (search_condition).
+    """
+    entity_type = _MODEL_TYPES.get(model)
+    match = search_match(company_id, search) if entity_type and search_available() else None
+    if not match:
+        return search_condition(search_column, search)
+    matches = text(
+        f"SELECT entity_id FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match AND entity_type = :entity_type"
+    ).bindparams(match=match, entity_type=entity_type).columns(column('entity_id', Integer))
+    return model.id.in_(matches)
+
+
+def _fallback_search(company_id, search, types, limit):
+    """البحث بدون FTS5 (قواعد بيانات أخرى): بادئة أعمدة البحث الموحدة لكل نوع
+
+    أرقام العقود والشيكات ليس لها عمود موحد، فتُقارن بحروف صغيرة مثل نص البحث الموحد.
+    """
+    if not normalize_text(search):
+        return [], {}
+    columns = {
+        'building': Building.search_name,
+        'unit': Unit.search_name,
+        'person': Person.search_name,
+        'contract': func.lower(Contract.contract_number),
+        'cheque': func.lower(Cheque.cheque_number),
+        'expense': Expense.search_name
+    }
+    results = []
+    totals = {}
+    for entity_type in types:
+        entry = SEARCH_ENTITIES[entity_type]
+        model = entry['model']
+        stmt, _ = entry['documents']()
+        stmt = stmt.where(model.company_id == company_id, search_condition(columns[entity_type], search))
+        count = db.session.execute(select(func.count()).select_from(stmt.subquery())).scalar()
+        if not count:
+            continue
+        totals[entity_type] = count
+        for row in db.session.execute(stmt.order_by(model.id).limit(limit)):
+            results.append({'type': entity_type, 'id': row[0], 'label': row[2], 'score': None})
+    return results, totals
@@ -0,0 +1,135 @@
+import threading
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select, func, and_, cast, Integer
+from sqlalchemy.dialects import sqlite, postgresql
+from src.models.property import db, DocumentSequence
+from src.models.contract import Contract
+from src.models.finance import Expense, MaintenanceRequest
+
+# نوع المستند ← (البادئة، النموذج، عمود الرقم)
+SEQUENCE_TYPES = {
+    'contract': ('CNT', Contract, 'contract_number'),
+    'expense': ('EXP', Expense, 'expense_number'),
+    'maintenance': ('MNT', MaintenanceRequest, 'request_number')
+}
+
+# عدد الأرقام التي يحجزها كل عامل مسبقاً في next_number إن لم يُضبط DOCUMENT_NUMBER_BLOCK_SIZE
+# في إعدادات التطبيق (1 = حجز كل رقم ضمن معاملة الطلب نفسها بلا فجوات؛ الأكبر يقلل الكتابة
+# على صف التسلسل لكن يترك فجوات عند إعادة التشغيل)
+DEFAULT_BLOCK_SIZE = 1
+
+_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def format_number(document_type, year, value):
+    prefix = SEQUENCE_TYPES[document_type][0]
+    return f'{prefix}-{year}-{value:04d}'
+
+
+def _number_column(document_type):
+    _, model, column = SEQUENCE_TYPES[document_type]
+    return getattr(model, column)
+
+
+def _existing_max(connection, document_type, year):
+    """أكبر قيمة مستخدمة بالبادئة والسنة (الأرقام المولدة سابقاً بالعد، في كل الشركات لأن الرقم فريد)"""
+    prefix = format_number(document_type, year, 0)[:-4]
+    column = _number_column(document_type)
+    value = connection.execute(
+        select(func.max(cast(func.substr(column, len(prefix) + 1), Integer))).where(column.like(f'{prefix}%'))
+    ).scalar()
+    return value or 0
+
+
+def allocate(connection, document_type, count=1, year=None):
+    """حجز count قيمة متتالية بزيادة ذرية واحدة لصف التسلسل، وإرجاع (السنة، أول قيمة)
+
+    أرقام المستندات فريدة على مستوى كل الشركات، فلكل نوع وسنة صف تسلسل واحد مشترك هو
+    المصدر الوحيد للقيم. UPDATE ... RETURNING يزيد القيمة ويقرؤها في جملة واحدة، فلا يحصل
+    عاملان متزامنان (من الشركة نفسها أو من شركتين) على القيمة نفسها. الصف يُنشأ عند أول
+    استخدام بادئاً من أكبر رقم موجود.
+    """
+    if document_type not in SEQUENCE_TYPES:
+        raise ValueError(f'نوع مستند غير مدعوم: {document_type}')
+    year = year or datetime.now().year
+    table = DocumentSequence.__table__
+    conditions = and_(table.c.document_type == document_type, table.c.year == year)
+    increment = table.update().where(conditions).values(
+        last_value=table.c.last_value + count, updated_at=datetime.utcnow()
+    )
+
+    def take():
+        if connection.dialect.update_returning:
+            return connection.execute(increment.returning(table.c.last_value)).scalar()
+        if connection.execute(increment).rowcount == 0:
+            return None
+        return connection.execute(select(table.c.last_value).where(conditions)).scalar()
+
+    last_value = take()
+    if last_value is None:
+        values = {
+            'document_type': document_type, 'year': year,
+            'last_value': _existing_max(connection, document_type, year), 'updated_at': datetime.utcnow()
+        }
+        dialect_insert = _INSERTS.get(connection.dialect.name)
+        if dialect_insert:
+            # عاملان ينشئان الصف معاً: الثاني يتجاهل التعارض ويكمل بالزيادة
+            connection.execute(dialect_insert(table).values(values).on_conflict_do_nothing(
+                index_elements=['document_type', 'year']
+            ))
+        else:
+            connection.execute(table.insert().values(values))
+        last_value = take()
+    return year, last_value - count + 1
+
+
+def reserve_numbers(document_type, count, connection=None, year=None):
+    """حجز count رقم مستند منسق
+
+    بدون connection يُحجز في معاملة مستقلة تُثبت فوراً (الأرقام لا تعود عند فشل الطلب).
+    أي رقم موجود مسبقاً (مُدخل يدوياً أو مستورد) يُتخطى ويُحجز بدلاً منه، باستعلام واحد لكل دفعة.
+    """
+    if connection is None:
+        with db.engine.begin() as own_connection:
+            return reserve_numbers(document_type, count, own_connection, year)
+
+    numbers = []
+    while len(numbers) < count:
+        needed = count - len(numbers)
+        year, first = allocate(connection, document_type, needed, year)
+        column = _number_column(document_type)
+        candidates = [format_number(document_type, year, value) for value in range(first, first + needed)]
+        taken = set(connection.execute(select(column).where(column.in_(candidates))).scalars())
+        numbers.extend(number for number in candidates if number not in taken)
+    return numbers
+
+
+_blocks = {}
+_blocks_lock = threading.Lock()
+
+
+def next_number(document_type):
+    """رقم المستند التالي
+
+    بحجم كتلة 1 (DOCUMENT_NUMBER_BLOCK_SIZE) يُحجز الرقم ضمن معاملة الجلسة الحالية (يُلغى
+    الحجز مع إلغاء الطلب). بحجم أكبر يحجز كل عامل كتلة أرقام في معاملة مستقلة ويوزعها من
+    الذاكرة، فلا يُكتب صف التسلسل إلا مرة لكل كتلة.
+    """
+    block_size = current_app.config.get('DOCUMENT_NUMBER_BLOCK_SIZE', DEFAULT_BLOCK_SIZE)
+    if block_size <= 1:
+        return reserve_numbers(document_type, 1, db.session.connection())[0]
+
+    key = (db.engine, document_type, datetime.now().year)
+    with _blocks_lock:
+        block = _blocks.get(key)
+        if not block:
+            block = _blocks[key] = reserve_numbers(document_type, block_size, year=key[2])
+            block.reverse()
+        return block.pop()
+
+
+def clear_blocks():
+    """إسقاط الكتل المحجوزة في الذاكرة (تبقى أرقامها غير مستخدمة)"""
+    with _blocks_lock:
+        _blocks.clear()
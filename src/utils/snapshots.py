@@ -0,0 +1,172 @@
+from collections import defaultdict
+from datetime import date
+from sqlalchemy import func, and_, delete
+from dateutil.relativedelta import relativedelta
+from src.models.property import db, Building, Unit, OccupancyCounter, OccupancySnapshot
+from src.models.contract import Contract
+from src.utils.timeseries import bucket_start
+
+# مدة الاحتفاظ باللقطات اليومية ثم الأسبوعية (اللقطات الشهرية تُحفظ دائماً)
+DAILY_RETENTION_DAYS = 90
+WEEKLY_RETENTION_DAYS = 730
+
+SNAPSHOT_GRANULARITIES = ('day', 'week', 'month')
+
+STATUS_COLUMNS = {
+    'available': 'available_units',
+    'occupied': 'occupied_units',
+    'maintenance': 'maintenance_units',
+    'reserved': 'reserved_units'
+}
+
+LEVEL_COLUMNS = ('total_units', 'available_units', 'occupied_units', 'maintenance_units',
+                 'reserved_units', 'contracted_rent')
+
+
+def take_snapshot(snapshot_date=None):
+    """تسجيل لقطة يومية لكل مبنى نشط من عدادات الإشغال والعقود النشطة"""
+    snapshot_date = snapshot_date or date.today()
+
+    buildings = db.session.query(Building.id, Building.company_id).filter(Building.is_active == True).all()
+
+    counts = defaultdict(dict)
+    for building_id, status, unit_count in db.session.query(
+        OccupancyCounter.building_id, OccupancyCounter.status, OccupancyCounter.unit_count
+    ).filter(OccupancyCounter.building_id.isnot(None)).all():
+        counts[building_id][status] = unit_count
+
+    rents = dict(db.session.query(Unit.building_id, func.sum(Contract.rent_amount)).join(
+        Contract, Contract.unit_id == Unit.id
+    ).filter(Contract.status == 'active').group_by(Unit.building_id).all())
+
+    rows = []
+    for building_id, company_id in buildings:
+        building_counts = counts.get(building_id, {})
+        row = {
+            'company_id': company_id,
+            'building_id': building_id,
+            'period_type': 'day',
+            'period_start': snapshot_date,
+            'sample_days': 1,
+            'total_units': sum(building_counts.values()),
+            'contracted_rent': rents.get(building_id) or 0,
+            'vacancy_days': building_counts.get('available', 0)
+        }
+        for status, column in STATUS_COLUMNS.items():
+            row[column] = building_counts.get(status, 0)
+        rows.append(row)
+
+    # إعادة التشغيل في نفس اليوم تستبدل اللقطة السابقة
+    db.session.execute(delete(OccupancySnapshot).where(and_(
+        OccupancySnapshot.period_type == 'day',
+        OccupancySnapshot.period_start == snapshot_date
+    )))
+    if rows:
+        db.session.execute(OccupancySnapshot.__table__.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def _rollup(period_type, today):
+    """تجميع اللقطات اليومية للفترات المكتملة التي لم تُجمع بعد"""
+    current_period = bucket_start(today, period_type)
+
+    existing = {(row.building_id, row.period_start) for row in db.session.query(
+        OccupancySnapshot.building_id, OccupancySnapshot.period_start
+    ).filter(OccupancySnapshot.period_type == period_type).all()}
+
+    groups = defaultdict(list)
+    for snapshot in OccupancySnapshot.query.filter(
+        OccupancySnapshot.period_type == 'day',
+        OccupancySnapshot.period_start < current_period
+    ).order_by(OccupancySnapshot.period_start).all():
+        period = bucket_start(snapshot.period_start, period_type)
+        if (snapshot.building_id, period) not in existing:
+            groups[(snapshot.building_id, period)].append(snapshot)
+
+    rows = []
+    for (building_id, period), snapshots in groups.items():
+        last = snapshots[-1]
+        row = {
+            'company_id': last.company_id,
+            'building_id': building_id,
+            'period_type': period_type,
+            'period_start': period,
+            'sample_days': len(snapshots),
+            'vacancy_days': sum(snapshot.vacancy_days or 0 for snapshot in snapshots)
+        }
+        for column in LEVEL_COLUMNS:
+            row[column] = getattr(last, column)
+        rows.append(row)
+
+    if rows:
+        db.session.execute(OccupancySnapshot.__table__.insert(), rows)
+    return len(rows)
+
+
+def compact_snapshots(today=None):
+    """تجميع اللقطات اليومية في صفوف أسبوعية وشهرية وحذف القديم منها"""
+    today = today or date.today()
+
+    weekly = _rollup('week', today)
+    monthly = _rollup('month', today)
+
+    # اللقطات اليومية القديمة أصبحت ممثلة في الصفوف الأسبوعية والشهرية
+    db.session.execute(delete(OccupancySnapshot).where(and_(
+        OccupancySnapshot.period_type == 'day',
+        OccupancySnapshot.period_start < today - relativedelta(days=DAILY_RETENTION_DAYS)
+    )))
+    db.session.execute(delete(OccupancySnapshot).where(and_(
+        OccupancySnapshot.period_type == 'week',
+        OccupancySnapshot.period_start < today - relativedelta(days=WEEKLY_RETENTION_DAYS)
+    )))
+    db.session.commit()
+    return weekly, monthly
+
+
+def run_nightly(today=None):
+    """مهمة الليل: أخذ لقطة اليوم ثم ضغط اللقطات القديمة"""
+    today = today or date.today()
+    buildings = take_snapshot(today)
+    weekly, monthly = compact_snapshots(today)
+    return {'buildings': buildings, 'weekly_rollups': weekly, 'monthly_rollups': monthly}
+
+
+def snapshot_series(company_id, granularity, start_date, end_date, building_id=None):
+    """سلسلة الإشغال والإيجار عبر الزمن من جدول اللقطات فقط"""
+    if granularity not in SNAPSHOT_GRANULARITIES:
+        raise ValueError(f'دقة غير مدعومة: {granularity}')
+
+    query = db.session.query(
+        OccupancySnapshot.period_start,
+        func.sum(OccupancySnapshot.total_units),
+        func.sum(OccupancySnapshot.available_units),
+        func.sum(OccupancySnapshot.occupied_units),
+        func.sum(OccupancySnapshot.maintenance_units),
+        func.sum(OccupancySnapshot.reserved_units),
+        func.sum(OccupancySnapshot.contracted_rent),
+        func.sum(OccupancySnapshot.vacancy_days)
+    ).filter(
+        OccupancySnapshot.company_id == company_id,
+        OccupancySnapshot.period_type == granularity,
+        OccupancySnapshot.period_start >= bucket_start(start_date, granularity),
+        OccupancySnapshot.period_start <= end_date
+    )
+    if building_id:
+        query = query.filter(OccupancySnapshot.building_id == building_id)
+
+    series = []
+    for period, total, available, occupied, maintenance, reserved, rent, vacancy in \
+            query.group_by(OccupancySnapshot.period_start).order_by(OccupancySnapshot.period_start).all():
+        series.append({
+            'period': period.isoformat(),
+            'total_units': total or 0,
+            'available_units': available or 0,
+            'occupied_units': occupied or 0,
+            'maintenance_units': maintenance or 0,
+            'reserved_units': reserved or 0,
+            'occupancy_rate': round(occupied / total * 100, 2) if total else 0,
+            'contracted_rent': float(rent or 0),
+            'vacancy_days': vacancy or 0
+        })
+    return series
@@ -0,0 +1,128 @@
+from datetime import datetime, date, timedelta
+from sqlalchemy import select, func, cast, Integer, and_
+from dateutil.relativedelta import relativedelta
+from src.models.property import db
+
+GRANULARITIES = ('day', 'week', 'month', 'quarter', 'year')
+
+# الحد الأقصى لعدد الفترات في السلسلة الواحدة
+MAX_BUCKETS = 1000
+
+
+def bucket_start(value, granularity):
+    """بداية الفترة التي يقع فيها التاريخ"""
+    if granularity == 'day':
+        return value
+    if granularity == 'week':
+        return value - timedelta(days=value.weekday())
+    if granularity == 'month':
+        return value.replace(day=1)
+    if granularity == 'quarter':
+        return value.replace(month=(value.month - 1) // 3 * 3 + 1, day=1)
+    if granularity == 'year':
+        return value.replace(month=1, day=1)
+    raise ValueError(f'دقة غير مدعومة: {granularity}')
+
+
+def bucket_step(granularity):
+    """طول الفترة الواحدة"""
+    return {
+        'day': relativedelta(days=1),
+        'week': relativedelta(weeks=1),
+        'month': relativedelta(months=1),
+        'quarter': relativedelta(months=3),
+        'year': relativedelta(years=1)
+    }[granularity]
+
+
+def bucket_range(start, end, granularity):
+    """جميع بدايات الفترات بين تاريخين (شاملة)"""
+    step = bucket_step(granularity)
+    current = bucket_start(start, granularity)
+    buckets = []
+    while current <= end:
+        if len(buckets) >= MAX_BUCKETS:
+            raise ValueError(f'عدد الفترات يتجاوز الحد الأقصى ({MAX_BUCKETS})')
+        buckets.append(current)
+        current = current + step
+    return buckets
+
+
+def bucket_expression(column, granularity):
+    """تعبير SQL يحوّل التاريخ إلى بداية فترته"""
+    if db.engine.dialect.name == 'sqlite':
+        if granularity == 'day':
+            return func.date(column)
+        if granularity == 'week':
+            # الأسبوع يبدأ يوم الاثنين كما في date.weekday()
+            weekday = (cast(func.strftime('%w', column), Integer) + 6) % 7
+            return func.date(func.julianday(column) - weekday)
+        if granularity == 'month':
+            return func.strftime('%Y-%m-01', column)
+        if granularity == 'quarter':
+            month = (cast(func.strftime('%m', column), Integer) - 1) // 3 * 3 + 1
+            return func.printf('%s-%02d-01', func.strftime('%Y', column), month)
+        if granularity == 'year':
+            return func.strftime('%Y-01-01', column)
+        raise ValueError(f'دقة غير مدعومة: {granularity}')
+
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'دقة غير مدعومة: {granularity}')
+    return func.date_trunc(granularity, column)
+
+
+def to_date(value):
+    """تحويل قيمة الفترة المرجعة من قاعدة البيانات إلى تاريخ"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def sum_by_bucket(value_column, date_column, granularity, start, end, filters=(), joins=()):
+    """مجموع القيم لكل فترة في استعلام واحد مع GROUP BY"""
+    bucket = bucket_expression(date_column, granularity).label('bucket')
+    stmt = select(bucket, func.sum(value_column).label('total')).select_from(date_column.class_)
+    for target in joins:
+        stmt = stmt.join(target)
+    stmt = stmt.where(and_(date_column >= start, date_column <= end, *filters)).group_by(bucket)
+
+    return {to_date(row.bucket): row.total or 0 for row in db.session.execute(stmt)}
+
+
+def fill_series(buckets, values):
+    """ملء الفترات الفارغة بالصفر"""
+    return [(bucket, values.get(bucket, 0)) for bucket in buckets]
+
+
+def parse_series_args(args, default_months=6):
+    """قراءة معاملات from و to و granularity من الطلب
+
+    عند غيابها يتم استخدام آخر default_months شهر (المعامل months) بدقة شهرية.
+    """
+    granularity = args.get('granularity', 'month')
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'دقة غير مدعومة: {granularity}')
+
+    today = date.today()
+    start = args.get('from')
+    end = args.get('to')
+
+    if end:
+        end = datetime.strptime(end, '%Y-%m-%d').date()
+    else:
+        end = bucket_start(today, granularity) + bucket_step(granularity) - relativedelta(days=1)
+
+    if start:
+        start = datetime.strptime(start, '%Y-%m-%d').date()
+    else:
+        months = args.get('months', default_months, type=int)
+        start = today.replace(day=1) - relativedelta(months=months - 1)
+
+    if start > end:
+        raise ValueError('تاريخ البداية بعد تاريخ النهاية')
+
+    buckets = bucket_range(start, end, granularity)
+
+    return start, end, granularity, buckets
@@ -0,0 +1,109 @@
+from sqlalchemy import select, func, and_, case, literal
+from src.models.property import db, Building, Unit
+
+# معايير النطاق: اسم المعامل في الطلب ← عمود الوحدة (min_<name> و max_<name>)
+RANGE_CRITERIA = {
+    'rent': Unit.current_rent,
+    'area': Unit.area,
+    'bedrooms': Unit.bedrooms,
+    'bathrooms': Unit.bathrooms,
+    'parking_spaces': Unit.parking_spaces
+}
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def parse_criteria(args):
+    """قراءة معايير المطابقة من معاملات الطلب (ValueError عند قيمة غير صالحة)"""
+    criteria = {}
+    for name in RANGE_CRITERIA:
+        low = args.get(f'min_{name}', type=float)
+        high = args.get(f'max_{name}', type=float)
+        if low is not None and high is not None and low > high:
+            raise ValueError(f'الحد الأدنى أكبر من الحد الأعلى: {name}')
+        if low is not None or high is not None:
+            criteria[name] = (low, high)
+
+    furnished = args.get('furnished')
+    if furnished is not None:
+        if furnished.lower() not in ('1', 'true', '0', 'false'):
+            raise ValueError('قيمة furnished يجب أن تكون true أو false')
+        criteria['furnished'] = furnished.lower() in ('1', 'true')
+
+    for name in ('view_type', 'building_id', 'unit_type_id', 'category_id'):
+        value = args.get(name, type=str if name == 'view_type' else int)
+        if value:
+            criteria[name] = value
+    return criteria
+
+
+def _target(low, high):
+    """القيمة المثالية للنطاق: منتصفه، أو الحد المعطى إذا كان مفتوحاً من جهة"""
+    if low is not None and high is not None:
+        return (low + high) / 2
+    return high if high is not None else low
+
+
+def match_units(company_id, criteria, limit=DEFAULT_LIMIT):
+    """الوحدات المتاحة التي تحقق المعايير مرتبة حسب القرب من القيم المطلوبة
+
+    شروط النطاق تُطبق في WHERE (بالفهارس المركبة على الشركة والحالة)، ثم تُرتب الوحدات
+    المطابقة بمجموع المسافات النسبية |القيمة - الهدف| / الهدف لكل معيار نطاق، فالوحدة
+    الأقرب إلى منتصف كل نطاق تأتي أولاً. يرجع (عدد المطابقات، الوحدات مع درجة القرب).
+    """
+    filters = [
+        Unit.company_id == company_id,
+        Unit.status == 'available',
+        Unit.is_active == True
+    ]
+    distances = []
+    for name, column in RANGE_CRITERIA.items():
+        if name not in criteria:
+            continue
+        low, high = criteria[name]
+        if low is not None:
+            filters.append(column >= low)
+        if high is not None:
+            filters.append(column <= high)
+        target = _target(low, high)
+        scale = abs(target) or 1
+        distances.append(func.abs(func.coalesce(column, target) - target) / scale)
+
+    if 'furnished' in criteria:
+        filters.append(Unit.furnished == criteria['furnished'])
+    for name in ('view_type', 'building_id', 'unit_type_id', 'category_id'):
+        if name in criteria:
+            filters.append(getattr(Unit, name) == criteria[name])
+
+    limit = max(1, min(limit, MAX_LIMIT))
+    # بدون معايير نطاق: الترتيب بالإيجار الأقل أولاً
+    distance = sum(distances[1:], distances[0]) if distances else None
+    order = [case((Unit.current_rent.is_(None), 1), else_=0), Unit.current_rent, Unit.id]
+    if distance is not None:
+        order.insert(0, distance)
+
+    # الترتيب والعد من الفهرس المغطي فقط (أعمدة المعايير)، ثم قراءة الصفوف الكاملة للصفحة
+    ranked = db.session.execute(
+        select(Unit.id, (distance if distance is not None else literal(0)).label('distance'),
+               func.count().over().label('total'))
+        .where(and_(*filters)).order_by(*order).limit(limit)
+    ).all()
+    if not ranked:
+        return 0, []
+
+    rows = db.session.execute(
+        select(Unit, Building.name).join(Building, Unit.building_id == Building.id)
+        .where(Unit.id.in_([row.id for row in ranked]))
+    ).all()
+    by_id = {unit.id: (unit, building_name) for unit, building_name in rows}
+
+    matches = []
+    for row in ranked:
+        unit, building_name = by_id[row.id]
+        item = unit.to_dict()
+        item['building_name'] = building_name
+        # درجة القرب بين 0 و1: 1 = مطابقة تامة لأهداف جميع النطاقات
+        item['match_score'] = round(1 / (1 + float(row.distance or 0)), 4)
+        matches.append(item)
+    return ranked[0].total, matches
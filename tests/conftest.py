@@ -0,0 +1,116 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+from src.models.property import db, Company, User, Building, Unit
+from src.models.contract import Person
+from src.models.finance import ExpenseCategory
+from src.routes.auth import auth_bp
+from src.routes.property import property_bp
+from src.routes.contract import contract_bp
+from src.routes.finance import finance_bp
+from src.routes.dashboard import dashboard_bp
+from src.routes.reports import reports_bp
+from src.routes.templates import templates_bp
+from src.routes.notifications import notifications_bp
+from src.routes.search import search_bp
+from src.routes.autocomplete import autocomplete_bp
+from src.utils.financial_summary import check_summary
+from src.utils.occupancy import reconcile_occupancy
+from src.utils.payment_cube import clear_cubes
+from src.utils.forecast import invalidate_forecast
+from src.utils.autocomplete import clear_indexes
+from src.utils.schema import ensure_schema
+
+COMPANY_ID = 1
+
+
+def build_app(database_uri):
+    """تطبيق اختبار بقاعدة بيانات database_uri وبيانات أساسية: شركة ومبنى بخمس وحدات ومستأجر"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['JWT_SECRET_KEY'] = 'test_jwt_secret_key_property_management'
+    JWTManager(app)
+    db.init_app(app)
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(property_bp, url_prefix='/api/properties')
+    app.register_blueprint(contract_bp, url_prefix='/api/contracts')
+    app.register_blueprint(finance_bp, url_prefix='/api/finance')
+    app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
+    app.register_blueprint(reports_bp, url_prefix='/api/reports')
+    app.register_blueprint(templates_bp, url_prefix='/api/templates')
+    app.register_blueprint(notifications_bp, url_prefix='/api/notifications')
+    app.register_blueprint(search_bp, url_prefix='/api/search')
+    app.register_blueprint(autocomplete_bp, url_prefix='/api/autocomplete')
+
+    with app.app_context():
+        # استيراد جميع النماذج لضمان إنشاء الجداول
+        import src.models.notification  # noqa: F401
+        ensure_schema()
+
+        db.session.add(Company(id=COMPANY_ID, name='Test'))
+        db.session.add(User(id=1, company_id=COMPANY_ID, username='admin', email='admin@test', password_hash='x'))
+        db.session.add(ExpenseCategory(id=1, company_id=COMPANY_ID, name='صيانة'))
+        db.session.add(Building(id=1, company_id=COMPANY_ID, name='المبنى الأول', is_active=True))
+        db.session.flush()
+        for number in range(1, 6):
+            db.session.add(Unit(id=number, company_id=COMPANY_ID, building_id=1, unit_number=str(100 + number),
+                                status='available', current_rent=1000, is_active=True))
+        db.session.add(Person(id=1, company_id=COMPANY_ID, person_type='tenant', first_name='أحمد',
+                              last_name='علي'))
+        db.session.commit()
+    return app
+
+
+@pytest.fixture
+def app():
+    """تطبيق بقاعدة بيانات SQLite في الذاكرة"""
+    app = build_app('sqlite://')
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+    # الذاكرة المؤقتة مفهرسة برقم الشركة فلا تنتقل بين قواعد الاختبارات
+    clear_cubes()
+    invalidate_forecast(COMPANY_ID)
+    clear_indexes()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def headers(app):
+    with app.app_context():
+        return {'Authorization': 'Bearer ' + create_access_token(identity='1')}
+
+
+@pytest.fixture
+def create_contract(client, headers):
+    """إنشاء عقد عبر الواجهة وإرجاع بياناته"""
+    def create(unit_id=1, start_date='2024-01-01', end_date='2024-12-31', rent_amount=1000,
+               payment_frequency='monthly'):
+        response = client.post('/api/contracts/', headers=headers, json={
+            'unit_id': unit_id, 'tenant_id': 1, 'start_date': start_date, 'end_date': end_date,
+            'rent_amount': rent_amount, 'payment_frequency': payment_frequency
+        })
+        assert response.status_code == 201, response.get_json()
+        return response.get_json()['contract']
+    return create
+
+
+@pytest.fixture
+def assert_consistent(app):
+    """الملخص المالي وعدادات الإشغال مطابقة تماماً للجداول الأصلية"""
+    def check():
+        with app.app_context():
+            assert check_summary(COMPANY_ID) == []
+            assert reconcile_occupancy(COMPANY_ID) == []
+    return check
@@ -0,0 +1,37 @@
+def test_aging_buckets_per_contract(client, headers, create_contract):
+    first = create_contract(unit_id=1, start_date='2024-01-01', end_date='2024-12-31', rent_amount=1000)
+    second = create_contract(unit_id=2, start_date='2024-04-01', end_date='2024-12-31', rent_amount=500)
+    # دفعة يناير مسددة قبل تاريخ التقرير، ودفعة فبراير بعده فكانت معلقة في ذلك التاريخ
+    assert client.post('/api/contracts/payments/pay', headers=headers, json={'payments': [
+        {'payment_id': 1, 'payment_date': '2024-01-05'},
+        {'payment_id': 2, 'payment_date': '2024-05-01'},
+    ]}).get_json()['paid'] == 2
+
+    response = client.get('/api/finance/reports/aging?as_of=2024-04-15&group_by=contract', headers=headers)
+    assert response.status_code == 200
+    report = response.get_json()
+    assert [(item['contract_id'], item['current'], item['days_1_30'], item['days_31_60'], item['days_61_90'],
+             item['days_90_plus'], item['total'], item['payment_count'], item['oldest_due_date'])
+            for item in report['items']] == [
+        (first['id'], 1000.0, 1000.0, 1000.0, 1000.0, 0.0, 4000.0, 4, '2024-02-01'),
+        (second['id'], 500.0, 500.0, 0.0, 0.0, 0.0, 1000.0, 2, '2024-04-01'),
+    ]
+    totals = report['totals']
+    assert (totals['current'], totals['days_1_30'], totals['days_31_60'], totals['days_61_90'],
+            totals['total']) == (1500.0, 1500.0, 1000.0, 1000.0, 5000.0)
+
+    # الترتيب والترقيم على النتيجة المجمعة
+    response = client.get('/api/finance/reports/aging?as_of=2024-04-15&group_by=contract&sort=total&order=asc'
+                          '&per_page=1&page=2', headers=headers)
+    report = response.get_json()
+    assert (report['total'], report['pages'], [item['contract_id'] for item in report['items']]) == \
+        (2, 2, [first['id']])
+
+    response = client.get('/api/finance/reports/aging?as_of=2024-04-15&group_by=building', headers=headers)
+    assert [(item['building_id'], item['total']) for item in response.get_json()['items']] == [(1, 5000.0)]
+
+
+def test_aging_invalid_args(client, headers):
+    assert client.get('/api/finance/reports/aging?group_by=unit', headers=headers).status_code == 400
+    assert client.get('/api/finance/reports/aging?sort=tenant_name', headers=headers).status_code == 400
+    assert client.get('/api/finance/reports/aging?as_of=15/04/2024', headers=headers).status_code == 400
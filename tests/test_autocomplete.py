@@ -0,0 +1,68 @@
+from src.models.property import db, Building
+from src.models.contract import Person
+from src.utils.autocomplete import get_index, invalidate
+
+
+def suggest(client, headers, entity_type, query, **params):
+    response = client.get('/api/autocomplete', headers=headers,
+                          query_string={'type': entity_type, 'q': query, **params})
+    assert response.status_code == 200
+    return [item['label'] for item in response.get_json()['suggestions']]
+
+
+def test_prefix_lookup(app, client, headers, create_contract):
+    contract = create_contract()
+    with app.app_context():
+        db.session.add(Person(id=2, company_id=1, person_type='tenant', first_name='أحمد', last_name='سالم'))
+        db.session.add(Person(id=3, company_id=1, person_type='landlord', first_name='أحمد', last_name='خالد'))
+        db.session.commit()
+
+    assert suggest(client, headers, 'unit', '10') == [f'المبنى الأول - {number}' for number in range(101, 106)]
+    assert suggest(client, headers, 'unit', 'الاول 103') == ['المبنى الأول - 103']
+    assert suggest(client, headers, 'unit', '10', limit=2) == ['المبنى الأول - 101', 'المبنى الأول - 102']
+    assert suggest(client, headers, 'tenant', 'احمد') == ['أحمد علي', 'أحمد سالم']
+    assert suggest(client, headers, 'tenant', 'اح سال') == ['أحمد سالم']
+    number = contract['contract_number']
+    assert suggest(client, headers, 'contract', number[:5]) == [number]
+    assert suggest(client, headers, 'tenant', '') == []
+    assert client.get('/api/autocomplete?type=building&q=x', headers=headers).status_code == 400
+
+
+def test_loaded_indexes_follow_committed_writes(app, client, headers):
+    assert suggest(client, headers, 'tenant', 'احمد') == ['أحمد علي']
+    assert suggest(client, headers, 'unit', '101') == ['المبنى الأول - 101']
+    with app.app_context():
+        db.session.get(Building, 1).name = 'برج النخيل'
+        db.session.add(Person(id=2, company_id=1, person_type='tenant', first_name='أحمد', last_name='سالم'))
+        db.session.commit()
+
+        db.session.get(Person, 1).person_type = 'landlord'
+        db.session.flush()
+        db.session.rollback()
+    assert suggest(client, headers, 'unit', '101') == ['برج النخيل - 101']
+    assert suggest(client, headers, 'unit', 'المبنى') == []
+    assert suggest(client, headers, 'tenant', 'احمد') == ['أحمد علي', 'أحمد سالم']
+
+    with app.app_context():
+        db.session.get(Person, 1).person_type = 'landlord'
+        db.session.commit()
+        # الكتابة المباشرة لا تمر بأحداث ORM فتبطل الفهرس ليعاد بناؤه
+        db.session.execute(Person.__table__.insert().values(company_id=1, person_type='tenant',
+                                                            first_name='أحمد', last_name='ناصر'))
+        db.session.commit()
+        invalidate(1, 'tenant')
+    assert suggest(client, headers, 'tenant', 'احمد') == ['أحمد سالم', 'أحمد ناصر']
+
+    report = client.get('/api/autocomplete/memory', headers=headers).get_json()
+    assert sorted(item['type'] for item in report['indexes']) == ['tenant', 'unit']
+    assert report['total_bytes'] > 0
+
+
+def test_index_updates_in_place(app):
+    with app.app_context():
+        index = get_index(1, 'unit')
+        index.upsert(1, 'وحدة', ('a', 'b'))
+        index.upsert(2, None, ())
+        assert index.keys == sorted(index.keys)
+        assert [item['id'] for item in index.lookup('1')] == [3, 4, 5]
+        assert index.lookup('b') == [{'id': 1, 'label': 'وحدة'}]
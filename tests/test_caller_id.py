@@ -0,0 +1,82 @@
+from datetime import date
+
+from sqlalchemy import select, text
+from src.models.property import db
+from src.models.contract import Person, ContractPayment
+from src.utils.caller_id import lookup_caller, _phone_condition
+from src.utils.normalization import backfill_phone_columns
+
+
+def add_persons(app):
+    with app.app_context():
+        person = db.session.get(Person, 1)
+        person.mobile = '+966 50 123 4567'
+        db.session.add_all([
+            Person(id=2, company_id=1, person_type='tenant', first_name='سارة', last_name='خالد',
+                   phone='٠٥٥٩٨٧٤٥٦٧'),
+            Person(id=3, company_id=2, person_type='tenant', first_name='عمر', last_name='حسن',
+                   mobile='0501234567'),
+        ])
+        db.session.commit()
+
+
+def lookup(client, headers, phone):
+    response = client.get('/api/contracts/persons/lookup', headers=headers, query_string={'phone': phone})
+    return response.status_code, response.get_json()
+
+
+def test_full_number_and_suffix(app, client, headers):
+    add_persons(app)
+    for phone in ('0501234567', '00966501234567', '501234567'):
+        status, result = lookup(client, headers, phone)
+        assert (status, result['match_type'], [match['person']['id'] for match in result['matches']]) == \
+            (200, 'exact', [1])
+
+    status, result = lookup(client, headers, '8745 67')
+    assert status == 400
+    status, result = lookup(client, headers, '9874567')
+    assert (result['match_type'], [match['person']['id'] for match in result['matches']]) == ('suffix', [2])
+    status, result = lookup(client, headers, '59874567')
+    assert [match['person']['id'] for match in result['matches']] == [2]
+    # نفس آخر سبعة أرقام مع رقم سابق مختلف
+    status, result = lookup(client, headers, '49874567')
+    assert result['matches'] == []
+
+
+def test_suffix_lookup_uses_the_tail_index(app):
+    with app.app_context():
+        condition, _ = _phone_condition(1, '1234567')
+        sql = str(select(Person.id).where(condition).compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plan = ' '.join(str(row[-1]) for row in db.session.execute(text('EXPLAIN QUERY PLAN ' + sql)))
+        for tail in ('phone_tail', 'mobile_tail', 'emergency_contact_phone_tail'):
+            assert f'(company_id=? AND {tail}=?)' in plan
+
+
+def test_balance_counts_open_payments(app, create_contract):
+    add_persons(app)
+    create_contract(start_date='2024-01-01', end_date='2024-06-30')
+    with app.app_context():
+        table = ContractPayment.__table__
+        db.session.execute(table.update().where(table.c.payment_number == 1).values(status='overdue'))
+        db.session.execute(table.update().where(table.c.payment_number == 2).values(status='paid',
+                                                                                   paid_amount=1000))
+        db.session.execute(table.update().where(table.c.payment_number == 3).values(paid_amount=400))
+        db.session.commit()
+
+        match_type, matches = lookup_caller(1, '0501234567', today=date(2024, 3, 15))
+        assert match_type == 'exact'
+        assert (matches[0]['outstanding_balance'], matches[0]['next_due_date']) == (1600.0, '2024-04-01')
+        assert len(matches[0]['active_contracts']) == 1
+
+
+def test_backfill_fills_the_tail_columns(app):
+    add_persons(app)
+    with app.app_context():
+        table = Person.__table__
+        db.session.execute(table.update().values(phone_tail=None, mobile_tail=None))
+        db.session.commit()
+        assert backfill_phone_columns() == 3
+        assert [(person.phone_tail, person.mobile_tail) for person in Person.query.order_by(Person.id)] == [
+            (None, '1234567'), ('9874567', None), (None, '1234567')
+        ]
+        assert backfill_phone_columns() == 0
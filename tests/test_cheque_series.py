@@ -0,0 +1,75 @@
+import pytest
+from src.models.property import db
+from src.models.contract import ContractPayment, Cheque
+from src.utils.cheque_series import cheque_numbers
+
+
+def payment_ids(app, contract_id):
+    with app.app_context():
+        return [payment.id for payment in ContractPayment.query.filter_by(contract_id=contract_id)
+                .order_by(ContractPayment.payment_number)]
+
+
+def register(client, headers, contract_id, start_number, count, **data):
+    return client.post('/api/contracts/cheques/series', headers=headers, json={
+        'contract_id': contract_id, 'start_cheque_number': start_number, 'bank_name': 'Bank', 'count': count, **data
+    })
+
+
+def test_cheque_numbers():
+    assert cheque_numbers('000998', 3) == ['000998', '000999', '001000']
+    assert cheque_numbers(' CHQ-9 ', 2) == ['CHQ-9', 'CHQ-10']
+    with pytest.raises(ValueError):
+        cheque_numbers('CHQ', 1)
+
+
+def test_cheque_series_and_reconciliation(app, client, headers, create_contract, assert_consistent):
+    contract = create_contract()
+    response = register(client, headers, contract['id'], '000120', 3)
+    assert response.status_code == 201
+    cheques = response.get_json()['cheques']
+    assert [cheque['cheque_number'] for cheque in cheques] == ['000120', '000121', '000122']
+    ids = payment_ids(app, contract['id'])
+    assert [cheque['payment_id'] for cheque in cheques] == ids[:3]
+    assert_consistent()
+
+    response = client.post('/api/contracts/reconciliation/apply', headers=headers, json={'matches': [
+        {'type': 'cheque', 'id': cheques[0]['id'], 'date': '2024-01-03'},
+        {'type': 'payment', 'id': ids[5], 'date': '2024-06-02'}
+    ]})
+    assert response.status_code == 200
+    result = response.get_json()
+    assert (result['applied'], result['cheques_cleared'], result['payments_paid']) == (2, 1, 2)
+    assert result['results'][0]['payment']['id'] == ids[0]
+    assert_consistent()
+
+    with app.app_context():
+        assert db.session.get(Cheque, cheques[0]['id']).status == 'cleared'
+        assert db.session.get(ContractPayment, ids[0]).status == 'paid'
+
+
+def test_series_skips_covered_payments(app, client, headers, create_contract):
+    contract = create_contract(start_date='2024-01-01', end_date='2024-06-30')
+    ids = payment_ids(app, contract['id'])
+    client.post('/api/contracts/payments/pay', headers=headers, json={'payments': [{'payment_id': ids[1]}]})
+    assert register(client, headers, contract['id'], '100', 1).status_code == 201
+
+    # الدفعة المسددة والمغطاة بشيك تُتخطى، والسلسلة تبدأ من first_due_date
+    response = register(client, headers, contract['id'], '200', 2, first_due_date='2024-04-01')
+    assert [(cheque['payment_id'], cheque['due_date']) for cheque in response.get_json()['cheques']] == [
+        (ids[3], '2024-04-01'), (ids[4], '2024-05-01')
+    ]
+    assert [cheque['payment_id'] for cheque in register(client, headers, contract['id'], '300', 2)
+            .get_json()['cheques']] == [ids[2], ids[5]]
+
+
+def test_invalid_series(client, headers, create_contract):
+    contract = create_contract(start_date='2024-01-01', end_date='2024-03-31')
+    assert register(client, headers, contract['id'], '500', 2).status_code == 201
+
+    # أرقام مسجلة لنفس البنك، أو شيكات أكثر من الدفعات المفتوحة، أو عدد أو تاريخ غير صالح
+    assert register(client, headers, contract['id'], '501', 1).status_code == 400
+    assert register(client, headers, contract['id'], '600', 2).status_code == 400
+    assert register(client, headers, contract['id'], '600', 0).status_code == 400
+    assert register(client, headers, contract['id'], '600', 1, first_due_date='01/03/2024').status_code == 400
+    assert register(client, headers, 999999, '600', 1).status_code == 404
@@ -0,0 +1,64 @@
+import io
+from datetime import date
+from decimal import Decimal
+
+from src.models.contract import Contract, ContractPayment
+from src.utils.forecast import cached_forecast
+from src.utils.recurring_revenue import current_mrr, monthly_rent
+from src.utils.search_index import global_search
+
+BODY = 'unit_id,tenant_id,start_date,end_date,rent_amount,payment_frequency,contract_number,paid_until,status\n' \
+       '1,1,2024-01-01,2024-12-31,1000,monthly,,2024-03-31,\n' \
+       '2,1,2024-01-31,2024-08-15,1333.33,quarterly,,,\n' \
+       '3,1,2024-01-01,2023-12-31,1000,monthly,,,\n' \
+       '1,1,2024-01-01,2024-12-31,900,monthly,,,\n' \
+       '4,1,2023-01-01,2023-12-31,800,monthly,IMP-1,,expired\n' \
+       '5,1,2024-01-01,2024-12-31,800,monthly,IMP-1,,\n'
+
+
+def upload(client, headers, url, body):
+    return client.post(url, headers=headers, content_type='multipart/form-data',
+                       data={'file': (io.BytesIO(body.encode('utf-8')), 'data.csv')})
+
+
+def test_contract_import(app, client, headers, assert_consistent):
+    with app.app_context():
+        before = cached_forecast(1)
+
+    response = upload(client, headers, '/api/contracts/import', BODY)
+    assert response.status_code == 200
+    report = response.get_json()
+    # التاريخ المعكوس والوحدة المشغولة في الملف نفسه ورقم العقد المكرر تُرفض بأرقام أسطرها
+    assert (report['imported'], report['failed']) == (3, 3)
+    assert [error['row'] for error in report['errors']] == [4, 5, 7]
+    assert_consistent()
+
+    with app.app_context():
+        contracts = Contract.query.order_by(Contract.id).all()
+        assert [contract.unit_id for contract in contracts] == [1, 2, 4]
+        assert contracts[2].contract_number == 'IMP-1'
+        assert contracts[0].contract_number and contracts[0].contract_number != contracts[1].contract_number
+        # الدفعات المستحقة حتى paid_until مسجلة مدفوعة
+        assert [payment.status for payment in ContractPayment.query.filter_by(contract_id=contracts[0].id)
+                .order_by(ContractPayment.payment_number)][:4] == ['paid', 'paid', 'paid', 'pending']
+        assert report['created']['payments'] == ContractPayment.query.count()
+
+        # العقد المنتهي لا يُحسب في الإيراد الشهري، والإدراج المباشر يحدّث فهرس البحث ويُبطل التوقعات
+        assert current_mrr(1, as_of=date(2024, 6, 1)) == \
+            monthly_rent(Decimal('1000')) + monthly_rent(Decimal('1333.33'))
+        assert global_search(1, 'احمد', ['contract'])[1] == {'contract': 3}
+        assert cached_forecast(1) is not before
+
+
+def test_dry_run_and_active_units(app, client, headers, create_contract):
+    response = upload(client, headers, '/api/contracts/import?dry_run=1', BODY)
+    report = response.get_json()
+    assert (report['imported'], report['failed'], report['dry_run']) == (3, 3, True)
+    with app.app_context():
+        assert (Contract.query.count(), ContractPayment.query.count()) == (0, 0)
+
+    # الوحدة المرتبطة بعقد نشط في قاعدة البيانات تُرفض
+    create_contract(unit_id=2)
+    response = upload(client, headers, '/api/contracts/import',
+                      'unit_id,tenant_id,start_date,end_date,rent_amount\n2,1,2024-01-01,2024-12-31,500\n')
+    assert response.get_json()['errors'] == [{'row': 2, 'errors': ['unit_id: الوحدة مرتبطة بعقد نشط آخر']}]
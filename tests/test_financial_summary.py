@@ -0,0 +1,94 @@
+from datetime import date
+from decimal import Decimal
+
+from src.models.property import db
+from src.models.contract import ContractPayment
+from src.models.finance import Expense, FinancialMonthlySummary
+from src.utils.financial_summary import (
+    check_summary, rebuild_summary, seed_summary, period_totals, receivable_totals
+)
+from src.utils.payment_posting import mark_payments_paid
+
+
+def summary_row(company_id, month):
+    row = FinancialMonthlySummary.query.filter_by(company_id=company_id, month=month).one()
+    return float(row.revenue), float(row.expenses), float(row.pending_amount)
+
+
+def test_contracts_keep_the_summary_consistent(app, client, headers, create_contract):
+    contract = create_contract(start_date='2024-01-01', end_date='2024-03-31')
+    create_contract(unit_id=2, start_date='2024-01-15', end_date='2024-06-20', rent_amount=1234.56,
+                    payment_frequency='quarterly')
+    assert client.put(f"/api/contracts/{contract['id']}/status", headers=headers,
+                      json={'status': 'terminated'}).status_code == 200
+    with app.app_context():
+        assert check_summary(1) == []
+        assert summary_row(1, date(2024, 1, 1)) == (0.0, 0.0, 4703.68)
+
+
+def test_expenses(app, client, headers):
+    response = client.post('/api/finance/expenses', headers=headers, json={
+        'amount': 300, 'expense_date': '2024-02-10', 'category_id': 1, 'status': 'paid'
+    })
+    assert response.status_code == 201
+    expense_id = response.get_json()['expense']['id']
+    with app.app_context():
+        assert check_summary(1) == []
+
+    response = client.put(f'/api/finance/expenses/{expense_id}', headers=headers,
+                          json={'amount': 450, 'expense_date': '2024-03-01'})
+    assert response.status_code == 200
+    with app.app_context():
+        assert check_summary(1) == []
+        assert summary_row(1, date(2024, 2, 1)) == (0.0, 0.0, 0.0)
+        assert summary_row(1, date(2024, 3, 1)) == (0.0, 450.0, 0.0)
+
+
+def test_null_status_is_pending_in_every_path(app, create_contract):
+    """دفعة قديمة بحالة فارغة معلقة في إعادة البناء كما في التحديث التزايدي"""
+    contract = create_contract(start_date='2024-01-01', end_date='2024-02-29')
+    with app.app_context():
+        payment = ContractPayment.query.filter_by(contract_id=contract['id'], payment_number=1).one()
+        db.session.execute(ContractPayment.__table__.update().where(ContractPayment.__table__.c.id == payment.id)
+                           .values(status=None))
+        db.session.commit()
+        assert check_summary(1) == []
+
+        rebuild_summary(1)
+        assert summary_row(1, date(2024, 1, 1)) == (0.0, 0.0, 1000.0)
+        assert receivable_totals(1, date(2024, 3, 1)) == (Decimal('2000.00'), Decimal('2000.00'))
+
+        assert mark_payments_paid(1, [{'payment_id': payment.id, 'payment_date': '2024-01-05'}])['paid'] == 1
+        assert check_summary(1) == []
+        assert summary_row(1, date(2024, 1, 1)) == (1000.0, 0.0, 0.0)
+
+
+def test_seed_summary_fills_an_empty_table_once(app, create_contract):
+    create_contract(start_date='2024-01-01', end_date='2024-02-29')
+    with app.app_context():
+        db.session.add(Expense(company_id=1, expense_number='E-1', amount=75, expense_date=date(2024, 1, 9),
+                               status='paid', category_id=1))
+        db.session.commit()
+        FinancialMonthlySummary.query.delete()
+        db.session.commit()
+
+        assert seed_summary() == 2
+        assert seed_summary() == 0
+        assert check_summary(1) == []
+
+
+def test_period_totals_combine_summary_and_partial_months(app, client, headers, create_contract):
+    create_contract(start_date='2024-01-01', end_date='2024-04-30')
+    client.post('/api/contracts/payments/pay', headers=headers, json={'payments': [
+        {'payment_id': 1, 'payment_date': '2024-01-20'},
+        {'payment_id': 2, 'payment_date': '2024-02-10'},
+        {'payment_id': 3, 'payment_date': '2024-03-25'},
+    ]})
+    for day, amount in (('2024-01-10', 100), ('2024-02-15', 200), ('2024-03-05', 400)):
+        client.post('/api/finance/expenses', headers=headers,
+                    json={'amount': amount, 'expense_date': day, 'category_id': 1, 'status': 'paid'})
+
+    with app.app_context():
+        totals = period_totals(1, date(2024, 1, 15), date(2024, 3, 10))
+        assert totals == {'revenue': Decimal('2000.00'), 'expenses': Decimal('600.00'),
+                          'by_category': {1: Decimal('600.00')}}
@@ -0,0 +1,66 @@
+from datetime import date, timedelta
+
+from dateutil.relativedelta import relativedelta
+from src.models.property import db
+from src.models.contract import ContractPayment, Cheque
+from src.utils import forecast
+from src.utils.forecast import compute_forecast, cached_forecast
+
+
+def test_open_payments_and_cheques_are_expected_inflows(app, client, headers, create_contract):
+    contract = create_contract(start_date='2024-01-01', end_date='2024-12-31')
+    # نسبة تحصيل المستأجر 50% من دفعات يناير إلى أبريل
+    assert client.post('/api/contracts/payments/pay', headers=headers, json={'payments': [
+        {'payment_id': 1, 'payment_date': '2024-01-05'}, {'payment_id': 2, 'payment_date': '2024-02-05'}
+    ]}).get_json()['paid'] == 2
+    with app.app_context():
+        table = ContractPayment.__table__
+        db.session.execute(table.update().where(table.c.payment_number == 5).values(status='overdue'))
+        db.session.add(Cheque(company_id=1, contract_id=contract['id'], cheque_number='000900', amount=700,
+                              due_date=date(2024, 6, 10), status='received'))
+        db.session.commit()
+
+        result = compute_forecast(1, 'month', 3, today=date(2024, 4, 15))
+    assert (result['company_collection_rate'], result['cheque_clearing_rate']) == (50.0, 100.0)
+    assert [(item['period'], item['scheduled'], item['cheques'], item['expected'])
+            for item in result['forecast']] == [
+        ('2024-04-01', 0.0, 0.0, 0.0), ('2024-05-01', 1000.0, 0.0, 500.0), ('2024-06-01', 1000.0, 700.0, 1200.0),
+        ('2024-07-01', 1000.0, 0.0, 500.0)
+    ]
+    assert result['total_expected'] == 2200.0
+
+
+def test_cached_forecast_is_kept_per_day_until_a_write(app, client, headers, create_contract):
+    start = date.today().replace(day=1) + relativedelta(months=1)
+    create_contract(start_date=start.isoformat(), end_date=(start + relativedelta(months=12, days=-1)).isoformat())
+    with app.app_context():
+        first = cached_forecast(1)
+        assert cached_forecast(1) is first
+        assert first['forecast'][1]['scheduled'] == 1000.0
+
+        # تعديل دفعة عبر ORM يبطل توقع الشركة بعد الحفظ
+        payment = ContractPayment.query.filter_by(payment_number=1).one()
+        payment.amount = 1500
+        db.session.commit()
+        second = cached_forecast(1)
+        assert second is not first
+        assert second['forecast'][1]['scheduled'] == 1500.0
+
+        # التراجع لا يبطل التوقع
+        payment.amount = 2000
+        db.session.flush()
+        db.session.rollback()
+        assert cached_forecast(1) is second
+
+        # نتيجة يوم سابق تُعاد حسابها وتُحذف معها النتائج القديمة الأخرى
+        key = (1, 'month', 6)
+        forecast._cache[key] = (date.today() - timedelta(days=1), second)
+        forecast._cache[(2, 'week', 3)] = (date.today() - timedelta(days=1), {})
+        assert cached_forecast(1) is not second
+        assert list(forecast._cache) == [key]
+
+    assert client.get('/api/finance/forecast?granularity=day', headers=headers).status_code == 400
+    assert client.get('/api/finance/forecast?months=30', headers=headers).status_code == 400
+    response = client.get('/api/finance/forecast?granularity=week&months=2', headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['granularity'] == 'week'
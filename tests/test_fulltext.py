@@ -0,0 +1,59 @@
+from sqlalchemy import text
+from src.models.property import db
+from src.models.contract import Person
+from src.utils.fulltext import ensure_person_search, fts_query, PERSON_FTS_TABLE
+
+
+def names(client, headers, search):
+    response = client.get('/api/contracts/persons', headers=headers, query_string={'search': search})
+    assert response.status_code == 200
+    return [f"{person['first_name']} {person['last_name']}" for person in response.get_json()['persons']]
+
+
+def add_persons(app):
+    with app.app_context():
+        db.session.add_all([
+            Person(id=2, company_id=1, person_type='tenant', first_name='محمد', last_name='الأحمدي',
+                   phone='0501234567'),
+            Person(id=3, company_id=1, person_type='tenant', first_name='فاطمة', last_name='الزهراء',
+                   email='fatima@example.com', id_number='1098765432'),
+            Person(id=4, company_id=2, person_type='tenant', first_name='أحمد', last_name='سالم'),
+        ])
+        db.session.commit()
+
+
+def test_fts_query():
+    assert fts_query('  أحمدُ  إبراهيم ') == '"احمد"* "ابراهيم"*'
+    assert fts_query('!!') == ''
+
+
+def test_person_search(app, client, headers):
+    add_persons(app)
+    # الهمزات والتشكيل موحدة، وكل كلمة بادئة، وأشخاص الشركات الأخرى مستبعدون
+    assert names(client, headers, 'احمد') == ['أحمد علي']
+    assert sorted(names(client, headers, 'ال')) == ['فاطمة الزهراء', 'محمد الأحمدي']
+    assert names(client, headers, 'محمد الاحمد') == ['محمد الأحمدي']
+    assert names(client, headers, 'فاطمه') == ['فاطمة الزهراء']
+    assert names(client, headers, '1098765432') == ['فاطمة الزهراء']
+    assert names(client, headers, 'fatima') == ['فاطمة الزهراء']
+    assert names(client, headers, 'خالد') == []
+
+
+def test_index_follows_person_writes(app, client, headers):
+    add_persons(app)
+    with app.app_context():
+        person = db.session.get(Person, 2)
+        person.first_name = 'خالد'
+        db.session.delete(db.session.get(Person, 3))
+        db.session.commit()
+    assert names(client, headers, 'محمد') == []
+    assert names(client, headers, 'خالد') == ['خالد الأحمدي']
+    assert names(client, headers, 'فاطمة') == []
+
+    with app.app_context():
+        # إعادة الإنشاء عند تغير الأعمدة المفهرسة تعيد بناء الفهرس من الصفوف الموجودة
+        with db.engine.begin() as connection:
+            connection.execute(text(f'DROP TABLE {PERSON_FTS_TABLE}'))
+            connection.execute(text(f'CREATE VIRTUAL TABLE {PERSON_FTS_TABLE} USING fts5(search_name)'))
+        assert ensure_person_search()
+    assert names(client, headers, 'خالد') == ['خالد الأحمدي']
@@ -0,0 +1,76 @@
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+from src.models.property import db, Unit
+from src.models.contract import Contract, ContractPayment
+from src.models.finance import MaintenanceRequest
+from src.models.notification import Notification, NotificationType
+from src.utils.metrics import MetricsQuery
+
+
+def test_metrics_are_folded_into_one_scan(app):
+    with app.app_context():
+        db.session.get(Unit, 1).status = 'occupied'
+        db.session.get(Unit, 2).status = 'maintenance'
+        db.session.get(Unit, 3).current_rent = 2500
+        db.session.commit()
+
+        query = (MetricsQuery(Unit, Unit.company_id == 1)
+                 .count('total')
+                 .count('available', Unit.status == 'available')
+                 .count('available_large', Unit.status == 'available', Unit.current_rent > 1000)
+                 .sum('available_rent', Unit.current_rent, Unit.status == 'available'))
+        assert str(query.statement()).count('SELECT') == 1
+        assert query.run() == {'total': 5, 'available': 3, 'available_large': 1, 'available_rent': 4500}
+
+
+def test_metrics_without_rows_are_zero(app):
+    with app.app_context():
+        stats = (MetricsQuery(ContractPayment, Contract.company_id == 99)
+                 .join(Contract)
+                 .count('payments')
+                 .sum('amount', ContractPayment.amount)
+                 .run())
+        assert stats == {'payments': 0, 'amount': 0}
+
+
+def test_dashboard_and_stats_endpoints(app, client, headers, create_contract):
+    today = date.today()
+    # أول ثلاث دفعات متأخرة، والعقد ينتهي خلال 30 يوماً
+    contract = create_contract(start_date=(today - relativedelta(months=3)).isoformat(),
+                               end_date=(today + relativedelta(days=20)).isoformat())
+    with app.app_context():
+        first = ContractPayment.query.filter_by(contract_id=contract['id'], payment_number=1).one().id
+        db.session.add(MaintenanceRequest(company_id=1, request_number='MNT-1', description='تسريب', status='open',
+                                          reported_date=today))
+        db.session.add(NotificationType(id=1, company_id=1, name='تذكير'))
+        db.session.add_all([
+            Notification(company_id=1, notification_type_id=1, title='a', message='a', priority='urgent'),
+            Notification(company_id=1, notification_type_id=1, title='b', message='b', priority='high',
+                         status='read'),
+        ])
+        db.session.commit()
+    assert client.post(f'/api/contracts/payments/{first}/pay', headers=headers,
+                       json={'payment_date': today.isoformat()}).status_code == 200
+    assert client.post('/api/finance/expenses', headers=headers, json={
+        'amount': 300, 'expense_date': today.isoformat(), 'category_id': 1, 'status': 'paid'
+    }).status_code == 201
+
+    overview = client.get('/api/dashboard/overview', headers=headers).get_json()
+    assert overview['properties'] == {'total_buildings': 1, 'total_units': 5, 'occupied_units': 1,
+                                      'available_units': 4, 'occupancy_rate': 20.0}
+    assert overview['contracts'] == {'active_contracts': 1, 'expiring_contracts': 1}
+    assert overview['finance'] == {'monthly_revenue': 1000.0, 'monthly_expenses': 300.0, 'net_income': 700.0,
+                                   'overdue_payments': 2, 'overdue_amount': 2000.0}
+    assert overview['maintenance'] == {'open_requests': 1}
+
+    stats = client.get('/api/contracts/stats', headers=headers).get_json()
+    assert stats['contracts'] == {'total': 1, 'active': 1, 'expiring_soon': 1}
+    assert stats['payments'] == {'overdue': 2}
+
+    stats = client.get('/api/properties/stats', headers=headers).get_json()
+    assert stats['buildings'] == {'total': 1}
+    assert (stats['units']['occupied'], stats['units']['available']) == (1, 4)
+
+    stats = client.get('/api/notifications/stats', headers=headers).get_json()
+    assert stats == {'total': 2, 'unread': 1, 'high_priority': 0, 'urgent': 1}
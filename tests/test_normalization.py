@@ -0,0 +1,57 @@
+from sqlalchemy import select, text
+from src.models.property import db, Project
+from src.models.contract import Person
+from src.utils.normalization import (
+    normalize_text, normalize_phone, search_condition, backfill_search_columns
+)
+
+
+def test_normalize_text():
+    assert normalize_text('  أَحْمَـــد   إبراهيم ') == 'احمد ابراهيم'
+    assert normalize_text('مؤسسة مكة الأولى') == 'موسسه مكه الاولي'
+    assert normalize_text('Unit ٤٠١') == 'unit 401'
+    assert normalize_text(None) == ''
+
+
+def test_normalize_phone():
+    for value in ('+966 50 123 4567', '00966501234567', '0501234567', '٠٥٠١٢٣٤٥٦٧', '501234567'):
+        assert normalize_phone(value) == '966501234567'
+    assert normalize_phone('+44 20 7946 0958') == '442079460958'
+    assert normalize_phone('لا يوجد') == ''
+
+
+def test_prefix_search_uses_the_company_index(app, client, headers):
+    with app.app_context():
+        db.session.add_all([
+            Project(company_id=1, name='مشروع الإسكان', is_active=True),
+            Project(company_id=1, name='مشروع النخيل', is_active=True),
+            Project(company_id=1, name='أبراج الواحة', is_active=True),
+        ])
+        db.session.commit()
+
+        stmt = select(Project.id).where(Project.company_id == 1, search_condition(Project.search_name, 'مشروع'))
+        sql = str(stmt.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plan = db.session.execute(text('EXPLAIN QUERY PLAN ' + sql)).all()
+        assert 'ix_projects_company_search' in ' '.join(str(row[-1]) for row in plan)
+
+    def search(term):
+        response = client.get('/api/properties/projects', headers=headers, query_string={'search': term})
+        return sorted(project['name'] for project in response.get_json()['projects'])
+
+    assert search('مشروع الاسكان') == ['مشروع الإسكان']
+    assert search('مشروع') == ['مشروع الإسكان', 'مشروع النخيل']
+    assert search('ابراج') == ['أبراج الواحة']
+    # البحث ببادئة القيمة وليس بجزء من وسطها
+    assert search('النخيل') == []
+
+
+def test_backfill_search_columns(app):
+    with app.app_context():
+        table = Person.__table__
+        db.session.execute(table.insert().values(company_id=1, person_type='tenant', first_name='عائشة',
+                                                 last_name='الإدريسي', phone='0551112222'))
+        db.session.commit()
+        assert backfill_search_columns() == 2
+        person = Person.query.filter_by(first_name='عائشة').one()
+        assert (person.search_name, person.phone_e164) == ('عايشه الادريسي', '966551112222')
+        assert backfill_search_columns() == 0
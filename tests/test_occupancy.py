@@ -0,0 +1,72 @@
+from src.models.property import db, Building, Unit, OccupancyCounter
+from src.utils.occupancy import (
+    company_occupancy, building_occupancy, reconcile_occupancy, seed_occupancy_counters
+)
+
+
+def counts(app, building_id=None):
+    with app.app_context():
+        stats = building_occupancy(1, [building_id])[building_id] if building_id else company_occupancy(1)
+        return {status: count for status, count in stats.items() if count and status != 'occupancy_rate'}
+
+
+def test_unit_transitions(app):
+    with app.app_context():
+        db.session.add(Building(id=2, company_id=1, name='المبنى الثاني', is_active=True))
+        db.session.add(Unit(id=6, company_id=1, building_id=2, unit_number='1', status='reserved'))
+        db.session.commit()
+        db.session.get(Unit, 1).status = 'occupied'
+        db.session.get(Unit, 2).is_active = False
+        db.session.get(Unit, 3).building_id = 2
+        db.session.delete(db.session.get(Unit, 4))
+        db.session.commit()
+
+    assert counts(app) == {'available': 2, 'occupied': 1, 'reserved': 1, 'total': 4}
+    assert counts(app, 1) == {'available': 1, 'occupied': 1, 'total': 2}
+    assert counts(app, 2) == {'available': 1, 'reserved': 1, 'total': 2}
+    with app.app_context():
+        assert reconcile_occupancy(1) == []
+
+
+def test_contract_writes(app, client, headers, create_contract):
+    contract = create_contract(unit_id=1)
+    assert counts(app)['occupied'] == 1
+
+    assert client.put(f"/api/contracts/{contract['id']}/status", headers=headers,
+                      json={'status': 'terminated'}).status_code == 200
+    assert counts(app) == {'available': 5, 'total': 5}
+    assert client.put(f"/api/contracts/{contract['id']}/status", headers=headers,
+                      json={'status': 'active'}).status_code == 200
+    assert client.put('/api/properties/units/3', headers=headers, json={'status': 'maintenance'}).status_code == 200
+    assert counts(app) == {'available': 3, 'occupied': 1, 'maintenance': 1, 'total': 5}
+    with app.app_context():
+        assert reconcile_occupancy(1) == []
+
+
+def test_null_is_active_counts_as_active(app):
+    with app.app_context():
+        table = Unit.__table__
+        db.session.execute(table.update().where(table.c.id == 5).values(is_active=None))
+        db.session.commit()
+        assert reconcile_occupancy(1) == []
+
+        db.session.get(Unit, 5).status = 'occupied'
+        db.session.commit()
+        assert reconcile_occupancy(1) == []
+    assert counts(app) == {'available': 4, 'occupied': 1, 'total': 5}
+
+
+def test_reconcile_and_seed(app):
+    with app.app_context():
+        counter = OccupancyCounter.query.filter_by(company_id=1, building_id=None, status='available').one()
+        counter.unit_count = 9
+        db.session.commit()
+        fixes = reconcile_occupancy(1)
+        assert [(fix['building_id'], fix['status']) for fix in fixes] == [(None, 'available')]
+        assert reconcile_occupancy(1) == []
+
+        OccupancyCounter.query.delete()
+        db.session.commit()
+        assert seed_occupancy_counters()
+        assert seed_occupancy_counters() == []
+    assert counts(app) == {'available': 5, 'total': 5}
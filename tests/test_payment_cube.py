@@ -0,0 +1,80 @@
+from datetime import date, datetime
+
+from src.models.property import db, Building, Unit
+from src.models.contract import ContractPayment
+from src.utils.payment_cube import PaymentCube
+
+ANALYTICS = '/api/finance/analytics/payments'
+
+
+def add_second_building(app):
+    with app.app_context():
+        db.session.add(Building(id=2, company_id=1, name='المبنى الثاني', is_active=True))
+        db.session.add(Unit(id=6, company_id=1, building_id=2, unit_number='1', status='available'))
+        db.session.commit()
+
+
+def pay(client, headers, payments):
+    assert client.post('/api/contracts/payments/pay', headers=headers,
+                       json={'payments': payments}).get_json()['paid'] == len(payments)
+
+
+def groups(client, headers, query):
+    response = client.get(f'{ANALYTICS}?{query}', headers=headers)
+    assert response.status_code == 200
+    result = response.get_json()
+    return result['total'], {group['key']: group['total'] for group in result.get('groups', [])}
+
+
+def test_analytics_groups(app, client, headers, create_contract):
+    add_second_building(app)
+    create_contract(unit_id=1, start_date='2024-01-01', end_date='2024-03-31', rent_amount=1000)
+    create_contract(unit_id=6, start_date='2024-01-01', end_date='2024-03-31', rent_amount=500)
+    pay(client, headers, [
+        {'payment_id': 1, 'payment_date': '2024-01-10', 'payment_method': 'cash'},
+        {'payment_id': 2, 'payment_date': '2024-02-10', 'payment_method': 'transfer', 'paid_amount': 800},
+        {'payment_id': 4, 'payment_date': '2024-01-15', 'payment_method': 'cash'},
+    ])
+
+    period = 'from=2024-01-01&to=2024-02-29'
+    assert groups(client, headers, f'{period}&group_by=building') == (2300.0, {1: 1800.0, 2: 500.0})
+    assert groups(client, headers, f'{period}&group_by=method') == (2300.0, {'cash': 1500.0, 'transfer': 800.0})
+    assert groups(client, headers, f'{period}&group_by=method&building_id=2') == (500.0, {'cash': 500.0})
+    assert groups(client, headers, 'from=2024-01-01&to=2024-03-31&status=all&date_field=due_date&measure=amount'
+                                   '&group_by=status') == (4500.0, {'paid': 2500.0, 'pending': 2000.0})
+    assert client.get(f'{ANALYTICS}?group_by=tenant', headers=headers).status_code == 400
+
+
+def test_group_sum_builds_all_groups_in_one_pass(app, create_contract):
+    add_second_building(app)
+    create_contract(unit_id=1, start_date='2024-01-01', end_date='2024-03-31')
+    create_contract(unit_id=6, start_date='2024-01-01', end_date='2024-03-31', rent_amount=500)
+    with app.app_context():
+        cube = PaymentCube(1)
+        cube.refresh(force=True)
+        totals = cube.group_sum('building', date(2024, 2, 1), date(2024, 3, 31), date_field='due_date',
+                                measure='amount', status=None)
+        assert totals == {1: 200000, 2: 100000}
+        assert len(cube.prefix_cache) == 1
+
+
+def test_refresh_detects_a_delete_with_an_insert(app, client, headers, create_contract):
+    contract = create_contract(start_date='2024-01-01', end_date='2024-03-31')
+    pay(client, headers, [{'payment_id': 1, 'payment_date': '2024-01-10'}])
+    with app.app_context():
+        cube = PaymentCube(1)
+        cube.refresh(force=True)
+        assert cube.range_sum(date(2024, 1, 1), date(2024, 1, 31)) == 100000
+
+        # عدد الدفعات لم يتغير لكن الدفعة المسددة حُذفت
+        table = ContractPayment.__table__
+        db.session.execute(table.delete().where(table.c.id == 1))
+        db.session.execute(table.insert().values(
+            contract_id=contract['id'], payment_number=4, due_date=date(2024, 4, 1), amount=1000,
+            paid_amount=300, payment_date=date(2024, 1, 20), status='paid', updated_at=datetime.utcnow()
+        ))
+        db.session.commit()
+
+        cube.refresh(force=True)
+        assert cube.range_sum(date(2024, 1, 1), date(2024, 1, 31)) == 30000
+        assert sorted(cube.ids) == [2, 3, 4]
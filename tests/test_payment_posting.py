@@ -0,0 +1,89 @@
+from datetime import date
+
+from src.models.property import db, Company
+from src.models.contract import Contract, ContractPayment
+from src.models.notification import Notification, NotificationType
+
+
+def payment_ids(app, contract_id):
+    with app.app_context():
+        return [payment.id for payment in ContractPayment.query.filter_by(contract_id=contract_id)
+                .order_by(ContractPayment.payment_number)]
+
+
+def test_mark_payment_paid(app, client, headers, create_contract, assert_consistent):
+    contract = create_contract()
+    first, second = payment_ids(app, contract['id'])[:2]
+
+    response = client.post(f'/api/contracts/payments/{first}/pay', headers=headers)
+    assert response.status_code == 200
+    response = client.post(f'/api/contracts/payments/{second}/pay', headers=headers,
+                           json={'paid_amount': 400, 'payment_date': '2024-03-10'})
+    assert response.status_code == 200
+    assert_consistent()
+
+    # الدفعة المسجلة لا تُسجل مرة أخرى، والتاريخ غير الصالح خطأ في الطلب
+    assert client.post(f'/api/contracts/payments/{first}/pay', headers=headers).status_code == 400
+    third = payment_ids(app, contract['id'])[2]
+    response = client.post(f'/api/contracts/payments/{third}/pay', headers=headers,
+                           json={'payment_date': '10/03/2024'})
+    assert response.status_code == 400
+    assert client.post('/api/contracts/payments/999999/pay', headers=headers).status_code == 404
+    assert_consistent()
+
+    with app.app_context():
+        payment = db.session.get(ContractPayment, second)
+        assert (payment.status, float(payment.paid_amount), payment.payment_date.isoformat()) == \
+            ('paid', 400.0, '2024-03-10')
+
+
+def test_mark_payments_paid_batch(app, client, headers, create_contract, assert_consistent):
+    contract = create_contract()
+    ids = payment_ids(app, contract['id'])
+    with app.app_context():
+        db.session.add(NotificationType(id=1, company_id=1, name='استحقاق دفعة'))
+        db.session.add(Notification(company_id=1, notification_type_id=1, title='دفعة مستحقة', message='-',
+                                    payment_id=ids[0]))
+        db.session.commit()
+
+    response = client.post('/api/contracts/payments/pay', headers=headers, json={'payments': [
+        {'payment_id': ids[0]},
+        {'payment_id': ids[1], 'paid_amount': 250.5, 'payment_date': '2024-02-03'},
+        {'payment_id': ids[0]},
+        {'payment_id': 999999},
+        {'payment_id': ids[2], 'paid_amount': -5}
+    ]})
+    assert response.status_code == 200
+    result = response.get_json()
+    # العناصر المرفوضة لا تمنع تسجيل الصالحة في المعاملة نفسها
+    assert (result['total'], result['paid'], result['failed']) == (5, 2, 3)
+    assert [item['success'] for item in result['results']] == [True, True, False, False, False]
+    assert result['results'][2]['error'] == 'الدفعة مكررة في الطلب'
+    assert_consistent()
+
+    with app.app_context():
+        assert [payment.status for payment in ContractPayment.query.filter(ContractPayment.id.in_(ids[:3]))
+                .order_by(ContractPayment.id)] == ['paid', 'paid', 'pending']
+        assert Notification.query.one().status == 'archived'
+
+    assert client.post('/api/contracts/payments/pay', headers=headers, json={'payments': []}).status_code == 400
+    assert client.post('/api/contracts/payments/pay', headers=headers,
+                       json={'payments': [{'payment_id': 1}] * 1001}).status_code == 400
+
+
+def test_payments_of_other_companies_are_not_found(app, client, headers, create_contract):
+    create_contract()
+    with app.app_context():
+        db.session.add(Company(id=2, name='Other'))
+        db.session.add(Contract(id=50, company_id=2, contract_number='OTHER-1', unit_id=5, tenant_id=1,
+                                start_date=date(2024, 1, 1), end_date=date(2024, 12, 31),
+                                rent_amount=100, status='expired'))
+        db.session.add(ContractPayment(id=500, contract_id=50, payment_number=1, amount=100, status='pending',
+                                       due_date=date(2024, 1, 1)))
+        db.session.commit()
+
+    result = client.post('/api/contracts/payments/pay', headers=headers,
+                         json={'payments': [{'payment_id': 500}]}).get_json()
+    assert (result['paid'], result['results'][0]['error']) == (0, 'الدفعة غير موجودة')
+    with app.app_context():
+        assert db.session.get(ContractPayment, 500).status == 'pending'
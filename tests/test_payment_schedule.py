@@ -0,0 +1,90 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from src.models.contract import ContractPayment
+from src.utils.payment_schedule import (
+    payment_schedule, contract_value, period_starts, payment_rows, PAYMENT_FREQUENCIES, PAYMENT_COLUMNS
+)
+
+
+def test_period_starts_keep_the_start_day():
+    assert period_starts(date(2024, 1, 31), 1, 4) == [
+        date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)
+    ]
+    assert period_starts(date(2023, 11, 30), 3, 3) == [date(2023, 11, 30), date(2024, 2, 29), date(2024, 5, 30)]
+
+
+def test_full_periods():
+    schedule = payment_schedule(date(2024, 1, 1), date(2024, 12, 31), 1000, 'quarterly')
+    assert [(number, due_date) for number, due_date, _ in schedule] == [
+        (1, date(2024, 1, 1)), (2, date(2024, 4, 1)), (3, date(2024, 7, 1)), (4, date(2024, 10, 1))
+    ]
+    assert {amount for _, _, amount in schedule} == {Decimal('3000.00')}
+
+
+def test_partial_last_period_is_pro_rated():
+    # 15 يوماً من فترة شهرية طولها 31 يوماً
+    schedule = payment_schedule(date(2024, 1, 1), date(2024, 3, 15), 3100, 'monthly')
+    assert [amount for _, _, amount in schedule] == [Decimal('3100.00'), Decimal('3100.00'), Decimal('1500.00')]
+
+
+@pytest.mark.parametrize('frequency', sorted(PAYMENT_FREQUENCIES))
+@pytest.mark.parametrize('start_date, end_date', [
+    (date(2024, 1, 1), date(2024, 12, 31)),
+    (date(2024, 1, 31), date(2025, 3, 17)),
+    (date(2023, 2, 28), date(2026, 2, 27)),
+    (date(2024, 5, 10), date(2024, 5, 10)),
+])
+@pytest.mark.parametrize('rent_amount', ['1000', '1333.33', '2750.125', '0.01'])
+def test_totals_match_contract_value(frequency, start_date, end_date, rent_amount):
+    """مجموع الدفعات يساوي قيمة الفترات الكاملة زائد حصة الفترة الأخيرة مقربة بالهللات تماماً"""
+    schedule = payment_schedule(start_date, end_date, rent_amount, frequency)
+    amounts = [amount for _, _, amount in schedule]
+    assert sum(amounts) == contract_value(start_date, end_date, rent_amount, frequency)
+    assert all(amount == amount.quantize(Decimal('0.01')) for amount in amounts)
+
+    months = PAYMENT_FREQUENCIES[frequency]
+    period = Decimal(rent_amount) * months
+    due_dates = [due_date for _, due_date, _ in schedule]
+    next_start = period_starts(start_date, months, len(schedule) + 1)[-1]
+    last_days = (next_start - due_dates[-1]).days
+    covered = (end_date - due_dates[-1]).days + 1
+    expected = period * (len(schedule) - 1) + period * min(covered, last_days) / last_days
+    assert sum(amounts) == expected.quantize(Decimal('0.01'))
+
+    # فرق التقريب يوزع على الفترات الكاملة ولا يتجمع في آخرها
+    full = amounts if covered >= last_days else amounts[:-1]
+    if full:
+        assert max(full) - min(full) <= Decimal('0.01')
+
+
+def test_end_before_start():
+    assert payment_schedule(date(2024, 2, 1), date(2024, 1, 31), 1000, 'monthly') == []
+    assert contract_value(date(2024, 2, 1), date(2024, 1, 31), 1000, 'monthly') == Decimal('0.00')
+
+
+def test_payment_rows_share_columns():
+    """كل الصفوف بنفس المفاتيح، والدفعات المستحقة حتى paid_until مدفوعة بكامل مبلغها"""
+    schedule = payment_schedule(date(2024, 1, 15), date(2024, 4, 14), 900, 'monthly')
+    rows = payment_rows(7, schedule, datetime(2024, 1, 1), paid_until=date(2024, 2, 15), payment_method='cash')
+    assert all(tuple(row) == PAYMENT_COLUMNS for row in rows)
+    assert [(row['status'], row['paid_amount'], row['payment_date'], row['payment_method']) for row in rows] == [
+        ('paid', Decimal('900.00'), date(2024, 1, 15), 'cash'),
+        ('paid', Decimal('900.00'), date(2024, 2, 15), 'cash'),
+        ('pending', 0, None, None),
+    ]
+
+
+def test_contract_payments_are_inserted_from_the_schedule(app, create_contract):
+    contract = create_contract(start_date='2024-01-31', end_date='2024-08-15', rent_amount=1333.33,
+                               payment_frequency='quarterly')
+    with app.app_context():
+        payments = ContractPayment.query.filter_by(contract_id=contract['id']) \
+            .order_by(ContractPayment.payment_number).all()
+        assert [(payment.payment_number, payment.due_date, payment.amount, payment.status)
+                for payment in payments] == [
+            (number, due_date, amount, 'pending')
+            for number, due_date, amount in payment_schedule(date(2024, 1, 31), date(2024, 8, 15), 1333.33,
+                                                             'quarterly')
+        ]
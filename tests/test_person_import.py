@@ -0,0 +1,70 @@
+import io
+
+from src.models.property import db
+from src.models.contract import Person
+from src.utils.bulk_import import document_key
+from src.utils.caller_id import lookup_caller
+
+BODY = 'first_name,last_name,id_number,passport_number,phone,email\n' \
+       'أحمد,علي,1234567890,,+966501234567,ahmed@example.com\n' \
+       'سارة,خالد,,P-123,0551112222,\n' \
+       'سارة,خالد,,p123,,\n' \
+       'محمد,حسن,,,0501234567,\n' \
+       'أحمد,علي,1234567890,,,\n' \
+       ',,,,,\n' \
+       'بدون,هاتف,,,,\n'
+
+
+def upload(client, headers, body, dry_run=False):
+    url = '/api/contracts/persons/import' + ('?dry_run=1' if dry_run else '')
+    response = client.post(url, headers=headers, content_type='multipart/form-data',
+                           data={'file': (io.BytesIO(body.encode('utf-8')), 'persons.csv')})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def set_documents(app):
+    with app.app_context():
+        person = db.session.get(Person, 1)
+        person.id_number, person.phone = '1-234-567-890', '050 123 4567'
+        db.session.commit()
+
+
+def test_document_key():
+    assert document_key(' 1-234 567/890 ') == '1234567890'
+    assert document_key('P.١٢٣') == 'p123'
+    assert document_key(None) == ''
+
+
+def test_persons_are_deduplicated(app, client, headers):
+    set_documents(app)
+    report = upload(client, headers, BODY)
+    assert (report['imported'], report['failed']) == (3, 2)
+    assert report['actions'] == {'update': 1, 'insert': 2, 'duplicate': 2}
+    # الهوية بفواصل مختلفة والهاتف بصيغة مختلفة ليسا تغييراً؛ البريد فقط تغير
+    assert report['rows'][0] == {'row': 2, 'action': 'update', 'person_id': 1, 'matched_by': 'id_number',
+                                 'changes': ['email']}
+    assert report['rows'][2] == {'row': 4, 'action': 'duplicate', 'matched_by': 'passport_number', 'row_of': 3}
+    assert report['rows'][3] == {'row': 6, 'action': 'duplicate', 'matched_by': 'id_number', 'person_id': 1}
+    # الهاتف يطابق شخصاً باسم مختلف
+    assert [error['row'] for error in report['errors']] == [5, 7]
+
+    with app.app_context():
+        assert db.session.get(Person, 1).email == 'ahmed@example.com'
+        sara = Person.query.filter_by(first_name='سارة').one()
+        assert (sara.phone_e164, sara.phone_tail, sara.search_name) == ('966551112222', '1112222', 'ساره خالد')
+        assert [match['person']['id'] for match in lookup_caller(1, '1112222')[1]] == [sara.id]
+        assert Person.query.count() == 3
+
+    # إعادة الاستيراد لا تضيف إلا الصف الذي ليس له مفتاح مطابقة
+    report = upload(client, headers, BODY)
+    assert (report['imported'], report['actions']) == (1, {'duplicate': 4, 'insert': 1})
+
+
+def test_dry_run_only_classifies(app, client, headers):
+    set_documents(app)
+    report = upload(client, headers, BODY, dry_run=True)
+    assert (report['dry_run'], report['actions']) == (True, {'update': 1, 'insert': 2, 'duplicate': 2})
+    with app.app_context():
+        assert Person.query.count() == 1
+        assert db.session.get(Person, 1).email is None
@@ -0,0 +1,131 @@
+import io
+
+import pytest
+from src.models.property import db
+from src.models.contract import ContractPayment, Cheque
+from src.utils.reconciliation import StatementReconciler, reconcile_statement, apply_matches
+
+
+@pytest.fixture
+def contracts(app, create_contract):
+    """عقدان بنفس الإيجار الشهري وعقد ثالث بمبلغ مختلف، وشيك مربوط بالدفعة الثالثة للأول"""
+    first = create_contract(unit_id=1, rent_amount=1000)
+    second = create_contract(unit_id=2, rent_amount=1000)
+    third = create_contract(unit_id=3, start_date='2024-01-10', rent_amount=1500)
+    with app.app_context():
+        payments = {
+            (contract['id'], payment.payment_number): payment.id
+            for contract in (first, second, third)
+            for payment in ContractPayment.query.filter_by(contract_id=contract['id'])
+        }
+        covered = db.session.get(ContractPayment, payments[(first['id'], 3)])
+        cheque = Cheque(company_id=1, contract_id=first['id'], payment_id=covered.id, cheque_number='555',
+                        amount=1000, due_date=covered.due_date)
+        db.session.add(cheque)
+        db.session.commit()
+        return first, second, third, payments, cheque.id
+
+
+def statement(*rows):
+    lines = ['date,amount,reference,description,cheque_number'] + [','.join(row) for row in rows]
+    return io.BytesIO(('\n'.join(lines) + '\n').encode('utf-8'))
+
+
+def reconcile(app, stream, window_days=3):
+    with app.app_context():
+        return StatementReconciler(1, window_days).run(stream).to_dict()
+
+
+def test_matching_passes(app, contracts):
+    first, second, third, payments, cheque_id = contracts
+    report = reconcile(app, statement(
+        ('2024-03-05', '1000', 'CHQ', '', '000555'),
+        ('2024-01-03', '1000', 'TRX1', '', ''),
+        ('2024-01-02', '1000', 'TRX2', f"تحويل إيجار {second['contract_number']}", ''),
+        ('2024-01-11', '1500', 'TRX3', '', ''),
+        ('02/02/2024', '"1,000.00"', 'TRX4', '', ''),
+        ('2024-06-01', '1234.50', 'X', '', ''),
+        ('2024-01-11', '-50', 'FEE', '', ''),
+        ('bad', '10', '', '', ''),
+    ))
+    matched = {line['line']: (line['match']['type'], line['match']['id'], line['reason'])
+               for line in report['matched']}
+
+    # المرحلة الأولى: رقم الشيك بأصفار بادئة يطابق الشيك حتى خارج نافذة التاريخ
+    assert matched[2] == ('cheque', cheque_id, 'cheque_number')
+    # المرحلة الثانية: رقم العقد في الوصف يحسم بين عقدين بنفس المبلغ والتاريخ
+    assert matched[4] == ('payment', payments[(second['id'], 1)], 'contract_reference')
+    assert matched[5] == ('payment', payments[(third['id'], 1)], 'amount_date')
+    # المرحلة الثالثة: الحركة الغامضة بقي لها مرشح واحد بعد مطابقة الحركة التي تليها
+    assert matched[3] == ('payment', payments[(first['id'], 1)], 'amount_date')
+
+    ambiguous = {line['line']: {item['id'] for item in line['candidates']} for line in report['ambiguous']}
+    assert ambiguous == {6: {payments[(first['id'], 2)], payments[(second['id'], 2)]}}
+    assert [line['line'] for line in report['unmatched']] == [7]
+    summary = report['summary']
+    assert (summary['ignored_debits'], summary['failed']) == (1, 1)
+
+
+def test_covered_payment_is_matched_through_its_cheque(app, contracts):
+    first, _, _, payments, cheque_id = contracts
+    report = reconcile(app, statement(('2024-03-01', '1000', 'TRX', first['contract_number'], '')))
+    assert [(line['match']['type'], line['match']['id']) for line in report['matched']] == [('cheque', cheque_id)]
+
+
+def test_cheque_number_with_different_amount_is_ambiguous(app, contracts):
+    _, _, _, _, cheque_id = contracts
+    report = reconcile(app, statement(('2024-03-01', '900', 'CHQ', '', '555')))
+    assert report['matched'] == []
+    assert [item['id'] for item in report['ambiguous'][0]['candidates']] == [cheque_id]
+
+
+def test_window_days(app, contracts):
+    _, _, third, payments, _ = contracts
+    row = ('2024-01-14', '1500', 'TRX', '', '')
+    assert reconcile(app, statement(row), window_days=3)['summary']['unmatched'] == 1
+    assert reconcile(app, statement(row), window_days=5)['matched'][0]['match']['id'] == payments[(third['id'], 1)]
+
+    with app.app_context(), pytest.raises(ValueError):
+        StatementReconciler(1, 60)
+
+
+def test_apply_confirmed_matches(app, contracts, assert_consistent):
+    first, _, third, payments, cheque_id = contracts
+    with app.app_context():
+        report = reconcile_statement(1, statement(
+            ('2024-03-04', '1000', 'CHQ', '', '555'),
+            ('2024-01-11', '1500', 'TRX', '', ''),
+        ), window_days=3, apply=True)
+        assert (report['applied']['applied'], report['applied']['payments_paid']) == (2, 2)
+        assert db.session.get(Cheque, cheque_id).status == 'cleared'
+        assert db.session.get(ContractPayment, payments[(first['id'], 3)]).status == 'paid'
+        assert db.session.get(ContractPayment, payments[(third['id'], 1)]).status == 'paid'
+    assert_consistent()
+
+    # البنود المطابقة لم تعد مفتوحة
+    report = reconcile(app, statement(('2024-01-11', '1500', 'TRX', '', '')))
+    assert report['summary']['unmatched'] == 1
+
+
+def test_cheque_fails_when_its_payment_is_rejected(app, contracts, assert_consistent):
+    """الدفعة المطابقة مباشرة في الطلب نفسه تُرفض كدفعة للشيك، فلا يُصرف الشيك"""
+    first, _, _, payments, cheque_id = contracts
+    covered = payments[(first['id'], 3)]
+    with app.app_context():
+        result = apply_matches(1, [
+            {'type': 'payment', 'id': covered, 'date': '2024-03-02'},
+            {'type': 'cheque', 'id': cheque_id, 'date': '2024-03-04'},
+            {'type': 'cheque', 'id': 999999, 'date': '2024-03-04'},
+        ])
+        assert (result['applied'], result['failed'], result['cheques_cleared'], result['payments_paid']) == \
+            (1, 2, 0, 1)
+        assert result['results'][1] == {'type': 'cheque', 'id': cheque_id, 'success': False, 'payment_id': covered,
+                                        'error': 'الدفعة المرتبطة: الدفعة مكررة في الطلب'}
+        assert db.session.get(Cheque, cheque_id).status == 'received'
+        payment = db.session.get(ContractPayment, covered)
+        assert (payment.status, payment.payment_method, payment.payment_date.isoformat()) == \
+            ('paid', 'bank_transfer', '2024-03-02')
+    assert_consistent()
+
+    with app.app_context(), pytest.raises(ValueError):
+        apply_matches(1, [])
@@ -0,0 +1,59 @@
+from datetime import date
+from decimal import Decimal
+
+from src.models.property import db, Building, Unit
+from src.models.contract import Contract, RecurringRevenueMovement
+from src.utils.recurring_revenue import current_mrr, mrr_series, rebuild_mrr, seed_mrr
+
+
+def test_mrr_follows_contract_writes(app, client, headers, create_contract):
+    with app.app_context():
+        db.session.add(Building(id=2, company_id=1, name='المبنى الثاني', is_active=True))
+        db.session.add(Unit(id=6, company_id=1, building_id=2, unit_number='1', status='available'))
+        db.session.commit()
+    first = create_contract(unit_id=1, start_date='2024-01-01', end_date='2026-12-31', rent_amount=1000)
+    create_contract(unit_id=6, start_date='2024-03-15', end_date='2026-12-31', rent_amount=500,
+                    payment_frequency='quarterly')
+
+    response = client.get('/api/contracts/mrr?from=2024-01-01&to=2024-04-30&group_by=building', headers=headers)
+    assert response.status_code == 200
+    result = response.get_json()
+    assert [(item['period'], item['mrr'], item['net_change']) for item in result['series']] == [
+        ('2024-01-01', 1000.0, 1000.0), ('2024-02-01', 1000.0, 0.0), ('2024-03-01', 1500.0, 500.0),
+        ('2024-04-01', 1500.0, 0.0)
+    ]
+    assert result['series'][-1]['groups'] == [{'key': 1, 'mrr': 1000.0}, {'key': 2, 'mrr': 500.0}]
+    assert (result['current_mrr'], result['current_arr']) == (1500.0, 18000.0)
+
+    # الإنهاء يخصم الإيراد من الشهر الحالي دون تغيير التاريخ السابق
+    assert client.put(f"/api/contracts/{first['id']}/status", headers=headers,
+                      json={'status': 'terminated'}).status_code == 200
+    with app.app_context():
+        assert current_mrr(1) == Decimal('500.00')
+        assert current_mrr(1, as_of=date(2024, 4, 1)) == Decimal('1500.00')
+
+        contract = db.session.get(Contract, first['id'])
+        contract.status = 'active'
+        contract.rent_amount = 1200
+        db.session.commit()
+        assert current_mrr(1, group_by='building') == {1: Decimal('1200.00'), 2: Decimal('500.00')}
+
+    assert client.get('/api/contracts/mrr?group_by=tenant', headers=headers).status_code == 400
+    assert client.get('/api/contracts/mrr?granularity=week', headers=headers).status_code == 400
+
+
+def test_rebuild_and_seed(app, create_contract):
+    create_contract(start_date='2024-01-01', rent_amount=1000)
+    create_contract(unit_id=2, start_date='2024-02-10', rent_amount=750)
+    with app.app_context():
+        RecurringRevenueMovement.query.update({'mrr_change': 1})
+        db.session.commit()
+        assert rebuild_mrr(1) == 2
+        assert [item['mrr'] for item in mrr_series(1, 'month', date(2024, 1, 1), date(2024, 2, 29))] == \
+            [1000.0, 1750.0]
+
+        RecurringRevenueMovement.query.delete()
+        db.session.commit()
+        assert seed_mrr() == 2
+        assert seed_mrr() == 0
+        assert current_mrr(1) == Decimal('1750.00')
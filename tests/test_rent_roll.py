@@ -0,0 +1,30 @@
+import json
+
+from src.models.property import db, Unit
+from src.models.contract import ContractPayment
+
+
+def test_rent_roll_streams_the_active_contract_and_next_due(app, client, headers, create_contract):
+    old = create_contract(unit_id=1, start_date='2023-01-01', end_date='2023-12-31', rent_amount=900)
+    assert client.put(f"/api/contracts/{old['id']}/status", headers=headers,
+                      json={'status': 'terminated'}).status_code == 200
+    contract = create_contract(unit_id=1, start_date='2024-01-01', end_date='2024-12-31', rent_amount=1100)
+    with app.app_context():
+        first = ContractPayment.query.filter_by(contract_id=contract['id'], payment_number=1).one().id
+        db.session.get(Unit, 2).is_active = False
+        db.session.commit()
+    assert client.post(f'/api/contracts/payments/{first}/pay', headers=headers).status_code == 200
+
+    response = client.get('/api/reports/rent-roll', headers=headers)
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [row['unit_number'] for row in rows] == ['101', '103', '104', '105']
+    assert (rows[0]['contract_id'], rows[0]['rent_amount'], rows[0]['tenant_name'], rows[0]['next_due_date'],
+            rows[0]['next_due_amount']) == (contract['id'], 1100.0, 'أحمد علي', '2024-02-01', 1100.0)
+    assert (rows[1]['contract_id'], rows[1]['next_due_date']) == (None, None)
+
+    response = client.get('/api/reports/rent-roll?format=csv&building_id=1', headers=headers)
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0].startswith('\ufeffbuilding_id,building_name,unit_id')
+    assert len(lines) == 5
+    assert client.get('/api/reports/rent-roll?format=xlsx', headers=headers).status_code == 400
@@ -0,0 +1,87 @@
+from datetime import date
+
+import pytest
+from src.models.property import db, Building, Unit
+from src.models.contract import Person, Cheque
+from src.models.finance import Expense
+from src.utils import search_index
+from src.utils.search_index import global_search, rebuild_search_index
+
+
+def search(client, headers, query, **params):
+    response = client.get('/api/search', headers=headers, query_string={'q': query, **params})
+    assert response.status_code == 200
+    result = response.get_json()
+    return [(item['type'], item['id']) for item in result['results']], result['totals']
+
+
+def contract_numbers(client, headers, term):
+    response = client.get('/api/contracts/', headers=headers, query_string={'search': term})
+    assert response.status_code == 200
+    return [contract['contract_number'] for contract in response.get_json()['contracts']]
+
+
+def test_global_search_across_types(app, client, headers, create_contract):
+    contract = create_contract()
+    with app.app_context():
+        db.session.add(Expense(company_id=1, expense_number='EXP-1', amount=50, vendor_name='مؤسسة أحمد للصيانة',
+                               expense_date=date(2024, 1, 5)))
+        db.session.add(Building(id=2, company_id=2, name='أحمد تاور', is_active=True))
+        db.session.commit()
+
+    # العنوان أهم من التفاصيل: المستأجر قبل العقد الذي يحمل اسمه، وشركة أخرى لا تظهر
+    results, totals = search(client, headers, 'احمد')
+    assert results[0] == ('person', 1)
+    assert totals == {'person': 1, 'contract': 1, 'expense': 1}
+    assert search(client, headers, 'احمد', types='contract')[0] == [('contract', contract['id'])]
+    assert search(client, headers, 'المبنى الاول 101', types='unit')[0] == [('unit', 1)]
+    assert search(client, headers, 'احمد', limit=1, types='person,contract')[1] == {'person': 1, 'contract': 1}
+
+    assert client.get('/api/search?q=x&types=tenant', headers=headers).status_code == 400
+    assert client.get('/api/search', headers=headers).status_code == 400
+
+
+def test_index_follows_writes(app, client, headers, create_contract):
+    contract = create_contract()
+    with app.app_context():
+        # تغيير اسم المبنى يعيد فهرسة وحداته وعقوده
+        db.session.get(Building, 1).name = 'برج الريان'
+        db.session.get(Person, 1).first_name = 'يوسف'
+        db.session.delete(db.session.get(Unit, 5))
+        db.session.commit()
+    assert search(client, headers, 'الريان', types='unit,contract')[1] == {'unit': 4, 'contract': 1}
+    assert search(client, headers, 'يوسف', types='contract')[0] == [('contract', contract['id'])]
+    assert search(client, headers, 'احمد')[0] == []
+
+    response = client.post('/api/contracts/cheques/series', headers=headers, json={
+        'contract_id': contract['id'], 'start_cheque_number': '000120', 'bank_name': 'Bank', 'count': 2
+    })
+    assert response.status_code == 201
+    assert search(client, headers, '000121')[0] == [('cheque', response.get_json()['cheques'][1]['id'])]
+
+    with app.app_context():
+        documents = rebuild_search_index()
+        assert documents == 1 + 4 + 1 + 1 + 2
+        assert global_search(1, 'الريان', ['building'])[1] == {'building': 1}
+        with pytest.raises(ValueError):
+            global_search(1, 'x', ['tenant'])
+
+
+def test_fallback_search_matches_document_numbers(app, client, headers, create_contract, monkeypatch):
+    contract = create_contract()
+    with app.app_context():
+        db.session.add(Cheque(company_id=1, contract_id=contract['id'], cheque_number='CHQ-77', amount=10,
+                              due_date=date(2024, 1, 1), status='received'))
+        db.session.commit()
+    prefix = contract['contract_number'][:6]
+    assert contract_numbers(client, headers, prefix) == [contract['contract_number']]
+
+    # بدون FTS5 يُقارن رقم العقد أو الشيك بحروف صغيرة مع نص البحث الموحد
+    monkeypatch.setattr(search_index, 'search_available', lambda: False)
+    assert contract_numbers(client, headers, prefix.lower()) == [contract['contract_number']]
+    assert contract_numbers(client, headers, prefix) == [contract['contract_number']]
+    with app.app_context():
+        results, totals = global_search(1, prefix, ['contract', 'person'])
+        assert (results[0]['id'], totals) == (contract['id'], {'contract': 1})
+        assert global_search(1, 'chq-7', ['cheque'])[1] == {'cheque': 1}
+        assert global_search(1, 'احمد', ['person', 'contract'])[1] == {'person': 1}
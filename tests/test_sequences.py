@@ -0,0 +1,110 @@
+import threading
+from datetime import datetime, date
+
+import pytest
+from sqlalchemy import inspect, text
+from src.models.property import db, Company, DocumentSequence
+from src.models.finance import Expense
+from src.utils import sequences
+from src.utils.schema import ensure_schema
+from conftest import build_app
+
+YEAR = datetime.now().year
+
+
+def test_numbers_continue_after_existing(app):
+    with app.app_context():
+        db.session.add(Expense(company_id=1, expense_number=f'EXP-{YEAR}-0007', amount=1, expense_date=date.today()))
+        db.session.commit()
+
+        assert sequences.next_number('expense') == f'EXP-{YEAR}-0008'
+        assert sequences.reserve_numbers('expense', 2) == [f'EXP-{YEAR}-0009', f'EXP-{YEAR}-0010']
+        assert sequences.next_number('maintenance') == f'MNT-{YEAR}-0001'
+        db.session.commit()
+
+
+def test_numbers_are_unique_across_companies(client, headers, app):
+    with app.app_context():
+        db.session.add(Company(id=2, name='Other'))
+        db.session.commit()
+        other = sequences.reserve_numbers('expense', 3)
+
+    created = []
+    for _ in range(3):
+        response = client.post('/api/finance/expenses', headers=headers,
+                               json={'amount': 10, 'expense_date': '2024-01-01', 'category_id': 1})
+        assert response.status_code == 201
+        created.append(response.get_json()['expense']['expense_number'])
+
+    assert len(set(other + created)) == 6
+    with app.app_context():
+        # صف واحد لكل نوع وسنة هو مصدر كل الأرقام
+        assert DocumentSequence.query.filter_by(document_type='expense').count() == 1
+
+
+def test_numbers_taken_by_hand_are_skipped(app):
+    with app.app_context():
+        assert sequences.next_number('expense') == f'EXP-{YEAR}-0001'
+        db.session.add(Expense(company_id=1, expense_number=f'EXP-{YEAR}-0002', amount=1, expense_date=date.today()))
+        db.session.commit()
+        assert sequences.reserve_numbers('expense', 2) == [f'EXP-{YEAR}-0003', f'EXP-{YEAR}-0004']
+
+
+def test_legacy_per_company_table_is_recreated(app):
+    """جدول التسلسل القديم (صف لكل شركة) يُعاد إنشاؤه، والترقيم يستأنف من أكبر رقم موجود"""
+    with app.app_context():
+        db.session.add(Expense(company_id=1, expense_number=f'EXP-{YEAR}-0041', amount=1, expense_date=date.today()))
+        db.session.commit()
+        DocumentSequence.__table__.drop(db.engine)
+        with db.engine.begin() as connection:
+            connection.execute(text(
+                'CREATE TABLE document_sequences (id INTEGER PRIMARY KEY, company_id INTEGER NOT NULL, '
+                'document_type VARCHAR(50) NOT NULL, year INTEGER NOT NULL, last_value INTEGER NOT NULL, '
+                'updated_at DATETIME)'
+            ))
+            connection.execute(text(
+                "INSERT INTO document_sequences (company_id, document_type, year, last_value) "
+                "VALUES (1, 'expense', :year, 3), (2, 'expense', :year, 5)"
+            ), {'year': YEAR})
+
+        ensure_schema()
+        assert 'company_id' not in {column['name'] for column in inspect(db.engine).get_columns('document_sequences')}
+        assert DocumentSequence.query.count() == 0
+        assert sequences.next_number('expense') == f'EXP-{YEAR}-0042'
+        db.session.commit()
+
+
+@pytest.mark.parametrize('block_size', [1, 10])
+def test_concurrent_workers_get_unique_numbers(tmp_path, block_size):
+    # قاعدة ملف: كل عامل باتصاله الخاص (قاعدة الذاكرة تتشارك اتصالاً واحداً)
+    app = build_app(f"sqlite:///{tmp_path / 'sequences.db'}")
+    app.config['DOCUMENT_NUMBER_BLOCK_SIZE'] = block_size
+    numbers = []
+    errors = []
+
+    def worker():
+        with app.app_context():
+            for _ in range(25):
+                try:
+                    numbers.append(sequences.next_number('expense'))
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    errors.append(e)
+
+    sequences.clear_blocks()
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sequences.clear_blocks()
+
+    assert errors == []
+    assert len(numbers) == len(set(numbers)) == 150
+
+
+def test_unknown_document_type(app):
+    with app.app_context():
+        with pytest.raises(ValueError):
+            sequences.next_number('invoice')
@@ -0,0 +1,73 @@
+from datetime import date, timedelta
+
+import pytest
+from src.models.property import db, Unit, OccupancySnapshot
+from src.utils.snapshots import take_snapshot, compact_snapshots, run_nightly, snapshot_series
+
+
+def snapshot_rows(period_type):
+    return [(row.period_start, row.sample_days, row.occupied_units, row.vacancy_days)
+            for row in OccupancySnapshot.query.filter_by(period_type=period_type)
+            .order_by(OccupancySnapshot.period_start)]
+
+
+def test_take_snapshot_replaces_the_same_day(app, create_contract):
+    create_contract(unit_id=1, rent_amount=1200)
+    with app.app_context():
+        assert take_snapshot(date(2024, 1, 1)) == 1
+        db.session.get(Unit, 2).status = 'maintenance'
+        db.session.commit()
+        assert take_snapshot(date(2024, 1, 1)) == 1
+
+        row = OccupancySnapshot.query.one()
+        assert (row.total_units, row.available_units, row.occupied_units, row.maintenance_units) == (5, 3, 1, 1)
+        assert (float(row.contracted_rent), row.vacancy_days) == (1200.0, 3)
+
+
+def test_compaction_rolls_up_and_expires(app):
+    with app.app_context():
+        # لقطات يومية من 1 إلى 14 يناير 2024، وتُشغل وحدة إضافية كل يوم من الأيام الخمسة الأولى
+        for offset in range(14):
+            if offset < 5:
+                db.session.get(Unit, offset + 1).status = 'occupied'
+                db.session.commit()
+            take_snapshot(date(2024, 1, 1) + timedelta(days=offset))
+
+        # الأسبوع الجاري (8-14 يناير) والشهر الجاري لم يكتملا بعد
+        assert compact_snapshots(date(2024, 1, 10)) == (1, 0)
+        assert snapshot_rows('week') == [(date(2024, 1, 1), 7, 5, 10)]
+        assert compact_snapshots(date(2024, 1, 10)) == (0, 0)
+
+        assert run_nightly(date(2024, 2, 1)) == {'buildings': 1, 'weekly_rollups': 1, 'monthly_rollups': 1}
+        assert snapshot_rows('month') == [(date(2024, 1, 1), 14, 5, 10)]
+
+        # بعد 90 يوماً تبقى الصفوف الأسبوعية والشهرية فقط، وبعد سنتين الشهرية فقط
+        compact_snapshots(date(2024, 6, 1))
+        assert snapshot_rows('day') == []
+        assert len(snapshot_rows('week')) == 3
+        compact_snapshots(date(2026, 3, 1))
+        assert snapshot_rows('week') == []
+        assert len(snapshot_rows('month')) == 2
+
+
+def test_snapshot_series(app, client, headers):
+    with app.app_context():
+        take_snapshot(date(2024, 3, 1))
+        db.session.get(Unit, 1).status = 'occupied'
+        db.session.commit()
+        take_snapshot(date(2024, 3, 2))
+
+        series = snapshot_series(1, 'day', date(2024, 3, 1), date(2024, 3, 31))
+        assert [(row['period'], row['occupied_units'], row['occupancy_rate']) for row in series] == [
+            ('2024-03-01', 0, 0), ('2024-03-02', 1, 20.0)
+        ]
+        assert snapshot_series(2, 'day', date(2024, 3, 1), date(2024, 3, 31)) == []
+        with pytest.raises(ValueError):
+            snapshot_series(1, 'quarter', date(2024, 3, 1), date(2024, 3, 31))
+
+    response = client.get('/api/dashboard/charts/occupancy-trend?from=2024-03-01&to=2024-03-31&granularity=day',
+                          headers=headers)
+    assert response.status_code == 200
+    assert [row['vacancy_days'] for row in response.get_json()['trend']] == [5, 4]
+    assert client.get('/api/dashboard/charts/occupancy-trend?granularity=year',
+                      headers=headers).status_code == 400
@@ -0,0 +1,82 @@
+from datetime import date, timedelta
+
+import pytest
+from src.models.property import db
+from src.models.finance import Expense
+from src.utils.timeseries import bucket_start, bucket_range, sum_by_bucket, GRANULARITIES, MAX_BUCKETS
+
+DATES = [date(2023, 12, 31), date(2024, 1, 1), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 1),
+         date(2024, 7, 14), date(2024, 9, 30), date(2024, 10, 6), date(2024, 12, 30)]
+
+
+def test_bucket_start():
+    value = date(2024, 8, 15)  # خميس
+    assert [bucket_start(value, granularity) for granularity in GRANULARITIES] == [
+        date(2024, 8, 15), date(2024, 8, 12), date(2024, 8, 1), date(2024, 7, 1), date(2024, 1, 1)
+    ]
+    with pytest.raises(ValueError):
+        bucket_start(value, 'hour')
+
+
+def test_bucket_range():
+    assert bucket_range(date(2024, 1, 15), date(2024, 7, 1), 'quarter') == [
+        date(2024, 1, 1), date(2024, 4, 1), date(2024, 7, 1)
+    ]
+    with pytest.raises(ValueError):
+        bucket_range(date(2000, 1, 1), date(2000, 1, 1) + timedelta(days=MAX_BUCKETS), 'day')
+
+
+@pytest.mark.parametrize('granularity', GRANULARITIES)
+def test_sql_buckets_match_python_buckets(app, granularity):
+    """تعبير الفترة في SQL يطابق bucket_start لكل دقة"""
+    with app.app_context():
+        for index, value in enumerate(DATES):
+            db.session.add(Expense(company_id=1, expense_number=f'E{index}', amount=index + 1, expense_date=value))
+        db.session.commit()
+
+        expected = {}
+        for index, value in enumerate(DATES):
+            bucket = bucket_start(value, granularity)
+            expected[bucket] = expected.get(bucket, 0) + index + 1
+        totals = sum_by_bucket(Expense.amount, Expense.expense_date, granularity, DATES[0], DATES[-1],
+                               filters=[Expense.company_id == 1])
+        assert {bucket: float(total) for bucket, total in totals.items()} == expected
+
+
+def test_cash_flow_and_revenue_series(app, client, headers, create_contract):
+    create_contract(start_date='2024-01-01', end_date='2024-03-31')
+    response = client.post('/api/contracts/payments/pay', headers=headers, json={'payments': [
+        {'payment_id': 1, 'payment_date': '2024-01-03'},
+        {'payment_id': 2, 'payment_date': '2024-02-05', 'paid_amount': 600},
+    ]})
+    assert response.get_json()['paid'] == 2
+    assert client.post('/api/finance/expenses', headers=headers, json={
+        'amount': 250, 'expense_date': '2024-02-20', 'category_id': 1, 'status': 'paid'
+    }).status_code == 201
+
+    # الدقة الشهرية من الملخص والأسبوعية من الجداول الأصلية
+    response = client.get('/api/finance/reports/cash-flow?from=2024-01-01&to=2024-03-31&granularity=month',
+                          headers=headers)
+    assert [(row['period'], row['revenue'], row['expenses'], row['net_cash_flow'])
+            for row in response.get_json()['cash_flow']] == [
+        ('2024-01-01', 1000.0, 0.0, 1000.0), ('2024-02-01', 600.0, 250.0, 350.0), ('2024-03-01', 0.0, 0.0, 0.0)
+    ]
+    response = client.get('/api/finance/reports/cash-flow?from=2024-01-29&to=2024-02-25&granularity=week',
+                          headers=headers)
+    assert [(row['period'], row['revenue'], row['expenses']) for row in response.get_json()['cash_flow']] == [
+        ('2024-01-29', 0.0, 0.0), ('2024-02-05', 600.0, 0.0), ('2024-02-12', 0.0, 0.0), ('2024-02-19', 0.0, 250.0)
+    ]
+
+    response = client.get('/api/dashboard/charts/revenue?from=2024-01-01&to=2024-06-30&granularity=quarter',
+                          headers=headers)
+    assert [(row['period'], row['revenue']) for row in response.get_json()['revenue_data']] == [
+        ('2024-01-01', 1600.0), ('2024-04-01', 0.0)
+    ]
+
+
+def test_invalid_series_args(client, headers):
+    assert client.get('/api/finance/reports/cash-flow?granularity=hour', headers=headers).status_code == 400
+    assert client.get('/api/finance/reports/cash-flow?from=2024-03-01&to=2024-01-01',
+                      headers=headers).status_code == 400
+    assert client.get('/api/dashboard/charts/revenue?from=2000-01-01&to=2024-01-01&granularity=day',
+                      headers=headers).status_code == 400
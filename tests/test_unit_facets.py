@@ -0,0 +1,41 @@
+from src.models.property import db, Unit
+from src.utils.metrics import facet_counts
+
+
+def set_units(app):
+    with app.app_context():
+        for unit_id, status, bedrooms in ((1, 'occupied', 2), (2, 'occupied', 3), (3, 'available', 2),
+                                          (4, 'maintenance', 2), (5, 'available', None)):
+            unit = db.session.get(Unit, unit_id)
+            unit.status, unit.bedrooms = status, bedrooms
+        db.session.commit()
+
+
+def test_facet_counts_exclude_their_own_filter(app):
+    set_units(app)
+    with app.app_context():
+        total, facets = facet_counts(Unit, [Unit.company_id == 1], {'status': Unit.status, 'bedrooms': Unit.bedrooms},
+                                     {'status': 'occupied', 'bedrooms': 2})
+    assert total == 1
+    # الحالة تحت فلتر الغرف فقط، والغرف تحت فلتر الحالة فقط
+    assert facets == {
+        'status': [{'value': 'available', 'count': 1}, {'value': 'maintenance', 'count': 1},
+                   {'value': 'occupied', 'count': 1}],
+        'bedrooms': [{'value': 2, 'count': 1}, {'value': 3, 'count': 1}]
+    }
+
+
+def test_units_list_with_facets(app, client, headers):
+    set_units(app)
+    response = client.get('/api/properties/units?facets=1&status=occupied&per_page=1', headers=headers)
+    assert response.status_code == 200
+    result = response.get_json()
+    assert (result['total'], result['pages'], [unit['id'] for unit in result['units']]) == (2, 2, [1])
+    assert result['facets']['status'] == [{'value': 'available', 'count': 2}, {'value': 'occupied', 'count': 2},
+                                          {'value': 'maintenance', 'count': 1}]
+    assert result['facets']['bedrooms'] == [{'value': 2, 'count': 1}, {'value': 3, 'count': 1}]
+    assert result['facets']['unit_type_id'] == [{'value': None, 'count': 2}]
+
+    # بدون facets تبقى القائمة كما هي
+    result = client.get('/api/properties/units?status=available', headers=headers).get_json()
+    assert ('facets' not in result, result['total']) == (True, 2)
@@ -0,0 +1,58 @@
+import io
+
+from src.models.property import Building, Unit
+from src.utils.bulk_import import UnitImporter
+from src.utils.search_index import global_search
+
+BODY = 'building_id,building_name,unit_number,status,bedrooms\n' \
+       '1,,201,available,2\n' \
+       ',المبنى الثاني,1,occupied,\n' \
+       ',المبنى الثانى,2,reserved,\n' \
+       '1,,101,available,\n' \
+       ',المبنى الاول,202,sold,x\n'
+
+
+def upload(client, headers, url, body):
+    return client.post(url, headers=headers, content_type='multipart/form-data',
+                       data={'file': (io.BytesIO(body.encode('utf-8')), 'data.csv')})
+
+
+def test_unit_import(app, client, headers, assert_consistent):
+    response = upload(client, headers, '/api/properties/units/import', BODY)
+    assert response.status_code == 200
+    report = response.get_json()
+    # اسم المبنى الجديد يُطابق بعد التوحيد فيُنشأ مرة واحدة، والمكرر والقيم غير الصالحة تُرفض بأرقام أسطرها
+    assert (report['imported'], report['failed'], report['created']) == (3, 2, {'buildings': 1})
+    assert [error['row'] for error in report['errors']] == [5, 6]
+    assert len(report['errors'][1]['errors']) == 2
+    assert_consistent()
+
+    with app.app_context():
+        building = Building.query.filter_by(name='المبنى الثاني').one()
+        assert sorted(unit.unit_number for unit in Unit.query.filter_by(building_id=building.id)) == ['1', '2']
+        assert global_search(1, 'الثاني', ['building', 'unit'])[1] == {'building': 1, 'unit': 2}
+
+
+def test_dry_run_and_missing_columns(app, client, headers):
+    response = upload(client, headers, '/api/properties/units/import?dry_run=1', BODY)
+    assert (response.get_json()['imported'], response.get_json()['dry_run']) == (3, True)
+    with app.app_context():
+        assert (Building.query.count(), Unit.query.count()) == (1, 5)
+
+    assert upload(client, headers, '/api/properties/units/import', 'unit_number\n1\n').status_code == 400
+    assert upload(client, headers, '/api/properties/units/import', 'name\nx\n').status_code == 400
+    assert client.post('/api/properties/units/import', headers=headers).status_code == 400
+
+
+def test_duplicates_across_chunks(app):
+    """الوحدات المدرجة في دفعة سابقة تحت مبنى جديد تُرفض إذا تكررت في الدفعات التالية"""
+    with app.app_context():
+        importer = UnitImporter(1)
+        importer.preload()
+        importer.import_chunk([(2, {'building_name': 'برج', 'unit_number': '1'}),
+                               (3, {'building_name': 'برج', 'unit_number': '2'})])
+        importer.import_chunk([(4, {'building_name': 'برج', 'unit_number': '1'}),
+                               (5, {'building_name': 'برج', 'unit_number': '3'})])
+        report = importer.report.to_dict()
+        assert (report['imported'], report['failed'], report['created']) == (3, 1, {'buildings': 1})
+        assert Building.query.filter_by(name='برج').count() == 1
@@ -0,0 +1,38 @@
+from src.models.property import db, Unit
+
+
+def set_units(app):
+    with app.app_context():
+        for unit_id, rent, area, bedrooms, status in ((1, 1000, 100, 2, 'available'), (2, 1400, 120, 3, 'available'),
+                                                      (3, 900, 80, 2, 'available'), (4, 1200, 150, 3, 'occupied'),
+                                                      (5, 2000, None, None, 'available')):
+            unit = db.session.get(Unit, unit_id)
+            unit.current_rent, unit.area, unit.bedrooms, unit.status = rent, area, bedrooms, status
+            unit.furnished = unit_id == 3
+        db.session.commit()
+
+
+def match(client, headers, query):
+    response = client.get(f'/api/properties/units/match?{query}', headers=headers)
+    assert response.status_code == 200
+    result = response.get_json()
+    return result['total'], [(unit['id'], unit['match_score']) for unit in result['units']]
+
+
+def test_units_are_ranked_by_distance_to_the_request(app, client, headers):
+    set_units(app)
+    # المسافة متساوية عن منتصف النطاق (1200): الإيجار الأقل أولاً، والوحدة المشغولة مستبعدة
+    assert match(client, headers, 'min_rent=1000&max_rent=1400') == (2, [(1, 0.8571), (2, 0.8571)])
+    assert match(client, headers, 'min_rent=1000&max_rent=1400&min_bedrooms=3') == (1, [(2, 0.8571)])
+    assert match(client, headers, 'max_area=110') == (2, [(1, 0.9167), (3, 0.7857)])
+    assert match(client, headers, 'min_rent=1000&max_rent=1400&limit=1') == (2, [(1, 0.8571)])
+    assert match(client, headers, 'furnished=true') == (1, [(3, 1.0)])
+    # بدون معايير نطاق: الإيجار الأقل أولاً
+    assert [unit_id for unit_id, _ in match(client, headers, 'building_id=1')[1]] == [3, 1, 2, 5]
+    assert match(client, headers, 'min_rent=5000') == (0, [])
+
+
+def test_invalid_criteria(client, headers):
+    assert client.get('/api/properties/units/match?min_rent=2000&max_rent=1000',
+                      headers=headers).status_code == 400
+    assert client.get('/api/properties/units/match?furnished=maybe', headers=headers).status_code == 400